@@ -1,20 +1,69 @@
-from .agents import (
-    BUILT_IN_TOOLS,
-    SUB_AGENT_RESEARCHER,
-    SUB_AGENT_RESEARCHER_TOOLS,
-    get_researcher_model,
-    get_supervisor_model,
-)
-from .prompts import SUPERVISOR_INSTRUCTIONS
-from .state import DeepAgentState
-from .tools import _create_task_tool
-from .utils import stream_agent_for_websocket
+"""Module: __init__.py
+
+Description:
+    Exports for the agents package. Exports are loaded lazily on first access so that importing the package (or
+    one of its light modules like `utils`) doesn't pull in LangChain, LangGraph and the model provider SDKs until
+    an agent is actually needed.
+
+Author: Nathan Thomas
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .agents import (
+        BUILT_IN_TOOLS,
+        SUB_AGENT_RESEARCHER,
+        SUB_AGENT_RESEARCHER_TOOLS,
+        build_supervisor_agent,
+        close_clients,
+        get_researcher_model,
+        get_supervisor_agent,
+        get_supervisor_model,
+        warm_up,
+    )
+    from .prompts import SUPERVISOR_INSTRUCTIONS
+    from .state import DeepAgentState
+    from .tools import _create_task_tool
+    from .utils import stream_agent_for_websocket
+
+# Maps each export to the module it's defined in
+_EXPORTS = {
+    "_create_task_tool": ".tools",
+    "build_supervisor_agent": ".agents",
+    "close_clients": ".agents",
+    "get_researcher_model": ".agents",
+    "get_supervisor_agent": ".agents",
+    "get_supervisor_model": ".agents",
+    "stream_agent_for_websocket": ".utils",
+    "warm_up": ".agents",
+    "DeepAgentState": ".state",
+    "BUILT_IN_TOOLS": ".agents",
+    "SUB_AGENT_RESEARCHER": ".agents",
+    "SUB_AGENT_RESEARCHER_TOOLS": ".agents",
+    "SUPERVISOR_INSTRUCTIONS": ".prompts",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "_create_task_tool",
+    "build_supervisor_agent",
+    "close_clients",
     "get_researcher_model",
+    "get_supervisor_agent",
     "get_supervisor_model",
     "stream_agent_for_websocket",
+    "warm_up",
     "DeepAgentState",
     "BUILT_IN_TOOLS",
     "SUB_AGENT_RESEARCHER",
@@ -7,51 +7,67 @@ Description:
 Author: Nathan Thomas
 """
 
-from langchain.chat_models import init_chat_model
+from typing import Any
+
 from langchain_core.language_models import BaseChatModel
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.prebuilt import create_react_agent
 
 from ..shared.config import app_config
-from .prompts import RESEARCHER_INSTRUCTIONS
+from .context import build_context_hook
+from .llm_cache import close_llm_cache
+from .model_router import build_chat_model, build_endpoints, build_model_router
+from .prompt_caching import prepare_cached_agent
+from .prompts import RESEARCHER_INSTRUCTIONS, SUPERVISOR_INSTRUCTIONS
+from .state import DeepAgentState
 from .tools import (
+    _create_task_tool,
     get_today_str,
     ls,
     read_file,
+    research_tools,
     tavily_search,
     think_tool,
     write_file,
     write_todos,
 )
 from .tools.task_tool import SubAgent
+from .utils import close_chat_model
 
 
-def build_chat_model(model_api_key: str, model_base_url: str, model_name: str, model_provider: str) -> BaseChatModel:
-    """Builds a chat model with the given parameters.
+def build_role_router(
+    role: str, model_api_key: str, model_base_url: str, model_name: str, model_provider: str, extra_endpoints: str
+) -> BaseChatModel:
+    """Build the router for a model role from its configuration: its configured model and any extra endpoints,
+    with the fallback model (if one is configured) after them.
 
     Args:
-        model_api_key (str): The API key for the model
-        model_base_url (str): The base URL for the model
-        model_name (str): The name of the model
-        model_provider (str): The provider of the model
+        role (str): The role (e.g. "supervisor")
+        model_api_key (str): The API key for the role's models
+        model_base_url (str): The base URL of the role's model
+        model_name (str): The name of the role's model
+        model_provider (str): The provider of the role's model
+        extra_endpoints (str): The role's extra endpoints
 
     Returns:
-        BaseChatModel: A chat model created based on given parameters
+        BaseChatModel: The router
     """
 
-    if model_name == "":
-        raise ValueError("Model name cannot be empty")
+    endpoints = build_endpoints(model_api_key, model_base_url, model_name, model_provider, extra_endpoints)
+    fallback = get_fallback_model()
+    fallbacks = [(app_config.FALLBACK_MODEL_NAME, fallback)] if fallback is not None else []
 
-    return init_chat_model(
-        model=model_name,
-        model_provider=model_provider if model_provider != "" else None,
-        base_url=model_base_url if model_base_url != "" else None,
-        api_key=model_api_key if model_api_key != "" else None,
-        temperature=0.0,
-    )
+    return build_model_router(role, endpoints, fallbacks)
 
 
 # Model instances - initialized lazily when first accessed
 _supervisor_model: BaseChatModel | None = None
 _researcher_model: BaseChatModel | None = None
+_fallback_model: BaseChatModel | None = None
+
+# The compiled supervisor agent and the checkpointer it was built with. Compiling the graph takes tens of
+# milliseconds and the compiled graph holds no per-run state, so every run with the same checkpointer shares it.
+_supervisor_agent: tuple[BaseCheckpointSaver | None, Any] | None = None
 
 
 def get_supervisor_model() -> BaseChatModel:
@@ -63,11 +79,13 @@ def get_supervisor_model() -> BaseChatModel:
 
     global _supervisor_model
     if _supervisor_model is None:
-        _supervisor_model = build_chat_model(
+        _supervisor_model = build_role_router(
+            "supervisor",
             app_config.SUPERVISOR_MODEL_API_KEY,
             app_config.SUPERVISOR_MODEL_BASE_URL,
             app_config.SUPERVISOR_MODEL_NAME,
             app_config.SUPERVISOR_MODEL_PROVIDER,
+            app_config.SUPERVISOR_MODEL_ENDPOINTS,
         )
     return _supervisor_model
 
@@ -81,15 +99,54 @@ def get_researcher_model() -> BaseChatModel:
 
     global _researcher_model
     if _researcher_model is None:
-        _researcher_model = build_chat_model(
+        _researcher_model = build_role_router(
+            "researcher",
             app_config.RESEARCHER_MODEL_API_KEY,
             app_config.RESEARCHER_MODEL_BASE_URL,
             app_config.RESEARCHER_MODEL_NAME,
             app_config.RESEARCHER_MODEL_PROVIDER,
+            app_config.RESEARCHER_MODEL_ENDPOINTS,
         )
     return _researcher_model
 
 
+def get_fallback_model() -> BaseChatModel | None:
+    """Get the model that answers for the supervisor and researcher models while theirs are failing, initializing
+    it if necessary.
+
+    Returns:
+        BaseChatModel | None: The fallback model, or None if none is configured
+    """
+
+    global _fallback_model
+    if _fallback_model is None and app_config.FALLBACK_MODEL_NAME != "":
+        _fallback_model = build_chat_model(
+            app_config.FALLBACK_MODEL_API_KEY,
+            app_config.FALLBACK_MODEL_BASE_URL,
+            app_config.FALLBACK_MODEL_NAME,
+            app_config.FALLBACK_MODEL_PROVIDER,
+        )
+    return _fallback_model
+
+
+async def close_clients() -> None:
+    """Close the pooled HTTP clients held by every model and research tool, and the LLM response cache. Models are
+    rebuilt on next use.
+    """
+
+    global _supervisor_model, _researcher_model, _fallback_model, _supervisor_agent
+    for model in (_supervisor_model, _researcher_model):
+        if model is not None:
+            await close_chat_model(model)
+
+    _supervisor_model = None
+    _researcher_model = None
+    _fallback_model = None
+    _supervisor_agent = None
+    await research_tools.close_clients()
+    close_llm_cache()
+
+
 # Tools
 SUB_AGENT_RESEARCHER_TOOLS = [tavily_search, think_tool, read_file]
 BUILT_IN_TOOLS = [ls, read_file, write_file, write_todos, think_tool]
@@ -100,4 +157,81 @@ SUB_AGENT_RESEARCHER: SubAgent = {
     "description": "Delegate research to the sub-agent researcher. Only give this researcher one topic at a time.",
     "prompt": RESEARCHER_INSTRUCTIONS.format(date=get_today_str()),
     "tools": [f.name for f in SUB_AGENT_RESEARCHER_TOOLS],
+    "context_token_budget": app_config.RESEARCHER_CONTEXT_TOKEN_BUDGET,
 }
+
+
+def build_supervisor_agent(checkpointer: BaseCheckpointSaver | None = None) -> Any:
+    """Build the supervisor agent graph along with its research sub-agents.
+
+    Args:
+        checkpointer (BaseCheckpointSaver | None): Saves the graph state after every step so runs can be resumed.
+            Sub-agents inherit it from the supervisor.
+
+    Returns:
+        Any: The compiled supervisor agent graph
+    """
+
+    task_tool = _create_task_tool(
+        SUB_AGENT_RESEARCHER_TOOLS, [SUB_AGENT_RESEARCHER], get_researcher_model(), DeepAgentState
+    )
+
+    # Tools are always sent in this order (without duplicates) so the prompt prefix stays cacheable
+    all_tools = list({tool.name: tool for tool in SUB_AGENT_RESEARCHER_TOOLS + BUILT_IN_TOOLS + [task_tool]}.values())
+    model, prompt = prepare_cached_agent(get_supervisor_model(), all_tools, SUPERVISOR_INSTRUCTIONS)
+
+    return create_react_agent(
+        model,
+        all_tools,
+        prompt=prompt,
+        state_schema=DeepAgentState,
+        checkpointer=checkpointer,
+        pre_model_hook=build_context_hook(
+            "supervisor", app_config.SUPERVISOR_CONTEXT_TOKEN_BUDGET, app_config.CONTEXT_KEEP_RECENT_MESSAGES
+        ),
+    )
+
+
+def get_supervisor_agent(checkpointer: BaseCheckpointSaver | None = None) -> Any:
+    """Get the compiled supervisor agent graph for a checkpointer, building it if necessary.
+
+    Args:
+        checkpointer (BaseCheckpointSaver | None): The checkpointer the graph saves its state with
+
+    Returns:
+        Any: The compiled supervisor agent graph
+    """
+
+    global _supervisor_agent
+    if _supervisor_agent is None or _supervisor_agent[0] is not checkpointer:
+        _supervisor_agent = (checkpointer, build_supervisor_agent(checkpointer))
+    return _supervisor_agent[1]
+
+
+def warm_up(checkpointer: BaseCheckpointSaver | None = None) -> list[str]:
+    """Build the models, the supervisor agent graph and the research tools' clients ahead of the first research
+    run, so that it doesn't pay their initialization cost. Anything that can't be built yet (e.g. because an API
+    key is missing) is skipped and left to be built, and to fail, on first use as before.
+
+    Args:
+        checkpointer (BaseCheckpointSaver | None): The checkpointer research runs are saved with
+
+    Returns:
+        list[str]: The names of the components that couldn't be built
+    """
+
+    components = {
+        "supervisor_agent": lambda: get_supervisor_agent(checkpointer),
+        "summarization_model": research_tools.get_summarization_model,
+        "tavily_client": research_tools.get_tavily_client,
+        "http_client": research_tools.get_http_client,
+    }
+
+    failed = []
+    for name, build in components.items():
+        try:
+            build()
+        except Exception:
+            failed.append(name)
+
+    return failed
@@ -0,0 +1,144 @@
+"""Module: context.py
+
+Description:
+    Context-window management for agents. Every model turn re-sends the whole conversation, and tool results (web
+    search summaries above all) make up most of it, so per-turn cost and latency grow with every tool round. A
+    pre-model hook keeps each agent's model input within a token budget by replacing old tool results with a short
+    note. Their content isn't lost: research results are already offloaded to `files`, and the agent can read them
+    back with `read_file`.
+
+    Trimming only changes what the model is sent, not the conversation kept in state. The system prompt, the
+    original task, every assistant message, and the most recent messages are always sent in full. Tool results
+    that have been removed once stay removed, and each trim goes well below the budget, so the start of the
+    conversation changes only now and then and stays cacheable by the provider in between.
+
+    The same hook tells the agent to wrap up once its research run has gone over its token or cost budget (see
+    `usage.py`).
+
+Author: Nathan Thomas
+"""
+
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from langchain_core.messages import AnyMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from ..shared.config import app_config
+from ..shared.metrics import registry
+from .usage import BUDGET_EXCEEDED_NOTE, budget_exceeded
+
+context_turns = registry.counter(
+    "llm_context_turns_total", "Model turns taken by agents with a context token budget", ["agent"]
+)
+context_trimmed_turns = registry.counter(
+    "llm_context_trimmed_turns_total", "Model turns sent with old tool results removed from the context", ["agent"]
+)
+context_tokens_saved = registry.counter(
+    "llm_context_tokens_saved_total",
+    "Estimated input tokens not sent to models because old tool results were removed from the context",
+    ["agent"],
+)
+
+# Once over budget, enough tool results are removed to bring the context down to this share of the budget
+LOW_WATER_RATIO = 0.6
+
+
+def elided_tool_result(message: ToolMessage) -> ToolMessage:
+    """Replace a tool result's content with a note that it was removed from the context.
+
+    Args:
+        message (ToolMessage): The tool result
+
+    Returns:
+        ToolMessage: A copy of the tool result without its content
+    """
+
+    note = (
+        f"[Earlier {message.name or 'tool'} result removed from the context to save space. Anything it saved to "
+        "files is still there, use read_file to look at it again.]"
+    )
+    return message.model_copy(update={"content": note, "artifact": None})
+
+
+def trim_context(
+    messages: Sequence[AnyMessage], elided: Sequence[str], budget: int, keep_recent: int
+) -> tuple[list[AnyMessage], list[str], int]:
+    """Fit a conversation into a token budget by removing the content of old tool results.
+
+    Args:
+        messages (Sequence[AnyMessage]): The conversation
+        elided (Sequence[str]): Tool call IDs of the tool results removed on earlier turns
+        budget (int): The maximum estimated number of tokens to send
+        keep_recent (int): The number of most recent messages that are always sent in full
+
+    Returns:
+        tuple[list[AnyMessage], list[str], int]: The messages to send, the tool call IDs of every removed tool
+            result, and the estimated number of tokens saved
+    """
+
+    elided_ids = set(elided)
+    all_elided = list(elided)
+    view = list(messages)
+    sizes = [count_tokens_approximately([message]) for message in view]
+    full_tokens = sum(sizes)
+
+    for index, message in enumerate(view):
+        if isinstance(message, ToolMessage) and message.tool_call_id in elided_ids:
+            view[index] = elided_tool_result(message)
+            sizes[index] = count_tokens_approximately([view[index]])
+
+    tokens = sum(sizes)
+    if tokens > budget:
+        for index in range(max(0, len(view) - keep_recent)):
+            message = view[index]
+            if not isinstance(message, ToolMessage) or message.tool_call_id in elided_ids:
+                continue
+
+            view[index] = elided_tool_result(message)
+            new_size = count_tokens_approximately([view[index]])
+            tokens -= sizes[index] - new_size
+            sizes[index] = new_size
+            elided_ids.add(message.tool_call_id)
+            all_elided.append(message.tool_call_id)
+            if tokens <= budget * LOW_WATER_RATIO:
+                break
+
+    return view, all_elided, max(0, full_tokens - tokens)
+
+
+def build_context_hook(agent: str, budget: int, keep_recent: int) -> Callable[[dict[str, Any]], dict[str, Any]] | None:
+    """Build the pre-model hook that keeps an agent's model input within a token budget, and tells the agent to
+    wrap up once its research run is over budget.
+
+    Args:
+        agent (str): The agent's name, used to label its metrics
+        budget (int): The maximum estimated number of input tokens per turn, or 0 to send everything
+        keep_recent (int): The number of most recent messages that are always sent in full
+
+    Returns:
+        Callable[[dict[str, Any]], dict[str, Any]] | None: The hook, or None if neither the agent nor its runs
+            have a budget
+    """
+
+    run_budgets = app_config.RUN_TOKEN_BUDGET > 0 or app_config.RUN_COST_BUDGET_USD > 0
+    if budget <= 0 and not run_budgets:
+        return None
+
+    def context_hook(state: dict[str, Any]) -> dict[str, Any]:
+        messages = state["messages"]
+        elided = state.get("elided_tool_results") or []
+        if budget > 0:
+            messages, elided, saved = trim_context(messages, elided, budget, keep_recent)
+
+            context_turns.inc(agent=agent)
+            if saved:
+                context_trimmed_turns.inc(agent=agent)
+                context_tokens_saved.inc(saved, agent=agent)
+
+        if budget_exceeded():
+            messages = [*messages, HumanMessage(content=BUDGET_EXCEEDED_NOTE)]
+
+        return {"llm_input_messages": messages, "elided_tool_results": elided}
+
+    return context_hook
@@ -0,0 +1,387 @@
+"""Module: llm_cache.py
+
+Description:
+    Response cache for LLM calls. Models are built with temperature 0, so the same call (model, messages, tools
+    and parameters) gives effectively the same response, and repeating it only adds cost and latency. The cache
+    plugs into LangChain's per-model `cache` hook, which looks up every call before it's sent to the provider and
+    stores the response afterwards. Since it works per call, runs that only partly overlap with an earlier run
+    (e.g. the same sub-topic researched for a different query) still skip the calls they share.
+
+    Responses are kept in an in-memory LRU tier, backed by an optional SQLite tier that survives restarts and is
+    shared by every worker process. Entries expire after a TTL, and each tier evicts its least recently used
+    entries once it grows past its size limit.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import ChatGeneration, Generation
+
+from ..shared.config import app_config
+from ..shared.metrics import registry
+
+llm_cache_lookups = registry.counter(
+    "llm_cache_lookups_total",
+    "LLM calls looked up in the response cache, by model and whether the response was cached",
+    ["model", "result"],
+)
+llm_cache_hit_ratio = registry.gauge(
+    "llm_cache_hit_ratio", "Share of LLM calls answered from the response cache since startup, by model", ["model"]
+)
+llm_cache_evictions = registry.counter(
+    "llm_cache_evictions_total",
+    "Responses removed from the LLM response cache before being used again, by tier and reason",
+    ["tier", "reason"],
+)
+
+
+class LLMCache:
+    """Two-tier store of LLM responses keyed by a hash of the call.
+
+    The SQLite tier is accessed through a single connection guarded by a lock, so it can be used both from the
+    event loop's worker threads and from synchronous callers.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        sqlite_path: str | None = None,
+        max_sqlite_bytes: int = 0,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            ttl_seconds (float): How long a response stays valid, or 0 to keep responses until they're evicted
+            max_entries (int): The maximum number of responses in the memory tier
+            sqlite_path (str | None): The path to the SQLite database file, or None for a memory-only cache
+            max_sqlite_bytes (int): The maximum total size of the responses in the SQLite tier, or 0 for no limit
+        """
+
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_sqlite_bytes = max_sqlite_bytes
+        self._memory: OrderedDict[str, tuple[float, list[Generation]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+        if sqlite_path is not None:
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    used_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_used_at ON llm_responses (used_at)")
+
+    @property
+    def persistent(self) -> bool:
+        """Whether the cache has a SQLite tier."""
+
+        return self._conn is not None
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        """Build the cache key for an LLM call.
+
+        Args:
+            prompt (str): The serialized messages sent to the model
+            llm_string (str): The serialized model, parameters and bound tools
+
+        Returns:
+            str: The cache key
+        """
+
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def get_memory(self, key: str) -> list[Generation] | None:
+        """Look up a response in the memory tier.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            list[Generation] | None: The cached response, or None if it isn't cached or has expired
+        """
+
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+
+        expires_at, generations = entry
+        if expires_at and expires_at <= time.time():
+            del self._memory[key]
+            llm_cache_evictions.inc(tier="memory", reason="expired")
+            return None
+
+        self._memory.move_to_end(key)
+        return generations
+
+    def put_memory(self, key: str, generations: list[Generation], expires_at: float) -> None:
+        """Store a response in the memory tier, evicting the least recently used responses beyond its limit.
+
+        Args:
+            key (str): The cache key
+            generations (list[Generation]): The response
+            expires_at (float): When the response expires, as a UNIX timestamp, or 0 if it doesn't
+        """
+
+        self._memory[key] = (expires_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            llm_cache_evictions.inc(tier="memory", reason="size")
+
+    def get_persistent(self, key: str) -> tuple[list[Generation], float] | None:
+        """Look up a response in the SQLite tier. This blocks on disk, so async callers run it in a thread.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            tuple[list[Generation], float] | None: The cached response and when it expires, or None if it isn't
+                cached or has expired
+        """
+
+        if self._conn is None:
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, expires_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                llm_cache_evictions.inc(tier="sqlite", reason="expired")
+                return None
+
+            self._conn.execute("UPDATE llm_responses SET used_at = ? WHERE key = ?", (now, key))
+
+        return loads(row[0], allowed_objects="core", secrets_from_env=False), row[1] or 0
+
+    def put_persistent(self, key: str, generations: list[Generation], expires_at: float) -> None:
+        """Store a response in the SQLite tier, evicting the least recently used responses beyond its size limit.
+        This blocks on disk, so async callers run it in a thread.
+
+        Args:
+            key (str): The cache key
+            generations (list[Generation]): The response
+            expires_at (float): When the response expires, as a UNIX timestamp, or 0 if it doesn't
+        """
+
+        if self._conn is None:
+            return
+
+        response = dumps(generations)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, size, expires_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response), expires_at or None, time.time()),
+            )
+            if self.max_sqlite_bytes:
+                self._evict_persistent()
+
+    def _evict_persistent(self) -> None:
+        assert self._conn is not None
+        expired = self._conn.execute(
+            "DELETE FROM llm_responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+        if expired:
+            llm_cache_evictions.inc(expired, tier="sqlite", reason="expired")
+
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+        if total <= self.max_sqlite_bytes:
+            return
+
+        # Delete the least recently used responses until the rest fit
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY used_at").fetchall():
+            if total <= self.max_sqlite_bytes:
+                break
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+
+        llm_cache_evictions.inc(evicted, tier="sqlite", reason="size")
+
+    def expiry(self) -> float:
+        """Get the expiry of a response stored now.
+
+        Returns:
+            float: When the response expires, as a UNIX timestamp, or 0 if it doesn't
+        """
+
+        return time.time() + self.ttl_seconds if self.ttl_seconds > 0 else 0
+
+    def clear(self) -> None:
+        """Remove every response from both tiers."""
+
+        self._memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM llm_responses")
+
+    def close(self) -> None:
+        """Close the SQLite tier, if any."""
+
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+
+class ModelResponseCache(BaseCache):
+    """The cache for one model, as passed to a LangChain chat model. Each model gets its own so that lookups are
+    counted by model, while the stored responses are shared (keys already include the model's identity).
+    """
+
+    def __init__(self, cache: LLMCache, model: str) -> None:
+        self.cache = cache
+        self.model = model
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = LLMCache.key(prompt, llm_string)
+        generations = self.cache.get_memory(key)
+        if generations is None:
+            stored = self.cache.get_persistent(key)
+            if stored is not None:
+                generations = stored[0]
+                self.cache.put_memory(key, generations, stored[1])
+
+        return self._record(generations)
+
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = LLMCache.key(prompt, llm_string)
+        generations = self.cache.get_memory(key)
+        if generations is None and self.cache.persistent:
+            stored = await asyncio.to_thread(self.cache.get_persistent, key)
+            if stored is not None:
+                generations = stored[0]
+                self.cache.put_memory(key, generations, stored[1])
+
+        return self._record(generations)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = LLMCache.key(prompt, llm_string)
+        generations, expires_at = _without_message_ids(return_val), self.cache.expiry()
+        self.cache.put_memory(key, generations, expires_at)
+        self.cache.put_persistent(key, generations, expires_at)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = LLMCache.key(prompt, llm_string)
+        generations, expires_at = _without_message_ids(return_val), self.cache.expiry()
+        self.cache.put_memory(key, generations, expires_at)
+        if self.cache.persistent:
+            await asyncio.to_thread(self.cache.put_persistent, key, generations, expires_at)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
+
+    def _record(self, generations: list[Generation] | None) -> list[Generation] | None:
+        llm_cache_lookups.inc(model=self.model, result="miss" if generations is None else "hit")
+        hits = llm_cache_lookups.get(model=self.model, result="hit")
+        llm_cache_hit_ratio.set(
+            hits / (hits + llm_cache_lookups.get(model=self.model, result="miss")), model=self.model
+        )
+        if generations is None:
+            return None
+
+        # Copies, so the caller can't change the cached response, marked so that cached responses can be told apart
+        return [
+            generation.model_copy(
+                update={
+                    "message": generation.message.model_copy(
+                        update={"response_metadata": {**generation.message.response_metadata, "cached": True}}
+                    )
+                }
+            )
+            if isinstance(generation, ChatGeneration)
+            else generation.model_copy()
+            for generation in generations
+        ]
+
+
+def _without_message_ids(generations: Sequence[Generation]) -> list[Generation]:
+    # A cached message keeping its original ID would replace, rather than add to, a message with the same ID in the
+    # agent's state, so IDs are dropped and assigned afresh on every use
+    return [
+        generation.model_copy(update={"message": generation.message.model_copy(update={"id": None})})
+        if isinstance(generation, ChatGeneration)
+        else generation
+        for generation in generations
+    ]
+
+
+# The cache shared by every model - initialized lazily when first accessed
+_llm_cache: LLMCache | None = None
+
+
+def get_llm_cache() -> LLMCache | None:
+    """Get the LLM response cache, initializing it if necessary.
+
+    Returns:
+        LLMCache | None: The cache, or None if caching is disabled
+
+    Raises:
+        ValueError: If the configured cache backend is unknown
+    """
+
+    global _llm_cache
+    backend = app_config.LLM_CACHE_BACKEND
+    if backend == "none":
+        return None
+
+    if _llm_cache is None:
+        if backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown LLM cache backend: {backend}")
+
+        _llm_cache = LLMCache(
+            ttl_seconds=app_config.LLM_CACHE_TTL_SECONDS,
+            max_entries=app_config.LLM_CACHE_MAX_ENTRIES,
+            sqlite_path=app_config.LLM_CACHE_SQLITE_PATH if backend == "sqlite" else None,
+            max_sqlite_bytes=int(app_config.LLM_CACHE_MAX_MB * 1024 * 1024),
+        )
+    return _llm_cache
+
+
+def build_model_cache(model: str) -> ModelResponseCache | None:
+    """Build the response cache for a model.
+
+    Args:
+        model (str): The model name, used to label its cache metrics
+
+    Returns:
+        ModelResponseCache | None: The model's cache, or None if caching is disabled
+    """
+
+    cache = get_llm_cache()
+    return None if cache is None else ModelResponseCache(cache, model)
+
+
+def close_llm_cache() -> None:
+    """Close the LLM response cache. It's reopened on next use."""
+
+    global _llm_cache
+    if _llm_cache is not None:
+        _llm_cache.close()
+    _llm_cache = None
@@ -0,0 +1,393 @@
+"""Module: memory.py
+
+Description:
+    Memory accounting for research runs, and caps on the virtual filesystem in agent state. Every search saves
+    whole web pages into `files`, and sub-agents merge their files back into the supervisor's, so a single run can
+    otherwise grow its state without bound.
+
+    A run's `RunMemory` tracks the size of each agent's state (files, messages and todos) as the run streams, and
+    what was done to keep the files within their caps. Sizes are counted in characters, which is close to the
+    bytes a string takes in memory for the mostly-ASCII text agents work with.
+
+    Files are capped as they're merged into state (see `file_reducer` in `state.py`):
+    - Above STATE_FILES_SOFT_LIMIT_BYTES, the raw page content of the oldest search results is evicted, keeping
+      their summaries.
+    - Above STATE_FILES_HARD_LIMIT_BYTES, the oldest files are spilled to disk in the run's own directory within
+      STATE_SPILL_DIR and replaced with a short stub, until the files are back under the soft limit. `read_file`
+      reads spilled files from disk, so agents can still use them. A run's directory is deleted once the run is
+      finished and can no longer be resumed.
+
+    This module is imported by the WebSocket server at startup, so it must stay free of the agent stack.
+
+Author: Nathan Thomas
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from ..shared.config import app_config
+from ..shared.metrics import registry
+
+state_size = registry.histogram(
+    "research_run_state_peak_bytes",
+    "Peak size of a research run's agent state, by part (files, messages or todos)",
+    ["part"],
+    buckets=(1e4, 1e5, 1e6, 4e6, 1.6e7, 6.4e7, 2.56e8, 1.024e9),
+)
+file_evictions = registry.counter(
+    "state_files_evicted_total",
+    "Files shrunk to keep agent state within its caps, by action (raw_content or spilled)",
+    ["action"],
+)
+file_eviction_bytes = registry.counter(
+    "state_files_evicted_bytes_total",
+    "Bytes removed from agent state to keep it within its caps, by action",
+    ["action"],
+)
+
+spill_failures = registry.counter(
+    "state_spill_failures_total", "Files that couldn't be spilled to disk, and were kept in memory instead"
+)
+
+logger = logging.getLogger(__name__)
+
+# Spilled files are written (and deleted) in order on one thread, off the event loop. Until a file is written, its
+# content is kept here by path so it can still be read.
+_spill_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-spill")
+_pending_spills: dict[str, str] = {}
+_pending_lock = threading.Lock()
+
+# Where a search result's raw page content starts in its file (see `tavily_search`)
+RAW_CONTENT_HEADING = "\n## Raw Content\n"
+RAW_CONTENT_EVICTED = "Evicted to save memory. The summary above is all that was kept of this page.\n"
+
+# Spilled files are replaced by a stub starting with this, followed by the spilled file's name
+SPILLED_FILE_PREFIX = "[Spilled to disk to save memory: "
+
+
+@dataclass
+class StateSize:
+    """Sizes of the parts of an agent's state, in characters."""
+
+    files: int = 0
+    messages: int = 0
+    todos: int = 0
+
+
+def measure_state(state: Mapping[str, Any]) -> StateSize:
+    """Measure the size of an agent's state.
+
+    Args:
+        state (Mapping[str, Any]): The agent's state
+
+    Returns:
+        StateSize: The size of its files, messages and todos
+    """
+
+    messages = 0
+    for message in state.get("messages") or []:
+        content = getattr(message, "content", "")
+        messages += len(content) if isinstance(content, str) else len(str(content))
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            messages += len(str(tool_call.get("args", "")))
+
+    return StateSize(
+        files=sum(len(content) for content in (state.get("files") or {}).values()),
+        messages=messages,
+        todos=sum(len(todo.get("content", "")) for todo in state.get("todos") or []),
+    )
+
+
+class RunMemory:
+    """State size and file evictions of a single research run."""
+
+    def __init__(self, run_id: str | None = None) -> None:
+        # The run's files are spilled to its own directory, which is deleted once the run is finished for good
+        self.run_id = run_id
+
+        # The latest size of each graph's state, keyed by its namespace ("" for the supervisor's own graph)
+        self.graphs: dict[str, StateSize] = {}
+        self.peak = StateSize()
+        self.evicted = {"raw_content": 0, "spilled": 0}
+        self.evicted_bytes = {"raw_content": 0, "spilled": 0}
+
+        # Incremented on every update, so that streaming only sends totals that changed
+        self.version = 0
+
+    @property
+    def total(self) -> StateSize:
+        """The size of every graph's state put together."""
+
+        return StateSize(
+            files=sum(size.files for size in self.graphs.values()),
+            messages=sum(size.messages for size in self.graphs.values()),
+            todos=sum(size.todos for size in self.graphs.values()),
+        )
+
+    def record_state(self, graph: str, state: Mapping[str, Any]) -> None:
+        """Record the latest state of one of the run's graphs.
+
+        Args:
+            graph (str): The graph's namespace ("" for the supervisor's own graph)
+            state (Mapping[str, Any]): The graph's state
+        """
+
+        size = measure_state(state)
+        if self.graphs.get(graph) == size:
+            return
+
+        # The supervisor's graph only moves on once the sub-agents it was waiting for are done, and their files
+        # are merged into its own. Sub-agents still running are added back on their next step.
+        if not graph:
+            self.graphs.clear()
+        self.graphs[graph] = size
+        total = self.total
+        self.peak = StateSize(
+            max(self.peak.files, total.files),
+            max(self.peak.messages, total.messages),
+            max(self.peak.todos, total.todos),
+        )
+        self.version += 1
+
+    def record_eviction(self, action: str, size: int) -> None:
+        """Record a file shrunk to keep the run's state within its caps.
+
+        Args:
+            action (str): What was done ("raw_content" or "spilled")
+            size (int): The number of characters removed from state
+        """
+
+        self.evicted[action] += 1
+        self.evicted_bytes[action] += size
+        self.version += 1
+
+    def finish(self) -> None:
+        """Record the run's peak state size in metrics once it's done."""
+
+        for part, size in asdict(self.peak).items():
+            state_size.observe(size, part=part)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Summarize the run's memory use for a memory event.
+
+        Returns:
+            dict[str, Any]: The current and peak size of its state, and what was evicted to keep it within its caps
+        """
+
+        return {
+            "state_bytes": asdict(self.total),
+            "peak_state_bytes": asdict(self.peak),
+            "files_soft_limit_bytes": app_config.STATE_FILES_SOFT_LIMIT_BYTES or None,
+            "files_hard_limit_bytes": app_config.STATE_FILES_HARD_LIMIT_BYTES or None,
+            "evicted_raw_content": self.evicted["raw_content"],
+            "spilled_files": self.evicted["spilled"],
+            "evicted_bytes": sum(self.evicted_bytes.values()),
+        }
+
+
+# The memory accounting of the research run being executed
+current_run_memory: ContextVar[RunMemory | None] = ContextVar("current_run_memory", default=None)
+
+
+def record_state(graph: str, state: Mapping[str, Any]) -> None:
+    """Record the latest state of one of the current research run's graphs, if there is a run.
+
+    Args:
+        graph (str): The graph's namespace
+        state (Mapping[str, Any]): The graph's state
+    """
+
+    run_memory = current_run_memory.get()
+    if run_memory is not None:
+        run_memory.record_state(graph, state)
+
+
+def _record_eviction(action: str, size: int) -> None:
+    """Count a file shrunk to keep state within its caps, for metrics and the current research run.
+
+    Args:
+        action (str): What was done ("raw_content" or "spilled")
+        size (int): The number of characters removed from state
+    """
+
+    file_evictions.inc(action=action)
+    file_eviction_bytes.inc(size, action=action)
+    run_memory = current_run_memory.get()
+    if run_memory is not None:
+        run_memory.record_eviction(action, size)
+
+
+def spill_dir(run_id: str | None = None) -> str:
+    """Get the directory files are spilled to.
+
+    Args:
+        run_id (str | None): The research run whose spilled files to locate, if any
+
+    Returns:
+        str: STATE_SPILL_DIR, or a directory in the system's temporary directory if it isn't set, or the run's own
+            directory within it
+    """
+
+    root = app_config.STATE_SPILL_DIR or os.path.join(tempfile.gettempdir(), "research-state-spill")
+    return os.path.join(root, os.path.basename(run_id)) if run_id else root
+
+
+def _write_spilled(path: str, content: str) -> None:
+    """Write a spilled file to disk, on the spill writer's thread. Content that can't be written stays in memory
+    so the file can still be read.
+
+    Args:
+        path (str): The file's path
+        content (str): The file's content
+    """
+
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "w") as file:
+                file.write(content)
+            os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        spill_failures.inc()
+        logger.warning("Failed to spill a file to %s, keeping it in memory: %s", path, e)
+        return
+
+    with _pending_lock:
+        _pending_spills.pop(path, None)
+
+
+def spill_file(content: str) -> str:
+    """Spill a file's content to the current research run's spill directory. Files are named after a hash of their
+    content, so the same content is only written once however many of the run's agents spill it.
+
+    The file is written on the spill writer's thread, since this is called from the files reducer on the event
+    loop. Until it's written, `load_file` reads it from memory.
+
+    Args:
+        content (str): The file's content
+
+    Returns:
+        str: The stub that replaces the file in state
+    """
+
+    run_memory = current_run_memory.get()
+    run_id = run_memory.run_id if run_memory is not None else None
+    name = f"{hashlib.sha256(content.encode()).hexdigest()}.md"
+    if run_id:
+        name = f"{os.path.basename(run_id)}/{name}"
+
+    path = os.path.join(spill_dir(), name)
+    with _pending_lock:
+        _pending_spills[path] = content
+    _spill_writer.submit(_write_spilled, path, content)
+
+    return f"{SPILLED_FILE_PREFIX}{name}]\n"
+
+
+def remove_spilled_files(run_id: str) -> "Future[None]":
+    """Delete a research run's spilled files once it's finished for good. The deletion runs on the spill writer's
+    thread after the run's pending writes.
+
+    Args:
+        run_id (str): The run's ID
+
+    Returns:
+        Future[None]: Resolved once the files are deleted
+    """
+
+    directory = spill_dir(run_id)
+
+    def remove() -> None:
+        shutil.rmtree(directory, ignore_errors=True)
+        with _pending_lock:
+            for path in [path for path in _pending_spills if os.path.dirname(path) == directory]:
+                del _pending_spills[path]
+
+    return _spill_writer.submit(remove)
+
+
+def load_file(content: str) -> str:
+    """Get a file's full content, reading it from the spill directory if it was spilled.
+
+    Args:
+        content (str): The file's content in state
+
+    Returns:
+        str: The file's content
+    """
+
+    if not content.startswith(SPILLED_FILE_PREFIX):
+        return content
+
+    # Spilled files are named "<run ID>/<hash>.md", or "<hash>.md" outside of a research run
+    name = content[len(SPILLED_FILE_PREFIX) :].split("]", 1)[0]
+    path = os.path.join(spill_dir(os.path.basename(os.path.dirname(name))), os.path.basename(name))
+    with _pending_lock:
+        pending = _pending_spills.get(path)
+    if pending is not None:
+        return pending
+
+    try:
+        with open(path) as file:
+            return file.read()
+    except OSError:
+        return "System reminder: This file was spilled to disk to save memory and is no longer available"
+
+
+def enforce_file_limits(files: dict[str, str]) -> dict[str, str]:
+    """Keep files within STATE_FILES_SOFT_LIMIT_BYTES and STATE_FILES_HARD_LIMIT_BYTES by evicting the raw page
+    content of the oldest search results and, if that's not enough, spilling the oldest files to disk.
+
+    Args:
+        files (dict[str, str]): The files, oldest first
+
+    Returns:
+        dict[str, str]: The files, shrunk if they were over a limit
+    """
+
+    soft_limit = app_config.STATE_FILES_SOFT_LIMIT_BYTES
+    hard_limit = app_config.STATE_FILES_HARD_LIMIT_BYTES
+    total = sum(len(content) for content in files.values())
+    if (soft_limit <= 0 or total <= soft_limit) and (hard_limit <= 0 or total <= hard_limit):
+        return files
+
+    files = dict(files)
+    target = soft_limit if soft_limit > 0 else hard_limit
+
+    # Raw page content is the bulk of most files, and the summary kept alongside it is usually enough
+    if soft_limit > 0:
+        for name, content in list(files.items()):
+            if total <= soft_limit:
+                break
+
+            heading = content.find(RAW_CONTENT_HEADING)
+            if heading < 0 or content.endswith(RAW_CONTENT_EVICTED):
+                continue
+
+            evicted = content[: heading + len(RAW_CONTENT_HEADING)] + RAW_CONTENT_EVICTED
+            files[name] = evicted
+            total -= len(content) - len(evicted)
+            _record_eviction("raw_content", len(content) - len(evicted))
+
+    if hard_limit > 0 and total > hard_limit:
+        for name, content in list(files.items()):
+            if total <= target:
+                break
+            if content.startswith(SPILLED_FILE_PREFIX):
+                continue
+
+            stub = spill_file(content)
+            files[name] = stub
+            total -= len(content) - len(stub)
+            _record_eviction("spilled", len(content) - len(stub))
+
+    return files
@@ -0,0 +1,562 @@
+"""Module: model_router.py
+
+Description:
+    Routes each model role's calls (supervisor, researcher, summarization) across one or more model endpoints. An
+    endpoint is a model at a provider (and base URL). The router keeps rolling latency and error statistics for
+    every endpoint and sends each call to the fastest healthy one, where healthy means its circuit breaker is
+    closed. Calls go through the provider's rate limiter and retries (see `app.shared.resilience`), and move on to
+    the next endpoint, and finally to any fallback endpoints, when one keeps failing.
+
+    Roles that are sensitive to tail latency can hedge: if the chosen endpoint hasn't answered by its p95 latency,
+    a second request is sent to the next best endpoint (or the same one if it's the only one), the first answer
+    wins and the other request is cancelled. Hedging only starts once an endpoint has enough latency samples for
+    its p95 to mean something.
+
+    Calls are recorded to, or replayed from, their research run's cassette when CASSETTE_MODE is set (see
+    `app.shared.cassette`). Replayed calls don't reach any endpoint.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from collections.abc import Callable, Sequence
+from functools import partial
+from typing import Any
+
+from langchain.chat_models import init_chat_model
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+    Callbacks,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from ..shared.cassette import Cassette, conversation_key, recorded
+from ..shared.config import app_config
+from ..shared.metrics import registry
+from ..shared.resilience import CircuitOpenError, CircuitState, call_provider, get_circuit_breaker, is_retryable
+from ..shared.tracing import span
+from .llm_cache import build_model_cache
+from .prompt_caching import ModelUsageHandler, supports_prompt_caching
+from .usage import current_agent, record_model_usage
+
+model_fallbacks = registry.counter(
+    "llm_model_fallbacks_total", "Model calls answered by a fallback model because the one before it failed", ["model"]
+)
+endpoint_latency = registry.gauge(
+    "llm_endpoint_latency_seconds",
+    "Rolling latency percentiles of successful calls per model endpoint",
+    ["endpoint", "quantile"],
+)
+endpoint_error_rate = registry.gauge(
+    "llm_endpoint_error_rate", "Share of recent calls to each model endpoint that failed", ["endpoint"]
+)
+hedged_calls = registry.counter(
+    "llm_hedged_calls_total",
+    "Model calls that sent a hedged second request, by which request answered first (first or hedge)",
+    ["endpoint", "winner"],
+)
+model_call_duration = registry.histogram(
+    "llm_call_duration_seconds",
+    "Duration of model calls (including retries, hedging and fallbacks), by role and result",
+    ["role", "result"],
+)
+
+# Number of recent calls per endpoint that latency and error statistics are computed over
+STATS_WINDOW = 100
+
+# Fewest latency samples for an endpoint's p95 to be used as a hedging delay
+HEDGE_MIN_SAMPLES = 20
+
+
+class EndpointStats:
+    """Rolling latency and error statistics of a model endpoint's recent calls."""
+
+    def __init__(self, endpoint: str, window: int = STATS_WINDOW) -> None:
+        self.endpoint = endpoint
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+
+    def record(self, latency: float | None) -> None:
+        """Record the outcome of a call.
+
+        Args:
+            latency (float | None): The call's latency in seconds, or None if it failed
+        """
+
+        self.outcomes.append(latency is not None)
+        if latency is not None:
+            self.latencies.append(latency)
+            endpoint_latency.set(self.percentile(0.5) or 0.0, endpoint=self.endpoint, quantile="0.5")
+            endpoint_latency.set(self.percentile(0.95) or 0.0, endpoint=self.endpoint, quantile="0.95")
+        endpoint_error_rate.set(self.error_rate, endpoint=self.endpoint)
+
+    def percentile(self, quantile: float) -> float | None:
+        """Get a latency percentile of recent successful calls.
+
+        Args:
+            quantile (float): The percentile as a fraction (e.g. 0.95)
+
+        Returns:
+            float | None: The latency in seconds, or None before any call succeeded
+        """
+
+        if not self.latencies:
+            return None
+
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1)]
+
+    @property
+    def error_rate(self) -> float:
+        return 0.0 if not self.outcomes else self.outcomes.count(False) / len(self.outcomes)
+
+
+_endpoint_stats: dict[str, EndpointStats] = {}
+
+
+def get_endpoint_stats(endpoint: str) -> EndpointStats:
+    """Get the statistics shared by every router calling a model endpoint, creating them if necessary.
+
+    Args:
+        endpoint (str): The endpoint's name
+
+    Returns:
+        EndpointStats: The endpoint's statistics
+    """
+
+    if endpoint not in _endpoint_stats:
+        _endpoint_stats[endpoint] = EndpointStats(endpoint)
+    return _endpoint_stats[endpoint]
+
+
+def reset_endpoint_stats() -> None:
+    """Forget the statistics of every model endpoint."""
+
+    _endpoint_stats.clear()
+
+
+def model_provider(model: BaseChatModel) -> str:
+    """Get the name of the provider behind a chat model, as LangChain reports it for tracing.
+
+    Args:
+        model (BaseChatModel): The chat model
+
+    Returns:
+        str: The provider's name (e.g. "anthropic", "openai", "ollama")
+    """
+
+    try:
+        return str(model._get_ls_params().get("ls_provider") or model._llm_type)
+    except Exception:
+        return model._llm_type
+
+
+def build_chat_model(model_api_key: str, model_base_url: str, model_name: str, model_provider: str) -> BaseChatModel:
+    """Builds a chat model with the given parameters.
+
+    Args:
+        model_api_key (str): The API key for the model
+        model_base_url (str): The base URL for the model
+        model_name (str): The name of the model
+        model_provider (str): The provider of the model
+
+    Returns:
+        BaseChatModel: A chat model created based on given parameters
+    """
+
+    if model_name == "":
+        raise ValueError("Model name cannot be empty")
+
+    return init_chat_model(
+        model=model_name,
+        model_provider=model_provider if model_provider != "" else None,
+        base_url=model_base_url if model_base_url != "" else None,
+        api_key=model_api_key if model_api_key != "" else None,
+        temperature=0.0,
+        # Retries go through call_provider, which respects the rate limit and circuit breaker. The SDK's own
+        # retries would multiply its attempts and hide failures from the breaker.
+        max_retries=0,
+        cache=build_model_cache(model_name),
+        callbacks=[ModelUsageHandler(model_name)],
+    )
+
+
+def parse_model_endpoints(spec: str) -> list[tuple[str, str]]:
+    """Parse extra model endpoints from their configuration string, a comma-separated list of
+    `[provider:]model[@base_url]` endpoints.
+
+    Args:
+        spec (str): The configured endpoints (e.g. "gpt-4o-mini,ollama:llama3.1@http://gpu-2:11434")
+
+    Returns:
+        list[tuple[str, str]]: The model name (with any provider prefix) and base URL of each endpoint
+    """
+
+    endpoints = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+
+        model, _, base_url = entry.strip().partition("@")
+        endpoints.append((model, base_url))
+
+    return endpoints
+
+
+def build_endpoints(
+    model_api_key: str, model_base_url: str, model_name: str, model_provider: str, extra_endpoints: str
+) -> list[tuple[str, BaseChatModel]]:
+    """Build the chat models for a role's endpoints: its configured model, and any extra endpoints, which share its
+    API key.
+
+    Args:
+        model_api_key (str): The API key for the models
+        model_base_url (str): The base URL of the configured model
+        model_name (str): The name of the configured model
+        model_provider (str): The provider of the configured model
+        extra_endpoints (str): The role's extra endpoints (see `parse_model_endpoints`)
+
+    Returns:
+        list[tuple[str, BaseChatModel]]: The name and chat model of each endpoint
+    """
+
+    endpoints = [(model_name, build_chat_model(model_api_key, model_base_url, model_name, model_provider))]
+    for name, base_url in parse_model_endpoints(extra_endpoints):
+        endpoints.append(
+            (f"{name}@{base_url}" if base_url else name, build_chat_model(model_api_key, base_url, name, ""))
+        )
+
+    return endpoints
+
+
+def child_callbacks(run_manager: CallbackManagerForLLMRun | AsyncCallbackManagerForLLMRun | None) -> Callbacks:
+    """Get the callbacks for a model called by a router, so that the model's run nests under the router's run and
+    the handlers inherited by the router (such as usage and metrics handlers) see it too.
+
+    Args:
+        run_manager (CallbackManagerForLLMRun | AsyncCallbackManagerForLLMRun | None): The router's run manager
+
+    Returns:
+        Callbacks: The callbacks for the model's run
+    """
+
+    if run_manager is None:
+        return None
+
+    manager = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    return manager
+
+
+def build_model_router(
+    role: str, endpoints: Sequence[tuple[str, BaseChatModel]], fallbacks: Sequence[tuple[str, BaseChatModel]] = ()
+) -> "ModelRouter":
+    """Build the router for a model role.
+
+    Args:
+        role (str): The role (e.g. "supervisor"), which hedges if it's listed in HEDGED_MODEL_ROLES
+        endpoints (Sequence[tuple[str, BaseChatModel]]): The name and chat model of each endpoint to route between
+        fallbacks (Sequence[tuple[str, BaseChatModel]]): The name and chat model of each endpoint to fall back to,
+            in order, when every routed endpoint fails
+
+    Returns:
+        ModelRouter: The router
+    """
+
+    hedged_roles = {name.strip() for name in app_config.HEDGED_MODEL_ROLES.split(",")}
+    everything = [*endpoints, *fallbacks]
+
+    return ModelRouter(
+        models=[model for _, model in everything],
+        names=[name for name, _ in everything],
+        fallbacks=len(fallbacks),
+        hedge=role in hedged_roles,
+        role=role,
+    )
+
+
+class ModelRouter(BaseChatModel):
+    """Chat model that routes each call to the fastest healthy of its endpoints, moving on to the next one (and
+    finally its fallbacks) while calls fail. Asynchronous calls (which is how agents call models) get routing,
+    rate limiting, retries, circuit breaking and hedging. Synchronous calls go straight to the first endpoint.
+
+    Prompts are prepared for the first endpoint (e.g. marked for prompt caching), so a role's endpoints should
+    share its provider unless prompt caching is off.
+    """
+
+    models: list[BaseChatModel]
+    names: list[str]
+
+    # The number of trailing models that are only used once every other model has failed
+    fallbacks: int = 0
+
+    # Whether to send a second request when the first one takes longer than its endpoint's p95 latency
+    hedge: bool = False
+
+    # The role the router serves (e.g. "supervisor"), which its call latencies are reported under
+    role: str = ""
+
+    # Models with call options bound to them, by model index and call options. Each agent binds its own tools to
+    # a shared router, so there's a binding per agent and endpoint.
+    _bound: dict[tuple[int, str], Runnable[LanguageModelInput, BaseMessage]] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return self.models[0]._llm_type
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"models": self.names}
+
+    def bind_tools(
+        self, tools: Sequence[dict[str, Any] | type | Callable | BaseTool], **kwargs: Any
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        # Tools are bound as dicts so that LangGraph can check which tools a bound model has
+        definitions = [tool if isinstance(tool, dict) else convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=definitions, **kwargs)
+
+    def route(self) -> list[int]:
+        """Order the endpoints for a call: healthy endpoints fastest first (endpoints without latency samples yet
+        count as fastest, so they get some), then endpoints whose circuit is open, then the fallbacks.
+
+        Returns:
+            list[int]: The endpoints' indexes, in the order they should be tried
+        """
+
+        routed = len(self.models) - self.fallbacks
+
+        def rank(index: int) -> tuple[bool, float]:
+            healthy = get_circuit_breaker(self.names[index]).state != CircuitState.OPEN
+            return (not healthy, get_endpoint_stats(self.names[index]).percentile(0.5) or 0.0)
+
+        return sorted(range(routed), key=rank) + list(range(routed, len(self.models)))
+
+    def _bind(self, index: int, options: dict[str, Any]) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Bind call options (such as tools) to one of the models, reusing an earlier binding of the same options.
+
+        Args:
+            index (int): The model's index
+            options (dict[str, Any]): The call options
+
+        Returns:
+            Runnable[LanguageModelInput, BaseMessage]: The model with the options bound
+        """
+
+        model = self.models[index]
+        if not supports_prompt_caching(model):
+            options = {key: value for key, value in options.items() if key != "cache_control"}
+
+        key = (index, json.dumps(options, sort_keys=True, default=repr))
+        bound = self._bound.get(key)
+        if bound is None:
+            tools = options.get("tools")
+            rest = {key: value for key, value in options.items() if key != "tools"}
+            bound = self._bound[key] = model.bind_tools(tools, **rest) if tools is not None else model.bind(**rest)
+
+        return bound
+
+    async def _call(
+        self,
+        index: int,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        options: dict[str, Any],
+        callbacks: Callbacks = None,
+    ) -> BaseMessage:
+        """Call one endpoint through its provider's rate limiter and retries and its own circuit breaker, recording
+        the outcome in its statistics.
+
+        Args:
+            index (int): The endpoint's index
+            messages (list[BaseMessage]): The messages to send
+            stop (list[str] | None): Stop sequences
+            options (dict[str, Any]): The call options
+            callbacks (Callbacks): Callbacks for the endpoint's model, under the router's own run
+
+        Returns:
+            BaseMessage: The endpoint's answer
+        """
+
+        name = self.names[index]
+        stats = get_endpoint_stats(name)
+        bound = self._bind(index, options)
+        started = time.monotonic()
+
+        try:
+            with span("model_call.endpoint", endpoint=name):
+                message = await call_provider(
+                    model_provider(self.models[index]),
+                    partial(bound.ainvoke, messages, RunnableConfig(callbacks=callbacks), stop=stop),
+                    circuit=name,
+                )
+        except CircuitOpenError:
+            raise
+        except Exception:
+            stats.record(None)
+            raise
+
+        stats.record(time.monotonic() - started)
+        return message
+
+    async def _hedged_call(
+        self,
+        first: int,
+        second: int,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        options: dict[str, Any],
+        callbacks: Callbacks = None,
+    ) -> BaseMessage:
+        """Call an endpoint, sending a second request to another endpoint if the first one is slow, and answer
+        with whichever request succeeds first.
+
+        Args:
+            first (int): The index of the endpoint to call
+            second (int): The index of the endpoint to hedge with
+            messages (list[BaseMessage]): The messages to send
+            stop (list[str] | None): Stop sequences
+            options (dict[str, Any]): The call options
+            callbacks (Callbacks): Callbacks for the endpoints' models
+
+        Returns:
+            BaseMessage: The first successful answer
+        """
+
+        stats = get_endpoint_stats(self.names[first])
+        delay = stats.percentile(0.95) if len(stats.latencies) >= HEDGE_MIN_SAMPLES else None
+        if delay is None:
+            return await self._call(first, messages, stop, options, callbacks)
+
+        requests = {asyncio.create_task(self._call(first, messages, stop, options, callbacks)): "first"}
+        try:
+            done, _ = await asyncio.wait(requests, timeout=delay)
+            if not done:
+                requests[asyncio.create_task(self._call(second, messages, stop, options, callbacks))] = "hedge"
+
+            error: BaseException | None = None
+            pending = set(requests)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for request in done:
+                    if request.exception() is None:
+                        if len(requests) > 1:
+                            hedged_calls.inc(endpoint=self.names[first], winner=requests[request])
+                        return request.result()
+                    error = request.exception()
+
+            assert error is not None
+            raise error
+        finally:
+            # The losing request is cancelled, as are both requests if the call itself is cancelled
+            for request in requests:
+                request.cancel()
+
+    async def _routed_call(
+        self, messages: list[BaseMessage], stop: list[str] | None, options: dict[str, Any], callbacks: Callbacks = None
+    ) -> BaseMessage:
+        """Call the endpoints in routing order until one answers.
+
+        Args:
+            messages (list[BaseMessage]): The messages to send
+            stop (list[str] | None): Stop sequences
+            options (dict[str, Any]): The call options
+            callbacks (Callbacks): Callbacks for the endpoints' models
+
+        Returns:
+            BaseMessage: The first answer
+        """
+
+        order = self.route()
+        routed = len(self.models) - self.fallbacks
+        error: Exception | None = None
+
+        for position, index in enumerate(order):
+            if error is not None:
+                model_fallbacks.inc(model=self.names[index])
+
+            try:
+                if self.hedge and position == 0 and index < routed:
+                    hedge_with = order[1] if routed > 1 else index
+                    return await self._hedged_call(index, hedge_with, messages, stop, options, callbacks)
+                return await self._call(index, messages, stop, options, callbacks)
+            except CircuitOpenError as e:
+                error = e
+            except Exception as e:
+                # Errors in the request itself would fail the same way on every endpoint
+                if not is_retryable(e):
+                    raise
+                error = e
+
+        assert error is not None
+        raise error
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        started = time.perf_counter()
+        result = "error"
+        try:
+            with span("model_call", role=self.role, agent=current_agent.get(), messages=len(messages)):
+                message = await recorded(
+                    "model",
+                    conversation_key(self.role, current_agent.get(), messages),
+                    partial(self._routed_call, messages, stop, kwargs, child_callbacks(run_manager)),
+                    lambda message, _: message_to_dict(message),
+                    self._replayed,
+                )
+            result = "success"
+        except asyncio.CancelledError:
+            result = "cancelled"
+            raise
+        finally:
+            model_call_duration.observe(time.perf_counter() - started, role=self.role, result=result)
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _replayed(self, data: dict[str, Any], _: Cassette) -> BaseMessage:
+        """Rebuild an answer replayed from a cassette, adding its token usage to the current run as the endpoint's
+        own usage handler would have.
+
+        Args:
+            data (dict[str, Any]): The recorded answer
+
+        Returns:
+            BaseMessage: The answer
+        """
+
+        message = messages_from_dict([data])[0]
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            record_model_usage(self.names[0], usage)
+        return message
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._bind(0, kwargs).invoke(
+            messages, RunnableConfig(callbacks=child_callbacks(run_manager)), stop=stop
+        )
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,125 @@
+"""Module: prompt_caching.py
+
+Description:
+    Provider-side prompt caching for agent model calls. Every model turn re-sends the agent's instructions and tool
+    descriptions (thousands of tokens that never change) followed by the conversation so far. Providers that
+    support prompt caching can serve that prefix from cache at a fraction of the price and latency, as long as it
+    is byte-for-byte identical to an earlier request.
+
+    For providers that need explicit cache markers (Anthropic), the tool definitions, the system prompt and the
+    conversation up to the latest message are each marked as a cache breakpoint (3 of the 4 allowed). Providers
+    that cache automatically (OpenAI) just need a stable prefix, which the fixed tool and prompt order gives them.
+    Cached input tokens are counted per model either way, by the same callback that adds each call's usage to its
+    research run (see `usage.py`).
+
+Author: Nathan Thomas
+"""
+
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel, LanguageModelLike
+from langchain_core.messages import SystemMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from ..shared.config import app_config
+from ..shared.metrics import registry
+from .usage import record_model_usage
+
+llm_input_tokens = registry.counter(
+    "llm_input_tokens_total",
+    "Input tokens sent to models, by model and whether they were read from, written to, or not in the prompt cache",
+    ["model", "cache"],
+)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Chat model types (as in BaseChatModel._llm_type) whose providers take explicit cache_control markers
+PROMPT_CACHING_LLM_TYPES = {"anthropic-chat"}
+
+
+def supports_prompt_caching(model: LanguageModelLike) -> bool:
+    """Check whether prompt caching is enabled and the model's provider takes cache markers.
+
+    Args:
+        model (LanguageModelLike): The chat model
+
+    Returns:
+        bool: True if the model's prompts should be marked for caching
+    """
+
+    return app_config.PROMPT_CACHING and getattr(model, "_llm_type", None) in PROMPT_CACHING_LLM_TYPES
+
+
+def prepare_cached_agent(
+    model: BaseChatModel, tools: Sequence[BaseTool], instructions: str
+) -> tuple[LanguageModelLike, str | SystemMessage]:
+    """Prepare a model and system prompt for `create_react_agent` with the static prompt prefix marked for
+    provider-side caching. For models whose provider doesn't take cache markers they're returned unchanged.
+
+    Args:
+        model (BaseChatModel): The agent's chat model
+        tools (Sequence[BaseTool]): The agent's tools, in the order they're always sent in
+        instructions (str): The agent's system prompt
+
+    Returns:
+        tuple[LanguageModelLike, str | SystemMessage]: The model (with tools bound if marked) and the system prompt
+    """
+
+    if not supports_prompt_caching(model):
+        return model, instructions
+
+    # Tools are sent before the system prompt, so the last tool's marker caches every tool definition
+    definitions = [_anthropic_tool(tool) for tool in tools]
+    if definitions:
+        definitions[-1]["cache_control"] = CACHE_CONTROL
+
+    # The call-level marker is placed on the latest message, so each turn caches the conversation for the next
+    bound_model = model.bind_tools(definitions, cache_control=CACHE_CONTROL)
+    prompt = SystemMessage(content=[{"type": "text", "text": instructions, "cache_control": CACHE_CONTROL}])
+
+    return bound_model, prompt
+
+
+def _anthropic_tool(tool: BaseTool) -> dict[str, Any]:
+    function = convert_to_openai_tool(tool)["function"]
+    definition = {"name": function["name"], "input_schema": function["parameters"]}
+    if "description" in function:
+        definition["description"] = function["description"]
+    return definition
+
+
+class ModelUsageHandler(BaseCallbackHandler):
+    """Records a model's token usage as each call completes: input tokens by prompt cache status, and the call's
+    usage for the research run it was made for. Responses served by the LLM response cache didn't reach the
+    provider, so they aren't counted.
+    """
+
+    run_inline = True
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                if not isinstance(generation, ChatGeneration):
+                    continue
+
+                message = generation.message
+                usage = getattr(message, "usage_metadata", None)
+                if not usage or message.response_metadata.get("cached"):
+                    continue
+
+                details = usage.get("input_token_details") or {}
+                read = details.get("cache_read") or 0
+                written = details.get("cache_creation") or 0
+                llm_input_tokens.inc(read, model=self.model, cache="read")
+                llm_input_tokens.inc(written, model=self.model, cache="write")
+                llm_input_tokens.inc(
+                    max(0, usage.get("input_tokens", 0) - read - written), model=self.model, cache="none"
+                )
+                record_model_usage(self.model, usage)
@@ -185,7 +185,7 @@ Your role is to coordinate research by delegating specific research tasks to sub
 **Task Delegation Budgets** (Prevent excessive delegation):
 - **Bias towards focused research** - Use single agent for simple questions, multiple only when clearly beneficial or when you have multiple independent research directions based on the user's request.
 - **Stop when adequate** - Don't over-research; stop when you have sufficient information
-- **Limit iterations** - Stop after {max_researcher_iterations} task delegations if you haven't found adequate sources
+- **Limit iterations** - Stop after {max_researcher_iterations} rounds of task delegations if you haven't found adequate sources
 </Hard Limits>
 
 <Scaling Rules>
@@ -13,6 +13,8 @@ from typing import Annotated, Literal, TypedDict
 
 from langgraph.prebuilt.chat_agent_executor import AgentState
 
+from .memory import enforce_file_limits
+
 
 class Todo(TypedDict):
     """A structured task item for tracking progress through complex workflows.
@@ -30,7 +32,8 @@ def file_reducer(left: dict[str, str] | None, right: dict[str, str] | None) -> d
     """Merge two file dictionaries, with right side taking precedence.
 
     Used as a reducer function for the files field in agent state,
-    allowing incremental updates to the virtual file system.
+    allowing incremental updates to the virtual file system. Merged files
+    are kept within their size limits (see `memory.py`).
 
     Args:
         left (dict[str, str] | None): Left side dictionary (existing files)
@@ -41,11 +44,11 @@ def file_reducer(left: dict[str, str] | None, right: dict[str, str] | None) -> d
     """
 
     if left is None:
-        return right
+        return right if right is None else enforce_file_limits(right)
     elif right is None:
         return left
     else:
-        return {**left, **right}
+        return enforce_file_limits({**left, **right})
 
 
 def todo_reducer(left: list[Todo] | None, right: list[Todo] | None) -> list[Todo] | None:
@@ -73,7 +76,9 @@ class DeepAgentState(AgentState):
     Inherits from LangGraph's AgentState and adds:
     - todos (Annotated[list[Todo], todo_reducer]): List of Todo items for task planning and progress tracking
     - files (Annotated[dict[str, str], file_reducer]): Virtual file system stored as dict mapping filenames to content
+    - elided_tool_results (list[str]): Tool call IDs of tool results no longer sent to the model (see `context.py`)
     """
 
     todos: Annotated[list[Todo], todo_reducer]
     files: Annotated[dict[str, str], file_reducer]
+    elided_tool_results: list[str]
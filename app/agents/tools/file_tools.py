@@ -14,6 +14,7 @@ from langchain_core.tools import InjectedToolCallId, tool
 from langgraph.prebuilt import InjectedState
 from langgraph.types import Command
 
+from ..memory import load_file
 from ..prompts import LS_DESCRIPTION, READ_FILE_DESCRIPTION, WRITE_FILE_DESCRIPTION
 from ..state import DeepAgentState
 
@@ -55,7 +56,8 @@ def read_file(
     if file_path not in files:
         return f"Error: File '{file_path}' not found"
 
-    content = files[file_path]
+    # Files spilled to disk to save memory are read back from disk
+    content = load_file(files[file_path])
     if not content:
         return "System reminder: File exists but has empty contents"
 
@@ -7,14 +7,16 @@ Description:
 Author: Nathan Thomas
 """
 
+import asyncio
 import base64
+import json
 import os
+import time
 import uuid
 from datetime import datetime
 from typing import Annotated, Literal, cast
 
 import httpx
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.messages import HumanMessage, ToolMessage
 from langchain_core.tools import InjectedToolArg, InjectedToolCallId, tool
@@ -22,14 +24,53 @@ from langgraph.prebuilt import InjectedState
 from langgraph.types import Command
 from markdownify import markdownify
 from pydantic import BaseModel, Field
-from tavily import TavilyClient
-
+from tavily import AsyncTavilyClient
+
+from ...shared.cassette import Cassette, CassetteMissError, recorded
+from ...shared.config import app_config
+from ...shared.metrics import registry
+from ...shared.resilience import call_provider
+from ...shared.tracing import Span, span
+from ..model_router import build_endpoints, build_model_router
 from ..prompts import SUMMARIZE_WEB_SEARCH
 from ..state import DeepAgentState
+from ..usage import current_agent
+from ..utils import close_chat_model
 
 # Initialize clients lazily to avoid import-time API key requirements
 summarization_model = None
 tavily_client = None
+http_client: httpx.AsyncClient | None = None
+
+# Limits how many summaries are generated at once across every research run in this worker
+summarization_slots: asyncio.Semaphore | None = None
+
+# The name summarization model calls are accounted to, separately from the researcher that searched
+SUMMARIZATION_AGENT = "summarization"
+
+cancelled_work = registry.counter(
+    "research_cancelled_work_total",
+    "In-flight units of work abandoned because their research run was cancelled",
+    ["kind"],
+)
+summaries = registry.counter(
+    "research_summaries_total",
+    "Web page summaries by result (success, timeout, or error, where the page's opening is used instead)",
+    ["result"],
+)
+summary_seconds = registry.counter(
+    "research_summary_seconds_total", "Time spent generating web page summaries, excluding waiting for a slot"
+)
+summary_wait_seconds = registry.counter(
+    "research_summary_wait_seconds_total", "Time web page summaries spent waiting for a summarization slot"
+)
+summaries_in_flight = registry.gauge("research_summaries_in_flight", "Web page summaries being generated")
+fetch_duration = registry.histogram(
+    "http_fetch_duration_seconds", "Duration of search result page fetches, by HTTP status class", ["status"]
+)
+fetch_bytes = registry.counter(
+    "http_fetch_bytes_total", "Bytes of search result pages fetched, by HTTP status class", ["status"]
+)
 
 
 def get_summarization_model() -> BaseLanguageModel:
@@ -41,23 +82,72 @@ def get_summarization_model() -> BaseLanguageModel:
 
     global summarization_model
     if summarization_model is None:
-        summarization_model = init_chat_model(model="anthropic:claude-3-5-sonnet-20241022")
+        endpoints = build_endpoints(
+            app_config.SUMMARIZATION_MODEL_API_KEY,
+            app_config.SUMMARIZATION_MODEL_BASE_URL,
+            app_config.SUMMARIZATION_MODEL_NAME,
+            app_config.SUMMARIZATION_MODEL_PROVIDER,
+            app_config.SUMMARIZATION_MODEL_ENDPOINTS,
+        )
+        summarization_model = build_model_router(SUMMARIZATION_AGENT, endpoints)
     return summarization_model
 
 
-def get_tavily_client() -> TavilyClient:
+def get_summarization_slots() -> asyncio.Semaphore:
+    """Get or initialize the semaphore limiting concurrent summaries.
+
+    Returns:
+        asyncio.Semaphore: The semaphore
+    """
+
+    global summarization_slots
+    if summarization_slots is None:
+        summarization_slots = asyncio.Semaphore(app_config.MAX_CONCURRENT_SUMMARIES)
+    return summarization_slots
+
+
+def get_tavily_client() -> AsyncTavilyClient:
     """Get or initialize the Tavily client.
 
     Returns:
-        TavilyClient: The Tavily client
+        AsyncTavilyClient: The Tavily client
     """
 
     global tavily_client
     if tavily_client is None:
-        tavily_client = TavilyClient()
+        tavily_client = AsyncTavilyClient()
     return tavily_client
 
 
+def get_http_client() -> httpx.AsyncClient:
+    """Get or initialize the HTTP client used to fetch search result pages. The client is shared so connections
+    are pooled across searches, and it's async so fetches stop as soon as their run is cancelled.
+
+    Returns:
+        httpx.AsyncClient: The HTTP client
+    """
+
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient()
+    return http_client
+
+
+async def close_clients() -> None:
+    """Close the pooled HTTP clients used for search and summarization. They're recreated on next use."""
+
+    global summarization_model, summarization_slots, tavily_client, http_client
+    if http_client is not None:
+        await http_client.aclose()
+    if summarization_model is not None:
+        await close_chat_model(summarization_model)
+
+    summarization_model = None
+    summarization_slots = None
+    tavily_client = None
+    http_client = None
+
+
 class Summary(BaseModel):
     """Schema for webpage content summarization."""
 
@@ -70,7 +160,7 @@ def get_today_str() -> str:
     return datetime.now().strftime("%a %b %-d, %Y")
 
 
-def run_tavily_search(
+async def run_tavily_search(
     search_query: str,
     max_results: int = 1,
     topic: Literal["general", "news", "finance"] = "general",
@@ -88,14 +178,23 @@ def run_tavily_search(
         dict[str, object]: Search results dictionary
     """
 
-    client = get_tavily_client()
-    result = client.search(search_query, max_results=max_results, include_raw_content=include_raw_content, topic=topic)
+    options = {"max_results": max_results, "include_raw_content": include_raw_content, "topic": topic}
+    with span("tavily_search", query=search_query, max_results=max_results):
+        result = await recorded(
+            "search",
+            json.dumps([search_query, options], sort_keys=True),
+            lambda: call_provider("tavily", lambda: get_tavily_client().search(search_query, **options)),
+            lambda result, _: result,
+            lambda data, _: data,
+        )
 
     return cast(dict[str, object], result)
 
 
-def summarize_webpage_content(webpage_content: str) -> Summary:
-    """Summarize webpage content using the configured summarization model.
+async def summarize_webpage_content(webpage_content: str) -> Summary:
+    """Summarize webpage content using the configured summarization model. Summaries wait for one of the
+    MAX_CONCURRENT_SUMMARIES slots, and fall back to the page's opening if the model fails or takes longer than
+    SUMMARIZATION_TIMEOUT_SECONDS.
 
     Args:
         webpage_content (str): Raw webpage content to summarize
@@ -104,79 +203,183 @@ def summarize_webpage_content(webpage_content: str) -> Summary:
         Summary: Summary object with filename and summary
     """
 
-    try:
-        # Set up structured output model for summarization
-        model = get_summarization_model()
-        structured_model = model.with_structured_output(Summary)
+    with span("summarize", characters=len(webpage_content)) as summarizing:
+        return await _summarize(webpage_content, summarizing)
 
-        # Generate summary
-        summary_and_filename = structured_model.invoke(
-            [HumanMessage(content=SUMMARIZE_WEB_SEARCH.format(webpage_content=webpage_content, date=get_today_str()))]
-        )
 
-        return cast(Summary, summary_and_filename)
+async def _summarize(webpage_content: str, summarizing: Span | None) -> Summary:
+    """Summarize webpage content once a summarization slot is free. See `summarize_webpage_content`.
 
-    except Exception:
-        # Return a basic summary object on failure
-        return Summary(
-            filename="search_result.md",
-            summary=webpage_content[:1000] + "..." if len(webpage_content) > 1000 else webpage_content,
-        )
+    Args:
+        webpage_content (str): Raw webpage content to summarize
+        summarizing (Span | None): The summary's span, if the run is traced
 
+    Returns:
+        Summary: Summary object with filename and summary
+    """
+
+    waiting_since = time.monotonic()
+    async with get_summarization_slots():
+        started = time.monotonic()
+        summary_wait_seconds.inc(started - waiting_since)
+        if summarizing is not None:
+            summarizing.attributes["wait_seconds"] = round(started - waiting_since, 6)
+        summaries_in_flight.inc()
+        agent = current_agent.set(SUMMARIZATION_AGENT)
+        try:
+            # Set up structured output model for summarization
+            model = get_summarization_model()
+            structured_model = model.with_structured_output(Summary)
+            prompt = SUMMARIZE_WEB_SEARCH.format(webpage_content=webpage_content, date=get_today_str())
+
+            # Generate summary
+            async with asyncio.timeout(app_config.SUMMARIZATION_TIMEOUT_SECONDS):
+                summary_and_filename = await structured_model.ainvoke([HumanMessage(content=prompt)])
+
+            summaries.inc(result="success")
+            return cast(Summary, summary_and_filename)
+
+        except Exception as e:
+            summaries.inc(result="timeout" if isinstance(e, TimeoutError) else "error")
+            if summarizing is not None:
+                summarizing.error = "timeout" if isinstance(e, TimeoutError) else f"{type(e).__name__}: {e}"
+            # Return a basic summary object on failure
+            return Summary(
+                filename="search_result.md",
+                summary=webpage_content[:1000] + "..." if len(webpage_content) > 1000 else webpage_content,
+            )
+
+        finally:
+            current_agent.reset(agent)
+            summaries_in_flight.dec()
+            summary_seconds.inc(time.monotonic() - started)
 
-def process_search_results(results: dict) -> list[dict]:
-    """Process search results by summarizing content where available.
+
+def _record_page(response: httpx.Response, cassette: Cassette) -> dict[str, object]:
+    """Record a fetched page in a cassette, storing its content once however often it's fetched.
 
     Args:
-        results (dict): Tavily search results dictionary
+        response (httpx.Response): The page's response
+        cassette (Cassette): The cassette it's recorded in
 
     Returns:
-        list[dict]: List of processed results with summaries
+        dict[str, object]: The recording
     """
 
-    processed_results = []
+    return {
+        "status_code": response.status_code,
+        "media_type": response.headers.get("content-type", "text/html").split(";")[0],
+        "text": cassette.add_blob(response.text),
+    }
 
-    # Create a client for HTTP requests
-    HTTPX_CLIENT = httpx.Client()
 
-    for result in results.get("results", []):
-        # Get url
-        url = result["url"]
+def _replay_page(recording: dict, cassette: Cassette) -> httpx.Response:
+    """Rebuild a fetched page's response from its recording. See `_record_page`.
 
-        # Read url
-        response = HTTPX_CLIENT.get(url)
-
-        if response.status_code == 200:
-            # Convert HTML to markdown
-            raw_content = markdownify(response.text)
-            summary_obj = summarize_webpage_content(raw_content)
-        else:
-            # Use Tavily's generated summary
-            raw_content = result.get("raw_content", "")
-            summary_obj = Summary(
-                filename="URL_error.md", summary=result.get("content", "Error reading URL; try another search.")
-            )
+    Args:
+        recording (dict): The recording
+        cassette (Cassette): The cassette it was recorded in
+
+    Returns:
+        httpx.Response: The response
+    """
+
+    return httpx.Response(
+        recording["status_code"],
+        content=cassette.get_blob(recording["text"]).encode(),
+        headers={"content-type": f"{recording['media_type']}; charset=utf-8"},
+    )
+
+
+async def process_search_result(result: dict) -> dict:
+    """Fetch and summarize a single search result.
 
-        # uniquify file names
-        uid = base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b"=").decode("ascii")[:8]
-        name, ext = os.path.splitext(summary_obj.filename)
-        summary_obj.filename = f"{name}_{uid}{ext}"
-
-        processed_results.append(
-            {
-                "url": result["url"],
-                "title": result["title"],
-                "summary": summary_obj.summary,
-                "filename": summary_obj.filename,
-                "raw_content": raw_content,
-            }
+    Args:
+        result (dict): A single Tavily search result
+
+    Returns:
+        dict: The processed result with its summary
+    """
+
+    # Get url
+    url = result["url"]
+
+    started = time.monotonic()
+    response: httpx.Response | None = None
+    try:
+        # Read url
+        with span("page_fetch", url=url) as fetching:
+            page = await recorded("fetch", url, lambda: get_http_client().get(url), _record_page, _replay_page)
+            if fetching is not None:
+                fetching.attributes.update(status_code=page.status_code, bytes=len(page.content))
+    except asyncio.CancelledError:
+        cancelled_work.inc(kind="page_fetch")
+        raise
+    except CassetteMissError:
+        raise
+    except Exception:
+        # Unreachable pages fall back to Tavily's summary below, like pages that answer with an error
+        fetch_duration.observe(time.monotonic() - started, status="error")
+    else:
+        response = page
+        status = f"{response.status_code // 100}xx"
+        fetch_duration.observe(time.monotonic() - started, status=status)
+        fetch_bytes.inc(len(response.content), status=status)
+
+    if response is not None and response.status_code == 200:
+        # Convert HTML to markdown off the event loop since large pages can take a while
+        with span("markdownify", url=url):
+            raw_content = await asyncio.to_thread(markdownify, response.text)
+        try:
+            summary_obj = await summarize_webpage_content(raw_content)
+        except asyncio.CancelledError:
+            cancelled_work.inc(kind="summarization")
+            raise
+    else:
+        # Use Tavily's generated summary
+        raw_content = result.get("raw_content", "")
+        summary_obj = Summary(
+            filename="URL_error.md", summary=result.get("content", "Error reading URL; try another search.")
         )
 
-    return processed_results
+    # uniquify file names
+    uid = base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b"=").decode("ascii")[:8]
+    name, ext = os.path.splitext(summary_obj.filename)
+    summary_obj.filename = f"{name}_{uid}{ext}"
+
+    return {
+        "url": result["url"],
+        "title": result["title"],
+        "summary": summary_obj.summary,
+        "filename": summary_obj.filename,
+        "raw_content": raw_content,
+    }
+
+
+async def process_search_results(results: dict) -> list[dict]:
+    """Process search results by summarizing content where available. Results are fetched and summarized
+    concurrently, and if one of them fails the others are cancelled rather than left running for a search that
+    has already failed.
+
+    Args:
+        results (dict): Tavily search results dictionary
+
+    Returns:
+        list[dict]: List of processed results with summaries
+    """
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(process_search_result(result)) for result in results.get("results", [])]
+    except ExceptionGroup as errors:
+        # Callers handle the error itself, as they would from a single result
+        raise errors.exceptions[0] from None
+
+    return [task.result() for task in tasks]
 
 
 @tool(parse_docstring=True)
-def tavily_search(
+async def tavily_search(
     query: str,
     state: Annotated[DeepAgentState, InjectedState],
     tool_call_id: Annotated[str, InjectedToolCallId],
@@ -200,20 +403,24 @@ def tavily_search(
     """
 
     # Execute search
-    search_results = run_tavily_search(
-        query,
-        max_results=max_results,
-        topic=topic,
-        include_raw_content=True,
-    )
+    try:
+        search_results = await run_tavily_search(
+            query,
+            max_results=max_results,
+            topic=topic,
+            include_raw_content=True,
+        )
+    except asyncio.CancelledError:
+        cancelled_work.inc(kind="search")
+        raise
 
     # Process and summarize results
-    processed_results = process_search_results(search_results)
+    processed_results = await process_search_results(search_results)
 
     # Save each result to a file and prepare summary
     files = state.get("files", {})
     saved_files = []
-    summaries = []
+    summary_lines = []
 
     for _, result in enumerate(processed_results):
         # Use the AI-generated filename from summarization
@@ -235,12 +442,12 @@ def tavily_search(
 
         files[filename] = file_content
         saved_files.append(filename)
-        summaries.append(f"- {filename}: {result['summary']}...")
+        summary_lines.append(f"- {filename}: {result['summary']}...")
 
     # Create minimal summary for tool message - focus on what was collected
     summary_text = f"""🔍 Found {len(processed_results)} result(s) for '{query}':
 
-{chr(10).join(summaries)}
+{chr(10).join(summary_lines)}
 
 Files: {", ".join(saved_files)}
 💡 Use read_file() to access full details when needed."""
@@ -8,17 +8,35 @@ Description:
 Author: Nathan Thomas
 """
 
+import asyncio
 from collections.abc import Sequence
 from typing import Annotated, NotRequired, TypedDict
 
-from langchain_core.language_models import BaseLanguageModel
-from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
 from langchain_core.tools import BaseTool, InjectedToolCallId, tool
 from langgraph.prebuilt import InjectedState, create_react_agent
 from langgraph.types import Command
 
+from ...shared.config import app_config
+from ...shared.metrics import registry
+from ...shared.tracing import span
+from ..context import build_context_hook
+from ..prompt_caching import prepare_cached_agent
 from ..prompts import TASK_DESCRIPTION_PREFIX
 from ..state import DeepAgentState
+from ..usage import budget_exceeded, current_agent
+
+cancelled_sub_agents = registry.counter(
+    "research_cancelled_sub_agents_total",
+    "Sub-agent runs abandoned because their parent research run was cancelled",
+    ["subagent_type"],
+)
+refused_delegations = registry.counter(
+    "research_refused_delegations_total",
+    "Task delegations refused because the run hit its iteration limit or went over budget",
+    ["reason"],
+)
 
 
 class SubAgent(TypedDict):
@@ -28,10 +46,37 @@ class SubAgent(TypedDict):
     description: str
     prompt: str
     tools: NotRequired[list[str]]
+    context_token_budget: NotRequired[int]
+
+
+def _delegation_round(messages: Sequence[BaseMessage], tool_call_id: str) -> int:
+    """Find which round of delegation a task tool call belongs to, counting every assistant message that delegated
+    tasks as one round (parallel task calls share their round).
+
+    Args:
+        messages (Sequence[BaseMessage]): The delegating agent's conversation
+        tool_call_id (str): The ID of the task tool call
+
+    Returns:
+        int: The one-based round of the tool call
+    """
+
+    rounds = 0
+    for message in messages:
+        if not isinstance(message, AIMessage):
+            continue
+
+        calls = [call for call in message.tool_calls if call["name"] == "task"]
+        if calls:
+            rounds += 1
+        if any(call["id"] == tool_call_id for call in calls):
+            break
+
+    return rounds
 
 
 def _create_task_tool(
-    tools: Sequence[BaseTool], subagents: list[SubAgent], model: BaseLanguageModel, state_schema: type[DeepAgentState]
+    tools: Sequence[BaseTool], subagents: list[SubAgent], model: BaseChatModel, state_schema: type[DeepAgentState]
 ) -> BaseTool:
     """Create a task delegation tool that enables context isolation through sub-agents.
 
@@ -64,15 +109,19 @@ def _create_task_tool(
         else:
             # Default to all tools
             _tools = list(tools)
+        agent_model, prompt = prepare_cached_agent(model, _tools, _agent["prompt"])
+        context_hook = build_context_hook(
+            _agent["name"], _agent.get("context_token_budget", 0), app_config.CONTEXT_KEEP_RECENT_MESSAGES
+        )
         agents[_agent["name"]] = create_react_agent(
-            model, prompt=_agent["prompt"], tools=_tools, state_schema=state_schema
+            agent_model, prompt=prompt, tools=_tools, state_schema=state_schema, pre_model_hook=context_hook
         )
 
     # Generate description of available sub-agents for the tool description
     other_agents_string = [f"- {_agent['name']}: {_agent['description']}" for _agent in subagents]
 
     @tool(description=TASK_DESCRIPTION_PREFIX.format(other_agents=other_agents_string))
-    def task(
+    async def task(
         description: str,
         subagent_type: str,
         state: Annotated[DeepAgentState, InjectedState],
@@ -90,6 +139,17 @@ def _create_task_tool(
                 f"Error: invoked agent of type {subagent_type}, the only allowed types are {[f'`{k}`' for k in agents]}"
             )
 
+        # Enforce the limits the supervisor is asked to keep to, in case it doesn't
+        if budget_exceeded():
+            refused_delegations.inc(reason="budget")
+            return "Error: the research budget for this request is used up, write the final answer from what you have"
+        if _delegation_round(state["messages"], tool_call_id) > app_config.MAX_RESEARCHER_ITERATIONS:
+            refused_delegations.inc(reason="iterations")
+            return (
+                f"Error: the limit of {app_config.MAX_RESEARCHER_ITERATIONS} rounds of delegation has been reached, "
+                "write the final answer from what you have"
+            )
+
         # Get the requested sub-agent
         sub_agent = agents[subagent_type]
 
@@ -97,8 +157,18 @@ def _create_task_tool(
         # This is the key to context isolation - no parent history
         state["messages"] = [HumanMessage(content=description)]
 
-        # Execute the sub-agent in isolation
-        result = sub_agent.invoke(state)
+        # Execute the sub-agent in isolation. This runs on the event loop (rather than a worker thread) so that
+        # cancelling the parent run also cancels the sub-agent along with its model calls and searches.
+        # Model calls made by the sub-agent are accounted to it, and traced within its span
+        agent_token = current_agent.set(subagent_type)
+        try:
+            with span("task", subagent_type=subagent_type):
+                result = await sub_agent.ainvoke(state)
+        except asyncio.CancelledError:
+            cancelled_sub_agents.inc(subagent_type=subagent_type)
+            raise
+        finally:
+            current_agent.reset(agent_token)
 
         # Return results to parent agent via Command state update
         return Command(
@@ -0,0 +1,243 @@
+"""Module: usage.py
+
+Description:
+    Token and cost accounting for research runs. Every model call made on behalf of a run (by the supervisor, its
+    sub-agents, or the web page summarizer) adds its token usage to the run's `RunUsage`, broken down by agent and
+    model, and priced from `MODEL_PRICES`. The run's usage is found through context variables, which asyncio and
+    LangGraph carry into every task and callback a run starts, so nothing has to be threaded through the graph.
+
+    Runs can be given a token budget and a cost budget. Once a run goes over either one, sub-agents are no longer
+    started and every agent is told to wrap up with what it has.
+
+    This module is imported by the WebSocket server at startup, so it must stay free of the agent stack.
+
+Author: Nathan Thomas
+"""
+
+from collections.abc import Mapping
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from ..shared.config import app_config
+from ..shared.metrics import registry
+
+llm_tokens = registry.counter(
+    "llm_tokens_total",
+    "Tokens used by models, by agent, model and direction (input or output)",
+    ["agent", "model", "kind"],
+)
+llm_cost = registry.counter("llm_cost_usd_total", "Estimated cost of model calls in US dollars", ["agent", "model"])
+runs_over_budget = registry.counter(
+    "research_runs_over_budget_total", "Research runs that went over their token or cost budget", ["budget"]
+)
+
+SUPERVISOR_AGENT = "supervisor"
+
+# Added to the end of every agent's model input once its run is over budget
+BUDGET_EXCEEDED_NOTE = (
+    "The research budget for this request has been used up. Don't start any more research or delegate any more "
+    "tasks. Write your final answer now from what you've already found, and note anything left unanswered."
+)
+
+
+@dataclass
+class ModelPrice:
+    """Prices of a model's tokens in US dollars per million tokens."""
+
+    input: float
+    output: float
+    cache_read: float | None = None
+
+
+@dataclass
+class ModelUsage:
+    """Token usage and estimated cost of one agent's calls to one model."""
+
+    agent: str
+    model: str
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+def parse_model_prices(spec: str) -> dict[str, ModelPrice]:
+    """Parse model prices from their configuration string, a comma-separated list of
+    `model=input:output[:cache_read]` prices in US dollars per million tokens.
+
+    Args:
+        spec (str): The configured prices (e.g. "gpt-4o=2.5:10,claude-sonnet-4=3:15:0.3")
+
+    Returns:
+        dict[str, ModelPrice]: The prices by model name
+    """
+
+    prices = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+
+        model, _, values = entry.partition("=")
+        amounts = [float(value) for value in values.split(":")]
+        if not model.strip() or len(amounts) not in (2, 3):
+            raise ValueError(f"Invalid model price {entry.strip()!r}, expected model=input:output[:cache_read]")
+
+        prices[model.strip()] = ModelPrice(*amounts)
+
+    return prices
+
+
+def find_model_price(prices: Mapping[str, ModelPrice], model: str) -> ModelPrice | None:
+    """Find the price of a model. Model names may carry a provider prefix ("anthropic:claude-...") and dated
+    versions match the price of their undated name, so the longest configured name the model starts with wins.
+
+    Args:
+        prices (Mapping[str, ModelPrice]): The prices by model name
+        model (str): The model name
+
+    Returns:
+        ModelPrice | None: The model's price, or None if it isn't configured
+    """
+
+    name = model.split(":", 1)[-1]
+    matches = [priced for priced in prices if name.startswith(priced) or model.startswith(priced)]
+    if not matches:
+        return None
+
+    return prices[max(matches, key=len)]
+
+
+class RunUsage:
+    """Token usage, estimated cost and budgets of a single research run."""
+
+    def __init__(
+        self, token_budget: int = 0, cost_budget: float = 0.0, prices: Mapping[str, ModelPrice] | None = None
+    ) -> None:
+        """Initialize the run's usage.
+
+        Args:
+            token_budget (int): The maximum number of tokens the run may use, or 0 for no limit
+            cost_budget (float): The maximum estimated cost of the run in US dollars, or 0 for no limit
+            prices (Mapping[str, ModelPrice] | None): Model prices, or None for the configured prices
+        """
+
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self.prices = parse_model_prices(app_config.MODEL_PRICES) if prices is None else prices
+        self.models: dict[tuple[str, str], ModelUsage] = {}
+        self.exceeded: str | None = None
+
+        # Incremented on every update, so that streaming only sends totals that changed
+        self.version = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(usage.input_tokens + usage.output_tokens for usage in self.models.values())
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(usage.cost_usd for usage in self.models.values())
+
+    def record(self, agent: str, model: str, usage: Mapping[str, Any]) -> None:
+        """Add a model call's token usage to the run.
+
+        Args:
+            agent (str): The agent the call was made for
+            model (str): The model name
+            usage (Mapping[str, Any]): The call's usage metadata (as in `AIMessage.usage_metadata`)
+        """
+
+        input_tokens = usage.get("input_tokens") or 0
+        output_tokens = usage.get("output_tokens") or 0
+        cache_read = (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+        cost = 0.0
+        price = find_model_price(self.prices, model)
+        if price is not None:
+            cache_read_price = price.input if price.cache_read is None else price.cache_read
+            cost = (
+                (input_tokens - cache_read) * price.input + cache_read * cache_read_price + output_tokens * price.output
+            ) / 1_000_000
+
+        entry = self.models.setdefault((agent, model), ModelUsage(agent, model))
+        entry.calls += 1
+        entry.input_tokens += input_tokens
+        entry.output_tokens += output_tokens
+        entry.cache_read_tokens += cache_read
+        entry.cost_usd += cost
+        self.version += 1
+
+        llm_tokens.inc(input_tokens, agent=agent, model=model, kind="input")
+        llm_tokens.inc(output_tokens, agent=agent, model=model, kind="output")
+        llm_cost.inc(cost, agent=agent, model=model)
+
+        if self.exceeded is None:
+            if self.token_budget > 0 and self.total_tokens > self.token_budget:
+                self.exceeded = "tokens"
+            elif self.cost_budget > 0 and self.cost_usd > self.cost_budget:
+                self.exceeded = "cost"
+            if self.exceeded is not None:
+                runs_over_budget.inc(budget=self.exceeded)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Summarize the run's usage for a usage event.
+
+        Returns:
+            dict[str, Any]: The run's totals, its usage by agent and model, and its budgets
+        """
+
+        models = [asdict(usage) for usage in self.models.values()]
+        for usage in models:
+            usage["cost_usd"] = round(usage["cost_usd"], 6)
+
+        return {
+            "input_tokens": sum(usage.input_tokens for usage in self.models.values()),
+            "output_tokens": sum(usage.output_tokens for usage in self.models.values()),
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "by_model": models,
+            "token_budget": self.token_budget or None,
+            "cost_budget_usd": self.cost_budget or None,
+            "budget_exceeded": self.exceeded,
+        }
+
+
+# The usage of the research run being executed, and the agent currently making model calls within it
+current_run_usage: ContextVar[RunUsage | None] = ContextVar("current_run_usage", default=None)
+current_agent: ContextVar[str] = ContextVar("current_agent", default=SUPERVISOR_AGENT)
+
+
+def build_run_usage() -> RunUsage:
+    """Build the usage tracker for a new research run with the configured budgets.
+
+    Returns:
+        RunUsage: The run's usage
+    """
+
+    return RunUsage(app_config.RUN_TOKEN_BUDGET, app_config.RUN_COST_BUDGET_USD)
+
+
+def record_model_usage(model: str, usage: Mapping[str, Any]) -> None:
+    """Add a model call's token usage to the current research run, if there is one.
+
+    Args:
+        model (str): The model name
+        usage (Mapping[str, Any]): The call's usage metadata
+    """
+
+    run_usage = current_run_usage.get()
+    if run_usage is not None:
+        run_usage.record(current_agent.get(), model, usage)
+
+
+def budget_exceeded() -> bool:
+    """Check whether the current research run is over its token or cost budget.
+
+    Returns:
+        bool: True if the run is over budget
+    """
+
+    run_usage = current_run_usage.get()
+    return run_usage is not None and run_usage.exceeded is not None
@@ -7,16 +7,39 @@ Description:
 Author: Nathan Thomas
 """
 
+import inspect
 import json
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Collection
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
+from ..shared.metrics import registry
+from ..shared.tracing import span
+from .memory import record_state
 
-console = Console()
+if TYPE_CHECKING:
+    from rich.console import Console
+
+# Graph nodes that only do bookkeeping for the agent, whose updates aren't streamed
+INTERNAL_NODES = {"pre_model_hook"}
+
+# Rich is only needed when displaying messages in a terminal, so it's imported on first use
+_console: "Console | None" = None
+
+
+def get_console() -> "Console":
+    """Get the console used to display messages and prompts, creating it if necessary.
+
+    Returns:
+        Console: The Rich console
+    """
+
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
 
 
 def format_message_content(message: Any) -> str:
@@ -65,6 +88,9 @@ def format_messages(messages: list[Any]) -> None:
         messages (list[Any]): The list of messages to format
     """
 
+    from rich.panel import Panel
+
+    console = get_console()
     for m in messages:
         msg_type = m.__class__.__name__.replace("Message", "")
         content = format_message_content(m)
@@ -88,6 +114,9 @@ def show_prompt(prompt_text: str, title: str = "Prompt", border_style: str = "bl
         border_style (str): Border color style (default: "blue")
     """
 
+    from rich.panel import Panel
+    from rich.text import Text
+
     # Create a formatted display of the prompt
     formatted_text = Text(prompt_text)
     formatted_text.highlight_regex(r"<[^>]+>", style="bold blue")  # Highlight XML tags
@@ -95,7 +124,7 @@ def show_prompt(prompt_text: str, title: str = "Prompt", border_style: str = "bl
     formatted_text.highlight_regex(r"###[^#\n]+", style="bold cyan")  # Highlight sub-headers
 
     # Display in a panel for better presentation
-    console.print(
+    get_console().print(
         Panel(
             formatted_text,
             title=f"[bold green]{title}[/bold green]",
@@ -120,9 +149,11 @@ async def stream_agent(agent: Any, query: Any, config: Any = None) -> Any:
     ):
         current_state = None
         if stream_mode == "updates":
-            print(f"Graph: {graph_name if len(graph_name) > 0 else 'root'}")
-
             node, result = list(event.items())[0]
+            if node in INTERNAL_NODES:
+                continue
+
+            print(f"Graph: {graph_name if len(graph_name) > 0 else 'root'}")
             print(f"Node: {node}")
 
             for key in result.keys():
@@ -136,79 +167,163 @@ async def stream_agent(agent: Any, query: Any, config: Any = None) -> Any:
     return current_state
 
 
+def _wants_event(event_type: str, event_types: Collection[str] | None) -> bool:
+    """Check whether an event type is part of a client's subscription.
+
+    Args:
+        event_type (str): The event type to check
+        event_types (Collection[str] | None): The subscribed event types, or None for all event types
+
+    Returns:
+        bool: True if the event should be sent
+    """
+
+    return event_types is None or event_type in event_types
+
+
+def _tool_call_data(tool_name: str, args: dict[str, Any], tool_id: str, include_args: bool) -> dict[str, Any]:
+    """Build the data payload for a tool call event.
+
+    Args:
+        tool_name (str): The name of the tool being called
+        args (dict[str, Any]): The arguments the tool was called with
+        tool_id (str): The tool call ID
+        include_args (bool): Whether to include the arguments in the payload
+
+    Returns:
+        dict[str, Any]: The tool call event data
+    """
+
+    data: dict[str, Any] = {"tool_name": tool_name, "tool_id": tool_id}
+    if include_args:
+        data["args"] = args
+    return data
+
+
 async def stream_agent_for_websocket(
-    agent: Any, query: Any, config: Any = None
+    agent: Any,
+    query: Any,
+    config: Any = None,
+    event_types: Collection[str] | None = None,
+    root_only: bool = False,
+    verbosity: str = "full",
+    durability: str | None = None,
 ) -> AsyncGenerator[dict[str, Any], None]:
     """Stream agent execution and yield WebSocket events.
 
+    Events outside of the given subscription are dropped before any formatting work is done for them. Completion
+    and error events are always yielded. While metrics are enabled, every node run and tool call is timed (see
+    `instrumentation.py`).
+
     Args:
         agent (Any): The agent to stream
         query (Any): The query to stream
         config (Any): The configuration to stream
+        event_types (Collection[str] | None): Event types to yield, or None for all event types
+        root_only (bool): Whether to skip events coming from subgraphs (e.g. sub-agents)
+        verbosity (str): One of "quiet", "normal", or "full" (see `app.api.models.Verbosity`)
+        durability (str | None): When checkpoints are written for checkpointed agents ("sync", "async", or "exit")
     """
 
-    try:
-        async for graph_name, stream_mode, event in agent.astream(
-            query, stream_mode=["updates", "values"], subgraphs=True, config=config
-        ):
-            timestamp = datetime.now().isoformat()
+    wants_status = verbosity != "quiet" and _wants_event("status_update", event_types)
+    wants_tool_calls = verbosity != "quiet" and _wants_event("tool_call", event_types)
+    wants_tool_args = verbosity == "full"
+    wants_results = _wants_event("result_chunk", event_types)
 
-            if stream_mode == "updates":
+    if registry.enabled:
+        # The agent stack is loaded by the time a run streams, so this import costs nothing extra
+        from .instrumentation import GraphMetricsHandler
+
+        config = dict(config or {})
+        config["callbacks"] = [*(config.get("callbacks") or []), GraphMetricsHandler()]
+
+    try:
+        # Spans opened while the graph runs (model calls, tools, sub-agents) nest under this one
+        with span("stream_agent", root_only=root_only, verbosity=verbosity):
+            async for graph_name, stream_mode, event in agent.astream(
+                query, stream_mode=["updates", "values"], subgraphs=True, config=config, durability=durability
+            ):
+                # Full states are only used to account for the run's memory
+                if stream_mode == "values":
+                    record_state("|".join(graph_name), event)
+                    continue
+
+                if root_only and len(graph_name) > 0:
+                    continue
+
+                # The context hook's update holds the trimmed copy of the conversation sent to the model, which
+                # clients have already received message by message
                 node, result = list(event.items())[0]
+                if node in INTERNAL_NODES:
+                    continue
+
+                timestamp = datetime.now().isoformat()
+                graph = graph_name if len(graph_name) > 0 else "root"
 
                 # Send status update
-                yield {
-                    "event_type": "status_update",
-                    "data": {
-                        "graph": graph_name if len(graph_name) > 0 else "root",
-                        "node": node,
-                        "status": "processing",
-                    },
-                    "timestamp": timestamp,
-                }
+                if wants_status:
+                    yield {
+                        "event_type": "status_update",
+                        "data": {
+                            "graph": graph,
+                            "node": node,
+                            "status": "processing",
+                        },
+                        "timestamp": timestamp,
+                    }
+
+                if not (wants_tool_calls or wants_results) or not isinstance(result, dict):
+                    continue
 
                 # Process messages and tool calls
                 for key in result.keys():
                     if "messages" in key:
                         for message in result[key]:
-                            # Handle tool calls
-                            if hasattr(message, "tool_calls") and message.tool_calls:
-                                for tool_call in message.tool_calls:
-                                    yield {
-                                        "event_type": "tool_call",
-                                        "data": {
-                                            "tool_name": tool_call.get("name", "unknown"),
-                                            "args": tool_call.get("args", {}),
-                                            "tool_id": tool_call.get("id", "unknown"),
-                                        },
-                                        "timestamp": timestamp,
-                                    }
-
-                            # Handle Anthropic-style tool calls in content
-                            if isinstance(message.content, list):
-                                for item in message.content:
-                                    if item.get("type") == "tool_use":
+                            if wants_tool_calls:
+                                # Handle tool calls
+                                if hasattr(message, "tool_calls") and message.tool_calls:
+                                    for tool_call in message.tool_calls:
                                         yield {
                                             "event_type": "tool_call",
-                                            "data": {
-                                                "tool_name": item.get("name", "unknown"),
-                                                "args": item.get("input", {}),
-                                                "tool_id": item.get("id", "unknown"),
-                                            },
+                                            "data": _tool_call_data(
+                                                tool_call.get("name", "unknown"),
+                                                tool_call.get("args", {}),
+                                                tool_call.get("id", "unknown"),
+                                                wants_tool_args,
+                                            ),
                                             "timestamp": timestamp,
                                         }
 
-                            # Handle text content
+                                # Handle Anthropic-style tool calls in content
+                                if isinstance(message.content, list):
+                                    for item in message.content:
+                                        if item.get("type") == "tool_use":
+                                            yield {
+                                                "event_type": "tool_call",
+                                                "data": _tool_call_data(
+                                                    item.get("name", "unknown"),
+                                                    item.get("input", {}),
+                                                    item.get("id", "unknown"),
+                                                    wants_tool_args,
+                                                ),
+                                                "timestamp": timestamp,
+                                            }
+
+                            # Handle text content. Anything below full verbosity only streams assistant text, so
+                            # skip formatting the other message types entirely.
+                            msg_type = message.__class__.__name__.replace("Message", "")
+                            if not wants_results or (verbosity != "full" and msg_type != "AI"):
+                                continue
+
                             content = format_message_content(message)
                             if content and content.strip():
-                                msg_type = message.__class__.__name__.replace("Message", "")
                                 yield {
                                     "event_type": "result_chunk",
                                     "data": {
                                         "content": content,
                                         "message_type": msg_type,
                                         "node": node,
-                                        "graph": graph_name if len(graph_name) > 0 else "root",
+                                        "graph": graph,
                                     },
                                     "timestamp": timestamp,
                                 }
@@ -228,3 +343,32 @@ async def stream_agent_for_websocket(
             "data": {"message": f"Agent execution failed: {str(e)}", "error_type": type(e).__name__},
             "timestamp": datetime.now().isoformat(),
         }
+
+
+async def close_chat_model(model: Any) -> None:
+    """Close the pooled async HTTP client behind a chat model, if it has created one. Only clients that already
+    exist are closed, so this never creates a client just to close it.
+
+    Args:
+        model (Any): The chat model
+    """
+
+    # Models wrapping other models (see `model_router.py`) hold no clients of their own
+    for inner in getattr(model, "models", None) or []:
+        await close_chat_model(inner)
+
+    private = getattr(model, "__pydantic_private__", None) or {}
+    clients = [
+        getattr(model, "root_async_client", None),
+        vars(model).get("_async_client"),
+        private.get("_async_client"),
+    ]
+
+    for client in clients:
+        close = getattr(client, "close", None)
+        if close is None:
+            continue
+
+        result = close()
+        if inspect.isawaitable(result):
+            await result
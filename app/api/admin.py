@@ -0,0 +1,200 @@
+"""Module: admin.py
+
+Description:
+    Admin-only endpoints for investigating a live worker, such as a slow research run that can't be reproduced
+    outside real traffic. Each profiling endpoint runs its profile on the worker that serves the request and
+    answers with the result as a file to download: collapsed stacks for flame graph tools, pstats for
+    `python -m pstats` or snakeviz, or a plain-text memory diff. One profile runs per worker at a time. Research
+    runs' execution traces are served here too, since they hold the query, fetched URLs and tool arguments.
+
+    The endpoints are only found while ADMIN_API_KEY is set, and requests need it in an X-Admin-Key header.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from typing import Annotated, Any, Literal
+
+from fastapi import APIRouter, Depends, Header, Query, Response
+
+from ..shared.config import app_config
+from ..shared.errors import ConflictError, ForbiddenError, NotFoundError, UnauthorizedError, ValidationError
+from ..shared.profiling import DEFAULT_SAMPLE_INTERVAL, SamplingProfiler, memory_diff, profile_calls
+from ..shared.tracing import TRACE_FORMATS, read_trace
+from .runs import current_run_id
+from .websocket import manager
+
+
+async def require_admin(x_admin_key: Annotated[str | None, Header()] = None) -> None:
+    """Only let requests carrying the admin key through.
+
+    Args:
+        x_admin_key (str | None): The X-Admin-Key header
+    """
+
+    if not app_config.ADMIN_API_KEY:
+        raise NotFoundError("Admin endpoint")
+    if x_admin_key is None:
+        raise UnauthorizedError("Admin key required")
+    if not secrets.compare_digest(x_admin_key.encode(), app_config.ADMIN_API_KEY.encode()):
+        raise ForbiddenError("Invalid admin key")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+# Held while a profile runs, since profiles would skew each other (and only one cProfile can run at a time)
+profiling = asyncio.Lock()
+
+Seconds = Annotated[float, Query(gt=0, description="How long to profile for")]
+Interval = Annotated[float, Query(ge=0.001, le=1, description="Seconds between samples")]
+
+
+def check_duration(seconds: float) -> None:
+    """Check that a profile doesn't run for longer than PROFILE_MAX_SECONDS.
+
+    Args:
+        seconds (float): How long the profile would run for
+    """
+
+    if seconds > app_config.PROFILE_MAX_SECONDS:
+        raise ValidationError(f"Profiles run for at most {app_config.PROFILE_MAX_SECONDS:g} seconds", "seconds")
+    if profiling.locked():
+        raise ConflictError("A profile is already running on this worker")
+
+
+def download(content: str | bytes, kind: str, extension: str, media_type: str) -> Response:
+    """Build a response that downloads a profile as a file named after its kind, the worker, and the time.
+
+    Args:
+        content (str | bytes): The profile
+        kind (str): What was profiled (e.g. "cpu")
+        extension (str): The file extension (e.g. "collapsed")
+        media_type (str): The media type
+
+    Returns:
+        Response: The response
+    """
+
+    filename = f"{kind}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.{extension}"
+    return Response(
+        content, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/profile/cpu")
+async def profile_cpu(
+    seconds: Seconds = 10,
+    format: Literal["collapsed", "pstats"] = "collapsed",
+    interval: Interval = DEFAULT_SAMPLE_INTERVAL,
+    all_threads: bool = False,
+) -> Response:
+    """Profile the worker's CPU use for a number of seconds. The `collapsed` format samples stacks (of the event
+    loop, or of every thread with `all_threads`) and costs little, while `pstats` traces every call the event loop
+    makes and slows the worker down while it runs.
+
+    Args:
+        seconds (float): How long to profile for
+        format (Literal["collapsed", "pstats"]): The profile's format
+        interval (float): Seconds between samples, for the collapsed format
+        all_threads (bool): Whether to sample worker threads too, for the collapsed format
+
+    Returns:
+        Response: The profile, as a collapsed stacks or pstats file
+    """
+
+    check_duration(seconds)
+    async with profiling:
+        if format == "pstats":
+            return download(await profile_calls(seconds), "cpu", "pstats", "application/octet-stream")
+
+        profiler = SamplingProfiler(interval, all_threads=all_threads)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await profiler.stop()
+
+    return download(profiler.render(), "cpu", "collapsed", "text/plain")
+
+
+@router.post("/profile/memory")
+async def profile_memory(seconds: Seconds = 10, limit: Annotated[int, Query(ge=1, le=1000)] = 50) -> Response:
+    """Diff tracemalloc snapshots taken a number of seconds apart, to find where the worker's memory grows.
+
+    Args:
+        seconds (float): Seconds between the snapshots
+        limit (int): The most allocation sites listed
+
+    Returns:
+        Response: The allocation sites whose memory changed most, as a text file
+    """
+
+    check_duration(seconds)
+    async with profiling:
+        diff = await memory_diff(seconds, limit)
+
+    return download(diff, "memory", "txt", "text/plain")
+
+
+@router.post("/profile/runs/{run_id}")
+async def profile_run(run_id: str, seconds: Seconds = 60, interval: Interval = DEFAULT_SAMPLE_INTERVAL) -> Response:
+    """Sample the stacks of a single research run (its own task and every task it started, such as sub-agents
+    and page fetches) until it finishes or the number of seconds is up. The run has to be running on the worker
+    that serves the request.
+
+    Args:
+        run_id (str): The run's ID
+        seconds (float): The most seconds to profile for
+        interval (float): Seconds between samples
+
+    Returns:
+        Response: The profile, as a collapsed stacks file
+    """
+
+    run = manager.runs.get(run_id)
+    if run is None or run.task is None or run.task.done():
+        raise NotFoundError("Running research run", run_id)
+
+    check_duration(seconds)
+    async with profiling:
+        profiler = SamplingProfiler(interval, task_filter=lambda task: task.get_context().get(current_run_id) == run_id)
+        profiler.start()
+        try:
+            await asyncio.wait([run.task], timeout=seconds)
+        finally:
+            await profiler.stop()
+
+    return download(profiler.render(), f"run-{run_id}", "collapsed", "text/plain")
+
+
+@router.get("/runs/{run_id}/trace")
+async def run_trace(run_id: str, format: str = "chrome") -> dict[str, Any]:
+    """Trace of a research run, as a Chrome trace (`format=chrome`) or OTLP/JSON (`format=otlp`). Runs still
+    retained by the worker are exported on the fly, and older runs are read from TRACE_DIR in the format they
+    were exported in. Not found while TRACING_ENABLED is off.
+
+    Args:
+        run_id (str): The run's ID
+        format (str): The trace format
+
+    Returns:
+        dict[str, Any]: The exported trace
+    """
+
+    if not app_config.TRACING_ENABLED:
+        raise NotFoundError("Trace")
+    if format not in TRACE_FORMATS:
+        raise ValidationError(f"Unknown trace format {format!r}, expected one of {TRACE_FORMATS}", "format")
+
+    run = manager.runs.get(run_id)
+    if run is not None and run.trace is not None:
+        return run.trace.export(format)
+
+    trace = await asyncio.to_thread(read_trace, app_config.TRACE_DIR, run_id, format) if app_config.TRACE_DIR else None
+    if trace is None:
+        raise NotFoundError(f"{format.capitalize()} trace of run", run_id)
+
+    return trace
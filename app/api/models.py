@@ -9,7 +9,7 @@ Author: Nathan Thomas
 from enum import Enum
 from typing import Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class EventType(str, Enum):
@@ -19,14 +19,80 @@ class EventType(str, Enum):
     TOOL_CALL = "tool_call"
     RESEARCH_PROGRESS = "research_progress"
     RESULT_CHUNK = "result_chunk"
+    USAGE = "usage"
+    MEMORY = "memory"
     COMPLETED = "completed"
+    CANCELLED = "cancelled"
     ERROR = "error"
 
 
+class MessageType(str, Enum):
+    """Types of messages clients can send over the WebSocket."""
+
+    RESEARCH = "research"
+    CANCEL = "cancel"
+    RESUME = "resume"
+
+
+class CancelReason(str, Enum):
+    """Reasons a research run can be cancelled before completing."""
+
+    CLIENT_CANCEL = "client_cancel"
+    CLIENT_DISCONNECT = "client_disconnect"
+    SHUTDOWN = "shutdown"
+
+
+class SubgraphScope(str, Enum):
+    """Which graphs a client wants to receive events from."""
+
+    ROOT = "root"
+    ALL = "all"
+
+
+class Verbosity(str, Enum):
+    """How much detail a client wants in streamed events.
+
+    - quiet: Only assistant text is streamed (no status updates or tool calls)
+    - normal: Status updates, tool call names without arguments, and assistant text
+    - full: Everything, including tool call arguments and tool/human message content
+    """
+
+    QUIET = "quiet"
+    NORMAL = "normal"
+    FULL = "full"
+
+
+class EventSubscription(BaseModel):
+    """Client-selected subset of events to stream for a research request. Completion and error events are
+    always sent regardless of the subscription."""
+
+    event_types: list[EventType] | None = None
+    scope: SubgraphScope = SubgraphScope.ALL
+    verbosity: Verbosity = Verbosity.FULL
+
+
 class ResearchRequest(BaseModel):
-    """Request model for research queries."""
+    """Request model for research queries. Set `bypass_cache` to run the research even if a cached result for the
+    same or a similar query could be replayed instead."""
 
     query: str
+    request_id: str | None = None
+    subscription: EventSubscription = Field(default_factory=EventSubscription)
+    bypass_cache: bool = False
+
+
+class CancelRequest(BaseModel):
+    """Request model for cancelling an in-flight research query by its request ID or run ID."""
+
+    request_id: str | None = None
+    run_id: str | None = None
+
+
+class ResumeRequest(BaseModel):
+    """Request model for resuming a research run from a new connection, replaying events after `last_seq`."""
+
+    run_id: str
+    last_seq: int = 0
 
 
 class ResearchResponse(BaseModel):
@@ -42,6 +108,9 @@ class WebSocketEvent(BaseModel):
 
     event_type: EventType
     data: dict[str, Any]
+    request_id: str | None = None
+    run_id: str | None = None
+    seq: int | None = None
     timestamp: str | None = None
 
 
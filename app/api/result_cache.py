@@ -0,0 +1,213 @@
+"""Module: result_cache.py
+
+Description:
+    Cache of whole research results. Many users ask essentially the same question ("latest advances in
+    mixture-of-experts routing" vs. "What are the latest advances in mixture of experts routing?"), and each one
+    would otherwise launch a full supervisor and sub-agent run. Completed runs store the event stream they sent,
+    and a later request for a near-duplicate query is answered by replaying it while it's still fresh.
+
+    Queries are normalized to a set of content words, and near-duplicates are found with MinHash signatures of
+    those sets, indexed with locality-sensitive hashing (LSH) so that a lookup only compares against the few
+    entries that share a band of their signature. The similarity estimate is the Jaccard similarity of the word
+    sets, so the threshold reads as "this share of the words in common".
+
+Author: Nathan Thomas
+"""
+
+import hashlib
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from ..shared.metrics import registry
+
+result_cache_lookups = registry.counter(
+    "research_result_cache_lookups_total",
+    "Research requests looked up in the result cache, by result (hit, miss, or bypass)",
+    ["result"],
+)
+result_cache_hit_ratio = registry.gauge(
+    "research_result_cache_hit_ratio",
+    "Share of research requests looked up in the result cache (not bypassing it) answered from it since startup",
+)
+
+# Words that don't change what a research question is about
+STOPWORDS = frozenset(
+    "a about an and any are as at be by can could do does for from how i in into is it me of on or please some "
+    "tell that the their there these this to up what whats when where which who why will with would you".split()
+)
+
+# MinHash signatures are NUM_PERMUTATIONS hashes long and split into LSH bands of ROWS_PER_BAND hashes. Entries
+# sharing any band are compared, which finds entries with a Jaccard similarity of 0.8 over 99.9% of the time.
+NUM_PERMUTATIONS = 64
+ROWS_PER_BAND = 4
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (random.Random(seed).randrange(1, _PRIME), random.Random(-seed).randrange(0, _PRIME))
+    for seed in range(1, NUM_PERMUTATIONS + 1)
+]
+
+
+@dataclass
+class CachedResult:
+    """A research result that matched a query."""
+
+    query: str
+    events: list[dict[str, Any]]
+    created_at: float
+    similarity: float
+
+
+@dataclass
+class _Entry:
+    query: str
+    words: frozenset[str]
+    subscription: str
+    signature: tuple[int, ...]
+    events: list[dict[str, Any]]
+    created_at: float
+
+
+def normalize_query(query: str) -> frozenset[str]:
+    """Reduce a query to the set of content words that decide what it's asking about. Case, punctuation,
+    hyphenation, filler words and plurals are ignored.
+
+    Args:
+        query (str): The research query
+
+    Returns:
+        frozenset[str]: The query's content words
+    """
+
+    text = unicodedata.normalize("NFKC", query).lower()
+    words = re.findall(r"[^\W_]+", text)
+    content = [word for word in words if word not in STOPWORDS] or words
+
+    return frozenset(
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word for word in content
+    )
+
+
+def minhash(words: frozenset[str]) -> tuple[int, ...]:
+    """Compute the MinHash signature of a set of words.
+
+    Args:
+        words (frozenset[str]): The words
+
+    Returns:
+        tuple[int, ...]: The signature
+    """
+
+    hashes = [int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big") for word in words] or [0]
+
+    return tuple(min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS)
+
+
+class ResultCache:
+    """Keeps the event streams of completed research runs, findable by near-duplicate queries. Entries are only
+    matched against requests with the same event subscription, since the stored stream was filtered by it.
+    """
+
+    def __init__(self, ttl_seconds: float, similarity: float, max_entries: int) -> None:
+        """Initialize the cache.
+
+        Args:
+            ttl_seconds (float): How long a result stays fresh enough to replay
+            similarity (float): The minimum estimated similarity between two queries for them to match (0-1)
+            max_entries (int): The maximum number of results kept, evicting the least recently used
+        """
+
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._buckets: dict[tuple[str, int, tuple[int, ...]], set[int]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, query: str, subscription: str) -> CachedResult | None:
+        """Find the fresh result of the most similar query.
+
+        Args:
+            query (str): The research query
+            subscription (str): The request's serialized event subscription
+
+        Returns:
+            CachedResult | None: The best match, or None if no fresh result is similar enough
+        """
+
+        words = normalize_query(query)
+        signature = minhash(words)
+        now = time.time()
+
+        best: tuple[float, int] | None = None
+        for entry_id in self._candidates(subscription, signature):
+            entry = self._entries[entry_id]
+            if now - entry.created_at > self.ttl_seconds:
+                self._remove(entry_id)
+                continue
+
+            if entry.words == words:
+                similarity = 1.0
+            else:
+                similarity = sum(x == y for x, y in zip(signature, entry.signature, strict=True)) / NUM_PERMUTATIONS
+            if similarity >= self.similarity and (best is None or similarity > best[0]):
+                best = (similarity, entry_id)
+
+        if best is None:
+            return None
+
+        entry = self._entries[best[1]]
+        self._entries.move_to_end(best[1])
+        return CachedResult(entry.query, entry.events, entry.created_at, best[0])
+
+    def store(self, query: str, subscription: str, events: list[dict[str, Any]]) -> None:
+        """Store the event stream of a completed research run, replacing any result for the same query.
+
+        Args:
+            query (str): The research query
+            subscription (str): The request's serialized event subscription
+            events (list[dict[str, Any]]): The events the run sent
+        """
+
+        words = normalize_query(query)
+        signature = minhash(words)
+        for entry_id in self._candidates(subscription, signature):
+            if self._entries[entry_id].words == words:
+                self._remove(entry_id)
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(query, words, subscription, signature, events, time.time())
+        for band in self._bands(subscription, signature):
+            self._buckets.setdefault(band, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _candidates(self, subscription: str, signature: tuple[int, ...]) -> set[int]:
+        candidates: set[int] = set()
+        for band in self._bands(subscription, signature):
+            candidates |= self._buckets.get(band, set())
+        return candidates
+
+    def _bands(self, subscription: str, signature: tuple[int, ...]) -> list[tuple[str, int, tuple[int, ...]]]:
+        return [
+            (subscription, index, signature[index : index + ROWS_PER_BAND])
+            for index in range(0, NUM_PERMUTATIONS, ROWS_PER_BAND)
+        ]
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for band in self._bands(entry.subscription, entry.signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
@@ -0,0 +1,254 @@
+"""Module: run_store.py
+
+Description:
+    Durable storage for research runs. Each store pairs a LangGraph checkpointer, which saves agent state after
+    every completed node under the run ID as the thread ID, with a record of the runs still in flight. Runs that
+    were interrupted by a shutdown are found again on startup and resumed from their last checkpoint instead of
+    losing all of the work (and LLM spend) that went into them.
+
+Author: Nathan Thomas
+"""
+
+import os
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from ..shared.config import app_config
+from ..shared.limits import process_exists
+from .models import ResearchRequest
+from .runs import ResearchRun
+
+# The checkpointer backends are imported when a store is created, so the server doesn't load them when
+# checkpointing is disabled
+if TYPE_CHECKING:
+    import aiosqlite
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+
+
+@dataclass
+class StoredRun:
+    """A research run that was still in flight when it was last saved."""
+
+    run_id: str
+    request_id: str
+    request: ResearchRequest
+    next_seq: int
+
+
+class RunStore:
+    """Run store used when checkpointing is disabled. Nothing is saved, so nothing can be resumed."""
+
+    checkpointer: "BaseCheckpointSaver | None" = None
+
+    async def save(self, run: ResearchRun) -> None:
+        """Record a run as in flight.
+
+        Args:
+            run (ResearchRun): The run
+        """
+
+    async def save_progress(self, runs: Sequence[ResearchRun]) -> None:
+        """Record the next event sequence number of runs, so a resumed run keeps numbering its events where the
+        interrupted one left off. Runs that are no longer recorded are skipped.
+
+        Args:
+            runs (Sequence[ResearchRun]): The runs
+        """
+
+    async def forget(self, run_id: str) -> None:
+        """Delete a run's record and checkpoints once it can no longer be resumed.
+
+        Args:
+            run_id (str): The run ID
+        """
+
+    async def interrupted(self) -> list[StoredRun]:
+        """Get every run that was still in flight when the store was last used.
+
+        Returns:
+            list[StoredRun]: The interrupted runs
+        """
+
+        return []
+
+    async def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+class MemoryRunStore(RunStore):
+    """Keeps checkpoints in process memory. Runs survive within the process but not across restarts."""
+
+    def __init__(self) -> None:
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        self.checkpointer: InMemorySaver = InMemorySaver()
+        self._runs: dict[str, StoredRun] = {}
+
+    async def save(self, run: ResearchRun) -> None:
+        self._runs[run.run_id] = StoredRun(run.run_id, run.request_id, run.request, run.next_seq)
+
+    async def save_progress(self, runs: Sequence[ResearchRun]) -> None:
+        for run in runs:
+            if run.run_id in self._runs:
+                self._runs[run.run_id].next_seq = run.next_seq
+
+    async def forget(self, run_id: str) -> None:
+        self._runs.pop(run_id, None)
+        await self.checkpointer.adelete_thread(run_id)
+
+    async def interrupted(self) -> list[StoredRun]:
+        return list(self._runs.values())
+
+
+class SqliteRunStore(RunStore):
+    """Keeps checkpoints and run records in a SQLite database so runs can resume after a restart.
+
+    Every run record is owned by the process running it, identified by the server launch and its PID. Several
+    worker processes can share one database: on startup each worker only claims runs left behind by an earlier
+    launch or by a worker that has died, so no run is resumed twice.
+    """
+
+    def __init__(self, conn: "aiosqlite.Connection") -> None:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        self.conn = conn
+        self.checkpointer: AsyncSqliteSaver = AsyncSqliteSaver(conn)
+        self.launch_id = app_config.APP_LAUNCH_ID or str(uuid.uuid4())
+
+    @classmethod
+    async def open(cls, path: str) -> "SqliteRunStore":
+        """Open (and create if needed) a SQLite run store.
+
+        Args:
+            path (str): The path to the SQLite database file
+
+        Returns:
+            SqliteRunStore: The opened store
+        """
+
+        import aiosqlite
+
+        conn = await aiosqlite.connect(path)
+
+        try:
+            # WAL with synchronous=NORMAL only syncs on WAL checkpoints rather than on every commit. A crash of the
+            # process can't lose committed writes, and checkpoint writes stay off the critical path of each step.
+            await conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS research_runs (
+                    run_id TEXT PRIMARY KEY,
+                    request_id TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    next_seq INTEGER NOT NULL,
+                    owner TEXT
+                );
+                """
+            )
+            await conn.commit()
+
+            store = cls(conn)
+            await store.checkpointer.setup()
+        except BaseException:
+            await conn.close()
+            raise
+
+        return store
+
+    async def save(self, run: ResearchRun) -> None:
+        async with self.checkpointer.lock:
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO research_runs (run_id, request_id, request, next_seq, owner) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run.run_id, run.request_id, run.request.model_dump_json(), run.next_seq, self.owner),
+            )
+            await self.conn.commit()
+
+    async def save_progress(self, runs: Sequence[ResearchRun]) -> None:
+        async with self.checkpointer.lock:
+            await self.conn.executemany(
+                "UPDATE research_runs SET next_seq = ? WHERE run_id = ?", [(run.next_seq, run.run_id) for run in runs]
+            )
+            await self.conn.commit()
+
+    async def forget(self, run_id: str) -> None:
+        async with self.checkpointer.lock:
+            await self.conn.execute("DELETE FROM research_runs WHERE run_id = ?", (run_id,))
+            await self.conn.commit()
+        await self.checkpointer.adelete_thread(run_id)
+
+    async def interrupted(self) -> list[StoredRun]:
+        async with self.checkpointer.lock:
+            # Claim abandoned runs inside one write transaction so that workers starting together can't both
+            # claim the same run
+            await self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                async with self.conn.execute(
+                    "SELECT run_id, request_id, request, next_seq, owner FROM research_runs"
+                ) as cursor:
+                    rows = [row for row in await cursor.fetchall() if self._is_abandoned(row[4])]
+
+                await self.conn.executemany(
+                    "UPDATE research_runs SET owner = ? WHERE run_id = ?", [(self.owner, row[0]) for row in rows]
+                )
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
+
+        return [
+            StoredRun(run_id, request_id, ResearchRequest.model_validate_json(request), next_seq)
+            for run_id, request_id, request, next_seq, _owner in rows
+        ]
+
+    async def close(self) -> None:
+        await self.conn.close()
+
+    @property
+    def owner(self) -> str:
+        """The owner recorded on runs started by this process."""
+
+        return f"{self.launch_id}:{os.getpid()}"
+
+    def _is_abandoned(self, owner: str | None) -> bool:
+        """Check whether a run's owner is gone, either from an earlier launch or a worker that has died.
+
+        Args:
+            owner (str | None): The run's owner
+
+        Returns:
+            bool: True if the run can be claimed by this process
+        """
+
+        if owner is None:
+            return True
+
+        launch_id, _, pid = owner.rpartition(":")
+        return launch_id != self.launch_id or owner == self.owner or not process_exists(int(pid))
+
+
+async def open_run_store(backend: str, sqlite_path: str) -> RunStore:
+    """Open the run store for a checkpointer backend.
+
+    Args:
+        backend (str): One of "none", "memory", or "sqlite"
+        sqlite_path (str): The database path used by the "sqlite" backend
+
+    Returns:
+        RunStore: The opened run store
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+
+    if backend == "none":
+        return RunStore()
+    if backend == "memory":
+        return MemoryRunStore()
+    if backend == "sqlite":
+        return await SqliteRunStore.open(sqlite_path)
+
+    raise ValueError(f"Unknown checkpointer backend: {backend}")
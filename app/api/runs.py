@@ -0,0 +1,215 @@
+"""Module: runs.py
+
+Description:
+    Research runs decoupled from the WebSocket connections that started them. Each run keeps a bounded ring
+    buffer of the events it has emitted, keyed by a resumable run ID, so that a client that reconnects after a
+    network blip can pick up from its last sequence number instead of re-running the whole research request.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import Any
+
+from ..shared.metrics import registry
+from ..shared.tracing import RunTrace
+from .models import CancelReason, ResearchRequest
+
+resumed_runs = registry.counter("research_runs_resumed_total", "Research runs resumed by a reconnecting client")
+replayed_events = registry.counter("research_events_replayed_total", "Buffered events replayed to resuming clients")
+expired_runs = registry.counter(
+    "research_runs_expired_total", "Detached research runs cancelled because no client resumed them in time"
+)
+
+# The ID of the research run executing in the current context, inherited by every task the run starts
+current_run_id: ContextVar[str | None] = ContextVar("current_run_id", default=None)
+
+
+class ResearchRun:
+    """A single research run along with the events it has emitted so far."""
+
+    def __init__(self, run_id: str, request_id: str, request: ResearchRequest, buffer_size: int) -> None:
+        self.run_id = run_id
+        self.request_id = request_id
+        self.request = request
+        self.client_id: str | None = None
+        self.task: asyncio.Task[None] | None = None
+        self.started = False
+        self.finished = False
+        self.events: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+        self.next_seq = 1
+        # The sequence number last saved to the run store, so progress is only saved when it has moved on
+        self.saved_seq = 1
+        self.trace: RunTrace | None = None
+        self._timer: asyncio.TimerHandle | None = None
+
+    def record(self, event: dict[str, Any]) -> dict[str, Any]:
+        """Tag an event with this run's ID and the next sequence number, then buffer it for replay.
+
+        Args:
+            event (dict[str, Any]): The event to record
+
+        Returns:
+            dict[str, Any]: The tagged event
+        """
+
+        event["request_id"] = self.request_id
+        event["run_id"] = self.run_id
+        event["seq"] = self.next_seq
+        self.next_seq += 1
+        self.events.append(event)
+
+        return event
+
+    def replay_from(self, last_seq: int) -> tuple[list[dict[str, Any]], bool]:
+        """Get every buffered event after a sequence number.
+
+        Args:
+            last_seq (int): The last sequence number the client received
+
+        Returns:
+            tuple[list[dict[str, Any]], bool]: The events to replay, and whether some events after `last_seq`
+                already fell out of the ring buffer
+        """
+
+        events = [event for event in self.events if event["seq"] > last_seq]
+        has_gap = last_seq + 1 < self.next_seq and (not events or events[0]["seq"] > last_seq + 1)
+
+        return events, has_gap
+
+
+class RunRegistry:
+    """Tracks research runs by run ID, including runs whose client has gone away."""
+
+    def __init__(self, buffer_size: int, resume_grace_seconds: float, retention_seconds: float) -> None:
+        self.buffer_size = buffer_size
+        self.resume_grace_seconds = resume_grace_seconds
+        self.retention_seconds = retention_seconds
+        self.runs: dict[str, ResearchRun] = {}
+
+    def create(self, request_id: str, request: ResearchRequest, client_id: str) -> ResearchRun:
+        """Create a run attached to a client.
+
+        Args:
+            request_id (str): The client's ID for the request
+            request (ResearchRequest): The validated research request
+            client_id (str): The connection the run is attached to
+
+        Returns:
+            ResearchRun: The new run
+        """
+
+        run = ResearchRun(str(uuid.uuid4()), request_id, request, self.buffer_size)
+        run.client_id = client_id
+        self.runs[run.run_id] = run
+
+        return run
+
+    def restore(self, run_id: str, request_id: str, request: ResearchRequest, next_seq: int) -> ResearchRun:
+        """Register a run that was interrupted by a restart. It starts out detached, so the client has the usual
+        grace period to resume it.
+
+        Args:
+            run_id (str): The interrupted run's ID
+            request_id (str): The client's ID for the request
+            request (ResearchRequest): The original research request
+            next_seq (int): The sequence number for the run's next event
+
+        Returns:
+            ResearchRun: The restored run
+        """
+
+        run = ResearchRun(run_id, request_id, request, self.buffer_size)
+        run.next_seq = run.saved_seq = next_seq
+        self.runs[run.run_id] = run
+
+        return run
+
+    def get(self, run_id: str) -> ResearchRun | None:
+        """Get a run by ID.
+
+        Args:
+            run_id (str): The run ID
+
+        Returns:
+            ResearchRun | None: The run, or None if it doesn't exist or has expired
+        """
+
+        return self.runs.get(run_id)
+
+    def runs_for(self, client_id: str) -> list[ResearchRun]:
+        """Get every run currently attached to a client.
+
+        Args:
+            client_id (str): The client ID
+
+        Returns:
+            list[ResearchRun]: The attached runs
+        """
+
+        return [run for run in self.runs.values() if run.client_id == client_id]
+
+    def attach(self, run: ResearchRun, client_id: str) -> None:
+        """Attach a run to a (possibly new) client connection, stopping any pending expiry.
+
+        Args:
+            run (ResearchRun): The run
+            client_id (str): The client ID
+        """
+
+        if run.client_id is None:
+            resumed_runs.inc()
+
+        self._cancel_timer(run)
+        run.client_id = client_id
+
+        if run.finished:
+            self._schedule(run, self.retention_seconds, self._remove)
+
+    def detach(self, run: ResearchRun) -> None:
+        """Detach a run from its client. Unfinished runs keep going for a grace period so the client can resume
+        them, after which they're cancelled.
+
+        Args:
+            run (ResearchRun): The run
+        """
+
+        run.client_id = None
+        if not run.finished:
+            self._schedule(run, self.resume_grace_seconds, self._expire)
+
+    def finish(self, run: ResearchRun) -> None:
+        """Mark a run as finished. Its events stay available for replay until the retention period passes.
+
+        Args:
+            run (ResearchRun): The run
+        """
+
+        run.finished = True
+        self._schedule(run, self.retention_seconds, self._remove)
+
+    def _schedule(self, run: ResearchRun, delay: float, callback: Callable[[ResearchRun], None]) -> None:
+        self._cancel_timer(run)
+        if delay <= 0:
+            callback(run)
+        else:
+            run._timer = asyncio.get_running_loop().call_later(delay, callback, run)
+
+    def _cancel_timer(self, run: ResearchRun) -> None:
+        if run._timer is not None:
+            run._timer.cancel()
+            run._timer = None
+
+    def _expire(self, run: ResearchRun) -> None:
+        run._timer = None
+        if run.client_id is None and run.task is not None and not run.task.done():
+            expired_runs.inc()
+            run.task.cancel(CancelReason.CLIENT_DISCONNECT.value)
+
+    def _remove(self, run: ResearchRun) -> None:
+        run._timer = None
+        self.runs.pop(run.run_id, None)
@@ -0,0 +1,219 @@
+"""Module: scheduler.py
+
+Description:
+    Admission control for research runs. A global limit caps how many runs execute at once (across every worker
+    process when slots are shared), and runs beyond that limit wait in a bounded queue that is shared fairly
+    (round-robin) across clients so that one busy client can't starve the others.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import math
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from ..shared.limits import SlotLimiter
+from ..shared.metrics import registry
+
+QueueUpdateCallback = Callable[[int, float | None], Awaitable[None]]
+
+active_runs_gauge = registry.gauge("research_runs_active", "Research runs currently executing")
+queued_runs_gauge = registry.gauge("research_runs_queued", "Research runs waiting for an execution slot")
+rejected_runs = registry.counter("research_runs_rejected_total", "Research runs rejected because the queue was full")
+
+
+class QueueFullError(Exception):
+    """Raised when a research run can't be admitted because the queue is at capacity."""
+
+    def __init__(self, retry_after_seconds: float) -> None:
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(f"Research queue is full, retry after {retry_after_seconds:.0f} seconds")
+
+
+@dataclass(eq=False)
+class _Ticket:
+    """A queued research run waiting for an execution slot."""
+
+    client_id: str
+    updated: asyncio.Event = field(default_factory=asyncio.Event)
+    granted: bool = False
+
+    # The ticket's queue position and ETA, as of the last change to the queue
+    position: int = 0
+    eta: float | None = None
+
+
+class ResearchScheduler:
+    """Limits concurrently executing research runs and queues the rest fairly across clients."""
+
+    # Number of recent run durations used to estimate queue wait times
+    DURATION_SAMPLES = 50
+
+    # Retry hint used for rejections before any run has completed
+    DEFAULT_RETRY_AFTER_SECONDS = 30.0
+
+    def __init__(self, max_active: int, max_queued: int, slots: SlotLimiter | None = None) -> None:
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.slots = slots or SlotLimiter(max_active)
+        self.active = 0
+        self._queues: OrderedDict[str, deque[_Ticket]] = OrderedDict()
+        self._durations: deque[float] = deque(maxlen=self.DURATION_SAMPLES)
+
+    @property
+    def queued(self) -> int:
+        """The number of runs currently waiting for a slot."""
+
+        return sum(len(queue) for queue in self._queues.values())
+
+    def average_duration(self) -> float | None:
+        """Get the average duration of recently completed runs.
+
+        Returns:
+            float | None: The average duration in seconds, or None if no run has completed yet
+        """
+
+        if not self._durations:
+            return None
+        return sum(self._durations) / len(self._durations)
+
+    def estimate_wait(self, position: int) -> float | None:
+        """Estimate how long a run at a given queue position will wait for a slot.
+
+        Args:
+            position (int): The zero-based position in the dispatch order
+
+        Returns:
+            float | None: The estimated wait in seconds, or None if there's no duration history yet
+        """
+
+        average = self.average_duration()
+        if average is None:
+            return None
+        return average * math.ceil((position + 1) / self.max_active)
+
+    async def acquire(self, client_id: str, on_update: QueueUpdateCallback | None = None) -> None:
+        """Wait for an execution slot. Calls `on_update` with the queue position and ETA whenever they change.
+
+        Args:
+            client_id (str): The client the run belongs to, used for fair sharing
+            on_update (QueueUpdateCallback | None): Callback for queue position and ETA updates
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+
+        if self.queued == 0 and self.slots.try_acquire():
+            self._grant()
+            return
+
+        if self.queued >= self.max_queued:
+            rejected_runs.inc()
+            retry_after = self.estimate_wait(self.queued) or self.DEFAULT_RETRY_AFTER_SECONDS
+            raise QueueFullError(retry_after)
+
+        ticket = _Ticket(client_id)
+        self._queues.setdefault(client_id, deque()).append(ticket)
+        self._on_queue_changed()
+
+        try:
+            last_update: tuple[int, float | None] | None = None
+            while not ticket.granted:
+                # Clear before notifying so a grant that lands during the callback isn't missed
+                ticket.updated.clear()
+                update = (ticket.position, ticket.eta)
+                if on_update is not None and update != last_update:
+                    last_update = update
+                    await on_update(*update)
+
+                # Slots shared with other worker processes can free up without this process hearing about it, so
+                # the ticket at the head of the queue checks for them. The rest wait until the queue moves.
+                polling = ticket.position == 0 and self.slots.poll_interval is not None
+                try:
+                    await asyncio.wait_for(ticket.updated.wait(), self.slots.poll_interval if polling else None)
+                except TimeoutError:
+                    if self._dispatch():
+                        self._on_queue_changed()
+        except BaseException:
+            if ticket.granted:
+                self.release()
+            else:
+                self._remove(ticket)
+            raise
+
+    def release(self, duration: float | None = None) -> None:
+        """Release an execution slot and hand it to the next queued run.
+
+        Args:
+            duration (float | None): How long the finished run took, used for ETA estimates
+        """
+
+        if duration is not None:
+            self._durations.append(duration)
+
+        self.active -= 1
+        self.slots.release()
+        active_runs_gauge.set(self.active)
+        self._dispatch()
+        self._on_queue_changed()
+
+    def _grant(self) -> None:
+        self.active += 1
+        active_runs_gauge.set(self.active)
+
+    def _dispatch_order(self) -> list[_Ticket]:
+        """Get every queued ticket in the order it will be dispatched (round-robin across clients)."""
+
+        order: list[_Ticket] = []
+        queues = [list(queue) for queue in self._queues.values()]
+        depth = 0
+        while len(order) < self.queued:
+            for queue in queues:
+                if depth < len(queue):
+                    order.append(queue[depth])
+            depth += 1
+        return order
+
+    def _dispatch(self) -> bool:
+        """Grant free slots to queued tickets, rotating between clients.
+
+        Returns:
+            bool: True if any ticket was granted a slot
+        """
+
+        granted = False
+        while self._queues and self.slots.try_acquire():
+            client_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+
+            # Rotate the client to the back so every client gets a turn before this one goes again
+            del self._queues[client_id]
+            if queue:
+                self._queues[client_id] = queue
+
+            ticket.granted = True
+            ticket.updated.set()
+            self._grant()
+            granted = True
+
+        return granted
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.client_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.client_id]
+        self._on_queue_changed()
+
+    def _on_queue_changed(self) -> None:
+        """Work out every queued ticket's position and ETA, waking only the tickets whose update changed."""
+
+        queued_runs_gauge.set(self.queued)
+        for position, ticket in enumerate(self._dispatch_order()):
+            eta = self.estimate_wait(position)
+            if (position, eta) != (ticket.position, ticket.eta):
+                ticket.position, ticket.eta = position, eta
+                ticket.updated.set()
@@ -7,26 +7,45 @@ Description:
 Author: Nathan Thomas
 """
 
+import asyncio
+import sys
+import time
 import uuid
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, WebSocket
+from fastapi import FastAPI, Request, Response, WebSocket
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from .. import agents
 from ..shared.config import app_config
 from ..shared.errors import CustomError
+from ..shared.loop_monitor import LoopMonitor
+from ..shared.metrics import registry, update_process_metrics
+from .admin import router as admin_router
 from .websocket import manager
 
 
+async def warm_up() -> None:
+    """Build the agent stack ahead of the first research run. The imports and client construction are blocking,
+    so they run in a worker thread while the event loop keeps answering health checks.
+    """
+
+    start = time.perf_counter()
+    failed = await asyncio.to_thread(agents.warm_up, manager.store.checkpointer)
+
+    skipped = f" (skipped {', '.join(failed)})" if failed else ""
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s{skipped}")
+
+
 @asynccontextmanager
-async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Hook into the application lifecycle for logging and custom logic. Run on startup and shutdown.
 
     Args:
-        _app (FastAPI): The FastAPI app
+        app (FastAPI): The FastAPI app
 
     Returns:
         AsyncGenerator[None, None]: The lifespan generator
@@ -34,10 +53,28 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
 
     # Everything below this is run on startup
     print(f"Starting {app_config.APP_NAME}")
+    if app_config.LOOP_MONITOR_ENABLED:
+        app.state.loop_monitor = LoopMonitor(
+            app_config.LOOP_MONITOR_INTERVAL_SECONDS, app_config.LOOP_BLOCK_THRESHOLD_SECONDS
+        )
+        app.state.loop_monitor.start()
+    await manager.startup()
+    if app_config.APP_WARMUP:
+        app.state.warmup = asyncio.create_task(warm_up())
     yield
 
     # Everything below this is run on shutdown
     print(f"Shutting down {app_config.APP_NAME}")
+    if app.state.warmup is not None:
+        await asyncio.gather(app.state.warmup, return_exceptions=True)
+    await manager.shutdown()
+
+    # The agent stack is loaded on first use, so there are only clients to close if it was ever loaded
+    if f"{agents.__name__}.agents" in sys.modules:
+        await agents.close_clients()
+
+    if app.state.loop_monitor is not None:
+        await app.state.loop_monitor.stop()
 
 
 # Create FastAPI app
@@ -49,6 +86,15 @@ app = FastAPI(
     debug=app_config.APP_DEBUG,
 )
 
+# The warm-up task while the server is warming up, or None if warm-up is disabled
+app.state.warmup = None
+
+# The event loop monitor while the server runs, or None if it's disabled
+app.state.loop_monitor = None
+
+# Optional instrumentation (such as timing every graph node and tool call) only runs while metrics are enabled
+registry.enabled = app_config.METRICS_ENABLED
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -58,6 +104,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-only endpoints, such as on-demand profiling
+app.include_router(admin_router)
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(_request: Request, exc: RequestValidationError) -> JSONResponse:
@@ -128,19 +177,53 @@ async def global_exception_handler(_request: Request, _exc: Exception) -> JSONRe
 
 
 @app.get("/health")
-async def health_check() -> dict[str, str]:
-    """Health check endpoint.
+async def health_check(response: Response) -> dict[str, str]:
+    """Health check endpoint. Reports not ready while the server warms up, so that load balancers don't route
+    the first research runs to it before it's ready, and while it drains ahead of a shutdown so that they stop
+    routing new connections to it.
+
+    Args:
+        response (Response): The response, used to set the status code
 
     Returns:
         dict[str, str]: The health check response
     """
 
+    if manager.draining:
+        response.status_code = 503
+        return {
+            "status": "draining",
+            "service": app_config.APP_NAME,
+        }
+
+    if app.state.warmup is not None and not app.state.warmup.done():
+        response.status_code = 503
+        return {
+            "status": "warming_up",
+            "service": app_config.APP_NAME,
+        }
+
     return {
         "status": "healthy",
         "service": app_config.APP_NAME,
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Metrics endpoint in the Prometheus text exposition format. Not found while METRICS_ENABLED is off.
+
+    Returns:
+        PlainTextResponse: The rendered metrics
+    """
+
+    if not registry.enabled:
+        return PlainTextResponse("Metrics are disabled\n", status_code=404)
+
+    update_process_metrics()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.websocket("/ws")
 async def handle_websocket_stream(websocket: WebSocket) -> None:
     """WebSocket endpoint for real-time streaming research
@@ -149,8 +232,8 @@ async def handle_websocket_stream(websocket: WebSocket) -> None:
         websocket (WebSocket): The websocket connection
     """
 
-    # TODO: This could be upgraded for a production environment to track clients by a real unique ID
-    # persisted across sessions. However, this is fine for this server's purposes right now.
+    # Client IDs only identify a single connection. Research runs outlive their connection and are resumed by
+    # their run ID, so a reconnecting client doesn't need to keep the same client ID.
     client_id = str(uuid.uuid4())
     connection_accepted = await manager.connect(websocket, client_id)
 
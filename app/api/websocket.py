@@ -8,34 +8,190 @@ Author: Nathan Thomas
 
 import asyncio
 import json
+import logging
+import math
+import time
+import uuid
 from datetime import UTC, datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from fastapi import WebSocket, WebSocketDisconnect
-from langgraph.prebuilt import create_react_agent
-
-from ..agents import (
-    BUILT_IN_TOOLS,
-    SUB_AGENT_RESEARCHER,
-    SUB_AGENT_RESEARCHER_TOOLS,
-    SUPERVISOR_INSTRUCTIONS,
-    DeepAgentState,
-    _create_task_tool,
-    get_researcher_model,
-    get_supervisor_model,
-    stream_agent_for_websocket,
-)
+from pydantic import ValidationError
+
+# The agent stack (LangChain, LangGraph and the model SDKs) is loaded on first use rather than at import
+from .. import agents
+from ..agents.memory import RunMemory, current_run_memory, remove_spilled_files
+from ..agents.usage import build_run_usage, current_run_usage
+from ..agents.utils import stream_agent_for_websocket
+from ..shared.cassette import finish_cassette, start_cassette
 from ..shared.config import app_config
-from .models import ResearchRequest
+from ..shared.limits import build_slot_limiter
+from ..shared.metrics import registry
+from ..shared.tracing import span, start_trace, write_trace
+from .models import (
+    CancelReason,
+    CancelRequest,
+    EventType,
+    MessageType,
+    ResearchRequest,
+    ResumeRequest,
+    SubgraphScope,
+)
+from .result_cache import CachedResult, ResultCache, result_cache_hit_ratio, result_cache_lookups
+from .run_store import RunStore, open_run_store
+from .runs import ResearchRun, RunRegistry, current_run_id, replayed_events
+from .scheduler import QueueFullError, ResearchScheduler
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+cancelled_runs = registry.counter(
+    "research_runs_cancelled_total", "Research runs cancelled before completing", ["reason"]
+)
+restored_runs = registry.counter(
+    "research_runs_restored_total", "Research runs restored from a checkpoint after the server restarted"
+)
+active_connections_gauge = registry.gauge("websocket_connections_active", "WebSocket connections currently open")
+events_sent = registry.counter(
+    "websocket_events_sent_total", "Events sent to WebSocket clients, by type", ["event_type"]
+)
+bytes_sent = registry.counter("websocket_bytes_sent_total", "Bytes of events sent to WebSocket clients")
+trace_export_failures = registry.counter(
+    "trace_export_failures_total", "Research run traces that couldn't be written to TRACE_DIR"
+)
+
+logger = logging.getLogger(__name__)
+
+# Runs cancelled for these reasons are finished for good. Any other cancellation (e.g. the server shutting down)
+# leaves the run's checkpoints in place so it can be resumed.
+FINAL_CANCEL_REASONS = {CancelReason.CLIENT_CANCEL.value, CancelReason.CLIENT_DISCONNECT.value}
 
 
 class WebSocketManager:
     """Wraps the native Websocket connection and offers up an API for managing these connections and streams."""
 
+    # Seconds between saves of the runs' event sequence numbers. Saving them with every event would put a write
+    # transaction on the path of every event, competing with checkpoint writes for the database.
+    PROGRESS_SAVE_SECONDS = 1.0
+
     def __init__(self) -> None:
         self.active_connections: dict[str, WebSocket] = {}
-        self.max_connections = app_config.MAX_CONCURRENT_WEBSOCKET_CONNECTIONS
+        self.connection_slots = build_slot_limiter("connections", app_config.MAX_CONCURRENT_WEBSOCKET_CONNECTIONS)
+        self.max_runs_per_connection = app_config.MAX_CONCURRENT_RUNS_PER_CONNECTION
+        self.scheduler = ResearchScheduler(
+            app_config.MAX_CONCURRENT_RESEARCH_RUNS,
+            app_config.MAX_QUEUED_RESEARCH_RUNS,
+            build_slot_limiter("research_runs", app_config.MAX_CONCURRENT_RESEARCH_RUNS),
+        )
+        self.runs = RunRegistry(
+            app_config.RUN_EVENT_BUFFER_SIZE, app_config.RUN_RESUME_GRACE_SECONDS, app_config.RUN_RETENTION_SECONDS
+        )
+        self.store = RunStore()
+        self.result_cache = (
+            ResultCache(
+                app_config.RESULT_CACHE_TTL_SECONDS,
+                app_config.RESULT_CACHE_SIMILARITY,
+                app_config.RESULT_CACHE_MAX_ENTRIES,
+            )
+            if app_config.RESULT_CACHE_ENABLED
+            else None
+        )
+        self.durability = app_config.CHECKPOINTER_DURABILITY
+        self.draining = False
         self._lock = asyncio.Lock()
+        self._send_locks: dict[str, asyncio.Lock] = {}
+        self._progress_saver: asyncio.Task[None] | None = None
+
+    async def startup(self) -> None:
+        """Open the run store and resume every run that was interrupted when the server last shut down."""
+
+        self.store = await open_run_store(app_config.CHECKPOINTER_BACKEND, app_config.CHECKPOINTER_SQLITE_PATH)
+        await self.restore_interrupted_runs()
+        self._progress_saver = asyncio.create_task(self._save_progress_periodically())
+
+    async def save_progress(self) -> None:
+        """Save the event sequence numbers of every run that has sent events since they were last saved, in one
+        write to the run store.
+        """
+
+        runs = [run for run in self.runs.runs.values() if run.next_seq != run.saved_seq]
+        if not runs:
+            return
+
+        # Events sent while saving are picked up by the next save
+        saved = [run.next_seq for run in runs]
+        await self.store.save_progress(runs)
+        for run, next_seq in zip(runs, saved, strict=True):
+            run.saved_seq = next_seq
+
+    async def _save_progress_periodically(self) -> None:
+        """Save the runs' progress every PROGRESS_SAVE_SECONDS, so a crash loses at most that much of it."""
+
+        while True:
+            await asyncio.sleep(self.PROGRESS_SAVE_SECONDS)
+            try:
+                await self.save_progress()
+            except Exception as e:
+                logger.warning("Failed to save the progress of research runs: %s", e)
+
+    async def drain(self, timeout: float) -> None:
+        """Drain the server ahead of a shutdown. New connections and research requests are turned away, queued
+        runs are stopped, and running runs get until the deadline to finish. Anything still running after that is
+        cancelled at its last checkpoint so it resumes on the next startup. Finally every connection is closed once
+        its pending events have been sent.
+
+        Args:
+            timeout (float): Seconds to wait for running research runs to finish
+        """
+
+        self.draining = True
+
+        # Queued runs haven't done any work yet, so there's nothing to wait for. They stay in the run store and
+        # start over on the next startup.
+        for run in self.runs.runs.values():
+            if run.task is not None and not run.task.done() and not run.started:
+                run.task.cancel(CancelReason.SHUTDOWN.value)
+
+        tasks = [run.task for run in self.runs.runs.values() if run.task is not None and not run.task.done()]
+        if tasks:
+            _done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel(CancelReason.SHUTDOWN.value)
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Runs cancelled above resume on the next startup, numbering their events from where they stopped
+        await self.save_progress()
+
+        for client_id in list(self.active_connections):
+            send_lock = self._send_locks.get(client_id)
+            if send_lock is not None:
+                # Wait for in-progress sends so the last events reach the client before the socket closes
+                async with send_lock:
+                    pass
+            await self.disconnect(client_id, code=1012, reason="Server restarting")
+
+    async def shutdown(self) -> None:
+        """Stop any runs still going, then close the run store."""
+
+        if self._progress_saver is not None:
+            self._progress_saver.cancel()
+            await asyncio.gather(self._progress_saver, return_exceptions=True)
+        await self.drain(0)
+        await self.store.close()
+
+    async def restore_interrupted_runs(self) -> None:
+        """Restart every run left in flight in the run store. Restored runs continue from their last checkpoint
+        and wait, detached, for their clients to resume them.
+        """
+
+        for stored in await self.store.interrupted():
+            if self.runs.get(stored.run_id) is not None:
+                continue
+
+            run = self.runs.restore(stored.run_id, stored.request_id, stored.request, stored.next_seq)
+            self._launch(run, resume=True)
+            self.runs.detach(run)
+            restored_runs.inc()
 
     async def connect(self, websocket: WebSocket, client_id: str) -> bool:
         """Accept a WebSocket connection. Returns True if successful, False if rejected.
@@ -49,20 +205,34 @@ class WebSocketManager:
         """
 
         async with self._lock:
-            if len(self.active_connections) >= self.max_connections:
+            if self.draining:
+                await websocket.close(code=1012, reason="Server restarting")
+                return False
+
+            if not self.connection_slots.try_acquire():
                 await websocket.close(code=1013, reason="Server overloaded - too many connections")
                 return False
 
-            await websocket.accept()
+            try:
+                await websocket.accept()
+            except BaseException:
+                self.connection_slots.release()
+                raise
+
             self.active_connections[client_id] = websocket
+            self._send_locks[client_id] = asyncio.Lock()
+            active_connections_gauge.set(len(self.active_connections))
 
             return True
 
-    async def disconnect(self, client_id: str) -> None:
-        """Remove a WebSocket connection.
+    async def disconnect(self, client_id: str, code: int = 1000, reason: str | None = None) -> None:
+        """Remove a WebSocket connection. Its in-flight research runs are detached rather than stopped so the client
+        can resume them after reconnecting; runs nobody resumes are cancelled once the grace period passes.
 
         Args:
             client_id (str): The client ID
+            code (int): The WebSocket close code
+            reason (str | None): The close reason
         """
 
         async with self._lock:
@@ -70,15 +240,21 @@ class WebSocketManager:
                 websocket = self.active_connections[client_id]
 
                 try:
-                    await websocket.close()
+                    await websocket.close(code=code, reason=reason)
                 except Exception:
                     # Connection might already be closed. Simply pass on and remove from the active conneciton list.
                     pass
                 finally:
                     del self.active_connections[client_id]
+                    active_connections_gauge.set(len(self.active_connections))
+                    self.connection_slots.release()
+                    self._send_locks.pop(client_id, None)
+                    for run in self.runs.runs_for(client_id):
+                        self.runs.detach(run)
 
     async def send_json(self, client_id: str, data: dict[str, Any]) -> None:
-        """Send JSON data to a specific client.
+        """Send JSON data to a specific client. Sends are serialized per connection since several research runs
+        can stream to the same socket concurrently.
 
         Args:
             client_id (str): The client ID
@@ -87,13 +263,74 @@ class WebSocketManager:
 
         if client_id in self.active_connections:
             try:
-                await self.active_connections[client_id].send_text(json.dumps(data))
+                async with self._send_locks[client_id]:
+                    await self._send_text(self.active_connections[client_id], data)
             except Exception:
                 await self.disconnect(client_id)
         # TODO: Add logging for not found client_id here
 
+    async def _send_text(self, websocket: WebSocket, data: dict[str, Any]) -> None:
+        """Send an event over a WebSocket, counting it and its size.
+
+        Args:
+            websocket (WebSocket): The websocket connection
+            data (dict[str, Any]): The event to send
+        """
+
+        text = json.dumps(data)
+        await websocket.send_text(text)
+        events_sent.inc(event_type=str(data.get("event_type", "unknown")))
+        bytes_sent.inc(len(text))
+
+    async def send_event(
+        self, client_id: str, event_type: EventType, data: dict[str, Any], request_id: str | None = None
+    ) -> None:
+        """Send a server-generated event to a specific client.
+
+        Args:
+            client_id (str): The client ID
+            event_type (EventType): The type of event to send
+            data (dict[str, Any]): The event data
+            request_id (str | None): The research request the event belongs to, if any
+        """
+
+        event: dict[str, Any] = {
+            "event_type": event_type.value,
+            "data": data,
+            "timestamp": datetime.now(UTC).isoformat(),
+        }
+        if request_id is not None:
+            event["request_id"] = request_id
+
+        await self.send_json(client_id, event)
+
+    async def emit(self, run: ResearchRun, event: dict[str, Any]) -> None:
+        """Record an event in a run's replay buffer and send it to whichever client the run is attached to.
+
+        Args:
+            run (ResearchRun): The run the event belongs to
+            event (dict[str, Any]): The event to send
+        """
+
+        run.record(event)
+        if run.client_id is not None:
+            await self.send_json(run.client_id, event)
+
+    async def emit_event(self, run: ResearchRun, event_type: EventType, data: dict[str, Any]) -> None:
+        """Record and send a server-generated event for a run.
+
+        Args:
+            run (ResearchRun): The run the event belongs to
+            event_type (EventType): The type of event to send
+            data (dict[str, Any]): The event data
+        """
+
+        await self.emit(run, {"event_type": event_type.value, "data": data, "timestamp": datetime.now(UTC).isoformat()})
+
     async def handle_websocket_stream(self, websocket: WebSocket, client_id: str) -> None:
-        """Handle the research streaming WebSocket connection.
+        """Handle the research streaming WebSocket connection. Research requests are started as background tasks so
+        that a single connection can multiplex several runs, cancel them, and resume runs started on an earlier
+        connection.
 
         Args:
             websocket (WebSocket): The websocket connection
@@ -103,49 +340,344 @@ class WebSocketManager:
         try:
             while True:
                 data = await websocket.receive_text()
-                request_data = json.loads(data)
 
-                # TODO: This can be modified later to support multiple other request types via the websocket.
-                if not request_data or not request_data.get("query"):
-                    await self.send_json(
-                        client_id,
-                        {
-                            "event_type": "error",
-                            "data": {"message": "Invalid researcy request"},
-                            "timestamp": datetime.now(UTC).isoformat(),
-                        },
-                    )
+                try:
+                    request_data = json.loads(data)
+                except json.JSONDecodeError:
+                    await self.send_event(client_id, EventType.ERROR, {"message": "Invalid JSON format"})
                     continue
-                request = ResearchRequest(**request_data)
 
-                await self.send_json(
-                    client_id,
+                if not isinstance(request_data, dict):
+                    await self.send_event(client_id, EventType.ERROR, {"message": "Invalid research request"})
+                    continue
+
+                message_type = request_data.pop("type", MessageType.RESEARCH.value)
+                if message_type == MessageType.RESEARCH.value:
+                    await self._start_run(client_id, request_data)
+                elif message_type == MessageType.CANCEL.value:
+                    await self._cancel_run(client_id, request_data)
+                elif message_type == MessageType.RESUME.value:
+                    await self._resume_run(client_id, request_data)
+                else:
+                    await self.send_event(
+                        client_id, EventType.ERROR, {"message": f"Unknown message type: {message_type}"}
+                    )
+
+        except WebSocketDisconnect:
+            await self.disconnect(client_id)
+        except Exception as e:
+            await self.send_event(client_id, EventType.ERROR, {"message": f"Error processing request: {str(e)}"})
+            await self.disconnect(client_id)
+
+    async def _start_run(self, client_id: str, request_data: dict[str, Any]) -> None:
+        """Validate a research request and start it as a background task for the given client.
+
+        Args:
+            client_id (str): The client ID
+            request_data (dict[str, Any]): The decoded research request message
+        """
+
+        if not request_data.get("query"):
+            await self.send_event(
+                client_id, EventType.ERROR, {"message": "Invalid research request"}, request_data.get("request_id")
+            )
+            return
+
+        try:
+            request = ResearchRequest(**request_data)
+        except ValidationError as e:
+            await self.send_event(
+                client_id,
+                EventType.ERROR,
+                {"message": f"Invalid research request: {e.errors()[0]['msg']}"},
+                request_data.get("request_id"),
+            )
+            return
+
+        request_id = request.request_id or str(uuid.uuid4())
+        if client_id not in self.active_connections:
+            return
+
+        if self.draining:
+            await self.send_event(
+                client_id,
+                EventType.ERROR,
+                {"message": "Server is restarting, retry on a new connection", "code": "DRAINING"},
+                request_id,
+            )
+            return
+
+        active_runs = [run for run in self.runs.runs_for(client_id) if not run.finished]
+        if any(run.request_id == request_id for run in active_runs):
+            await self.send_event(
+                client_id, EventType.ERROR, {"message": f"Request {request_id} is already running"}, request_id
+            )
+            return
+
+        if len(active_runs) >= self.max_runs_per_connection:
+            await self.send_event(
+                client_id,
+                EventType.ERROR,
+                {
+                    "message": "Too many concurrent research requests on this connection",
+                    "max_runs_per_connection": self.max_runs_per_connection,
+                },
+                request_id,
+            )
+            return
+
+        cached = self._find_cached_result(request)
+        run = self.runs.create(request_id, request, client_id)
+        if cached is not None:
+            # Replaying does no research, so it skips the run store and the research queue
+            run.task = asyncio.create_task(self._replay_cached_result(run, cached))
+            run.task.add_done_callback(lambda _: self.runs.finish(run))
+            return
+
+        await self.store.save(run)
+        self._launch(run)
+
+    def _launch(self, run: ResearchRun, resume: bool = False) -> None:
+        """Start a run's research as a background task.
+
+        Args:
+            run (ResearchRun): The run to start
+            resume (bool): Whether to continue from the run's last checkpoint rather than starting over
+        """
+
+        run.task = asyncio.create_task(self._run_research(run, resume))
+        run.task.add_done_callback(lambda _: self.runs.finish(run))
+
+    def _find_cached_result(self, request: ResearchRequest) -> CachedResult | None:
+        """Find a fresh cached result for a research request's query, or a near-duplicate of it.
+
+        Args:
+            request (ResearchRequest): The research request
+
+        Returns:
+            CachedResult | None: The cached result to replay, or None if the research needs to run
+        """
+
+        if self.result_cache is None:
+            return None
+
+        if request.bypass_cache:
+            result_cache_lookups.inc(result="bypass")
+            return None
+
+        cached = self.result_cache.lookup(request.query, request.subscription.model_dump_json())
+        result_cache_lookups.inc(result="miss" if cached is None else "hit")
+        hits = result_cache_lookups.get(result="hit")
+        result_cache_hit_ratio.set(hits / (hits + result_cache_lookups.get(result="miss")))
+        return cached
+
+    async def _replay_cached_result(self, run: ResearchRun, cached: CachedResult) -> None:
+        """Answer a research request by replaying the events of an earlier run for the same or a similar query.
+
+        Args:
+            run (ResearchRun): The run answering the request
+            cached (CachedResult): The cached result to replay
+        """
+
+        run.started = True
+        try:
+            await self.emit_event(
+                run,
+                EventType.STATUS_UPDATE,
+                {
+                    "graph": "system",
+                    "node": "cache",
+                    "status": "cached",
+                    "message": f"Replaying cached research for: {cached.query}",
+                    "cached_query": cached.query,
+                    "similarity": round(cached.similarity, 3),
+                    "age_seconds": math.floor(time.time() - cached.created_at),
+                },
+            )
+            for event in cached.events:
+                await self.emit(run, {**event, "timestamp": datetime.now(UTC).isoformat()})
+        except asyncio.CancelledError as e:
+            reason = str(e.args[0]) if e.args else "unknown"
+            cancelled_runs.inc(reason=reason)
+            await self.emit_event(run, EventType.CANCELLED, {"message": "Research request cancelled", "reason": reason})
+            raise
+
+    async def _cancel_run(self, client_id: str, request_data: dict[str, Any]) -> None:
+        """Cancel one of the given client's in-flight research runs, by request ID or run ID.
+
+        Args:
+            client_id (str): The client ID
+            request_data (dict[str, Any]): The decoded cancel message
+        """
+
+        try:
+            request = CancelRequest(**request_data)
+        except ValidationError:
+            request = CancelRequest()
+
+        if request.request_id is None and request.run_id is None:
+            await self.send_event(client_id, EventType.ERROR, {"message": "Cancel requests require a request_id"})
+            return
+
+        run = next(
+            (
+                run
+                for run in self.runs.runs_for(client_id)
+                if not run.finished and (run.request_id == request.request_id or run.run_id == request.run_id)
+            ),
+            None,
+        )
+        if run is None or run.task is None:
+            await self.send_event(
+                client_id,
+                EventType.ERROR,
+                {"message": f"No running request with id {request.request_id or request.run_id}"},
+                request.request_id,
+            )
+            return
+
+        run.task.cancel(CancelReason.CLIENT_CANCEL.value)
+
+    async def _resume_run(self, client_id: str, request_data: dict[str, Any]) -> None:
+        """Attach an existing run to this connection and replay every buffered event after the client's last
+        sequence number, then continue streaming live events.
+
+        Args:
+            client_id (str): The client ID
+            request_data (dict[str, Any]): The decoded resume message
+        """
+
+        try:
+            request = ResumeRequest(**request_data)
+        except ValidationError:
+            await self.send_event(client_id, EventType.ERROR, {"message": "Resume requests require a run_id"})
+            return
+
+        run = self.runs.get(request.run_id)
+        websocket = self.active_connections.get(client_id)
+        if run is None or websocket is None:
+            await self.send_event(
+                client_id, EventType.ERROR, {"message": f"Unknown or expired run {request.run_id}", "code": "NOT_FOUND"}
+            )
+            return
+
+        # Hold the connection's send lock while replaying so that live events emitted by the run in the meantime
+        # are queued up behind the replay and arrive in sequence order.
+        try:
+            async with self._send_locks[client_id]:
+                events, has_gap = run.replay_from(request.last_seq)
+                self.runs.attach(run, client_id)
+
+                await self._send_text(
+                    websocket,
                     {
-                        "event_type": "status_update",
+                        "event_type": EventType.STATUS_UPDATE.value,
                         "data": {
                             "graph": "system",
                             "node": "connection",
-                            "status": "connected",
-                            "message": f"Starting research for: {request.query}",
+                            "status": "resumed",
+                            "replayed_events": len(events),
+                            "replay_gap": has_gap,
+                            "finished": run.finished,
                         },
+                        "request_id": run.request_id,
+                        "run_id": run.run_id,
                         "timestamp": datetime.now(UTC).isoformat(),
                     },
                 )
+                for event in events:
+                    await self._send_text(websocket, event)
+        except Exception:
+            await self.disconnect(client_id)
+            return
 
-                # TODO: This can be refactored later to its own helper functions surrounding agents
-                current_task_tool = _create_task_tool(
-                    SUB_AGENT_RESEARCHER_TOOLS, [SUB_AGENT_RESEARCHER], get_researcher_model(), DeepAgentState
-                )
-                current_delegation_tools = [current_task_tool]
-                current_all_tools = SUB_AGENT_RESEARCHER_TOOLS + BUILT_IN_TOOLS + current_delegation_tools
-                supervisor_agent = create_react_agent(
-                    get_supervisor_model(),
-                    current_all_tools,
-                    prompt=SUPERVISOR_INSTRUCTIONS,
-                    state_schema=DeepAgentState,
+        replayed_events.inc(len(events))
+
+    async def _send_queue_update(self, run: ResearchRun, position: int, eta_seconds: float | None) -> None:
+        """Tell a client where its queued research run is in line.
+
+        Args:
+            run (ResearchRun): The queued run
+            position (int): The zero-based position in the queue
+            eta_seconds (float | None): Estimated seconds until the run starts, if known
+        """
+
+        await self.emit_event(
+            run,
+            EventType.STATUS_UPDATE,
+            {
+                "graph": "system",
+                "node": "queue",
+                "status": "queued",
+                "position": position + 1,
+                "eta_seconds": None if eta_seconds is None else math.ceil(eta_seconds),
+            },
+        )
+
+    async def _run_research(self, run: ResearchRun, resume: bool = False) -> None:
+        """Run a single research request, streaming its events to whichever client the run is attached to. When
+        checkpointing is enabled, the agent's state is checkpointed under the run ID after every step. When tracing
+        is enabled, the run is traced from the moment it's queued, and its trace is exported to TRACE_DIR (if set)
+        once it finishes.
+
+        Args:
+            run (ResearchRun): The run to execute
+            resume (bool): Whether to continue from the run's last checkpoint rather than starting over
+        """
+
+        # Runs execute in their own task, so the run ID and trace only cover this run
+        current_run_id.set(run.run_id)
+        run.trace = start_trace(run.run_id)
+        try:
+            with span("research_run", run_id=run.run_id, request_id=run.request_id, resumed=resume):
+                await self._execute_research(run, resume)
+        finally:
+            if run.trace is not None and app_config.TRACE_DIR:
+                try:
+                    await asyncio.to_thread(write_trace, run.trace, app_config.TRACE_DIR, app_config.TRACE_FORMAT)
+                except (OSError, ValueError) as e:
+                    trace_export_failures.inc()
+                    logger.warning("Failed to export the trace of run %s: %s", run.run_id, e)
+
+    async def _execute_research(self, run: ResearchRun, resume: bool) -> None:
+        """Execute a research run. See `_run_research`.
+
+        Args:
+            run (ResearchRun): The run to execute
+            resume (bool): Whether to continue from the run's last checkpoint rather than starting over
+        """
+
+        request = run.request
+        checkpointer = self.store.checkpointer
+        config: RunnableConfig | None = None if checkpointer is None else {"configurable": {"thread_id": run.run_id}}
+        resumable = False
+
+        try:
+            try:
+                with span("queue"):
+                    await self.scheduler.acquire(
+                        run.client_id or run.run_id, lambda position, eta: self._send_queue_update(run, position, eta)
+                    )
+            except QueueFullError as e:
+                await self.emit_event(
+                    run,
+                    EventType.ERROR,
+                    {
+                        "message": str(e),
+                        "code": "QUEUE_FULL",
+                        "retry_after_seconds": math.ceil(e.retry_after_seconds),
+                    },
                 )
+                return
 
-                query = {
+            run.started = True
+            started = time.monotonic()
+            duration: float | None = None
+            memory: RunMemory | None = None
+            try:
+                # Passing no input continues the graph from its last checkpoint. A run interrupted before its
+                # first checkpoint was written has nothing to continue from, so it starts over.
+                query: dict[str, Any] | None = {
                     "messages": [
                         {
                             "role": "user",
@@ -153,30 +685,97 @@ class WebSocketManager:
                         }
                     ],
                 }
+                if resume and checkpointer is not None and config is not None:
+                    if await checkpointer.aget_tuple(config) is not None:
+                        query = None
 
-                async for event in stream_agent_for_websocket(supervisor_agent, query):
-                    await self.send_json(client_id, event)
+                await self.emit_event(
+                    run,
+                    EventType.STATUS_UPDATE,
+                    {
+                        "graph": "system",
+                        "node": "connection",
+                        "status": "connected",
+                        "message": f"{'Resuming' if query is None else 'Starting'} research for: {request.query}",
+                    },
+                )
 
-        except WebSocketDisconnect:
-            await self.disconnect(client_id)
-        except json.JSONDecodeError:
-            await self.send_json(
-                client_id,
-                {
-                    "event_type": "error",
-                    "data": {"message": "Invalid JSON format"},
-                    "timestamp": datetime.now(UTC).isoformat(),
-                },
-            )
+                supervisor_agent = agents.get_supervisor_agent(checkpointer)
+
+                # With CASSETTE_MODE set, the run's model, search and fetch traffic is recorded, or replayed
+                cassette = await start_cassette(request.query)
+
+                # Fresh runs record what they send so the result can be replayed to similar requests later
+                recorded: list[dict[str, Any]] | None = None
+                if self.result_cache is not None and not resume:
+                    recorded = []
+
+                # Model calls made for the run add up their usage here, and changed totals are sent along with the
+                # next event. Resumed runs only count what they use after resuming.
+                usage = build_run_usage()
+                current_run_usage.set(usage)
+                sent_usage = 0
+
+                # The size of the run's state is tracked the same way, along with what was evicted to cap it
+                memory = RunMemory(run.run_id)
+                current_run_memory.set(memory)
+                sent_memory = 0
+
+                subscription = request.subscription
+                wants_usage = subscription.event_types is None or EventType.USAGE in subscription.event_types
+                wants_memory = subscription.event_types is None or EventType.MEMORY in subscription.event_types
+                async for event in stream_agent_for_websocket(
+                    supervisor_agent,
+                    query,
+                    config,
+                    event_types=(
+                        None
+                        if subscription.event_types is None
+                        else {event_type.value for event_type in subscription.event_types}
+                    ),
+                    root_only=subscription.scope == SubgraphScope.ROOT,
+                    verbosity=subscription.verbosity.value,
+                    durability=None if checkpointer is None else self.durability,
+                ):
+                    if wants_usage and usage.version != sent_usage:
+                        sent_usage = usage.version
+                        await self.emit_event(run, EventType.USAGE, usage.snapshot())
+                    if wants_memory and memory.version != sent_memory:
+                        sent_memory = memory.version
+                        await self.emit_event(run, EventType.MEMORY, memory.snapshot())
+
+                    if recorded is not None:
+                        recorded.append(dict(event))
+                    await self.emit(run, event)
+
+                if (
+                    self.result_cache is not None
+                    and recorded
+                    and recorded[-1]["event_type"] == EventType.COMPLETED.value
+                ):
+                    self.result_cache.store(request.query, subscription.model_dump_json(), recorded)
+                await finish_cassette(cassette)
+
+                # Only completed runs feed the queue's ETA estimates
+                duration = time.monotonic() - started
+            finally:
+                self.scheduler.release(duration)
+                if memory is not None:
+                    memory.finish()
+
+        except asyncio.CancelledError as e:
+            # The cancellation message carries the CancelReason passed to task.cancel()
+            reason = str(e.args[0]) if e.args else "unknown"
+            resumable = reason not in FINAL_CANCEL_REASONS
+            cancelled_runs.inc(reason=reason)
+            await self.emit_event(run, EventType.CANCELLED, {"message": "Research request cancelled", "reason": reason})
+            raise
         except Exception as e:
-            await self.send_json(
-                client_id,
-                {
-                    "event_type": "error",
-                    "data": {"message": f"Error processing request: {str(e)}"},
-                    "timestamp": datetime.now(UTC).isoformat(),
-                },
-            )
+            await self.emit_event(run, EventType.ERROR, {"message": f"Error processing request: {str(e)}"})
+        finally:
+            if not resumable:
+                await self.store.forget(run.run_id)
+                await asyncio.wrap_future(remove_spilled_files(run.run_id))
 
 
 manager = WebSocketManager()
@@ -0,0 +1,31 @@
+from .cassette import (
+    CASSETTE_MODES,
+    Cassette,
+    CassetteMissError,
+    Interaction,
+    cassette_name,
+    cassette_path,
+    conversation_key,
+    current_cassette,
+    finish_cassette,
+    read_cassette,
+    recorded,
+    start_cassette,
+    write_cassette,
+)
+
+__all__ = [
+    "CASSETTE_MODES",
+    "Cassette",
+    "CassetteMissError",
+    "Interaction",
+    "cassette_name",
+    "cassette_path",
+    "conversation_key",
+    "current_cassette",
+    "finish_cassette",
+    "read_cassette",
+    "recorded",
+    "start_cassette",
+    "write_cassette",
+]
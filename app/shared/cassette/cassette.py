@@ -0,0 +1,343 @@
+"""Module: cassette.py
+
+Description:
+    Record and replay of the traffic of research runs, so a real research session can be run again offline and
+    deterministically, such as to compare performance across versions.
+
+    With CASSETTE_MODE=record, each run records every chat model call, Tavily search and page fetch it makes, with
+    how long each took, into a cassette: a gzipped JSON file in CASSETTE_DIR named after the run's query. Fetched
+    pages are stored once however many times they're fetched. With CASSETTE_MODE=replay, a run for the same query
+    is answered from its cassette instead, without any call leaving the process, taking as long as the recorded
+    calls did times CASSETTE_LATENCY_SCALE (0 for no latency).
+
+    Calls are matched to their recordings by a key: the query of a search, the URL of a fetch, and for model calls
+    the model role and agent, the conversation's opening message and how many turns into it the call is. Calls
+    with the same key are replayed in the order they were recorded. A call with nothing recorded for it fails
+    with `CassetteMissError`, so a replay never silently reaches the network.
+
+    This module is imported by the WebSocket server at startup, so it must stay free of the agent stack.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable, Sequence
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, TypeVar
+
+from ..config import app_config
+
+# The modes cassettes can be used in, besides "off"
+CASSETTE_MODES = ("record", "replay")
+
+CASSETTE_VERSION = 1
+
+T = TypeVar("T")
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed run makes a call that wasn't recorded, or its query has no cassette."""
+
+
+@dataclass
+class Interaction:
+    """A recorded call."""
+
+    kind: str
+    key: str
+    seconds: float
+    response: Any
+
+
+class Cassette:
+    """The recorded calls of a research run."""
+
+    def __init__(self, name: str, replaying: bool = False) -> None:
+        """Initialize an empty cassette.
+
+        Args:
+            name (str): The cassette's name (see `cassette_name`)
+            replaying (bool): Whether the cassette is being replayed rather than recorded
+        """
+
+        self.name = name
+        self.replaying = replaying
+        self.interactions: list[Interaction] = []
+        self.blobs: dict[str, str] = {}
+        self._unplayed: dict[tuple[str, str], deque[Interaction]] = defaultdict(deque)
+
+    def record(self, kind: str, key: str, response: Any, seconds: float) -> None:
+        """Record a call.
+
+        Args:
+            kind (str): The kind of call ("model", "search" or "fetch")
+            key (str): The key the call is matched by
+            response (Any): The call's response, as JSON-serializable data
+            seconds (float): How long the call took
+        """
+
+        self.interactions.append(Interaction(kind, key, round(seconds, 6), response))
+
+    def replay(self, kind: str, key: str) -> Interaction:
+        """Take the next recording of a call.
+
+        Args:
+            kind (str): The kind of call
+            key (str): The key the call is matched by
+
+        Returns:
+            Interaction: The recorded call
+        """
+
+        unplayed = self._unplayed.get((kind, key))
+        if not unplayed:
+            raise CassetteMissError(f"Cassette {self.name} has no recording of this {kind} call: {key[:200]}")
+        return unplayed.popleft()
+
+    def add_blob(self, content: str) -> str:
+        """Store content that may be recorded more than once (such as a page), keeping a single copy of it.
+
+        Args:
+            content (str): The content
+
+        Returns:
+            str: The reference to record in its place
+        """
+
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        self.blobs[digest] = content
+        return digest
+
+    def get_blob(self, reference: str) -> str:
+        """Get content stored with `add_blob`.
+
+        Args:
+            reference (str): The content's reference
+
+        Returns:
+            str: The content
+        """
+
+        return self.blobs[reference]
+
+    def to_json(self) -> dict[str, Any]:
+        """Serialize the cassette.
+
+        Returns:
+            dict[str, Any]: The cassette's recordings and stored content
+        """
+
+        return {
+            "version": CASSETTE_VERSION,
+            "name": self.name,
+            "interactions": [asdict(interaction) for interaction in self.interactions],
+            "blobs": self.blobs,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "Cassette":
+        """Load a serialized cassette for replay.
+
+        Args:
+            data (dict[str, Any]): The serialized cassette
+
+        Returns:
+            Cassette: The cassette
+        """
+
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {data.get('version')}")
+
+        cassette = cls(data["name"], replaying=True)
+        cassette.blobs = dict(data["blobs"])
+        for recorded in data["interactions"]:
+            interaction = Interaction(**recorded)
+            cassette.interactions.append(interaction)
+            cassette._unplayed[(interaction.kind, interaction.key)].append(interaction)
+
+        return cassette
+
+
+# The cassette of the research run being executed
+current_cassette: ContextVar[Cassette | None] = ContextVar("current_cassette", default=None)
+
+
+def _without_date(text: str) -> str:
+    """Remove today's date from a text, since prompts mention the date they're sent on (see `get_today_str`).
+
+    Args:
+        text (str): The text
+
+    Returns:
+        str: The text without today's date
+    """
+
+    return text.replace(datetime.now().strftime("%a %b %-d, %Y"), "")
+
+
+def cassette_name(query: str) -> str:
+    """Name the cassette of a research query.
+
+    Args:
+        query (str): The query
+
+    Returns:
+        str: The cassette's name
+    """
+
+    return hashlib.sha256(" ".join(query.lower().split()).encode()).hexdigest()[:16]
+
+
+def cassette_path(directory: str, name: str) -> str:
+    """Get the path of a cassette.
+
+    Args:
+        directory (str): The cassette directory
+        name (str): The cassette's name
+
+    Returns:
+        str: The cassette's path
+    """
+
+    return os.path.join(directory, f"{name}.cassette.json.gz")
+
+
+def write_cassette(cassette: Cassette, directory: str) -> str:
+    """Write a cassette to a directory, replacing any earlier recording of it. This blocks, so call it from a
+    worker thread.
+
+    Args:
+        cassette (Cassette): The cassette
+        directory (str): The cassette directory, created if necessary
+
+    Returns:
+        str: The path of the written file
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    path = cassette_path(directory, cassette.name)
+    with gzip.open(f"{path}.tmp", "wt") as file:
+        json.dump(cassette.to_json(), file, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+    return path
+
+
+def read_cassette(directory: str, name: str) -> Cassette:
+    """Read a cassette for replay. This blocks, so call it from a worker thread.
+
+    Args:
+        directory (str): The cassette directory
+        name (str): The cassette's name
+
+    Returns:
+        Cassette: The cassette
+    """
+
+    try:
+        with gzip.open(cassette_path(directory, name), "rt") as file:
+            return Cassette.from_json(json.load(file))
+    except FileNotFoundError:
+        raise CassetteMissError(f"No cassette {name} recorded in {directory}") from None
+
+
+async def start_cassette(query: str) -> Cassette | None:
+    """Start recording or replaying the research run executing in the current context, if CASSETTE_MODE says to.
+
+    Args:
+        query (str): The run's query
+
+    Returns:
+        Cassette | None: The run's cassette, or None if cassettes are off
+    """
+
+    cassette = None
+    if app_config.CASSETTE_MODE == "record":
+        cassette = Cassette(cassette_name(query))
+    elif app_config.CASSETTE_MODE == "replay":
+        cassette = await asyncio.to_thread(read_cassette, app_config.CASSETTE_DIR, cassette_name(query))
+
+    current_cassette.set(cassette)
+    return cassette
+
+
+async def finish_cassette(cassette: Cassette | None) -> None:
+    """Write a run's cassette to CASSETTE_DIR once the run completed, if it was recorded.
+
+    Args:
+        cassette (Cassette | None): The run's cassette
+    """
+
+    if cassette is None or cassette.replaying:
+        return
+
+    try:
+        await asyncio.to_thread(write_cassette, cassette, app_config.CASSETTE_DIR)
+    except OSError as e:
+        print(f"Failed to write cassette {cassette.name}: {e}")
+
+
+def conversation_key(role: str, agent: str, messages: Sequence[Any]) -> str:
+    """Key a model call by what stays the same when its run is replayed: the model role and agent, the opening
+    message of the conversation (the query, a delegated task or a page to summarize), and how many turns the
+    conversation has had.
+
+    Args:
+        role (str): The model role (e.g. "supervisor")
+        agent (str): The agent making the call
+        messages (Sequence[Any]): The call's messages
+
+    Returns:
+        str: The call's key
+    """
+
+    opening = next((message for message in messages if getattr(message, "type", "") == "human"), None)
+    content = _without_date(str(getattr(opening, "content", "")))
+    turns = sum(getattr(message, "type", "") == "ai" for message in messages)
+
+    return f"{role}:{agent}:{hashlib.sha256(content.encode()).hexdigest()[:16]}:{turns}"
+
+
+async def recorded(
+    kind: str,
+    key: str,
+    call: Callable[[], Awaitable[T]],
+    encode: Callable[[T, Cassette], Any],
+    decode: Callable[[Any, Cassette], T],
+) -> T:
+    """Make a call as the current run's cassette says: record it, replay its recording, or just make it outside
+    a cassette.
+
+    Args:
+        kind (str): The kind of call ("model", "search" or "fetch")
+        key (str): The key the call is matched by
+        call (Callable[[], Awaitable[T]]): Makes the call
+        encode (Callable[[T, Cassette], Any]): Turns a response into JSON-serializable data
+        decode (Callable[[Any, Cassette], T]): Turns recorded data back into a response
+
+    Returns:
+        T: The call's response
+    """
+
+    cassette = current_cassette.get()
+    if cassette is None:
+        return await call()
+
+    if cassette.replaying:
+        interaction = cassette.replay(kind, key)
+        if app_config.CASSETTE_LATENCY_SCALE > 0:
+            await asyncio.sleep(interaction.seconds * app_config.CASSETTE_LATENCY_SCALE)
+        return decode(interaction.response, cassette)
+
+    started = time.monotonic()
+    response = await call()
+    cassette.record(kind, key, encode(response, cassette), time.monotonic() - started)
+    return response
@@ -22,18 +22,106 @@ class AppConfig:
     APP_DEBUG: bool
     APP_HOST: str
     APP_LOG_LEVEL: str
+    APP_MODE: str
     APP_NAME: str
     APP_PORT: int
     APP_RELOAD: bool
     APP_VERSION: str
+    APP_WARMUP: bool
+    APP_WORKERS: int
+
+    # Set by the launcher for its worker processes: an ID for the launch, and a directory for limits shared
+    # between workers
+    APP_LAUNCH_ID: str
+    SHARED_LIMITS_DIR: str
+
+    # Graceful shutdown
+    DRAIN_TIMEOUT_SECONDS: float
+
+    # Metrics served on /metrics
+    METRICS_ENABLED: bool
+
+    # Per-run execution traces, served on /admin/runs/{run_id}/trace and exported to TRACE_DIR if set
+    TRACING_ENABLED: bool
+    TRACE_DIR: str
+    TRACE_FORMAT: str
+    TRACE_MAX_SPANS: int
+
+    # Event loop lag measurement and detection of calls blocking the loop
+    LOOP_MONITOR_ENABLED: bool
+    LOOP_MONITOR_INTERVAL_SECONDS: float
+    LOOP_BLOCK_THRESHOLD_SECONDS: float
+
+    # Admin endpoints (such as on-demand profiling), disabled unless a key is set
+    ADMIN_API_KEY: str
+    PROFILE_MAX_SECONDS: float
+
+    # Recording and replay of research runs' model, search and fetch traffic
+    CASSETTE_MODE: str
+    CASSETTE_DIR: str
+    CASSETTE_LATENCY_SCALE: float
 
     # Limits on WebSocket connections
     MAX_CONCURRENT_WEBSOCKET_CONNECTIONS: int
+    MAX_CONCURRENT_RUNS_PER_CONNECTION: int
 
     # Limits on resource usage
+    MAX_CONCURRENT_RESEARCH_RUNS: int
     MAX_CONCURRENT_RESEARCH_UNITS: int
+    MAX_QUEUED_RESEARCH_RUNS: int
     MAX_RESEARCHER_ITERATIONS: int
 
+    # Rate limiting, retries and circuit breaking of calls to model providers and Tavily
+    CIRCUIT_BREAKER_COOLDOWN_SECONDS: float
+    CIRCUIT_BREAKER_ERROR_RATE: float
+    CIRCUIT_BREAKER_MIN_CALLS: int
+    CIRCUIT_BREAKER_WINDOW_SECONDS: float
+    PROVIDER_MAX_RETRIES: int
+    PROVIDER_RATE_LIMITS: str
+    PROVIDER_RETRY_BASE_SECONDS: float
+    PROVIDER_RETRY_MAX_SECONDS: float
+
+    # Token and cost accounting for research runs
+    MODEL_PRICES: str
+    RUN_COST_BUDGET_USD: float
+    RUN_TOKEN_BUDGET: int
+
+    # Memory accounting for research runs, and caps on the files in agent state
+    STATE_FILES_HARD_LIMIT_BYTES: int
+    STATE_FILES_SOFT_LIMIT_BYTES: int
+    STATE_SPILL_DIR: str
+
+    # Research run resumption after client reconnects
+    RUN_EVENT_BUFFER_SIZE: int
+    RUN_RESUME_GRACE_SECONDS: float
+    RUN_RETENTION_SECONDS: float
+
+    # Durable checkpointing of research runs
+    CHECKPOINTER_BACKEND: str
+    CHECKPOINTER_DURABILITY: str
+    CHECKPOINTER_SQLITE_PATH: str
+
+    # Caching of LLM responses
+    LLM_CACHE_BACKEND: str
+    LLM_CACHE_MAX_ENTRIES: int
+    LLM_CACHE_MAX_MB: float
+    LLM_CACHE_SQLITE_PATH: str
+    LLM_CACHE_TTL_SECONDS: float
+
+    # Provider-side caching of static prompt prefixes
+    PROMPT_CACHING: bool
+
+    # Token budgets for what agents send to their model each turn
+    CONTEXT_KEEP_RECENT_MESSAGES: int
+    RESEARCHER_CONTEXT_TOKEN_BUDGET: int
+    SUPERVISOR_CONTEXT_TOKEN_BUDGET: int
+
+    # Caching of whole research results
+    RESULT_CACHE_ENABLED: bool
+    RESULT_CACHE_MAX_ENTRIES: int
+    RESULT_CACHE_SIMILARITY: float
+    RESULT_CACHE_TTL_SECONDS: float
+
     # Researcher model used for conducting research
     RESEARCHER_MODEL_API_KEY: str
     RESEARCHER_MODEL_BASE_URL: str
@@ -46,7 +134,27 @@ class AppConfig:
     SUPERVISOR_MODEL_NAME: str
     SUPERVISOR_MODEL_PROVIDER: str
 
-    def __init__(self, **kwargs: str | int | bool) -> None:
+    # Fallback model used while the supervisor or researcher model is failing
+    FALLBACK_MODEL_API_KEY: str
+    FALLBACK_MODEL_BASE_URL: str
+    FALLBACK_MODEL_NAME: str
+    FALLBACK_MODEL_PROVIDER: str
+
+    # Summarization model used to summarize fetched web pages, with its own concurrency limit and timeout
+    MAX_CONCURRENT_SUMMARIES: int
+    SUMMARIZATION_MODEL_API_KEY: str
+    SUMMARIZATION_MODEL_BASE_URL: str
+    SUMMARIZATION_MODEL_NAME: str
+    SUMMARIZATION_MODEL_PROVIDER: str
+    SUMMARIZATION_TIMEOUT_SECONDS: float
+
+    # Extra endpoints each model role is routed across, and the roles that hedge slow calls
+    HEDGED_MODEL_ROLES: str
+    RESEARCHER_MODEL_ENDPOINTS: str
+    SUMMARIZATION_MODEL_ENDPOINTS: str
+    SUPERVISOR_MODEL_ENDPOINTS: str
+
+    def __init__(self, **kwargs: str | int | float | bool) -> None:
         """Initialize the application configuration.
 
         Args:
@@ -68,15 +176,86 @@ def build_app_config() -> AppConfig:
         APP_DEBUG=os.getenv("APP_DEBUG", "false").lower() == "true",
         APP_HOST=os.getenv("APP_HOST", "0.0.0.0"),
         APP_LOG_LEVEL=os.getenv("APP_LOG_LEVEL", "info"),
+        APP_MODE=os.getenv("APP_MODE", "development").lower(),
         APP_NAME=os.getenv("APP_NAME", "deep-learning-research-agent"),
         APP_PORT=int(os.getenv("APP_PORT", 8000)),
         APP_RELOAD=os.getenv("APP_RELOAD", "true").lower() == "true",
         APP_VERSION=os.getenv("APP_VERSION", ""),
+        APP_WARMUP=os.getenv("APP_WARMUP", "false").lower() == "true",
+        APP_WORKERS=int(os.getenv("APP_WORKERS", 0)),
+        # Set by the launcher for its worker processes
+        APP_LAUNCH_ID=os.getenv("APP_LAUNCH_ID", ""),
+        SHARED_LIMITS_DIR=os.getenv("SHARED_LIMITS_DIR", ""),
+        # Graceful shutdown
+        DRAIN_TIMEOUT_SECONDS=float(os.getenv("DRAIN_TIMEOUT_SECONDS", 25)),
+        # Metrics served on /metrics
+        METRICS_ENABLED=os.getenv("METRICS_ENABLED", "true").lower() == "true",
+        # Per-run execution traces
+        TRACING_ENABLED=os.getenv("TRACING_ENABLED", "false").lower() == "true",
+        TRACE_DIR=os.getenv("TRACE_DIR", ""),
+        TRACE_FORMAT=os.getenv("TRACE_FORMAT", "chrome"),
+        TRACE_MAX_SPANS=int(os.getenv("TRACE_MAX_SPANS", 10000)),
+        # Event loop lag measurement and detection of calls blocking the loop
+        LOOP_MONITOR_ENABLED=os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true",
+        LOOP_MONITOR_INTERVAL_SECONDS=float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", 0.1)),
+        LOOP_BLOCK_THRESHOLD_SECONDS=float(os.getenv("LOOP_BLOCK_THRESHOLD_SECONDS", 0.1)),
+        # Admin endpoints
+        ADMIN_API_KEY=os.getenv("ADMIN_API_KEY", ""),
+        PROFILE_MAX_SECONDS=float(os.getenv("PROFILE_MAX_SECONDS", 300)),
+        # Recording and replay of research runs' model, search and fetch traffic
+        CASSETTE_MODE=os.getenv("CASSETTE_MODE", "off").lower(),
+        CASSETTE_DIR=os.getenv("CASSETTE_DIR", "cassettes"),
+        CASSETTE_LATENCY_SCALE=float(os.getenv("CASSETTE_LATENCY_SCALE", 1.0)),
         # Limits on WebSocket connections
         MAX_CONCURRENT_WEBSOCKET_CONNECTIONS=int(os.getenv("MAX_CONCURRENT_WEBSOCKET_CONNECTIONS", 100)),
+        MAX_CONCURRENT_RUNS_PER_CONNECTION=int(os.getenv("MAX_CONCURRENT_RUNS_PER_CONNECTION", 3)),
         # Limits on resource usage
+        MAX_CONCURRENT_RESEARCH_RUNS=int(os.getenv("MAX_CONCURRENT_RESEARCH_RUNS", 10)),
         MAX_CONCURRENT_RESEARCH_UNITS=int(os.getenv("MAX_CONCURRENT_RESEARCH_UNITS", 1)),
+        MAX_QUEUED_RESEARCH_RUNS=int(os.getenv("MAX_QUEUED_RESEARCH_RUNS", 50)),
         MAX_RESEARCHER_ITERATIONS=int(os.getenv("MAX_RESEARCHER_ITERATIONS", 1)),
+        # Rate limiting, retries and circuit breaking of calls to model providers and Tavily
+        CIRCUIT_BREAKER_COOLDOWN_SECONDS=float(os.getenv("CIRCUIT_BREAKER_COOLDOWN_SECONDS", 30)),
+        CIRCUIT_BREAKER_ERROR_RATE=float(os.getenv("CIRCUIT_BREAKER_ERROR_RATE", 0.5)),
+        CIRCUIT_BREAKER_MIN_CALLS=int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", 10)),
+        CIRCUIT_BREAKER_WINDOW_SECONDS=float(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", 60)),
+        PROVIDER_MAX_RETRIES=int(os.getenv("PROVIDER_MAX_RETRIES", 3)),
+        PROVIDER_RATE_LIMITS=os.getenv("PROVIDER_RATE_LIMITS", ""),
+        PROVIDER_RETRY_BASE_SECONDS=float(os.getenv("PROVIDER_RETRY_BASE_SECONDS", 0.5)),
+        PROVIDER_RETRY_MAX_SECONDS=float(os.getenv("PROVIDER_RETRY_MAX_SECONDS", 20)),
+        # Token and cost accounting for research runs
+        MODEL_PRICES=os.getenv("MODEL_PRICES", ""),
+        RUN_COST_BUDGET_USD=float(os.getenv("RUN_COST_BUDGET_USD", 0)),
+        RUN_TOKEN_BUDGET=int(os.getenv("RUN_TOKEN_BUDGET", 0)),
+        # Memory accounting for research runs, and caps on the files in agent state
+        STATE_FILES_HARD_LIMIT_BYTES=int(os.getenv("STATE_FILES_HARD_LIMIT_BYTES", 128 * 1024 * 1024)),
+        STATE_FILES_SOFT_LIMIT_BYTES=int(os.getenv("STATE_FILES_SOFT_LIMIT_BYTES", 32 * 1024 * 1024)),
+        STATE_SPILL_DIR=os.getenv("STATE_SPILL_DIR", ""),
+        # Research run resumption after client reconnects
+        RUN_EVENT_BUFFER_SIZE=int(os.getenv("RUN_EVENT_BUFFER_SIZE", 1000)),
+        RUN_RESUME_GRACE_SECONDS=float(os.getenv("RUN_RESUME_GRACE_SECONDS", 60)),
+        RUN_RETENTION_SECONDS=float(os.getenv("RUN_RETENTION_SECONDS", 300)),
+        # Durable checkpointing of research runs
+        CHECKPOINTER_BACKEND=os.getenv("CHECKPOINTER_BACKEND", "none").lower(),
+        CHECKPOINTER_DURABILITY=os.getenv("CHECKPOINTER_DURABILITY", "async").lower(),
+        CHECKPOINTER_SQLITE_PATH=os.getenv("CHECKPOINTER_SQLITE_PATH", "checkpoints.sqlite"),
+        # Caching of LLM responses
+        LLM_CACHE_BACKEND=os.getenv("LLM_CACHE_BACKEND", "none").lower(),
+        LLM_CACHE_MAX_ENTRIES=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000)),
+        LLM_CACHE_MAX_MB=float(os.getenv("LLM_CACHE_MAX_MB", 512)),
+        LLM_CACHE_SQLITE_PATH=os.getenv("LLM_CACHE_SQLITE_PATH", "llm_cache.sqlite"),
+        LLM_CACHE_TTL_SECONDS=float(os.getenv("LLM_CACHE_TTL_SECONDS", 86400)),
+        # Provider-side caching of static prompt prefixes
+        PROMPT_CACHING=os.getenv("PROMPT_CACHING", "true").lower() == "true",
+        # Token budgets for what agents send to their model each turn
+        CONTEXT_KEEP_RECENT_MESSAGES=int(os.getenv("CONTEXT_KEEP_RECENT_MESSAGES", 6)),
+        RESEARCHER_CONTEXT_TOKEN_BUDGET=int(os.getenv("RESEARCHER_CONTEXT_TOKEN_BUDGET", 30000)),
+        SUPERVISOR_CONTEXT_TOKEN_BUDGET=int(os.getenv("SUPERVISOR_CONTEXT_TOKEN_BUDGET", 60000)),
+        # Caching of whole research results
+        RESULT_CACHE_ENABLED=os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true",
+        RESULT_CACHE_MAX_ENTRIES=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 500)),
+        RESULT_CACHE_SIMILARITY=float(os.getenv("RESULT_CACHE_SIMILARITY", 0.8)),
+        RESULT_CACHE_TTL_SECONDS=float(os.getenv("RESULT_CACHE_TTL_SECONDS", 21600)),
         # Researcher model used for conducting research
         RESEARCHER_MODEL_API_KEY=os.getenv("RESEARCHER_MODEL_API_KEY", ""),
         RESEARCHER_MODEL_BASE_URL=os.getenv("RESEARCHER_MODEL_BASE_URL", ""),
@@ -87,6 +266,23 @@ def build_app_config() -> AppConfig:
         SUPERVISOR_MODEL_BASE_URL=os.getenv("SUPERVISOR_MODEL_BASE_URL", ""),
         SUPERVISOR_MODEL_NAME=os.getenv("SUPERVISOR_MODEL_NAME", ""),
         SUPERVISOR_MODEL_PROVIDER=os.getenv("SUPERVISOR_MODEL_PROVIDER", ""),
+        # Fallback model used while the supervisor or researcher model is failing
+        FALLBACK_MODEL_API_KEY=os.getenv("FALLBACK_MODEL_API_KEY", ""),
+        FALLBACK_MODEL_BASE_URL=os.getenv("FALLBACK_MODEL_BASE_URL", ""),
+        FALLBACK_MODEL_NAME=os.getenv("FALLBACK_MODEL_NAME", ""),
+        FALLBACK_MODEL_PROVIDER=os.getenv("FALLBACK_MODEL_PROVIDER", ""),
+        # Summarization model used to summarize fetched web pages, with its own concurrency limit and timeout
+        MAX_CONCURRENT_SUMMARIES=int(os.getenv("MAX_CONCURRENT_SUMMARIES", 8)),
+        SUMMARIZATION_MODEL_API_KEY=os.getenv("SUMMARIZATION_MODEL_API_KEY", ""),
+        SUMMARIZATION_MODEL_BASE_URL=os.getenv("SUMMARIZATION_MODEL_BASE_URL", ""),
+        SUMMARIZATION_MODEL_NAME=os.getenv("SUMMARIZATION_MODEL_NAME", "claude-3-5-sonnet-20241022"),
+        SUMMARIZATION_MODEL_PROVIDER=os.getenv("SUMMARIZATION_MODEL_PROVIDER", "anthropic"),
+        SUMMARIZATION_TIMEOUT_SECONDS=float(os.getenv("SUMMARIZATION_TIMEOUT_SECONDS", 60)),
+        # Extra endpoints each model role is routed across, and the roles that hedge slow calls
+        HEDGED_MODEL_ROLES=os.getenv("HEDGED_MODEL_ROLES", ""),
+        RESEARCHER_MODEL_ENDPOINTS=os.getenv("RESEARCHER_MODEL_ENDPOINTS", ""),
+        SUMMARIZATION_MODEL_ENDPOINTS=os.getenv("SUMMARIZATION_MODEL_ENDPOINTS", ""),
+        SUPERVISOR_MODEL_ENDPOINTS=os.getenv("SUPERVISOR_MODEL_ENDPOINTS", ""),
     )
 
 
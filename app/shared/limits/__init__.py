@@ -0,0 +1,3 @@
+from .limits import SharedSlotLimiter, SlotLimiter, build_slot_limiter, process_exists
+
+__all__ = ["SharedSlotLimiter", "SlotLimiter", "build_slot_limiter", "process_exists"]
@@ -0,0 +1,151 @@
+"""Module: limits.py
+
+Description:
+    Slot limiters that cap how many of something (connections, running research) can be in use at once. The
+    process-local limiter is used when the server runs a single worker. When it runs several worker processes,
+    the shared limiter keeps one count across all of them in a lock-protected file, so global limits stay correct
+    no matter which worker a client lands on.
+
+Author: Nathan Thomas
+"""
+
+import fcntl
+import json
+import os
+from pathlib import Path
+from typing import IO
+
+from ..config import app_config
+
+
+class SlotLimiter:
+    """Counts slots in use by this process against a limit."""
+
+    # Seconds between checks for slots freed by other processes, or None if slots can only be freed locally
+    poll_interval: float | None = None
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._in_use = 0
+
+    @property
+    def in_use(self) -> int:
+        """The number of slots currently in use."""
+
+        return self._in_use
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free.
+
+        Returns:
+            bool: True if a slot was taken, False if every slot is in use
+        """
+
+        if self._in_use >= self.limit:
+            return False
+
+        self._in_use += 1
+        return True
+
+    def release(self) -> None:
+        """Give back a slot taken with `try_acquire`."""
+
+        self._in_use = max(0, self._in_use - 1)
+
+
+class SharedSlotLimiter(SlotLimiter):
+    """Counts slots in use across every worker process against one shared limit.
+
+    Each process's count is stored under its PID in a small JSON file guarded by an exclusive `flock`. Counts
+    belonging to processes that no longer exist are dropped on every update, so a crashed worker can't leak slots.
+    The file operations are local and take microseconds, so they're done inline on the event loop.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, limit: int, path: str) -> None:
+        super().__init__(limit)
+        self.path = Path(path)
+        self.path.touch(exist_ok=True)
+
+    @property
+    def in_use(self) -> int:
+        """The number of slots currently in use across every process."""
+
+        with self.path.open("r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            return sum(self._read(file).values())
+
+    def try_acquire(self) -> bool:
+        with self.path.open("r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            counts = self._read(file)
+            if sum(counts.values()) >= self.limit:
+                return False
+
+            pid = str(os.getpid())
+            counts[pid] = counts.get(pid, 0) + 1
+            self._write(file, counts)
+
+        self._in_use += 1
+        return True
+
+    def release(self) -> None:
+        with self.path.open("r+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            counts = self._read(file)
+            pid = str(os.getpid())
+            counts[pid] = max(0, counts.get(pid, 0) - 1)
+            self._write(file, counts)
+
+        self._in_use = max(0, self._in_use - 1)
+
+    def _read(self, file: IO[str]) -> dict[str, int]:
+        file.seek(0)
+        content = file.read()
+        counts: dict[str, int] = json.loads(content) if content else {}
+
+        return {pid: count for pid, count in counts.items() if count > 0 and process_exists(int(pid))}
+
+    def _write(self, file: IO[str], counts: dict[str, int]) -> None:
+        file.seek(0)
+        file.truncate()
+        file.write(json.dumps({pid: count for pid, count in counts.items() if count > 0}))
+        file.flush()
+
+
+def process_exists(pid: int) -> bool:
+    """Check whether a process is still running.
+
+    Args:
+        pid (int): The process ID
+
+    Returns:
+        bool: True if the process exists
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def build_slot_limiter(name: str, limit: int) -> SlotLimiter:
+    """Build a slot limiter, shared across worker processes when the server runs more than one.
+
+    Args:
+        name (str): A name for the limit, unique per limit
+        limit (int): The maximum number of slots in use at once
+
+    Returns:
+        SlotLimiter: The slot limiter
+    """
+
+    if app_config.SHARED_LIMITS_DIR == "":
+        return SlotLimiter(limit)
+
+    return SharedSlotLimiter(limit, os.path.join(app_config.SHARED_LIMITS_DIR, f"{name}.json"))
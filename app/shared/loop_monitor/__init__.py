@@ -0,0 +1,3 @@
+from .loop_monitor import BlockedSite, LoopMonitor, call_site
+
+__all__ = ["BlockedSite", "LoopMonitor", "call_site"]
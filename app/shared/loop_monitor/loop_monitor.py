@@ -0,0 +1,184 @@
+"""Module: loop_monitor.py
+
+Description:
+    Monitoring of the event loop the server runs on. Anything that runs synchronously on the loop (sync tools,
+    HTML conversion, serializing large events, formatting messages) holds up every other connection and research
+    run until it returns, so the monitor continuously measures how late the loop wakes up and catches whatever is
+    blocking it.
+
+    A heartbeat task sleeps for LOOP_MONITOR_INTERVAL_SECONDS at a time and records how late it woke up as loop
+    lag. A watchdog thread checks the heartbeat, and once the loop has been stuck for longer than
+    LOOP_BLOCK_THRESHOLD_SECONDS, it samples the loop thread's stack to find the blocking call site. Call sites are
+    counted in metrics, and logged along with their stack the first time they block.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from types import FrameType
+
+from ..metrics import registry
+
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a scheduled wake-up, measured every LOOP_MONITOR_INTERVAL_SECONDS",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+loop_blocks = registry.counter(
+    "event_loop_blocks_total",
+    "Times the event loop was blocked for longer than LOOP_BLOCK_THRESHOLD_SECONDS, by blocking call site",
+    ["site"],
+)
+loop_blocked_seconds = registry.counter(
+    "event_loop_blocked_seconds_total", "Seconds the event loop was blocked, by blocking call site", ["site"]
+)
+
+# The most call sites tracked separately, beyond which new ones are counted together so labels stay bounded
+MAX_SITES = 50
+
+# Call sites in the application itself are more useful than the library code they called into
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@dataclass
+class BlockedSite:
+    """A call site that blocked the event loop, and the stack it was first caught with."""
+
+    site: str
+    stack: str
+    blocks: int = 0
+    blocked_seconds: float = 0.0
+    max_blocked_seconds: float = 0.0
+
+
+def call_site(frame: FrameType | None) -> str:
+    """Describe where a stack is: its innermost frame in the application, or its innermost frame if none is.
+
+    Args:
+        frame (FrameType | None): The innermost frame of the stack
+
+    Returns:
+        str: The call site, as "path:line (function)" with application paths relative to the application root
+    """
+
+    innermost = frame
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(APP_ROOT + os.sep):
+            break
+        frame = frame.f_back
+
+    chosen = frame or innermost
+    if chosen is None:
+        return "unknown"
+
+    path = chosen.f_code.co_filename
+    if path.startswith(APP_ROOT + os.sep):
+        path = os.path.join("app", os.path.relpath(path, APP_ROOT))
+    else:
+        path = os.path.basename(path)
+
+    return f"{path}:{chosen.f_lineno} ({chosen.f_code.co_name})"
+
+
+class LoopMonitor:
+    """Measures event loop lag and catches the call sites that block the loop."""
+
+    def __init__(self, interval: float, threshold: float) -> None:
+        """Initialize a monitor. It isn't running until it's started.
+
+        Args:
+            interval (float): Seconds between heartbeats
+            threshold (float): Seconds the loop has to be stuck for before it counts as blocked
+        """
+
+        self.interval = interval
+        self.threshold = threshold
+        self.sites: dict[str, BlockedSite] = {}
+        self._heartbeat_task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop_thread = 0
+
+        # Written by the loop thread and read by the watchdog, or the other way around for the sample. Plain
+        # attribute reads and writes are atomic, so neither needs a lock.
+        self._last_heartbeat = 0.0
+        self._sample: tuple[str, str] | None = None
+
+    def start(self) -> None:
+        """Start the heartbeat on the running event loop, and the watchdog thread."""
+
+        self._loop_thread = threading.get_ident()
+        self._last_heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stop the heartbeat and the watchdog thread."""
+
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        """Sleep for the interval over and over, recording how late each wake-up is."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            self._last_heartbeat = time.monotonic()
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            loop_lag.observe(lag)
+            self._finish_block(lag)
+
+    def _watch(self) -> None:
+        """Check the heartbeat from the watchdog thread, sampling the loop thread's stack once it's stuck."""
+
+        while not self._stopped.wait(self.threshold / 2):
+            stuck = time.monotonic() - self._last_heartbeat - self.interval
+            if stuck < self.threshold or self._sample is not None:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            self._sample = (call_site(frame), "".join(traceback.format_stack(frame)))
+
+    def _finish_block(self, lag: float) -> None:
+        """Attribute a late wake-up to the call site sampled while the loop was stuck, if there was one.
+
+        Args:
+            lag (float): How late the heartbeat woke up
+        """
+
+        sample, self._sample = self._sample, None
+        if sample is None or lag < self.threshold:
+            return
+
+        site, stack = sample
+        if site not in self.sites and len(self.sites) >= MAX_SITES:
+            site = "other"
+
+        blocked = self.sites.get(site)
+        if blocked is None:
+            blocked = self.sites[site] = BlockedSite(site, stack)
+            print(f"Event loop blocked for {lag:.3f}s at {site}, sampled from:\n{stack}", end="")
+        else:
+            print(f"Event loop blocked for {lag:.3f}s at {site}")
+
+        blocked.blocks += 1
+        blocked.blocked_seconds += lag
+        blocked.max_blocked_seconds = max(blocked.max_blocked_seconds, lag)
+        loop_blocks.inc(site=site)
+        loop_blocked_seconds.inc(lag, site=site)
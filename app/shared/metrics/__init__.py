@@ -0,0 +1,4 @@
+from .metrics import Counter, Gauge, Histogram, MetricsRegistry, registry
+from .process import update_process_metrics
+
+__all__ = ["Counter", "Gauge", "Histogram", "MetricsRegistry", "registry", "update_process_metrics"]
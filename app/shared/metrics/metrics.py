@@ -0,0 +1,331 @@
+"""Module: metrics.py
+
+Description:
+    A small, dependency-free metrics registry that renders the Prometheus text exposition format. Metrics are
+    process-local and safe to update from both the event loop and worker threads.
+
+    Instrumentation that costs more than updating a metric (timing every graph node or tool, for instance) checks
+    `registry.enabled` first, so that it can be switched off with METRICS_ENABLED.
+
+Author: Nathan Thomas
+"""
+
+import math
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+
+LabelValues = tuple[str, ...]
+
+# Upper bounds of the default histogram buckets, in seconds. They span a fast tool call to a long research run.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(label_names: Sequence[str], label_values: LabelValues) -> str:
+    """Format label names and values for the Prometheus text format.
+
+    Args:
+        label_names (Sequence[str]): The label names
+        label_values (LabelValues): The label values, in the same order as the names
+
+    Returns:
+        str: The formatted labels (e.g. `{reason="client_disconnect"}`), or an empty string without labels
+    """
+
+    if not label_names:
+        return ""
+
+    pairs = []
+    for name, value in zip(label_names, label_values, strict=True):
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """Base class for labelled metrics holding one float value per label combination."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def get(self, **labels: str) -> float:
+        """Get the current value for a label combination.
+
+        Args:
+            labels (str): The label values
+
+        Returns:
+            float: The current value, or 0.0 if the combination was never recorded
+        """
+
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        """Render this metric in the Prometheus text format.
+
+        Returns:
+            list[str]: The rendered lines
+        """
+
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing metric."""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increment the counter.
+
+        Args:
+            amount (float): The amount to increment by (must not be negative)
+            labels (str): The label values
+        """
+
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts")
+
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """A metric that can go up and down."""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge to a value.
+
+        Args:
+            value (float): The new value
+            labels (str): The label values
+        """
+
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increment the gauge.
+
+        Args:
+            amount (float): The amount to increment by
+            labels (str): The label values
+        """
+
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Decrement the gauge.
+
+        Args:
+            amount (float): The amount to decrement by
+            labels (str): The label values
+        """
+
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """A metric that counts observations into cumulative buckets, along with their sum and count. Its value is the
+    count of observations.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(
+        self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._observations: dict[LabelValues, list[float]] = {}
+
+    def get_sum(self, **labels: str) -> float:
+        """Get the sum of the observations for a label combination.
+
+        Args:
+            labels (str): The label values
+
+        Returns:
+            float: The sum of the observations
+        """
+
+        observations = self._observations.get(self._key(labels))
+        return 0.0 if observations is None else observations[-1]
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation.
+
+        Args:
+            value (float): The observed value
+            labels (str): The label values
+        """
+
+        key = self._key(labels)
+        with self._lock:
+            # One count per bucket, then the sum. Counts aren't cumulative until rendered.
+            observations = self._observations.get(key)
+            if observations is None:
+                observations = self._observations[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    observations[index] += 1
+                    break
+            else:
+                observations[len(self.buckets)] += 1
+            observations[-1] += value
+            self._values[key] = self._values.get(key, 0.0) + 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe how long the body of a `with` block takes, in seconds.
+
+        Args:
+            labels (str): The label values
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        """Render this histogram in the Prometheus text format.
+
+        Returns:
+            list[str]: The rendered lines
+        """
+
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            observations = sorted((key, list(values)) for key, values in self._observations.items())
+
+        for label_values, values in observations:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, math.inf), values, strict=False):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                labels = _format_labels((*self.label_names, "le"), (*label_values, le))
+                lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {values[-1]:g}")
+            lines.append(f"{self.name}_count{labels} {cumulative:g}")
+
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric for the process and renders them for scraping."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+        # Whether optional, costlier instrumentation should record anything
+        self.enabled = True
+
+    def _get_or_create[MetricT: _Metric](
+        self,
+        metric_class: type[MetricT],
+        name: str,
+        description: str,
+        label_names: Sequence[str],
+        **options: Sequence[float],
+    ) -> MetricT:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, description, label_names, **options)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class) or metric.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        """Get or create a counter.
+
+        Args:
+            name (str): The metric name
+            description (str): Help text for the metric
+            label_names (Sequence[str]): The label names for the metric
+
+        Returns:
+            Counter: The counter
+        """
+
+        return self._get_or_create(Counter, name, description, label_names)
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge.
+
+        Args:
+            name (str): The metric name
+            description (str): Help text for the metric
+            label_names (Sequence[str]): The label names for the metric
+
+        Returns:
+            Gauge: The gauge
+        """
+
+        return self._get_or_create(Gauge, name, description, label_names)
+
+    def histogram(
+        self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Get or create a histogram.
+
+        Args:
+            name (str): The metric name
+            description (str): Help text for the metric
+            label_names (Sequence[str]): The label names for the metric
+            buckets (Sequence[float]): The upper bounds of the histogram's buckets
+
+        Returns:
+            Histogram: The histogram
+        """
+
+        return self._get_or_create(Histogram, name, description, label_names, buckets=buckets)
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text format.
+
+        Returns:
+            str: The rendered metrics
+        """
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
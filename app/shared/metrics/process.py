@@ -0,0 +1,40 @@
+"""Module: process.py
+
+Description:
+    Resource use of the server process (CPU time, memory and open file descriptors), in the metric names
+    Prometheus client libraries use, so capacity can be judged from /metrics alongside the work being done. The
+    values are read when metrics are scraped. Current RSS and open file descriptors are read from /proc, and are
+    left out where it doesn't exist.
+
+Author: Nathan Thomas
+"""
+
+import os
+import resource
+import sys
+
+from .metrics import registry
+
+cpu_seconds = registry.counter("process_cpu_seconds_total", "User and system CPU time spent by the process, in seconds")
+resident_memory = registry.gauge("process_resident_memory_bytes", "Resident memory size of the process, in bytes")
+max_resident_memory = registry.gauge(
+    "process_max_resident_memory_bytes", "Peak resident memory size of the process, in bytes"
+)
+open_fds = registry.gauge("process_open_fds", "Number of open file descriptors of the process")
+
+
+def update_process_metrics() -> None:
+    """Read the process's current resource use into its metrics."""
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds.inc(max(0.0, usage.ru_utime + usage.ru_stime - cpu_seconds.get()))
+
+    # Linux reports the peak in kilobytes and macOS in bytes
+    max_resident_memory.set(usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024)
+
+    try:
+        with open("/proc/self/statm") as file:
+            resident_memory.set(int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+        open_fds.set(len(os.listdir("/proc/self/fd")))
+    except OSError:
+        pass
@@ -0,0 +1,3 @@
+from .profiling import DEFAULT_SAMPLE_INTERVAL, SamplingProfiler, collapse_stack, memory_diff, profile_calls
+
+__all__ = ["DEFAULT_SAMPLE_INTERVAL", "SamplingProfiler", "collapse_stack", "memory_diff", "profile_calls"]
@@ -0,0 +1,229 @@
+"""Module: profiling.py
+
+Description:
+    On-demand profiling of a live server, for problems that only show up under real traffic and concurrency.
+
+    The sampling profiler reads the stacks of running threads from a background thread at a fixed interval and
+    counts them as collapsed stacks (one `frame;frame;frame count` line per distinct stack), which flame graph
+    tools such as speedscope, Brendan Gregg's flamegraph.pl or Perfetto load directly. It costs nothing while it
+    isn't running, so it's safe to start on a production worker. It can also be limited to the samples taken
+    while the event loop runs one particular task, such as the tasks of a single research run. Samples of an idle
+    event loop are counted under a single `event_loop;(idle)` stack.
+
+    Samples are taken whenever the profiled thread lets go of the GIL, which it does while waiting on I/O and at
+    least every switch interval (5ms by default) while running Python code. Anything that holds the event loop up
+    for longer than that is sampled in proportion to how long it runs.
+
+    `profile_calls` collects deterministic call statistics of everything the event loop runs (pstats format), and
+    `memory_diff` compares two tracemalloc snapshots taken some time apart to show where memory grew.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import cProfile
+import marshal
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from collections.abc import Callable
+from types import FrameType
+from typing import Any
+
+# Seconds between samples taken by the sampling profiler
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Frames recorded per allocation by `memory_diff` when it starts tracemalloc itself
+MEMORY_TRACE_FRAMES = 25
+
+# Frames of the profiling machinery itself, left out of memory diffs
+MEMORY_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>")
+
+
+def _frame_name(frame: FrameType) -> str:
+    """Name a stack frame after its module and function.
+
+    Args:
+        frame (FrameType): The frame
+
+    Returns:
+        str: The frame's name (e.g. "app.agents.utils:format_message_content")
+    """
+
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+def collapse_stack(frame: FrameType | None, root: str) -> str:
+    """Collapse a stack into a single line, outermost frame first.
+
+    Args:
+        frame (FrameType | None): The innermost frame
+        root (str): The name of the stack's root (such as its thread's name)
+
+    Returns:
+        str: The collapsed stack
+    """
+
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join([root, *reversed(names)]).replace(" ", "_")
+
+
+def _is_idle(frame: FrameType) -> bool:
+    """Check whether the event loop's thread is idle, waiting for I/O or a timer in its selector.
+
+    Args:
+        frame (FrameType): The innermost frame of the event loop's thread
+
+    Returns:
+        bool: Whether the event loop is idle
+    """
+
+    return frame.f_code.co_name == "select" and frame.f_globals.get("__name__") == "selectors"
+
+
+class SamplingProfiler:
+    """Samples the stacks of running threads from a background thread."""
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+        loop: asyncio.AbstractEventLoop | None = None,
+        all_threads: bool = False,
+        task_filter: Callable[[asyncio.Task[Any]], bool] | None = None,
+    ) -> None:
+        """Initialize a profiler. It isn't sampling until it's started.
+
+        Args:
+            interval (float): Seconds between samples
+            loop (asyncio.AbstractEventLoop | None): The event loop whose thread is sampled, or None for the
+                running loop
+            all_threads (bool): Whether to sample every thread rather than only the event loop's
+            task_filter (Callable[[asyncio.Task[Any]], bool] | None): If set, the event loop's thread is only
+                sampled while it runs a task this returns True for
+        """
+
+        self.interval = interval
+        self.loop = loop or asyncio.get_running_loop()
+        self.all_threads = all_threads
+        self.task_filter = task_filter
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._loop_thread = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start sampling. Must be called from the event loop's thread."""
+
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample_until_stopped, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stop sampling."""
+
+        self._stopped.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def render(self) -> str:
+        """Render the samples as collapsed stacks.
+
+        Returns:
+            str: One `stack count` line per distinct stack, most sampled first
+        """
+
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _sample_until_stopped(self) -> None:
+        """Take a sample every interval until stopped."""
+
+        own_thread = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread or (thread_id != self._loop_thread and not self.all_threads):
+                    continue
+
+                if thread_id == self._loop_thread and self.task_filter is not None:
+                    task = asyncio.current_task(self.loop)
+                    if task is None or not self.task_filter(task):
+                        continue
+
+                if thread_id == self._loop_thread and _is_idle(frame):
+                    self.stacks["event_loop;(idle)"] += 1
+                else:
+                    root = "event_loop" if thread_id == self._loop_thread else names.get(thread_id, str(thread_id))
+                    self.stacks[collapse_stack(frame, root)] += 1
+                self.samples += 1
+
+
+async def profile_calls(seconds: float) -> bytes:
+    """Collect call statistics of everything the event loop runs for a while.
+
+    Args:
+        seconds (float): How long to profile for
+
+    Returns:
+        bytes: The statistics, in the pstats format written by `cProfile.Profile.dump_stats`
+    """
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+async def memory_diff(seconds: float, limit: int) -> str:
+    """Compare tracemalloc snapshots taken at the start and end of a period, to see where memory grew. Tracing is
+    started for the period if it isn't already on, which slows allocations down while it lasts.
+
+    Args:
+        seconds (float): How long to wait between the snapshots
+        limit (int): The most allocation sites listed
+
+    Returns:
+        str: The allocation sites whose memory changed most, with their stacks
+    """
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+
+    try:
+        # Taking a snapshot copies every trace, which takes a while on a big heap
+        before = await asyncio.to_thread(tracemalloc.take_snapshot)
+        await asyncio.sleep(seconds)
+        after = await asyncio.to_thread(tracemalloc.take_snapshot)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    ignored = [tracemalloc.Filter(False, filename) for filename in MEMORY_IGNORED_FILES]
+    differences = await asyncio.to_thread(
+        lambda: after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "traceback")
+    )
+
+    growth = sum(difference.size_diff for difference in differences)
+    lines = [f"Memory change over {seconds:g}s: {growth:+,} B across {len(differences)} allocation sites", ""]
+    for difference in differences[:limit]:
+        lines.append(
+            f"{difference.size_diff:+,} B ({difference.count_diff:+,} blocks), {difference.size:,} B in "
+            f"{difference.count:,} blocks now"
+        )
+        lines.extend(difference.traceback.format(most_recent_first=True))
+        lines.append("")
+
+    return "\n".join(lines)
@@ -0,0 +1,23 @@
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    TokenBucket,
+    call_provider,
+    get_circuit_breaker,
+    get_rate_limiter,
+    is_retryable,
+    reset_providers,
+)
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "CircuitState",
+    "TokenBucket",
+    "call_provider",
+    "get_circuit_breaker",
+    "get_rate_limiter",
+    "is_retryable",
+    "reset_providers",
+]
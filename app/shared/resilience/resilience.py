@@ -0,0 +1,379 @@
+"""Module: resilience.py
+
+Description:
+    Rate limiting, retries and circuit breaking for calls to external providers (model APIs and Tavily). Every
+    call to a provider goes through `call_provider`, which:
+
+    - Waits for a token from the provider's token bucket, so that every session in this worker together stays
+      under the provider's configured request rate instead of running into 429s.
+    - Retries transient failures (rate limits, overload, server errors, timeouts and dropped connections) with
+      exponential backoff and full jitter, honoring the provider's Retry-After hint when it sends one.
+    - Fails fast while the provider's circuit breaker is open. The breaker opens when too many recent calls
+      failed, and lets a single probe call through once it has cooled down to check whether the provider
+      recovered.
+
+    Limiters and breakers are process-wide and created on first use. There's one limiter per provider, and by
+    default one breaker per provider too, but callers can keep separate breakers for parts of a provider (such as
+    each model endpoint) so that one failing endpoint doesn't stop calls to the others.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from enum import Enum
+
+from ..config import app_config
+from ..metrics import registry
+
+provider_calls = registry.counter(
+    "provider_calls_total",
+    "Calls to external providers, by result (success, error, or rejected by an open circuit breaker)",
+    ["provider", "result"],
+)
+provider_retries = registry.counter("provider_retries_total", "Retried calls to external providers", ["provider"])
+rate_limit_wait = registry.counter(
+    "provider_rate_limit_wait_seconds_total", "Time spent waiting for a provider's rate limiter", ["provider"]
+)
+circuit_state = registry.gauge(
+    "provider_circuit_state", "State of each provider's circuit breaker (0 closed, 1 half-open, 2 open)", ["provider"]
+)
+
+# HTTP statuses worth retrying: request timeout, conflict, rate limited, server errors and Anthropic's overloaded
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Exception class names (from the provider SDKs and httpx) for transient failures without a status code
+RETRYABLE_ERROR_NAMES = ("Timeout", "Connection", "RateLimit", "Overloaded", "ServiceUnavailable")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider while its circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_after_seconds: float) -> None:
+        self.provider = provider
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(f"{provider} is failing, not calling it for another {retry_after_seconds:.0f} seconds")
+
+
+class CircuitState(Enum):
+    """States of a circuit breaker, valued as reported by the `provider_circuit_state` gauge."""
+
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class TokenBucket:
+    """Token bucket rate limiter. Callers that find the bucket empty reserve the next token and sleep until it's
+    due, so waiting callers are served in order without polling.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """Initialize the bucket, full.
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): The most tokens the bucket holds, i.e. the largest burst allowed
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, borrowing against future tokens if the bucket is empty.
+
+        Returns:
+            float: Seconds to wait before the token is available
+        """
+
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self) -> float:
+        """Wait for a token.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class CircuitBreaker:
+    """Tracks the outcome of recent calls to a provider and stops calls while too many of them fail."""
+
+    def __init__(
+        self, provider: str, error_rate: float, min_calls: int, window_seconds: float, cooldown_seconds: float
+    ) -> None:
+        """Initialize the breaker, closed.
+
+        Args:
+            provider (str): The provider's name
+            error_rate (float): The share of failed calls in the window (0-1) at which the breaker opens
+            min_calls (int): The fewest calls in the window for the error rate to count
+            window_seconds (float): How far back calls are counted
+            cooldown_seconds (float): How long the breaker stays open before letting a probe call through
+        """
+
+        self.provider = provider
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CircuitState.CLOSED
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        """Get the seconds until the open breaker lets a probe call through.
+
+        Returns:
+            float: The seconds left to wait, or 0 if calls are let through
+        """
+
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.cooldown_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Check whether a call may go ahead. Once an open breaker has cooled down, a single probe call is allowed.
+
+        Returns:
+            bool: True if the call may go ahead
+        """
+
+        if self.state == CircuitState.OPEN and self.retry_after() == 0:
+            self._set_state(CircuitState.HALF_OPEN)
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+
+        return self.state != CircuitState.OPEN
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of a call let through by `allow`.
+
+        Args:
+            success (bool): Whether the call succeeded
+        """
+
+        now = time.monotonic()
+        if self.state == CircuitState.HALF_OPEN:
+            self._probing = False
+            self._calls.clear()
+            if success:
+                self._set_state(CircuitState.CLOSED)
+            else:
+                self._open(now)
+            return
+
+        self._calls.append((now, success))
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+        failures = sum(not ok for _, ok in self._calls)
+        if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.error_rate:
+            self._calls.clear()
+            self._open(now)
+
+    def abandon(self) -> None:
+        """Give back a call let through by `allow` that was cancelled before it had an outcome."""
+
+        if self.state == CircuitState.HALF_OPEN:
+            self._probing = False
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._set_state(CircuitState.OPEN)
+
+    def _set_state(self, state: CircuitState) -> None:
+        self.state = state
+        circuit_state.set(state.value, provider=self.provider)
+
+
+def parse_rate_limits(spec: str) -> dict[str, float]:
+    """Parse provider rate limits from their configuration string, a comma-separated list of
+    `provider=requests_per_minute` limits.
+
+    Args:
+        spec (str): The configured limits (e.g. "anthropic=50,tavily=100")
+
+    Returns:
+        dict[str, float]: Requests per minute by provider
+    """
+
+    limits = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+
+        provider, _, value = entry.partition("=")
+        if not provider.strip() or not value.strip():
+            raise ValueError(f"Invalid rate limit {entry.strip()!r}, expected provider=requests_per_minute")
+        limits[provider.strip()] = float(value)
+
+    return limits
+
+
+_rate_limiters: dict[str, TokenBucket | None] = {}
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_rate_limiter(provider: str) -> TokenBucket | None:
+    """Get the rate limiter shared by every call to a provider, creating it if necessary.
+
+    Args:
+        provider (str): The provider's name
+
+    Returns:
+        TokenBucket | None: The provider's rate limiter, or None if its rate isn't limited
+    """
+
+    if provider not in _rate_limiters:
+        requests_per_minute = parse_rate_limits(app_config.PROVIDER_RATE_LIMITS).get(provider)
+        _rate_limiters[provider] = None
+        if requests_per_minute:
+            # Bursts are capped at a second's worth of requests
+            rate = requests_per_minute / 60
+            _rate_limiters[provider] = TokenBucket(rate, max(1.0, rate))
+
+    return _rate_limiters[provider]
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get the circuit breaker shared by every call to a provider, creating it if necessary.
+
+    Args:
+        provider (str): The provider's name
+
+    Returns:
+        CircuitBreaker: The provider's circuit breaker
+    """
+
+    if provider not in _circuit_breakers:
+        _circuit_breakers[provider] = CircuitBreaker(
+            provider,
+            app_config.CIRCUIT_BREAKER_ERROR_RATE,
+            app_config.CIRCUIT_BREAKER_MIN_CALLS,
+            app_config.CIRCUIT_BREAKER_WINDOW_SECONDS,
+            app_config.CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+        )
+    return _circuit_breakers[provider]
+
+
+def reset_providers() -> None:
+    """Forget every provider's rate limiter and circuit breaker, so they're rebuilt from the configuration."""
+
+    _rate_limiters.clear()
+    _circuit_breakers.clear()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Check whether a failed provider call is worth retrying.
+
+    Args:
+        error (BaseException): The error the call raised
+
+    Returns:
+        bool: True for transient failures
+    """
+
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+
+    return isinstance(error, TimeoutError | ConnectionError) or any(
+        name in cls.__name__ for cls in type(error).__mro__ for name in RETRYABLE_ERROR_NAMES
+    )
+
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """Get how long to wait before retrying a failed call: full jitter over an exponentially growing window, or
+    the provider's Retry-After hint if it's longer.
+
+    Args:
+        error (BaseException): The error the call raised
+        attempt (int): The zero-based number of the attempt that failed
+
+    Returns:
+        float: Seconds to wait
+    """
+
+    delay = random.uniform(
+        0, min(app_config.PROVIDER_RETRY_MAX_SECONDS, app_config.PROVIDER_RETRY_BASE_SECONDS * 2**attempt)
+    )
+
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        hint = float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        hint = 0.0
+
+    return min(app_config.PROVIDER_RETRY_MAX_SECONDS, max(delay, hint))
+
+
+async def call_provider[T](provider: str, call: Callable[[], Awaitable[T]], circuit: str | None = None) -> T:
+    """Call a provider with its rate limit, retries and circuit breaker.
+
+    Args:
+        provider (str): The provider's name
+        call (Callable[[], Awaitable[T]]): Makes the call, once per attempt
+        circuit (str | None): The name of the circuit breaker to use, if not the provider's own
+
+    Returns:
+        T: The call's result
+
+    Raises:
+        CircuitOpenError: If the provider's circuit breaker is open
+    """
+
+    limiter = get_rate_limiter(provider)
+    breaker = get_circuit_breaker(circuit or provider)
+    attempt = 0
+
+    while True:
+        if not breaker.allow():
+            provider_calls.inc(provider=provider, result="rejected")
+            raise CircuitOpenError(breaker.provider, breaker.retry_after())
+
+        try:
+            # Waiting for the rate limit is inside the try, so a call cancelled while it waits gives back the
+            # half-open breaker's probe
+            if limiter is not None:
+                rate_limit_wait.inc(await limiter.acquire(), provider=provider)
+
+            result = await call()
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except Exception as e:
+            retryable = is_retryable(e)
+            # Errors in the request itself (bad input, auth) aren't the provider's fault
+            breaker.record(not retryable)
+            provider_calls.inc(provider=provider, result="error")
+            if not retryable or attempt >= app_config.PROVIDER_MAX_RETRIES:
+                raise
+
+            provider_retries.inc(provider=provider)
+            await asyncio.sleep(retry_delay(e, attempt))
+            attempt += 1
+            continue
+
+        breaker.record(True)
+        provider_calls.inc(provider=provider, result="success")
+        return result
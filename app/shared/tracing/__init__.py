@@ -0,0 +1,25 @@
+from .tracing import (
+    TRACE_FORMATS,
+    RunTrace,
+    Span,
+    current_span,
+    current_trace,
+    read_trace,
+    span,
+    start_trace,
+    trace_path,
+    write_trace,
+)
+
+__all__ = [
+    "TRACE_FORMATS",
+    "RunTrace",
+    "Span",
+    "current_span",
+    "current_trace",
+    "read_trace",
+    "span",
+    "start_trace",
+    "trace_path",
+    "write_trace",
+]
@@ -0,0 +1,309 @@
+"""Module: tracing.py
+
+Description:
+    Span-based execution traces of research runs, to see where a run's time went: the supervisor's model calls,
+    each sub-agent, searches, page fetches or summaries. A run's trace is started when the run starts, and code
+    along the way opens spans with `span(...)`. Spans nest by context, so a span's parent is whichever span was
+    open in the task that opened it, including across asyncio tasks and sub-agent graphs. Outside a traced run,
+    `span` does nothing.
+
+    Finished traces can be exported as Chrome trace event JSON (for chrome://tracing or Perfetto) or as
+    OpenTelemetry-compatible OTLP/JSON. Spans opened in different asyncio tasks (such as concurrent page fetches)
+    are put on separate lanes in the Chrome format, so they don't overlap.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from ..config import app_config
+from ..metrics import registry
+
+dropped_spans = registry.counter(
+    "trace_spans_dropped_total", "Spans not recorded because their run's trace reached TRACE_MAX_SPANS"
+)
+
+# The formats traces can be exported in
+TRACE_FORMATS = ("chrome", "otlp")
+
+
+@dataclass
+class Span:
+    """A timed operation within a run's trace."""
+
+    name: str
+    span_id: str
+    parent_id: str | None
+    lane: int
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+
+class RunTrace:
+    """The spans recorded for one research run."""
+
+    def __init__(self, run_id: str, max_spans: int) -> None:
+        """Initialize an empty trace.
+
+        Args:
+            run_id (str): The traced run's ID
+            max_spans (int): The most spans recorded, beyond which spans are dropped
+        """
+
+        self.run_id = run_id
+        self.trace_id = secrets.token_hex(16)
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self._lanes: dict[int, int] = {}
+
+    def start_span(self, name: str, parent: Span | None, attributes: dict[str, Any]) -> Span | None:
+        """Start a span.
+
+        Args:
+            name (str): The span's name
+            parent (Span | None): The span it runs within
+            attributes (dict[str, Any]): Details of the operation
+
+        Returns:
+            Span | None: The span, or None if the trace is full
+        """
+
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            dropped_spans.inc()
+            return None
+
+        try:
+            owner = id(asyncio.current_task())
+        except RuntimeError:
+            # Spans opened off the event loop (such as in a worker thread) get a lane per thread
+            owner = threading.get_ident()
+        lane = self._lanes.setdefault(owner, len(self._lanes) + 1)
+        span = Span(name, secrets.token_hex(8), parent.span_id if parent else None, lane, time.time_ns())
+        span.attributes.update(attributes)
+        self.spans.append(span)
+
+        return span
+
+    def to_chrome(self) -> dict[str, Any]:
+        """Export the trace in the Chrome trace event format.
+
+        Returns:
+            dict[str, Any]: The trace, as complete ("X") events in microseconds
+        """
+
+        now = time.time_ns()
+        events: list[dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": f"research run {self.run_id}"}}
+        ]
+        for span in self.spans:
+            args = {**span.attributes, "span_id": span.span_id, "parent_id": span.parent_id}
+            if span.error is not None:
+                args["error"] = span.error
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(".")[0],
+                    "ph": "X",
+                    "ts": span.start_ns / 1000,
+                    "dur": ((span.end_ns or now) - span.start_ns) / 1000,
+                    "pid": 1,
+                    "tid": span.lane,
+                    "args": args,
+                }
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"run_id": self.run_id}}
+
+    def to_otlp(self) -> dict[str, Any]:
+        """Export the trace in the OTLP/JSON format used by OpenTelemetry collectors.
+
+        Returns:
+            dict[str, Any]: The trace as an OTLP `ExportTraceServiceRequest`
+        """
+
+        now = time.time_ns()
+        spans = []
+        for span in self.spans:
+            otlp_span: dict[str, Any] = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or now),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1},
+            }
+            if span.parent_id is not None:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+
+        resource = [
+            {"key": "service.name", "value": {"stringValue": app_config.APP_NAME}},
+            {"key": "research.run_id", "value": {"stringValue": self.run_id}},
+        ]
+        return {
+            "resourceSpans": [
+                {"resource": {"attributes": resource}, "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}]}
+            ]
+        }
+
+    def export(self, trace_format: str) -> dict[str, Any]:
+        """Export the trace.
+
+        Args:
+            trace_format (str): One of TRACE_FORMATS
+
+        Returns:
+            dict[str, Any]: The exported trace
+        """
+
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {trace_format!r}, expected one of {TRACE_FORMATS}")
+        return self.to_chrome() if trace_format == "chrome" else self.to_otlp()
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    """Convert an attribute value to an OTLP `AnyValue`.
+
+    Args:
+        value (Any): The attribute value
+
+    Returns:
+        dict[str, Any]: The OTLP value
+    """
+
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# The trace of the research run being executed, and the innermost span open in the current task
+current_trace: ContextVar[RunTrace | None] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def start_trace(run_id: str) -> RunTrace | None:
+    """Start tracing the research run executing in the current context, if tracing is enabled.
+
+    Args:
+        run_id (str): The run's ID
+
+    Returns:
+        RunTrace | None: The run's trace, or None if tracing is disabled
+    """
+
+    if not app_config.TRACING_ENABLED:
+        return None
+
+    trace = RunTrace(run_id, app_config.TRACE_MAX_SPANS)
+    current_trace.set(trace)
+    current_span.set(None)
+    return trace
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Record the body of a `with` block as a span of the current run's trace. Errors raised by the body are
+    recorded on the span and re-raised.
+
+    Args:
+        name (str): The span's name (e.g. "tavily_search")
+        attributes (Any): Details of the operation
+
+    Returns:
+        Iterator[Span | None]: The span, or None outside a traced run
+    """
+
+    trace = current_trace.get()
+    started = trace.start_span(name, current_span.get(), attributes) if trace is not None else None
+    if started is None:
+        yield None
+        return
+
+    token = current_span.set(started)
+    try:
+        yield started
+    except BaseException as e:
+        started.error = type(e).__name__ if isinstance(e, asyncio.CancelledError) else f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        started.end_ns = time.time_ns()
+        try:
+            current_span.reset(token)
+        except ValueError:
+            # An abandoned async generator can be closed from another context, which has nothing to reset
+            pass
+
+
+def trace_path(directory: str, run_id: str, trace_format: str) -> str:
+    """Get the path a run's trace is exported to.
+
+    Args:
+        directory (str): The export directory
+        run_id (str): The run's ID
+        trace_format (str): One of TRACE_FORMATS
+
+    Returns:
+        str: The path of the run's trace file
+    """
+
+    return os.path.join(directory, f"{os.path.basename(run_id)}.{trace_format}.json")
+
+
+def write_trace(trace: RunTrace, directory: str, trace_format: str) -> str:
+    """Write a trace to a directory. This blocks, so call it from a worker thread.
+
+    Args:
+        trace (RunTrace): The trace
+        directory (str): The export directory, created if necessary
+        trace_format (str): One of TRACE_FORMATS
+
+    Returns:
+        str: The path of the written file
+    """
+
+    exported = trace.export(trace_format)
+    os.makedirs(directory, exist_ok=True)
+    path = trace_path(directory, trace.run_id, trace_format)
+    with open(path, "w") as file:
+        json.dump(exported, file)
+
+    return path
+
+
+def read_trace(directory: str, run_id: str, trace_format: str) -> dict[str, Any] | None:
+    """Read a trace exported to a directory. This blocks, so call it from a worker thread.
+
+    Args:
+        directory (str): The export directory
+        run_id (str): The run's ID
+        trace_format (str): One of TRACE_FORMATS
+
+    Returns:
+        dict[str, Any] | None: The exported trace, or None if the run's trace wasn't exported in that format
+    """
+
+    try:
+        with open(trace_path(directory, run_id, trace_format)) as file:
+            return dict(json.load(file))
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,121 @@
+"""Module: checkpoint_writes.py
+
+Description:
+    Benchmarks how long a single checkpoint write takes for each checkpointer backend as the `files` state of a
+    research run grows. A checkpoint is written after every agent step, so a backend whose write cost grows with the
+    total size of the state (rather than with what the step changed) can become the bottleneck for long runs.
+
+    Run with: uv run python -m benchmarks.checkpoint_writes
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.api.run_store import RunStore, open_run_store
+
+# Sizes of the virtual file system to benchmark, in kilobytes
+DEFAULT_FILES_KB = [0, 64, 512, 4096]
+
+
+def build_state(files_kb: int, messages: int) -> dict[str, Any]:
+    """Build channel values resembling a research run's state.
+
+    Args:
+        files_kb (int): The total size of the files in state, in kilobytes
+        messages (int): The number of messages in state
+
+    Returns:
+        dict[str, Any]: The channel values
+    """
+
+    files = {f"notes_{index}.md": "x" * 1024 for index in range(files_kb)}
+    history: list[Any] = [HumanMessage(content="Research mixture of experts routing")]
+    history += [AIMessage(content=f"Step {index} " + "y" * 500) for index in range(messages)]
+
+    return {"messages": history, "files": files, "todos": []}
+
+
+async def time_writes(store: RunStore, files_kb: int, steps: int, files_changed: bool) -> list[float]:
+    """Time a run's worth of checkpoint writes.
+
+    Args:
+        store (RunStore): The run store whose checkpointer to benchmark
+        files_kb (int): The total size of the files in state, in kilobytes
+        steps (int): The number of checkpoints to write
+        files_changed (bool): Whether every step changes the files (otherwise only the messages change)
+
+    Returns:
+        list[float]: The duration of each write, in milliseconds
+    """
+
+    assert store.checkpointer is not None
+    thread_id = f"bench-{files_kb}-{files_changed}"
+    config: Any = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    durations: list[float] = []
+
+    for step in range(steps):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = build_state(files_kb, step)
+        checkpoint["channel_versions"] = {"messages": step + 1, "files": step + 1 if files_changed else 1, "todos": 1}
+        new_versions: dict[str, str | int | float] = {"messages": step + 1}
+        if files_changed or step == 0:
+            new_versions.update({"files": step + 1, "todos": 1})
+
+        started = time.perf_counter()
+        config = await store.checkpointer.aput(config, checkpoint, {"source": "loop", "step": step}, new_versions)
+        durations.append((time.perf_counter() - started) * 1000)
+
+    await store.forget(thread_id)
+
+    return durations
+
+
+async def run_benchmark(files_kb: list[int], steps: int) -> None:
+    """Print checkpoint write costs for every backend, file system size, and change pattern.
+
+    Args:
+        files_kb (list[int]): The file system sizes to benchmark, in kilobytes
+        steps (int): The number of checkpoints to write per measurement
+    """
+
+    print(f"{'backend':<8} {'files':>8} {'files change':>13} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in ("memory", "sqlite"):
+            store = await open_run_store(backend, str(Path(directory) / "bench.sqlite"))
+            try:
+                for size in files_kb:
+                    for files_changed in (False, True):
+                        durations = sorted(await time_writes(store, size, steps, files_changed))
+                        print(
+                            f"{backend:<8} {f'{size} KB':>8} {'every step' if files_changed else 'never':>13} "
+                            f"{statistics.median(durations):>9.2f} {durations[int(len(durations) * 0.95)]:>9.2f} "
+                            f"{durations[-1]:>9.2f}"
+                        )
+            finally:
+                await store.close()
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files-kb", type=int, nargs="+", default=DEFAULT_FILES_KB, help="File system sizes in KB")
+    parser.add_argument("--steps", type=int, default=20, help="Checkpoints written per measurement")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.files_kb, args.steps))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Module: fake_server.py
+
+Description:
+    Runs the server as it would run in production (the same app, lifespan, limits and `/ws` endpoint) but with
+    the fake models, search and pages of `fakes.py` in place of real ones, so it can be load tested without API
+    keys or spend. The server's own settings (such as MAX_CONCURRENT_WEBSOCKET_CONNECTIONS) come from the
+    environment as usual. Run a single worker, since the fakes live in this process.
+
+    Run with: APP_VERSION=load-test uv run python -m benchmarks.fake_server --port 8000 --model-latency 0.5
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+
+import uvicorn
+
+from .fakes import Workload, add_workload_arguments, fake_backends, workload_from_arguments
+
+
+async def serve(host: str, port: int, workload: Workload) -> None:
+    """Serve the app with fake backends until interrupted.
+
+    Args:
+        host (str): The host to bind to
+        port (int): The port to listen on
+        workload (Workload): The shape of each research run and the latency of its backends
+    """
+
+    from app.api import server
+
+    async with fake_backends(workload):
+        print(f"Serving with fake backends on http://{host}:{port} (research on ws://{host}:{port}/ws)")
+        await uvicorn.Server(uvicorn.Config(server.app, host=host, port=port, log_level="warning")).serve()
+
+
+def main() -> None:
+    """Parse arguments and run the server."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind to")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    add_workload_arguments(parser)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, workload_from_arguments(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""Module: fakes.py
+
+Description:
+    Offline stand-ins for everything a research run reaches outside the process, for benchmarking the research
+    pipeline end to end without API keys or spend:
+    - `FakeChatModel` follows a tool-call plan (one list of tool calls per turn, then a final answer) after a
+      configurable latency. It works out which turn it's on from the conversation it's given, so one model can
+      serve any number of concurrent runs.
+    - `FakeSummarizationModel` answers summarization requests with a structured summary excerpted from the page.
+    - `FakeTavilyClient` answers searches with results pointing at the page server.
+    - The page server serves synthetic HTML pages, or pages recorded from real searches, over local HTTP.
+
+    `fake_backends` starts the page server and puts all of them in place of the configured models and clients,
+    with the agent graph built around the fakes. The fake models are routed like configured ones, so runs against
+    them can be recorded to cassettes and replayed like any other (see `app.shared.cassette`).
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import Field
+
+from app.agents import agents
+from app.agents.model_router import ModelRouter, build_model_router
+from app.agents.prompt_caching import ModelUsageHandler
+from app.agents.tools import research_tools
+
+from .ollama_stand_in import EXCERPT_WORDS
+from .summarization_throughput import PARAGRAPH, free_port
+
+# Characters per token, for the token usage fake models report
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: The estimated number of tokens
+    """
+
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that follows a tool-call plan after a configurable latency, and then gives its final answer."""
+
+    # The tool calls to make on each turn, as {"name": ..., "args": ...} dicts
+    plan: list[list[dict[str, Any]]] = Field(default_factory=list)
+    answer: str = "Research complete."
+    latency: float = 0.0
+    jitter: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable[Any, BaseMessage]:
+        return self
+
+    def respond(self, messages: list[BaseMessage]) -> AIMessage:
+        """Answer a conversation with the next turn of the plan. Every earlier turn left an AI message in the
+        conversation, so counting them tells which turn is next.
+
+        Args:
+            messages (list[BaseMessage]): The conversation so far
+
+        Returns:
+            AIMessage: The tool calls of the next turn, or the final answer once the plan is done
+        """
+
+        turn = sum(isinstance(message, AIMessage) for message in messages)
+        if turn >= len(self.plan):
+            return AIMessage(content=self.answer)
+
+        tool_calls = [
+            {"name": call["name"], "args": call["args"], "id": f"call_{turn}_{index}"}
+            for index, call in enumerate(self.plan[turn])
+        ]
+        return AIMessage(content="", tool_calls=tool_calls)
+
+    def delay(self) -> float:
+        """Pick how long a call takes.
+
+        Returns:
+            float: The latency, give or take up to the jitter, in seconds
+        """
+
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        """Build the result of a call, with token usage estimated from the conversation and the response.
+
+        Args:
+            messages (list[BaseMessage]): The conversation
+
+        Returns:
+            ChatResult: The result
+        """
+
+        response = self.respond(messages)
+        input_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+        output_tokens = estimate_tokens(str(response.content) + str(response.tool_calls))
+        response.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _generate(
+        self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        time.sleep(self.delay())
+        return self._result(messages)
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.delay())
+        return self._result(messages)
+
+
+class FakeSummarizationModel(FakeChatModel):
+    """Chat model that summarizes a page by excerpting it, as structured output of the `Summary` schema."""
+
+    def respond(self, messages: list[BaseMessage]) -> AIMessage:
+        prompt = str(messages[-1].content)
+        words = prompt.split()
+        summary = " ".join(words[-EXCERPT_WORDS:])
+        filename = f"{hashlib.sha256(prompt.encode()).hexdigest()[:12]}.md"
+        tool_call = {"name": "Summary", "args": {"filename": filename, "summary": summary}, "id": "call_summary"}
+        return AIMessage(content="", tool_calls=[tool_call])
+
+
+class FakeTavilyClient:
+    """Stand-in for `AsyncTavilyClient` whose results point at pages on the page server."""
+
+    def __init__(self, base_url: str, pages: list[str], results: int, latency: float) -> None:
+        """Initialize the client.
+
+        Args:
+            base_url (str): The page server's URL
+            pages (list[str]): The names of the pages on the page server
+            results (int): The number of results every search returns
+            latency (float): The latency of every search, in seconds
+        """
+
+        self.base_url = base_url
+        self.pages = pages
+        self.results = results
+        self.latency = latency
+
+    async def search(self, query: str, **kwargs: Any) -> dict[str, Any]:
+        """Search for a query. The same query always returns the same pages.
+
+        Args:
+            query (str): The search query
+            **kwargs (Any): Search options, which are ignored
+
+        Returns:
+            dict[str, Any]: The results, in Tavily's format
+        """
+
+        await asyncio.sleep(self.latency)
+        first = int(hashlib.sha256(query.encode()).hexdigest(), 16) % len(self.pages)
+        names = [self.pages[(first + index) % len(self.pages)] for index in range(self.results)]
+        return {
+            "query": query,
+            "results": [
+                {
+                    "url": f"{self.base_url}/pages/{name}",
+                    "title": name,
+                    "content": f"About {name}.",
+                    "raw_content": None,
+                    "score": 1.0,
+                }
+                for name in names
+            ],
+        }
+
+
+def build_pages(count: int, chars: int) -> dict[str, str]:
+    """Build synthetic HTML pages.
+
+    Args:
+        count (int): The number of pages
+        chars (int): The amount of text on each page, in characters
+
+    Returns:
+        dict[str, str]: The pages' HTML, by name
+    """
+
+    text = (PARAGRAPH * (chars // len(PARAGRAPH) + 1))[:chars]
+    return {f"page-{index}": f"<html><body><h1>Page {index}</h1><p>{text}</p></body></html>" for index in range(count)}
+
+
+def load_pages(directory: str) -> dict[str, str]:
+    """Load recorded pages saved as `<name>.html` files.
+
+    Args:
+        directory (str): The directory the pages are saved in
+
+    Returns:
+        dict[str, str]: The pages' HTML, by name
+    """
+
+    return {path.stem: path.read_text() for path in sorted(Path(directory).glob("*.html"))}
+
+
+def build_page_app(pages: dict[str, str], latency: float) -> FastAPI:
+    """Build the app serving pages at `/pages/<name>`.
+
+    Args:
+        pages (dict[str, str]): The pages' HTML, by name
+        latency (float): The latency of every request, in seconds
+
+    Returns:
+        FastAPI: The app
+    """
+
+    app = FastAPI()
+
+    @app.get("/pages/{name}", response_model=None)
+    async def page(name: str) -> HTMLResponse | PlainTextResponse:
+        await asyncio.sleep(latency)
+        if name not in pages:
+            return PlainTextResponse("Not found", status_code=404)
+        return HTMLResponse(pages[name])
+
+    return app
+
+
+@dataclass
+class Workload:
+    """The shape of every fake research run, and the latency of each backend it reaches."""
+
+    # Research tasks the supervisor delegates at once, and searches each researcher runs one after another
+    delegations: int = 2
+    searches: int = 2
+    results_per_search: int = 2
+
+    # Latency of each call, in seconds
+    model_latency: float = 0.05
+    model_jitter: float = 0.0
+    summary_latency: float = 0.02
+    search_latency: float = 0.05
+    page_latency: float = 0.0
+
+    # Synthetic pages, unless pages_dir holds recorded ones
+    pages: int = 20
+    page_chars: int = 8000
+    pages_dir: str = ""
+
+
+def add_workload_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add command line arguments for the fields of a workload.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to add them to
+    """
+
+    defaults = Workload()
+    parser.add_argument("--delegations", type=int, default=defaults.delegations, help="Tasks the supervisor delegates")
+    parser.add_argument("--searches", type=int, default=defaults.searches, help="Searches each researcher runs")
+    parser.add_argument("--results", type=int, default=defaults.results_per_search, help="Results per search")
+    parser.add_argument("--model-latency", type=float, default=defaults.model_latency, help="Seconds per model call")
+    parser.add_argument("--model-jitter", type=float, default=defaults.model_jitter, help="Model latency jitter")
+    parser.add_argument("--search-latency", type=float, default=defaults.search_latency, help="Seconds per search")
+    parser.add_argument("--summary-latency", type=float, default=defaults.summary_latency, help="Seconds per summary")
+    parser.add_argument("--page-latency", type=float, default=defaults.page_latency, help="Seconds per page fetch")
+    parser.add_argument("--page-chars", type=int, default=defaults.page_chars, help="Text per synthetic page")
+    parser.add_argument("--pages-dir", default="", help="Directory of recorded pages (*.html) to serve instead")
+
+
+def workload_from_arguments(args: argparse.Namespace) -> Workload:
+    """Build a workload from the command line arguments added by `add_workload_arguments`.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments
+
+    Returns:
+        Workload: The workload
+    """
+
+    return Workload(
+        delegations=args.delegations,
+        searches=args.searches,
+        results_per_search=args.results,
+        model_latency=args.model_latency,
+        model_jitter=args.model_jitter,
+        summary_latency=args.summary_latency,
+        search_latency=args.search_latency,
+        page_latency=args.page_latency,
+        page_chars=args.page_chars,
+        pages_dir=args.pages_dir,
+    )
+
+
+def build_models(workload: Workload) -> tuple[ModelRouter, ModelRouter, ModelRouter]:
+    """Build the fake supervisor, researcher and summarization models for a workload. Each is routed like a
+    configured model would be, so calls go through the router's rate limiting, circuit breaking and cassettes.
+
+    Args:
+        workload (Workload): The workload
+
+    Returns:
+        tuple[ModelRouter, ModelRouter, ModelRouter]: The supervisor, researcher and summarization models
+    """
+
+    delegations = [
+        {
+            "name": "task",
+            "args": {"description": f"Research part {index} of the question", "subagent_type": "research-agent"},
+        }
+        for index in range(workload.delegations)
+    ]
+    supervisor = FakeChatModel(
+        plan=[delegations] if delegations else [],
+        answer="# Report\n\nThe findings of the research, put together.",
+        latency=workload.model_latency,
+        jitter=workload.model_jitter,
+        callbacks=[ModelUsageHandler("fake-supervisor")],
+    )
+    researcher = FakeChatModel(
+        plan=[[{"name": "tavily_search", "args": {"query": f"search {index}"}}] for index in range(workload.searches)],
+        answer="Findings of the searches.",
+        latency=workload.model_latency,
+        jitter=workload.model_jitter,
+        callbacks=[ModelUsageHandler("fake-researcher")],
+    )
+    summarizer = FakeSummarizationModel(
+        latency=workload.summary_latency,
+        jitter=workload.model_jitter,
+        callbacks=[ModelUsageHandler("fake-summarizer")],
+    )
+
+    return (
+        build_model_router("supervisor", [("fake-supervisor", supervisor)]),
+        build_model_router("researcher", [("fake-researcher", researcher)]),
+        build_model_router(research_tools.SUMMARIZATION_AGENT, [("fake-summarizer", summarizer)]),
+    )
+
+
+@asynccontextmanager
+async def fake_backends(workload: Workload) -> AsyncIterator[Any]:
+    """Serve pages locally and put fake models and a fake search client in place of the configured ones, until
+    the context exits.
+
+    Args:
+        workload (Workload): The workload the fakes follow
+
+    Yields:
+        Any: The supervisor agent graph, built around the fake models
+    """
+
+    pages = load_pages(workload.pages_dir) if workload.pages_dir else build_pages(workload.pages, workload.page_chars)
+    if not pages:
+        raise ValueError(f"No recorded pages (*.html) found in {workload.pages_dir}")
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(build_page_app(pages, workload.page_latency), port=port, log_level="warning")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    supervisor, researcher, summarizer = build_models(workload)
+    tavily = FakeTavilyClient(
+        f"http://127.0.0.1:{port}", list(pages), workload.results_per_search, workload.search_latency
+    )
+    try:
+        with (
+            patch.object(agents, "get_supervisor_model", return_value=supervisor),
+            patch.object(agents, "get_researcher_model", return_value=researcher),
+            patch.object(research_tools, "get_summarization_model", return_value=summarizer),
+            patch.object(research_tools, "get_tavily_client", return_value=tavily),
+        ):
+            agent = agents.build_supervisor_agent()
+            with patch("app.agents.get_supervisor_agent", return_value=agent):
+                yield agent
+    finally:
+        await research_tools.close_clients()
+        server.should_exit = True
+        await serving
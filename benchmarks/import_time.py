@@ -0,0 +1,115 @@
+"""Module: import_time.py
+
+Description:
+    Benchmarks how long the server takes to import, which is most of a worker's cold start, and how much of the
+    agent stack (LangChain, LangGraph and the model SDKs) is deferred until the first research run or warm-up.
+    Every measurement runs in a fresh interpreter with `-X importtime`, and the packages that contribute the most
+    self time are listed so that new heavy imports on the startup path are easy to spot.
+
+    Run with: uv run python -m benchmarks.import_time
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# Modules imported in order in each measurement. Each is charged only for what the ones before it didn't load.
+DEFAULT_MODULES = ["app.api.server", "app.agents.agents"]
+
+
+def parse_import_times(output: str) -> list[tuple[str, int, int]]:
+    """Parse the report written to stderr by `python -X importtime`.
+
+    Args:
+        output (str): The stderr of the interpreter
+
+    Returns:
+        list[tuple[str, int, int]]: The module name, self time and cumulative time in microseconds of every import
+    """
+
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+
+    return imports
+
+
+def measure(modules: list[str]) -> list[tuple[str, int, int]]:
+    """Import modules in a fresh interpreter and collect its import times.
+
+    Args:
+        modules (list[str]): The modules to import, in order
+
+    Returns:
+        list[tuple[str, int, int]]: The module name, self time and cumulative time in microseconds of every import
+    """
+
+    # The server refuses to start without a version, which is normally set by the deployment
+    env = {**os.environ, "APP_VERSION": os.environ.get("APP_VERSION") or "benchmark"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        capture_output=True,
+        check=True,
+        env=env,
+        text=True,
+    )
+
+    return parse_import_times(result.stderr)
+
+
+def run_benchmark(modules: list[str], runs: int, top: int) -> None:
+    """Print the median import time of each module and the packages contributing the most self time.
+
+    Args:
+        modules (list[str]): The modules to import, in order
+        runs (int): The number of fresh interpreters to measure
+        top (int): The number of packages to list
+    """
+
+    cumulative: dict[str, list[int]] = defaultdict(list)
+    package_self: dict[str, list[int]] = defaultdict(list)
+
+    for _ in range(runs):
+        totals: dict[str, int] = defaultdict(int)
+        for module, self_us, cumulative_us in measure(modules):
+            if module in modules:
+                cumulative[module].append(cumulative_us)
+            totals[module.split(".")[0]] += self_us
+
+        for package, self_us in totals.items():
+            package_self[package].append(self_us)
+
+    print(f"{'module':<32} {'median ms':>10} {'min ms':>9}")
+    for module in modules:
+        times = cumulative[module]
+        print(f"{module:<32} {statistics.median(times) / 1000:>10.1f} {min(times) / 1000:>9.1f}")
+
+    print(f"\n{'package':<32} {'self ms':>10}")
+    medians = {package: statistics.median(times) for package, times in package_self.items()}
+    for package, median_us in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{package:<32} {median_us / 1000:>10.1f}")
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import, in order")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list by self time")
+    args = parser.parse_args()
+
+    run_benchmark(args.modules, args.runs, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""Module: load_generator.py
+
+Description:
+    Load tests a running server over real WebSocket connections, for sizing MAX_CONCURRENT_WEBSOCKET_CONNECTIONS,
+    the research run limits and the number of replicas. It opens a number of concurrent `/ws` clients, submits
+    research queries across them at a target rate (whether or not earlier ones have finished, as independent
+    users would), and measures:
+    - connections accepted and rejected by the server's connection limit
+    - time to first event and completion time of each query, and how each one ended (including the error code of
+      those turned away, such as QUEUE_FULL)
+    - event latency, from the timestamp the server put on an event to its arrival. This assumes the client and
+      server clocks agree, as they do on the same host.
+    - the server's resource use (CPU time, resident memory, open files) and peak connections, active and queued
+      runs, scraped from its /metrics endpoint while the test runs
+
+    Results are written as a JSON report. Run it against `benchmarks.fake_server` to load test without API keys
+    or spend, or against a server with real backends to include them.
+
+    Run with: uv run python -m benchmarks.load_generator --clients 50 --rate 5 --requests 200 --report load.json
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import cycle
+from typing import Any
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed, InvalidStatus
+
+# Events that end a research request
+FINAL_EVENTS = ("completed", "cancelled", "error")
+
+# Server metrics whose peak over the test is reported
+PEAK_METRICS = {
+    "process_resident_memory_bytes": "peak_rss_bytes",
+    "process_open_fds": "peak_open_fds",
+    "websocket_connections_active": "peak_connections",
+    "research_runs_active": "peak_active_runs",
+    "research_runs_queued": "peak_queued_runs",
+}
+
+# Seconds between scrapes of the server's metrics
+METRICS_INTERVAL = 1.0
+
+
+@dataclass
+class RequestResult:
+    """What happened to a single research query."""
+
+    request_id: str
+    submitted: float
+    first_event: float | None = None
+    finished: float | None = None
+    outcome: str = "timeout"
+    error_code: str | None = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class LoadClient:
+    """A WebSocket client submitting research queries and timing the events it gets back."""
+
+    def __init__(self, url: str, event_latencies: list[float]) -> None:
+        """Initialize a client. It isn't connected until `connect` is called.
+
+        Args:
+            url (str): The server's WebSocket URL
+            event_latencies (list[float]): Where the latency of every event received is added, in milliseconds
+        """
+
+        self.url = url
+        self.event_latencies = event_latencies
+        self.requests: dict[str, RequestResult] = {}
+        self.websocket: ClientConnection | None = None
+        self._reader: asyncio.Task[None] | None = None
+
+    async def connect(self) -> str:
+        """Open the client's connection.
+
+        Returns:
+            str: "accepted", "rejected" if the server turned the connection away, or "failed"
+        """
+
+        try:
+            self.websocket = await connect(self.url, max_size=None)
+        except InvalidStatus:
+            return "rejected"
+        except (OSError, TimeoutError):
+            return "failed"
+
+        self._reader = asyncio.create_task(self._read())
+        return "accepted"
+
+    async def research(self, request_id: str, query: str, timeout: float) -> RequestResult:
+        """Submit a research query and wait for it to finish.
+
+        Args:
+            request_id (str): The query's request ID
+            query (str): The research query
+            timeout (float): The most seconds to wait for it to finish
+
+        Returns:
+            RequestResult: What happened to the query
+        """
+
+        assert self.websocket is not None
+        result = self.requests[request_id] = RequestResult(request_id, time.perf_counter())
+        try:
+            await self.websocket.send(json.dumps({"query": query, "request_id": request_id}))
+            await asyncio.wait_for(result.done.wait(), timeout)
+        except ConnectionClosed:
+            result.outcome = "disconnected"
+        except TimeoutError:
+            pass
+
+        return result
+
+    async def close(self) -> None:
+        """Close the client's connection."""
+
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def _read(self) -> None:
+        """Time every event received, and finish queries as their final event arrives."""
+
+        assert self.websocket is not None
+        try:
+            async for message in self.websocket:
+                received = time.perf_counter()
+                event = json.loads(message)
+
+                timestamp = event.get("timestamp")
+                if timestamp:
+                    self.event_latencies.append((time.time() - datetime.fromisoformat(timestamp).timestamp()) * 1000)
+
+                result = self.requests.get(event.get("request_id", ""))
+                if result is None or result.done.is_set():
+                    continue
+
+                if result.first_event is None:
+                    result.first_event = received
+                if event.get("event_type") in FINAL_EVENTS:
+                    result.finished = received
+                    result.outcome = event["event_type"]
+                    if result.outcome == "error":
+                        result.error_code = event.get("data", {}).get("code") or "ERROR"
+                    result.done.set()
+        except ConnectionClosed:
+            pass
+        finally:
+            for result in self.requests.values():
+                if not result.done.is_set():
+                    result.outcome = "disconnected"
+                    result.done.set()
+
+
+def summarize(values: list[float]) -> dict[str, float] | None:
+    """Summarize a distribution of measurements.
+
+    Args:
+        values (list[float]): The measurements
+
+    Returns:
+        dict[str, float] | None: Their count, mean, p50, p95, p99 and max, or None without any
+    """
+
+    if not values:
+        return None
+
+    ordered = sorted(values)
+
+    def percentile(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def metrics_url_for(url: str) -> str:
+    """Get the /metrics URL of the server behind a WebSocket URL.
+
+    Args:
+        url (str): The WebSocket URL (e.g. "ws://localhost:8000/ws")
+
+    Returns:
+        str: The metrics URL (e.g. "http://localhost:8000/metrics")
+    """
+
+    parts = urlsplit(url)
+    return urlunsplit(("https" if parts.scheme == "wss" else "http", parts.netloc, "/metrics", "", ""))
+
+
+async def scrape_metrics(client: httpx.AsyncClient, url: str) -> dict[str, float]:
+    """Scrape a server's unlabelled metrics.
+
+    Args:
+        client (httpx.AsyncClient): The HTTP client
+        url (str): The metrics URL
+
+    Returns:
+        dict[str, float]: The value of each unlabelled metric, or nothing if the scrape failed
+    """
+
+    try:
+        response = await client.get(url)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+
+    values = {}
+    for line in response.text.splitlines():
+        name, _, value = line.partition(" ")
+        if line and not line.startswith("#") and "{" not in name:
+            values[name] = float(value)
+
+    return values
+
+
+class ServerMonitor:
+    """Scrapes the server's metrics while a load test runs, keeping their values at the start and end and the
+    peak of those in PEAK_METRICS.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.start: dict[str, float] = {}
+        self.end: dict[str, float] = {}
+        self.peaks: dict[str, float] = {}
+        self._client = httpx.AsyncClient(timeout=5)
+        self._task: asyncio.Task[None] | None = None
+
+    async def begin(self) -> None:
+        """Take the first scrape and keep scraping in the background."""
+
+        self.start = await self.scrape()
+        self._task = asyncio.create_task(self._scrape_until_cancelled())
+
+    async def finish(self) -> None:
+        """Stop scraping in the background and take the last scrape."""
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.end = await self.scrape()
+        await self._client.aclose()
+
+    def report(self, requests: int) -> dict[str, Any] | None:
+        """Summarize the server's resource use over the test.
+
+        Args:
+            requests (int): The number of queries submitted
+
+        Returns:
+            dict[str, Any] | None: The server's resource use, or None if its metrics couldn't be scraped
+        """
+
+        if not self.start or not self.end:
+            return None
+
+        cpu_seconds = self.end.get("process_cpu_seconds_total", 0.0) - self.start.get("process_cpu_seconds_total", 0.0)
+        return {
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_ms_per_request": round(cpu_seconds / requests * 1000, 3) if requests else None,
+            "rss_bytes_start": self.start.get("process_resident_memory_bytes"),
+            "rss_bytes_end": self.end.get("process_resident_memory_bytes"),
+            "max_rss_bytes": self.end.get("process_max_resident_memory_bytes"),
+            **{report_name: self.peaks.get(name) for name, report_name in PEAK_METRICS.items()},
+        }
+
+    async def scrape(self) -> dict[str, float]:
+        """Scrape the server's metrics now, keeping the peaks.
+
+        Returns:
+            dict[str, float]: The value of each unlabelled metric
+        """
+
+        values = await scrape_metrics(self._client, self.url)
+        for name in PEAK_METRICS:
+            if name in values:
+                self.peaks[name] = max(self.peaks.get(name, values[name]), values[name])
+        return values
+
+    async def _scrape_until_cancelled(self) -> None:
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            await self.scrape()
+
+
+async def run_load(
+    url: str, clients: int, rate: float, requests: int, timeout: float, query: str, scrape: bool = True
+) -> dict[str, Any]:
+    """Run a load test.
+
+    Args:
+        url (str): The server's WebSocket URL
+        clients (int): The number of connections to open
+        rate (float): The target number of queries submitted per second, across every connection
+        requests (int): The number of queries to submit
+        timeout (float): The most seconds to wait for each query to finish
+        query (str): The research query, with `{n}` replaced by the query's number
+        scrape (bool): Whether to scrape the server's /metrics for its resource use
+
+    Returns:
+        dict[str, Any]: The report
+    """
+
+    event_latencies: list[float] = []
+    monitor = ServerMonitor(metrics_url_for(url)) if scrape else None
+    if monitor is not None:
+        await monitor.begin()
+
+    started = time.perf_counter()
+    load_clients = [LoadClient(url, event_latencies) for _ in range(clients)]
+    connections = await asyncio.gather(*(client.connect() for client in load_clients))
+    connect_seconds = time.perf_counter() - started
+    accepted = [client for client, status in zip(load_clients, connections, strict=True) if status == "accepted"]
+
+    # Queries are submitted on schedule, spread across the accepted connections in turn
+    submissions: list[asyncio.Task[RequestResult]] = []
+    submitting = time.perf_counter()
+    if accepted:
+        targets = cycle(accepted)
+        for number in range(requests):
+            await asyncio.sleep(max(0.0, submitting + number / rate - time.perf_counter()))
+            request = next(targets).research(f"load-{number}", query.replace("{n}", str(number)), timeout)
+            submissions.append(asyncio.create_task(request))
+    submitted_seconds = time.perf_counter() - submitting
+
+    results = list(await asyncio.gather(*submissions))
+    duration = time.perf_counter() - started
+    if monitor is not None:
+        # Once more while every connection is still open, in case the test ran between background scrapes
+        await monitor.scrape()
+    await asyncio.gather(*(client.close() for client in accepted))
+    if monitor is not None:
+        await monitor.finish()
+
+    outcomes = [result.outcome for result in results]
+    errors: dict[str, int] = {}
+    for result in results:
+        if result.error_code is not None:
+            errors[result.error_code] = errors.get(result.error_code, 0) + 1
+
+    completed = [result for result in results if result.outcome == "completed"]
+    return {
+        "config": {
+            "url": url,
+            "clients": clients,
+            "rate": rate,
+            "requests": requests,
+            "timeout_seconds": timeout,
+        },
+        "duration_seconds": round(duration, 3),
+        "connections": {
+            "attempted": clients,
+            "accepted": len(accepted),
+            "rejected": connections.count("rejected"),
+            "failed": connections.count("failed"),
+            "connect_seconds": round(connect_seconds, 3),
+        },
+        "requests": {
+            "submitted": len(results),
+            "completed": len(completed),
+            "errors": errors,
+            "cancelled": outcomes.count("cancelled"),
+            "disconnected": outcomes.count("disconnected"),
+            "timed_out": outcomes.count("timeout"),
+            "submitted_per_second": round(len(results) / submitted_seconds, 3) if submitted_seconds > 0 else None,
+            "completed_per_second": round(len(completed) / duration, 3),
+        },
+        "time_to_first_event_ms": summarize(
+            [(result.first_event - result.submitted) * 1000 for result in results if result.first_event is not None]
+        ),
+        "completion_ms": summarize(
+            [(result.finished - result.submitted) * 1000 for result in completed if result.finished is not None]
+        ),
+        "event_latency_ms": summarize(event_latencies),
+        "server": monitor.report(len(results)) if monitor is not None else None,
+    }
+
+
+def main() -> None:
+    """Parse arguments, run the load test and write its report."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws", help="The server's WebSocket URL")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent WebSocket connections to open")
+    parser.add_argument("--rate", type=float, default=2.0, help="Queries submitted per second, across connections")
+    parser.add_argument("--requests", type=int, default=50, help="Queries to submit")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for each query to finish")
+    parser.add_argument("--query", default="Load test query {n}", help="Research query, {n} is the query number")
+    parser.add_argument("--no-metrics", action="store_true", help="Don't scrape the server's /metrics")
+    parser.add_argument("--report", default="", help="File to write the JSON report to, instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load(args.url, args.clients, args.rate, args.requests, args.timeout, args.query, not args.no_metrics)
+    )
+
+    rendered = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as file:
+            file.write(rendered + "\n")
+    else:
+        print(rendered)
+
+    connections, requests = report["connections"], report["requests"]
+    completion = report["completion_ms"] or {}
+    print(
+        f"connections {connections['accepted']}/{connections['attempted']} accepted, {connections['rejected']} "
+        f"rejected; queries {requests['completed']}/{requests['submitted']} completed, errors {requests['errors']}; "
+        f"completion p50 {completion.get('p50')} ms, p95 {completion.get('p95')} ms",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
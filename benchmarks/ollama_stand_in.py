@@ -0,0 +1,162 @@
+"""Module: ollama_stand_in.py
+
+Description:
+    A stand-in for a local Ollama server, for running and benchmarking summarization without a GPU or an API key.
+    It serves Ollama's chat API (`/api/chat`, streamed or not) with a configurable latency, and answers every
+    request by excerpting the last user message, or the longest `<tag>...</tag>` block in it (such as the page in a
+    summarization prompt): tool calls and JSON schema requests get arguments filled in from
+    their schema, so structured output (such as web page summaries) parses as it would from a real model. Token
+    counts are estimated at four characters per token.
+
+    Point the summarization model at it with SUMMARIZATION_MODEL_PROVIDER=ollama and
+    SUMMARIZATION_MODEL_BASE_URL=http://localhost:11434.
+
+    Run with: uv run python -m benchmarks.ollama_stand_in --latency 0.2
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Words of the last user message that answers are made of
+EXCERPT_WORDS = 60
+
+
+def excerpt(messages: list[dict[str, Any]]) -> str:
+    """Get the opening words of the last user message, or of its longest tagged block if it has any.
+
+    Args:
+        messages (list[dict[str, Any]]): The request's messages
+
+    Returns:
+        str: The excerpt
+    """
+
+    content = next((message.get("content") or "" for message in reversed(messages) if message["role"] == "user"), "")
+    blocks = [block for _, block in re.findall(r"<(\w+)>(.*?)</\1>", str(content), re.DOTALL)]
+    return " ".join(max(blocks or [str(content)], key=len).split()[:EXCERPT_WORDS])
+
+
+def fill_schema(schema: dict[str, Any], text: str) -> dict[str, Any]:
+    """Fill in an object matching a JSON schema, with text for its string properties and file names for properties
+    that look like one.
+
+    Args:
+        schema (dict[str, Any]): The JSON schema of the object
+        text (str): The text to fill string properties with
+
+    Returns:
+        dict[str, Any]: The object
+    """
+
+    slug = "_".join(re.findall(r"[a-z0-9]+", text.lower())[:4]) or "result"
+    defaults: dict[str, Any] = {"integer": 0, "number": 0.0, "boolean": False, "array": [], "object": {}}
+
+    filled: dict[str, Any] = {}
+    for name, prop in schema.get("properties", {}).items():
+        if prop.get("type", "string") == "string":
+            filled[name] = f"{slug}.md" if "file" in name else text
+        else:
+            filled[name] = defaults.get(prop.get("type"), None)
+
+    return filled
+
+
+def answer(body: dict[str, Any]) -> dict[str, Any]:
+    """Build the assistant message answering a chat request.
+
+    Args:
+        body (dict[str, Any]): The chat request
+
+    Returns:
+        dict[str, Any]: The assistant message
+    """
+
+    text = excerpt(body.get("messages", []))
+    tools = body.get("tools") or []
+    response_format = body.get("format")
+
+    if tools:
+        function = tools[0]["function"]
+        call = {"function": {"name": function["name"], "arguments": fill_schema(function.get("parameters", {}), text)}}
+        return {"role": "assistant", "content": "", "tool_calls": [call]}
+    if isinstance(response_format, dict):
+        return {"role": "assistant", "content": json.dumps(fill_schema(response_format, text))}
+    if response_format == "json":
+        return {"role": "assistant", "content": json.dumps({"summary": text})}
+
+    return {"role": "assistant", "content": text}
+
+
+def build_app(latency: float = 0.0, jitter: float = 0.0) -> FastAPI:
+    """Build the stand-in server.
+
+    Args:
+        latency (float): Seconds every chat request takes
+        jitter (float): Up to this many seconds are added to each request's latency at random
+
+    Returns:
+        FastAPI: The server's app
+    """
+
+    app = FastAPI(title="Ollama stand-in")
+
+    @app.get("/api/version")
+    async def version() -> dict[str, str]:
+        return {"version": "0.0.0-stand-in"}
+
+    @app.post("/api/chat", response_model=None)
+    async def chat(request: Request) -> JSONResponse | StreamingResponse:
+        body = await request.json()
+        await asyncio.sleep(latency + random.uniform(0, jitter))
+
+        message = answer(body)
+        prompt_chars = sum(len(str(item.get("content") or "")) for item in body.get("messages", []))
+        done = {
+            "model": body.get("model", ""),
+            "created_at": datetime.now(UTC).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": prompt_chars // 4,
+            "eval_count": len(json.dumps(message)) // 4,
+        }
+
+        if not body.get("stream", True):
+            return JSONResponse({**done, "message": message})
+
+        async def stream() -> AsyncGenerator[str, None]:
+            chunk = {"model": done["model"], "created_at": done["created_at"], "message": message, "done": False}
+            yield json.dumps(chunk) + "\n"
+            yield json.dumps({**done, "message": {"role": "assistant", "content": ""}}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main() -> None:
+    """Parse arguments and serve the stand-in."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=11434, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every chat request takes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random seconds per chat request, at most")
+    args = parser.parse_args()
+
+    uvicorn.run(build_app(args.latency, args.jitter), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
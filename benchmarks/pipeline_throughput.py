@@ -0,0 +1,232 @@
+"""Module: pipeline_throughput.py
+
+Description:
+    Benchmarks the research pipeline end to end and offline: research requests go through
+    `WebSocketManager.handle_websocket_stream` and `stream_agent_for_websocket` as they would from real clients,
+    while the models, search and web pages are the fakes in `fakes.py`. With every backend's latency fixed, what's
+    left to measure is the pipeline's own overhead and how it holds up under concurrency.
+
+    Each concurrency level runs the same number of requests from that many clients at once, each client sending
+    its next request as soon as its last one finishes, and reports runs per second, p50/p95 latency, CPU time per
+    run and peak RSS. Peak RSS is the process's high-water mark, so levels run from lowest to highest concurrency.
+
+    Run with: uv run python -m benchmarks.pipeline_throughput --concurrency 1,4,16 --runs 64
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any
+from unittest.mock import patch
+
+from fastapi import WebSocketDisconnect
+
+from app.api.models import EventType
+from app.api.websocket import WebSocketManager
+from app.shared.config import app_config
+
+from .fakes import Workload, add_workload_arguments, fake_backends, workload_from_arguments
+
+# Events that end a research request
+FINAL_EVENTS = {EventType.COMPLETED.value, EventType.CANCELLED.value, EventType.ERROR.value}
+
+
+class BenchmarkWebSocket:
+    """In-memory WebSocket for a benchmark client, which resolves a future as each of its requests finishes."""
+
+    def __init__(self) -> None:
+        self.incoming: asyncio.Queue[str | None] = asyncio.Queue()
+        self.finished: dict[str, asyncio.Future[str]] = {}
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        pass
+
+    async def receive_text(self) -> str:
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect()
+        return message
+
+    async def send_text(self, data: str) -> None:
+        event = json.loads(data)
+        future = self.finished.get(event.get("request_id", ""))
+        if event.get("event_type") in FINAL_EVENTS and future is not None and not future.done():
+            future.set_result(event["event_type"])
+
+    async def research(self, request_id: str, query: str) -> str:
+        """Send a research request and wait for it to finish.
+
+        Args:
+            request_id (str): The request's ID
+            query (str): The research query
+
+        Returns:
+            str: The request's final event type
+        """
+
+        finished: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self.finished[request_id] = finished
+        await self.incoming.put(json.dumps({"query": query, "request_id": request_id}))
+        try:
+            return await finished
+        finally:
+            del self.finished[request_id]
+
+
+@dataclass
+class LevelResult:
+    """Results of a single concurrency level."""
+
+    concurrency: int
+    runs: int
+    failed: int
+    seconds: float
+    latencies_ms: list[float]
+    cpu_seconds: float
+    peak_rss_mb: float
+
+    @property
+    def runs_per_second(self) -> float:
+        return self.runs / self.seconds
+
+    def percentile(self, fraction: float) -> float:
+        """Get a latency percentile.
+
+        Args:
+            fraction (float): The percentile, as a fraction
+
+        Returns:
+            float: The latency, in milliseconds
+        """
+
+        latencies = sorted(self.latencies_ms)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def peak_rss_mb() -> float:
+    """Get the process's peak resident set size.
+
+    Returns:
+        float: The peak RSS, in megabytes
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes and macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_level(concurrency: int, runs: int) -> LevelResult:
+    """Run research requests from a number of concurrent clients, with fake backends already in place.
+
+    Args:
+        concurrency (int): The number of clients, each with one request in flight at a time
+        runs (int): The total number of requests
+
+    Returns:
+        LevelResult: The results
+    """
+
+    overrides: dict[str, Any] = {
+        "MAX_CONCURRENT_WEBSOCKET_CONNECTIONS": concurrency,
+        "MAX_CONCURRENT_RESEARCH_RUNS": concurrency,
+        "MAX_QUEUED_RESEARCH_RUNS": runs,
+        "RESULT_CACHE_ENABLED": False,
+    }
+    with patch.multiple(app_config, **overrides):
+        manager = WebSocketManager()
+
+    latencies: list[float] = []
+    outcomes: list[str] = []
+
+    async def client(index: int) -> None:
+        websocket = BenchmarkWebSocket()
+        client_id = f"client-{index}"
+        await manager.connect(websocket, client_id)  # type: ignore[arg-type]
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, client_id))  # type: ignore[arg-type]
+
+        for request in range(index, runs, concurrency):
+            started = time.perf_counter()
+            outcomes.append(await websocket.research(f"request-{request}", f"Research question {request}"))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        await websocket.incoming.put(None)
+        await handler
+
+    cpu = time.process_time()
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    seconds = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu
+
+    return LevelResult(
+        concurrency=concurrency,
+        runs=runs,
+        failed=sum(outcome != EventType.COMPLETED.value for outcome in outcomes),
+        seconds=seconds,
+        latencies_ms=latencies,
+        cpu_seconds=cpu_seconds,
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+async def run_benchmark(levels: list[int], runs: int, workload: Workload) -> list[LevelResult]:
+    """Print the throughput and latency of the research pipeline at each concurrency level.
+
+    Args:
+        levels (list[int]): The concurrency levels
+        runs (int): The number of requests per level
+        workload (Workload): The shape of each run and the latency of its backends
+
+    Returns:
+        list[LevelResult]: The results of each level
+    """
+
+    print(
+        f"workload: {workload.delegations} delegations x {workload.searches} searches x "
+        f"{workload.results_per_search} results, model {workload.model_latency:.3f}s, search "
+        f"{workload.search_latency:.3f}s, summary {workload.summary_latency:.3f}s, page {workload.page_latency:.3f}s"
+    )
+    print(
+        f"{'clients':>8} {'runs/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'cpu ms/run':>11} {'peak rss MB':>12} {'failed':>7}"
+    )
+
+    results = []
+    async with fake_backends(workload):
+        for concurrency in sorted(levels):
+            result = await run_level(concurrency, runs)
+            results.append(result)
+            print(
+                f"{concurrency:>8} {result.runs_per_second:>8.2f} {statistics.median(result.latencies_ms):>9.1f} "
+                f"{result.percentile(0.95):>9.1f} {result.cpu_seconds / runs * 1000:>11.1f} "
+                f"{result.peak_rss_mb:>12.1f} {result.failed:>7}"
+            )
+
+    return results
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--runs", type=int, default=32, help="Research requests per concurrency level")
+    add_workload_arguments(parser)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    asyncio.run(run_benchmark(levels, args.runs, workload_from_arguments(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Module: summarization_throughput.py
+
+Description:
+    Benchmarks web page summarization on its own, apart from search and the research agents: how many summaries
+    per second the summarization model sustains at MAX_CONCURRENT_SUMMARIES, and how long each summary takes
+    including its wait for a slot. By default the model is pointed at an in-process Ollama stand-in with a fixed
+    latency, which measures the pipeline's own overhead and concurrency limit. With `--configured` the summarization
+    model from the environment is used instead.
+
+    Run with: uv run python -m benchmarks.summarization_throughput --pages 200 --latency 0.2
+
+Author: Nathan Thomas
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import time
+from typing import Any
+from unittest.mock import patch
+
+import uvicorn
+
+from app.agents.tools import research_tools
+from app.shared.config import app_config
+
+from .ollama_stand_in import build_app
+
+# Paragraph repeated to make up a page of the requested size
+PARAGRAPH = (
+    "Mixture of experts models route each token to a small subset of expert networks, which keeps the compute per "
+    "token low while the total parameter count grows. The router is trained jointly with the experts. "
+)
+
+
+def free_port() -> int:
+    """Find a free local port for the stand-in.
+
+    Returns:
+        int: The port
+    """
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+async def time_summaries(pages: int, page_chars: int) -> tuple[float, list[float]]:
+    """Summarize pages concurrently, as a burst of search results would be.
+
+    Args:
+        pages (int): The number of pages to summarize
+        page_chars (int): The size of each page in characters
+
+    Returns:
+        tuple[float, list[float]]: The total duration in seconds, and the duration of each summary in milliseconds
+    """
+
+    page = (PARAGRAPH * (page_chars // len(PARAGRAPH) + 1))[:page_chars]
+    durations: list[float] = []
+
+    async def summarize(index: int) -> None:
+        started = time.perf_counter()
+        await research_tools.summarize_webpage_content(f"Page {index}. {page}")
+        durations.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(summarize(index) for index in range(pages)))
+
+    return time.perf_counter() - started, durations
+
+
+async def run_benchmark(pages: int, page_chars: int, latency: float, configured: bool) -> None:
+    """Print summarization throughput and latency.
+
+    Args:
+        pages (int): The number of pages to summarize
+        page_chars (int): The size of each page in characters
+        latency (float): The stand-in's latency per request, in seconds
+        configured (bool): Whether to use the configured summarization model instead of the stand-in
+    """
+
+    server = serving = None
+    overrides: dict[str, Any] = {}
+    if not configured:
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(build_app(latency), port=port, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        overrides = {
+            "SUMMARIZATION_MODEL_BASE_URL": f"http://127.0.0.1:{port}",
+            "SUMMARIZATION_MODEL_NAME": "stand-in",
+            "SUMMARIZATION_MODEL_PROVIDER": "ollama",
+            "SUMMARIZATION_MODEL_ENDPOINTS": "",
+            "LLM_CACHE_BACKEND": "none",
+        }
+
+    try:
+        with patch.multiple(app_config, **overrides):
+            total, durations = await time_summaries(pages, page_chars)
+            await research_tools.close_clients()
+    finally:
+        if server is not None and serving is not None:
+            server.should_exit = True
+            await serving
+
+    durations.sort()
+    results = {result: research_tools.summaries.get(result=result) for result in ("success", "timeout", "error")}
+    print(f"model: {app_config.SUMMARIZATION_MODEL_NAME if configured else f'stand-in ({latency:.2f}s)'}")
+    print(f"pages: {pages} x {page_chars} chars, {app_config.MAX_CONCURRENT_SUMMARIES} concurrent")
+    print(f"throughput: {pages / total:.1f} summaries/s over {total:.2f}s")
+    print(
+        f"latency ms: p50 {statistics.median(durations):.1f}, p95 {durations[int(len(durations) * 0.95)]:.1f}, "
+        f"max {durations[-1]:.1f}"
+    )
+    print(f"slot wait: {research_tools.summary_wait_seconds.get():.2f}s total")
+    print("results: " + ", ".join(f"{result} {count:g}" for result, count in results.items()))
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100, help="Pages to summarize")
+    parser.add_argument("--page-chars", type=int, default=8000, help="Size of each page in characters")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stand-in latency per request in seconds")
+    parser.add_argument("--configured", action="store_true", help="Use the configured summarization model")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.pages, args.page_chars, args.latency, args.configured))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,45 +4,129 @@ Description:
     Entrypoint file for running the FastAPI server that powers a deep learning research agent. It
     allows connection via websocket for real-time streaming of agent actions.
 
+    In development mode a single worker runs with auto-reload. In production mode (APP_MODE=production) reload is
+    disabled and one worker process runs per available CPU core, with connection and admission limits shared
+    between the workers. uvicorn picks up uvloop and httptools automatically when the `production` extra is
+    installed.
+
 Author: Nathan Thomas
 """
 
-import signal
-import sys
+import asyncio
+import math
+import os
+import socket
+import tempfile
+import uuid
+from pathlib import Path
 from types import FrameType
 
 import uvicorn
+from uvicorn.supervisors import ChangeReload, Multiprocess
 
 from app.shared.config import app_config
 
 
-def signal_handler(signum: int, _frame: FrameType | None) -> None:
-    """Allow graceful shutdown of the application.
+class DrainingServer(uvicorn.Server):
+    """Uvicorn server that drains research runs before shutting down. On SIGTERM or SIGINT the server stops
+    admitting work and waits for in-flight runs (up to DRAIN_TIMEOUT_SECONDS) before uvicorn closes connections.
+    A second signal skips the rest of the drain.
+    """
+
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._drain_task: asyncio.Task[None] | None = None
+
+    async def serve(self, sockets: list[socket.socket] | None = None) -> None:
+        """Run the server, keeping hold of its event loop so that signal handlers can schedule the drain on it.
+
+        Args:
+            sockets (list[socket.socket] | None): Pre-bound sockets to serve on
+        """
+
+        self._loop = asyncio.get_running_loop()
+        await super().serve(sockets)
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        """Start draining on the first shutdown signal, and shut down immediately on the next.
+
+        Args:
+            sig (int): The signal number
+            frame (FrameType | None): The frame object
+        """
+
+        if self._loop is None or self._drain_task is not None or self.should_exit:
+            super().handle_exit(sig, frame)
+            return
+
+        print(f"\nReceived signal {sig}, draining research runs before shutting down...")
+        self._loop.call_soon_threadsafe(self._start_drain, sig, frame)
 
-    Args:
-        signum (int): The signal number.
-        _frame (FrameType | None): The frame object.
+    def _start_drain(self, sig: int, frame: FrameType | None) -> None:
+        self._drain_task = asyncio.create_task(self._drain(sig, frame))
+
+    async def _drain(self, sig: int, frame: FrameType | None) -> None:
+        # Imported here so that a reloading parent process doesn't need to import the whole application
+        from app.api import manager
+
+        try:
+            await manager.drain(app_config.DRAIN_TIMEOUT_SECONDS)
+        finally:
+            super().handle_exit(sig, frame)
+
+
+def available_cpus() -> int:
+    """Count the CPU cores this process can use, honoring both CPU affinity and container (cgroup v2) CPU quotas.
+
+    Returns:
+        int: The number of usable CPU cores, at least 1
     """
 
-    print(f"\nReceived signal {signum}, shutting down gracefully...")
-    sys.exit(0)
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            count = min(count, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, count)
 
 
 def run_server() -> None:
-    """Run the application server via uvicorn with proper signal handling."""
+    """Run the application server via uvicorn, draining research runs on shutdown."""
 
-    # Register signal handlers for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    production = app_config.APP_MODE == "production"
+    workers = (app_config.APP_WORKERS or available_cpus()) if production else 1
 
-    # Run the application server
-    uvicorn.run(
+    config = uvicorn.Config(
         "app.api.server:app",
         host=app_config.APP_HOST,
         port=app_config.APP_PORT,
         log_level=app_config.APP_LOG_LEVEL,
-        reload=app_config.APP_RELOAD,
+        reload=app_config.APP_RELOAD and not production,
+        workers=workers,
     )
+    server = DrainingServer(config)
+
+    try:
+        if config.should_reload:
+            sock = config.bind_socket()
+            ChangeReload(config, target=server.run, sockets=[sock]).run()
+        elif config.workers > 1:
+            # Workers inherit the environment, which is how they find the shared limits and recognize each other
+            with tempfile.TemporaryDirectory(prefix="research-agent-limits-") as limits_dir:
+                os.environ["APP_LAUNCH_ID"] = str(uuid.uuid4())
+                os.environ["SHARED_LIMITS_DIR"] = limits_dir
+
+                sock = config.bind_socket()
+                Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run()
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+"""Module: test_agent_utils.py
+
+Description:
+    Test cases for agent streaming utilities, including event subscription filtering for WebSocket clients.
+
+Author: Nathan Thomas
+"""
+
+from collections.abc import AsyncGenerator
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from app.agents.utils import stream_agent_for_websocket
+
+
+class FakeAgent:
+    """Minimal stand-in for a compiled LangGraph agent that replays canned stream chunks."""
+
+    def __init__(self, chunks: list[tuple[tuple[str, ...], str, Any]]) -> None:
+        self.chunks = chunks
+
+    async def astream(self, *_args: Any, **_kwargs: Any) -> AsyncGenerator[tuple[tuple[str, ...], str, Any], None]:
+        for chunk in self.chunks:
+            yield chunk
+
+
+def build_fake_agent() -> FakeAgent:
+    """Build a fake agent with one root update and one sub-agent update."""
+
+    tool_call = {"name": "tavily_search", "args": {"query": "moe routing"}, "id": "call_1"}
+    return FakeAgent(
+        [
+            ((), "updates", {"agent": {"messages": [AIMessage(content="Planning", tool_calls=[tool_call])]}}),
+            (("task:1",), "updates", {"tools": {"messages": [ToolMessage(content="Found 1", tool_call_id="call_1")]}}),
+            ((), "values", {"messages": []}),
+        ]
+    )
+
+
+async def collect(**kwargs: Any) -> list[dict[str, Any]]:
+    """Collect every event streamed for the fake agent."""
+
+    return [event async for event in stream_agent_for_websocket(build_fake_agent(), {}, **kwargs)]
+
+
+class TestStreamAgentForWebsocket:
+    """Test cases for stream_agent_for_websocket subscription filtering."""
+
+    @pytest.mark.asyncio
+    async def test_default_streams_everything(self) -> None:
+        """Test that the default subscription streams all event types from all graphs."""
+
+        events = await collect()
+
+        assert [event["event_type"] for event in events] == [
+            "status_update",
+            "tool_call",
+            "result_chunk",
+            "status_update",
+            "result_chunk",
+            "completed",
+        ]
+        assert events[1]["data"]["args"] == {"query": "moe routing"}
+
+    @pytest.mark.asyncio
+    async def test_root_only_skips_subgraphs(self) -> None:
+        """Test that root-only subscriptions drop sub-agent events."""
+
+        events = await collect(root_only=True)
+
+        assert all(event["data"].get("graph", "root") == "root" for event in events)
+        assert events[-1]["event_type"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_event_types_filter(self) -> None:
+        """Test that only subscribed event types (plus completion) are streamed."""
+
+        events = await collect(event_types={"tool_call"})
+
+        assert [event["event_type"] for event in events] == ["tool_call", "completed"]
+
+    @pytest.mark.asyncio
+    async def test_quiet_verbosity_skips_formatting(self) -> None:
+        """Test that quiet verbosity only streams assistant text and never formats suppressed messages."""
+
+        with patch("app.agents.utils.format_message_content", return_value="text") as mock_format:
+            events = await collect(verbosity="quiet")
+
+        assert [event["event_type"] for event in events] == ["result_chunk", "completed"]
+        assert mock_format.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_normal_verbosity_omits_tool_args(self) -> None:
+        """Test that normal verbosity streams tool calls without their arguments."""
+
+        events = await collect(verbosity="normal", event_types={"tool_call"})
+
+        assert events[0]["data"] == {"tool_name": "tavily_search", "tool_id": "call_1"}
@@ -0,0 +1,135 @@
+"""Module: test_cassettes.py
+
+Description:
+    Test cases for recording research runs' model, search and fetch traffic to cassettes, and replaying it.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.agents.tools import research_tools
+from app.api.websocket import WebSocketManager
+from app.shared.cassette import (
+    Cassette,
+    CassetteMissError,
+    cassette_name,
+    conversation_key,
+    read_cassette,
+    write_cassette,
+)
+from app.shared.config import app_config
+from benchmarks.fakes import FakeChatModel, FakeTavilyClient, Workload, fake_backends
+
+from .test_websocket import FakeWebSocket, wait_until_idle
+
+WORKLOAD = Workload(delegations=2, searches=1, model_latency=0, summary_latency=0, search_latency=0, page_chars=500)
+
+
+async def research(query: str) -> list[dict[str, Any]]:
+    """Run a research request through a fresh WebSocket manager and get the events it sent."""
+
+    with patch.object(app_config, "RESULT_CACHE_ENABLED", False):
+        manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+    handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+    await websocket.incoming.put(json.dumps({"query": query, "request_id": "a"}))
+    await asyncio.sleep(0.01)
+    await wait_until_idle(manager, "client")
+    await websocket.incoming.put(None)
+    await handler
+
+    return [event for event in websocket.sent if event.get("request_id") == "a"]
+
+
+class TestCassette:
+    """Test cases for Cassette and its keys."""
+
+    def test_round_trip(self, tmp_path: Path) -> None:
+        """Test that cassettes are written compactly, and that calls with the same key replay in recorded order."""
+
+        cassette = Cassette(cassette_name("MoE  routing"))
+        page = cassette.add_blob("<html>page</html>")
+        cassette.record("fetch", "https://a", {"text": page}, 0.2)
+        cassette.record("fetch", "https://a", {"text": cassette.add_blob("<html>page</html>")}, 0.1)
+        cassette.record("search", "moe", {"results": []}, 0.3)
+
+        write_cassette(cassette, str(tmp_path))
+        replayed = read_cassette(str(tmp_path), cassette_name("moe routing"))
+
+        assert len(replayed.blobs) == 1
+        assert [replayed.replay("fetch", "https://a").seconds for _ in range(2)] == [0.2, 0.1]
+        assert replayed.get_blob(replayed.interactions[0].response["text"]) == "<html>page</html>"
+        with pytest.raises(CassetteMissError):
+            replayed.replay("fetch", "https://a")
+        with pytest.raises(CassetteMissError):
+            read_cassette(str(tmp_path), cassette_name("something else"))
+
+    def test_conversation_key(self) -> None:
+        """Test that model calls are keyed by their conversation's opening and turn, not the date or system prompt."""
+
+        today = datetime.now().strftime("%a %b %-d, %Y")
+        opening = [SystemMessage(content="You research."), HumanMessage(content=f"Summarize this. Today is {today}.")]
+        replayed = [SystemMessage(content="You research, v2."), HumanMessage(content="Summarize this. Today is .")]
+
+        assert conversation_key("researcher", "research-agent", opening) == conversation_key(
+            "researcher", "research-agent", replayed
+        )
+        assert conversation_key("researcher", "research-agent", opening) != conversation_key(
+            "researcher", "research-agent", [*opening, AIMessage(content="")]
+        )
+        assert conversation_key("researcher", "research-agent", opening) != conversation_key(
+            "supervisor", "supervisor", opening
+        )
+
+
+class TestRecordReplay:
+    """Test cases for recording and replaying whole research runs."""
+
+    @pytest.mark.asyncio
+    async def test_replays_recorded_run_offline(self, tmp_path: Path) -> None:
+        """Test that a recorded run replays to the same result without calling models, search or websites, and
+        that queries without a cassette fail.
+        """
+
+        with patch.multiple(app_config, CASSETTE_MODE="record", CASSETTE_DIR=str(tmp_path)):
+            async with fake_backends(WORKLOAD):
+                original = await research("moe routing")
+
+        assert original[-1]["event_type"] == "completed"
+        assert len(list(tmp_path.iterdir())) == 1
+
+        recording = read_cassette(str(tmp_path), cassette_name("moe routing"))
+        kinds = [interaction.kind for interaction in recording.interactions]
+        assert kinds.count("search") == 2 and kinds.count("fetch") == 4 and kinds.count("model") == 10
+
+        offline = AssertionError("Replays shouldn't leave the process")
+        with (
+            patch.multiple(app_config, CASSETTE_MODE="replay", CASSETTE_DIR=str(tmp_path), CASSETTE_LATENCY_SCALE=0),
+            patch.object(FakeChatModel, "_agenerate", side_effect=offline),
+            patch.object(FakeTavilyClient, "search", side_effect=offline),
+            patch.object(research_tools, "get_http_client", side_effect=offline),
+        ):
+            async with fake_backends(WORKLOAD):
+                replayed = await research("moe routing")
+                missing = await research("sparse attention")
+
+        def results(events: list[dict[str, Any]]) -> list[str]:
+            return [event["data"]["content"] for event in events if event["event_type"] == "result_chunk"]
+
+        assert replayed[-1]["event_type"] == "completed"
+        # Saved files are named uniquely on every run, so only the report itself comes out identical
+        assert len(results(replayed)) == len(results(original))
+        assert results(replayed)[-1] == results(original)[-1]
+        assert missing[-1]["event_type"] == "error"
+        assert "No cassette" in missing[-1]["data"]["message"]
@@ -52,17 +52,80 @@ class TestBuildAppConfig:
             assert config.APP_DEBUG is False
             assert config.APP_HOST == "0.0.0.0"
             assert config.APP_LOG_LEVEL == "info"
+            assert config.APP_MODE == "development"
             assert config.APP_NAME == "deep-learning-research-agent"
             assert config.APP_PORT == 8000
             assert config.APP_RELOAD is True
+            assert config.APP_WARMUP is False
+            assert config.APP_WORKERS == 0
+            assert config.APP_LAUNCH_ID == ""
+            assert config.SHARED_LIMITS_DIR == ""
+            assert config.DRAIN_TIMEOUT_SECONDS == 25.0
+            assert config.METRICS_ENABLED is True
+            assert config.TRACING_ENABLED is False
+            assert config.TRACE_DIR == ""
+            assert config.TRACE_FORMAT == "chrome"
+            assert config.TRACE_MAX_SPANS == 10000
+            assert config.LOOP_MONITOR_ENABLED is True
+            assert config.LOOP_MONITOR_INTERVAL_SECONDS == 0.1
+            assert config.LOOP_BLOCK_THRESHOLD_SECONDS == 0.1
+            assert config.ADMIN_API_KEY == ""
+            assert config.PROFILE_MAX_SECONDS == 300.0
+            assert config.CASSETTE_MODE == "off"
+            assert config.CASSETTE_DIR == "cassettes"
+            assert config.CASSETTE_LATENCY_SCALE == 1.0
 
             # Connection limits defaults
             assert config.MAX_CONCURRENT_WEBSOCKET_CONNECTIONS == 100
+            assert config.MAX_CONCURRENT_RUNS_PER_CONNECTION == 3
 
             # Resource limits defaults
+            assert config.MAX_CONCURRENT_RESEARCH_RUNS == 10
             assert config.MAX_CONCURRENT_RESEARCH_UNITS == 1
+            assert config.MAX_QUEUED_RESEARCH_RUNS == 50
             assert config.MAX_RESEARCHER_ITERATIONS == 1
 
+            # Provider resilience defaults
+            assert config.CIRCUIT_BREAKER_COOLDOWN_SECONDS == 30
+            assert config.CIRCUIT_BREAKER_ERROR_RATE == 0.5
+            assert config.CIRCUIT_BREAKER_MIN_CALLS == 10
+            assert config.CIRCUIT_BREAKER_WINDOW_SECONDS == 60
+            assert config.PROVIDER_MAX_RETRIES == 3
+            assert config.PROVIDER_RATE_LIMITS == ""
+            assert config.PROVIDER_RETRY_BASE_SECONDS == 0.5
+            assert config.PROVIDER_RETRY_MAX_SECONDS == 20
+
+            # Token and cost accounting defaults
+            assert config.MODEL_PRICES == ""
+            assert config.RUN_COST_BUDGET_USD == 0
+            assert config.RUN_TOKEN_BUDGET == 0
+            assert config.STATE_FILES_HARD_LIMIT_BYTES == 128 * 1024 * 1024
+            assert config.STATE_FILES_SOFT_LIMIT_BYTES == 32 * 1024 * 1024
+            assert config.STATE_SPILL_DIR == ""
+
+            # Run resumption defaults
+            assert config.RUN_EVENT_BUFFER_SIZE == 1000
+            assert config.RUN_RESUME_GRACE_SECONDS == 60.0
+            assert config.RUN_RETENTION_SECONDS == 300.0
+
+            # Checkpointing defaults
+            assert config.CHECKPOINTER_BACKEND == "none"
+            assert config.CHECKPOINTER_DURABILITY == "async"
+            assert config.CHECKPOINTER_SQLITE_PATH == "checkpoints.sqlite"
+            assert config.LLM_CACHE_BACKEND == "none"
+            assert config.LLM_CACHE_MAX_ENTRIES == 1000
+            assert config.LLM_CACHE_MAX_MB == 512
+            assert config.LLM_CACHE_SQLITE_PATH == "llm_cache.sqlite"
+            assert config.LLM_CACHE_TTL_SECONDS == 86400
+            assert config.PROMPT_CACHING is True
+            assert config.CONTEXT_KEEP_RECENT_MESSAGES == 6
+            assert config.RESEARCHER_CONTEXT_TOKEN_BUDGET == 30000
+            assert config.SUPERVISOR_CONTEXT_TOKEN_BUDGET == 60000
+            assert config.RESULT_CACHE_ENABLED is False
+            assert config.RESULT_CACHE_MAX_ENTRIES == 500
+            assert config.RESULT_CACHE_SIMILARITY == 0.8
+            assert config.RESULT_CACHE_TTL_SECONDS == 21600
+
             # Model settings defaults (empty strings)
             assert config.RESEARCHER_MODEL_API_KEY == ""
             assert config.RESEARCHER_MODEL_BASE_URL == ""
@@ -72,6 +135,20 @@ class TestBuildAppConfig:
             assert config.SUPERVISOR_MODEL_BASE_URL == ""
             assert config.SUPERVISOR_MODEL_NAME == ""
             assert config.SUPERVISOR_MODEL_PROVIDER == ""
+            assert config.FALLBACK_MODEL_API_KEY == ""
+            assert config.FALLBACK_MODEL_BASE_URL == ""
+            assert config.FALLBACK_MODEL_NAME == ""
+            assert config.FALLBACK_MODEL_PROVIDER == ""
+            assert config.MAX_CONCURRENT_SUMMARIES == 8
+            assert config.SUMMARIZATION_MODEL_API_KEY == ""
+            assert config.SUMMARIZATION_MODEL_BASE_URL == ""
+            assert config.SUMMARIZATION_MODEL_NAME == "claude-3-5-sonnet-20241022"
+            assert config.SUMMARIZATION_MODEL_PROVIDER == "anthropic"
+            assert config.SUMMARIZATION_TIMEOUT_SECONDS == 60.0
+            assert config.HEDGED_MODEL_ROLES == ""
+            assert config.RESEARCHER_MODEL_ENDPOINTS == ""
+            assert config.SUMMARIZATION_MODEL_ENDPOINTS == ""
+            assert config.SUPERVISOR_MODEL_ENDPOINTS == ""
 
     def test_custom_environment_values(self) -> None:
         """Test build_app_config with custom environment values."""
@@ -80,12 +157,67 @@ class TestBuildAppConfig:
             "APP_DEBUG": "true",
             "APP_HOST": "localhost",
             "APP_LOG_LEVEL": "debug",
+            "APP_MODE": "Production",
             "APP_NAME": "custom-app",
             "APP_PORT": "9999",
             "APP_RELOAD": "false",
+            "APP_WARMUP": "true",
+            "APP_WORKERS": "4",
+            "APP_LAUNCH_ID": "launch",
+            "SHARED_LIMITS_DIR": "/tmp/limits",
+            "DRAIN_TIMEOUT_SECONDS": "5",
+            "METRICS_ENABLED": "false",
+            "TRACING_ENABLED": "true",
+            "TRACE_DIR": "/tmp/traces",
+            "TRACE_FORMAT": "otlp",
+            "TRACE_MAX_SPANS": "500",
+            "LOOP_MONITOR_ENABLED": "false",
+            "LOOP_MONITOR_INTERVAL_SECONDS": "0.5",
+            "LOOP_BLOCK_THRESHOLD_SECONDS": "0.25",
+            "ADMIN_API_KEY": "admin_key",
+            "PROFILE_MAX_SECONDS": "30",
+            "CASSETTE_MODE": "Replay",
+            "CASSETTE_DIR": "/tmp/cassettes",
+            "CASSETTE_LATENCY_SCALE": "0",
             "MAX_CONCURRENT_WEBSOCKET_CONNECTIONS": "100",
+            "MAX_CONCURRENT_RUNS_PER_CONNECTION": "2",
+            "MAX_CONCURRENT_RESEARCH_RUNS": "4",
             "MAX_CONCURRENT_RESEARCH_UNITS": "5",
+            "MAX_QUEUED_RESEARCH_RUNS": "8",
             "MAX_RESEARCHER_ITERATIONS": "10",
+            "CIRCUIT_BREAKER_COOLDOWN_SECONDS": "5",
+            "CIRCUIT_BREAKER_ERROR_RATE": "0.25",
+            "CIRCUIT_BREAKER_MIN_CALLS": "4",
+            "CIRCUIT_BREAKER_WINDOW_SECONDS": "10",
+            "PROVIDER_MAX_RETRIES": "1",
+            "PROVIDER_RATE_LIMITS": "anthropic=50,tavily=100",
+            "PROVIDER_RETRY_BASE_SECONDS": "0.1",
+            "PROVIDER_RETRY_MAX_SECONDS": "2",
+            "MODEL_PRICES": "gpt-4o=2.5:10",
+            "RUN_COST_BUDGET_USD": "0.5",
+            "RUN_TOKEN_BUDGET": "200000",
+            "STATE_FILES_HARD_LIMIT_BYTES": "4000000",
+            "STATE_FILES_SOFT_LIMIT_BYTES": "1000000",
+            "STATE_SPILL_DIR": "/tmp/spill",
+            "RUN_EVENT_BUFFER_SIZE": "10",
+            "RUN_RESUME_GRACE_SECONDS": "2.5",
+            "RUN_RETENTION_SECONDS": "30",
+            "CHECKPOINTER_BACKEND": "SQLite",
+            "CHECKPOINTER_DURABILITY": "sync",
+            "CHECKPOINTER_SQLITE_PATH": "/tmp/runs.sqlite",
+            "LLM_CACHE_BACKEND": "SQLite",
+            "LLM_CACHE_MAX_ENTRIES": "50",
+            "LLM_CACHE_MAX_MB": "1.5",
+            "LLM_CACHE_SQLITE_PATH": "/tmp/llm.sqlite",
+            "LLM_CACHE_TTL_SECONDS": "0",
+            "PROMPT_CACHING": "false",
+            "CONTEXT_KEEP_RECENT_MESSAGES": "4",
+            "RESEARCHER_CONTEXT_TOKEN_BUDGET": "0",
+            "SUPERVISOR_CONTEXT_TOKEN_BUDGET": "20000",
+            "RESULT_CACHE_ENABLED": "true",
+            "RESULT_CACHE_MAX_ENTRIES": "20",
+            "RESULT_CACHE_SIMILARITY": "0.9",
+            "RESULT_CACHE_TTL_SECONDS": "60",
             "RESEARCHER_MODEL_API_KEY": "researcher-key",
             "RESEARCHER_MODEL_BASE_URL": "https://researcher.api.com",
             "RESEARCHER_MODEL_NAME": "researcher-model",
@@ -94,6 +226,20 @@ class TestBuildAppConfig:
             "SUPERVISOR_MODEL_BASE_URL": "https://supervisor.api.com",
             "SUPERVISOR_MODEL_NAME": "supervisor-model",
             "SUPERVISOR_MODEL_PROVIDER": "supervisor-provider",
+            "FALLBACK_MODEL_API_KEY": "fallback-key",
+            "FALLBACK_MODEL_BASE_URL": "https://fallback.api.com",
+            "FALLBACK_MODEL_NAME": "fallback-model",
+            "FALLBACK_MODEL_PROVIDER": "fallback-provider",
+            "MAX_CONCURRENT_SUMMARIES": "16",
+            "SUMMARIZATION_MODEL_API_KEY": "summarization-key",
+            "SUMMARIZATION_MODEL_BASE_URL": "http://localhost:11434",
+            "SUMMARIZATION_MODEL_NAME": "llama3.2",
+            "SUMMARIZATION_MODEL_PROVIDER": "ollama",
+            "SUMMARIZATION_TIMEOUT_SECONDS": "15",
+            "HEDGED_MODEL_ROLES": "supervisor,summarization",
+            "RESEARCHER_MODEL_ENDPOINTS": "gpt-4o-mini",
+            "SUMMARIZATION_MODEL_ENDPOINTS": "ollama:llama3.1@http://gpu-2:11434",
+            "SUPERVISOR_MODEL_ENDPOINTS": "gpt-4o@https://eu.api.com",
         }
 
         with patch.dict(os.environ, env_vars, clear=True):
@@ -103,17 +249,80 @@ class TestBuildAppConfig:
             assert config.APP_DEBUG is True
             assert config.APP_HOST == "localhost"
             assert config.APP_LOG_LEVEL == "debug"
+            assert config.APP_MODE == "production"
             assert config.APP_NAME == "custom-app"
             assert config.APP_PORT == 9999
             assert config.APP_RELOAD is False
+            assert config.APP_WARMUP is True
+            assert config.APP_WORKERS == 4
+            assert config.APP_LAUNCH_ID == "launch"
+            assert config.SHARED_LIMITS_DIR == "/tmp/limits"
+            assert config.DRAIN_TIMEOUT_SECONDS == 5.0
+            assert config.METRICS_ENABLED is False
+            assert config.TRACING_ENABLED is True
+            assert config.TRACE_DIR == "/tmp/traces"
+            assert config.TRACE_FORMAT == "otlp"
+            assert config.TRACE_MAX_SPANS == 500
+            assert config.LOOP_MONITOR_ENABLED is False
+            assert config.LOOP_MONITOR_INTERVAL_SECONDS == 0.5
+            assert config.LOOP_BLOCK_THRESHOLD_SECONDS == 0.25
+            assert config.ADMIN_API_KEY == "admin_key"
+            assert config.PROFILE_MAX_SECONDS == 30.0
+            assert config.CASSETTE_MODE == "replay"
+            assert config.CASSETTE_DIR == "/tmp/cassettes"
+            assert config.CASSETTE_LATENCY_SCALE == 0.0
 
             # Connection limits
             assert config.MAX_CONCURRENT_WEBSOCKET_CONNECTIONS == 100
+            assert config.MAX_CONCURRENT_RUNS_PER_CONNECTION == 2
 
             # Resource limits
+            assert config.MAX_CONCURRENT_RESEARCH_RUNS == 4
             assert config.MAX_CONCURRENT_RESEARCH_UNITS == 5
+            assert config.MAX_QUEUED_RESEARCH_RUNS == 8
             assert config.MAX_RESEARCHER_ITERATIONS == 10
 
+            # Provider resilience
+            assert config.CIRCUIT_BREAKER_COOLDOWN_SECONDS == 5
+            assert config.CIRCUIT_BREAKER_ERROR_RATE == 0.25
+            assert config.CIRCUIT_BREAKER_MIN_CALLS == 4
+            assert config.CIRCUIT_BREAKER_WINDOW_SECONDS == 10
+            assert config.PROVIDER_MAX_RETRIES == 1
+            assert config.PROVIDER_RATE_LIMITS == "anthropic=50,tavily=100"
+            assert config.PROVIDER_RETRY_BASE_SECONDS == 0.1
+            assert config.PROVIDER_RETRY_MAX_SECONDS == 2
+
+            # Token and cost accounting
+            assert config.MODEL_PRICES == "gpt-4o=2.5:10"
+            assert config.RUN_COST_BUDGET_USD == 0.5
+            assert config.RUN_TOKEN_BUDGET == 200000
+            assert config.STATE_FILES_HARD_LIMIT_BYTES == 4000000
+            assert config.STATE_FILES_SOFT_LIMIT_BYTES == 1000000
+            assert config.STATE_SPILL_DIR == "/tmp/spill"
+
+            # Run resumption
+            assert config.RUN_EVENT_BUFFER_SIZE == 10
+            assert config.RUN_RESUME_GRACE_SECONDS == 2.5
+            assert config.RUN_RETENTION_SECONDS == 30.0
+
+            # Checkpointing
+            assert config.CHECKPOINTER_BACKEND == "sqlite"
+            assert config.CHECKPOINTER_DURABILITY == "sync"
+            assert config.CHECKPOINTER_SQLITE_PATH == "/tmp/runs.sqlite"
+            assert config.LLM_CACHE_BACKEND == "sqlite"
+            assert config.LLM_CACHE_MAX_ENTRIES == 50
+            assert config.LLM_CACHE_MAX_MB == 1.5
+            assert config.LLM_CACHE_SQLITE_PATH == "/tmp/llm.sqlite"
+            assert config.LLM_CACHE_TTL_SECONDS == 0
+            assert config.PROMPT_CACHING is False
+            assert config.CONTEXT_KEEP_RECENT_MESSAGES == 4
+            assert config.RESEARCHER_CONTEXT_TOKEN_BUDGET == 0
+            assert config.SUPERVISOR_CONTEXT_TOKEN_BUDGET == 20000
+            assert config.RESULT_CACHE_ENABLED is True
+            assert config.RESULT_CACHE_MAX_ENTRIES == 20
+            assert config.RESULT_CACHE_SIMILARITY == 0.9
+            assert config.RESULT_CACHE_TTL_SECONDS == 60
+
             # Researcher model settings
             assert config.RESEARCHER_MODEL_API_KEY == "researcher-key"
             assert config.RESEARCHER_MODEL_BASE_URL == "https://researcher.api.com"
@@ -126,6 +335,26 @@ class TestBuildAppConfig:
             assert config.SUPERVISOR_MODEL_NAME == "supervisor-model"
             assert config.SUPERVISOR_MODEL_PROVIDER == "supervisor-provider"
 
+            # Fallback model settings
+            assert config.FALLBACK_MODEL_API_KEY == "fallback-key"
+            assert config.FALLBACK_MODEL_BASE_URL == "https://fallback.api.com"
+            assert config.FALLBACK_MODEL_NAME == "fallback-model"
+            assert config.FALLBACK_MODEL_PROVIDER == "fallback-provider"
+
+            # Summarization model settings
+            assert config.MAX_CONCURRENT_SUMMARIES == 16
+            assert config.SUMMARIZATION_MODEL_API_KEY == "summarization-key"
+            assert config.SUMMARIZATION_MODEL_BASE_URL == "http://localhost:11434"
+            assert config.SUMMARIZATION_MODEL_NAME == "llama3.2"
+            assert config.SUMMARIZATION_MODEL_PROVIDER == "ollama"
+            assert config.SUMMARIZATION_TIMEOUT_SECONDS == 15.0
+
+            # Model routing settings
+            assert config.HEDGED_MODEL_ROLES == "supervisor,summarization"
+            assert config.RESEARCHER_MODEL_ENDPOINTS == "gpt-4o-mini"
+            assert config.SUMMARIZATION_MODEL_ENDPOINTS == "ollama:llama3.1@http://gpu-2:11434"
+            assert config.SUPERVISOR_MODEL_ENDPOINTS == "gpt-4o@https://eu.api.com"
+
     def test_boolean_parsing(self) -> None:
         """Test boolean environment variable parsing."""
 
@@ -176,12 +405,67 @@ class TestBuildAppConfig:
             "APP_DEBUG",
             "APP_HOST",
             "APP_LOG_LEVEL",
+            "APP_MODE",
             "APP_NAME",
             "APP_PORT",
             "APP_RELOAD",
+            "APP_WARMUP",
+            "APP_WORKERS",
+            "APP_LAUNCH_ID",
+            "SHARED_LIMITS_DIR",
+            "DRAIN_TIMEOUT_SECONDS",
+            "METRICS_ENABLED",
+            "TRACING_ENABLED",
+            "TRACE_DIR",
+            "TRACE_FORMAT",
+            "TRACE_MAX_SPANS",
+            "LOOP_MONITOR_ENABLED",
+            "LOOP_MONITOR_INTERVAL_SECONDS",
+            "LOOP_BLOCK_THRESHOLD_SECONDS",
+            "ADMIN_API_KEY",
+            "PROFILE_MAX_SECONDS",
+            "CASSETTE_MODE",
+            "CASSETTE_DIR",
+            "CASSETTE_LATENCY_SCALE",
             "MAX_CONCURRENT_WEBSOCKET_CONNECTIONS",
+            "MAX_CONCURRENT_RUNS_PER_CONNECTION",
+            "MAX_CONCURRENT_RESEARCH_RUNS",
             "MAX_CONCURRENT_RESEARCH_UNITS",
+            "MAX_QUEUED_RESEARCH_RUNS",
             "MAX_RESEARCHER_ITERATIONS",
+            "CIRCUIT_BREAKER_COOLDOWN_SECONDS",
+            "CIRCUIT_BREAKER_ERROR_RATE",
+            "CIRCUIT_BREAKER_MIN_CALLS",
+            "CIRCUIT_BREAKER_WINDOW_SECONDS",
+            "PROVIDER_MAX_RETRIES",
+            "PROVIDER_RATE_LIMITS",
+            "PROVIDER_RETRY_BASE_SECONDS",
+            "PROVIDER_RETRY_MAX_SECONDS",
+            "MODEL_PRICES",
+            "RUN_COST_BUDGET_USD",
+            "RUN_TOKEN_BUDGET",
+            "STATE_FILES_HARD_LIMIT_BYTES",
+            "STATE_FILES_SOFT_LIMIT_BYTES",
+            "STATE_SPILL_DIR",
+            "RUN_EVENT_BUFFER_SIZE",
+            "RUN_RESUME_GRACE_SECONDS",
+            "RUN_RETENTION_SECONDS",
+            "CHECKPOINTER_BACKEND",
+            "CHECKPOINTER_DURABILITY",
+            "CHECKPOINTER_SQLITE_PATH",
+            "LLM_CACHE_BACKEND",
+            "LLM_CACHE_MAX_ENTRIES",
+            "LLM_CACHE_MAX_MB",
+            "LLM_CACHE_SQLITE_PATH",
+            "LLM_CACHE_TTL_SECONDS",
+            "PROMPT_CACHING",
+            "CONTEXT_KEEP_RECENT_MESSAGES",
+            "RESEARCHER_CONTEXT_TOKEN_BUDGET",
+            "SUPERVISOR_CONTEXT_TOKEN_BUDGET",
+            "RESULT_CACHE_ENABLED",
+            "RESULT_CACHE_MAX_ENTRIES",
+            "RESULT_CACHE_SIMILARITY",
+            "RESULT_CACHE_TTL_SECONDS",
             "RESEARCHER_MODEL_API_KEY",
             "RESEARCHER_MODEL_BASE_URL",
             "RESEARCHER_MODEL_NAME",
@@ -190,6 +474,14 @@ class TestBuildAppConfig:
             "SUPERVISOR_MODEL_BASE_URL",
             "SUPERVISOR_MODEL_NAME",
             "SUPERVISOR_MODEL_PROVIDER",
+            "FALLBACK_MODEL_API_KEY",
+            "FALLBACK_MODEL_BASE_URL",
+            "FALLBACK_MODEL_NAME",
+            "FALLBACK_MODEL_PROVIDER",
+            "HEDGED_MODEL_ROLES",
+            "RESEARCHER_MODEL_ENDPOINTS",
+            "SUMMARIZATION_MODEL_ENDPOINTS",
+            "SUPERVISOR_MODEL_ENDPOINTS",
         ]
 
         for attr in required_attributes:
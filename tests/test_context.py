@@ -0,0 +1,125 @@
+"""Module: test_context.py
+
+Description:
+    Test cases for keeping agents' model input within a token budget.
+
+Author: Nathan Thomas
+"""
+
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.agents import agents
+from app.agents.context import build_context_hook, context_tokens_saved, trim_context
+from app.agents.utils import stream_agent_for_websocket
+
+from .test_agent_utils import FakeAgent
+from .test_prompt_caching import RecordingChatModel
+
+
+def build_conversation(rounds: int) -> list[AnyMessage]:
+    """Build a conversation with a search round of a large tool result per round."""
+
+    messages: list[AnyMessage] = [SystemMessage(content="You are a researcher"), HumanMessage(content="moe routing")]
+    for index in range(rounds):
+        tool_call = {"name": "tavily_search", "args": {"query": f"moe {index}"}, "id": f"call_{index}"}
+        messages.append(AIMessage(content=f"Searching {index}", tool_calls=[tool_call]))
+        messages.append(ToolMessage(content="result " * 1000, tool_call_id=f"call_{index}", name="tavily_search"))
+    messages.append(AIMessage(content="Done"))
+
+    return messages
+
+
+class TestTrimContext:
+    """Test cases for trim_context."""
+
+    def test_under_budget_is_unchanged(self) -> None:
+        """Test that a conversation within budget is sent as is."""
+
+        messages = build_conversation(2)
+        view, elided, saved = trim_context(messages, [], budget=100_000, keep_recent=2)
+
+        assert view == messages
+        assert elided == []
+        assert saved == 0
+
+    def test_elides_old_tool_results_only(self) -> None:
+        """Test that old tool results are removed until well under budget, keeping the system prompt, the task,
+        assistant messages and recent messages intact.
+        """
+
+        messages = build_conversation(6)
+        view, elided, saved = trim_context(messages, [], budget=8_000, keep_recent=3)
+
+        assert elided == ["call_0", "call_1", "call_2", "call_3"]
+        assert saved > 0
+        assert view[:2] == messages[:2]
+        assert view[-3:] == messages[-3:]
+        assert [m for m in view if isinstance(m, AIMessage)] == [m for m in messages if isinstance(m, AIMessage)]
+
+        removed = [m for m in view if isinstance(m, ToolMessage) and m.tool_call_id in elided]
+        assert all("read_file" in str(m.content) for m in removed)
+        assert [m.tool_call_id for m in view if isinstance(m, ToolMessage)] == [f"call_{i}" for i in range(6)]
+
+    def test_elision_is_sticky(self) -> None:
+        """Test that tool results removed on an earlier turn stay removed, so the start of the context is stable."""
+
+        messages = build_conversation(6)
+        first_view, elided, _ = trim_context(messages, [], budget=8_000, keep_recent=3)
+        second_view, second_elided, _ = trim_context(messages, elided, budget=1_000_000, keep_recent=3)
+
+        assert second_elided == elided
+        assert second_view == first_view
+
+
+class TestContextHook:
+    """Test cases for the context hook on agents."""
+
+    def test_no_budget_has_no_hook(self) -> None:
+        """Test that agents without a budget send the whole conversation."""
+
+        assert build_context_hook("researcher", 0, 6) is None
+
+    @pytest.mark.asyncio
+    async def test_supervisor_sends_trimmed_context(self) -> None:
+        """Test that the supervisor's model gets the trimmed conversation while its state keeps all of it."""
+
+        model = RecordingChatModel()
+        saved_before = context_tokens_saved.get(agent="supervisor")
+
+        with (
+            patch.object(agents, "get_supervisor_model", return_value=model),
+            patch.object(agents, "get_researcher_model", return_value=model),
+            patch.object(agents.app_config, "SUPERVISOR_CONTEXT_TOKEN_BUDGET", 8_000),
+            patch.object(agents.app_config, "CONTEXT_KEEP_RECENT_MESSAGES", 3),
+        ):
+            agent = agents.build_supervisor_agent()
+
+        conversation = build_conversation(6)[1:] + [HumanMessage(content="Now compare them")]
+        result = await agent.ainvoke({"messages": conversation})
+
+        sent, _ = model.requests[-1]
+        sent_results = [m for m in sent if isinstance(m, ToolMessage)]
+        assert "read_file" in str(sent_results[0].content)
+        assert sent_results[-1].content == conversation[-3].content
+
+        assert result["messages"][2].content == conversation[2].content
+        assert result["elided_tool_results"][0] == "call_0"
+        assert context_tokens_saved.get(agent="supervisor") > saved_before
+
+    @pytest.mark.asyncio
+    async def test_hook_updates_are_not_streamed(self) -> None:
+        """Test that the context hook's copy of the conversation isn't re-sent to WebSocket clients."""
+
+        agent = FakeAgent(
+            [
+                ((), "updates", {"pre_model_hook": {"llm_input_messages": build_conversation(2)}}),
+                ((), "updates", {"agent": {"messages": [AIMessage(content="Done")]}}),
+            ]
+        )
+
+        events = [event async for event in stream_agent_for_websocket(agent, {})]
+
+        assert [event["data"].get("node") for event in events if event["event_type"] == "status_update"] == ["agent"]
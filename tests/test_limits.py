@@ -0,0 +1,92 @@
+"""Module: test_limits.py
+
+Description:
+    Test cases for process-local and cross-process slot limiters.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.api.scheduler import ResearchScheduler
+from app.shared.limits import SharedSlotLimiter, SlotLimiter
+
+
+def dead_pid() -> int:
+    """Get the PID of a process that has already exited."""
+
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+class TestSlotLimiter:
+    """Test cases for SlotLimiter."""
+
+    def test_limits_slots(self) -> None:
+        """Test that slots can't be taken beyond the limit until one is released."""
+
+        limiter = SlotLimiter(2)
+
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+
+        limiter.release()
+        assert limiter.try_acquire()
+        assert limiter.in_use == 2
+
+
+class TestSharedSlotLimiter:
+    """Test cases for SharedSlotLimiter."""
+
+    def test_counts_slots_held_by_other_processes(self, tmp_path: Path) -> None:
+        """Test that slots held by other live processes count against the shared limit."""
+
+        path = tmp_path / "connections.json"
+        path.write_text(json.dumps({str(os.getppid()): 2}))
+        limiter = SharedSlotLimiter(3, str(path))
+
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        assert limiter.in_use == 3
+
+        limiter.release()
+        assert json.loads(path.read_text()) == {str(os.getppid()): 2}
+
+    def test_reclaims_slots_of_dead_processes(self, tmp_path: Path) -> None:
+        """Test that slots held by a process that has exited are freed for everyone else."""
+
+        path = tmp_path / "connections.json"
+        path.write_text(json.dumps({str(dead_pid()): 3}))
+        limiter = SharedSlotLimiter(3, str(path))
+
+        assert limiter.try_acquire()
+        assert json.loads(path.read_text()) == {str(os.getpid()): 1}
+
+    @pytest.mark.asyncio
+    async def test_scheduler_notices_slots_freed_elsewhere(self, tmp_path: Path) -> None:
+        """Test that a queued run starts once another worker frees a shared slot."""
+
+        path = str(tmp_path / "research_runs.json")
+        other_worker = SharedSlotLimiter(1, path)
+        assert other_worker.try_acquire()
+
+        slots = SharedSlotLimiter(1, path)
+        slots.poll_interval = 0.01
+        scheduler = ResearchScheduler(max_active=1, max_queued=5, slots=slots)
+
+        waiter = asyncio.create_task(scheduler.acquire("client"))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        other_worker.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert scheduler.active == 1
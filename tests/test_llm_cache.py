@@ -0,0 +1,135 @@
+"""Module: test_llm_cache.py
+
+Description:
+    Test cases for the LLM response cache and its memory and SQLite tiers.
+
+Author: Nathan Thomas
+"""
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+from app.agents.llm_cache import LLMCache, ModelResponseCache, llm_cache_lookups
+
+
+def build_model(cache: LLMCache, model: str = "fake") -> GenericFakeChatModel:
+    """Build a chat model that answers with numbered responses, so that cached responses can be recognized."""
+
+    responses = iter(AIMessage(content=f"response {index}", id=f"message-{index}") for index in range(100))
+    return GenericFakeChatModel(messages=responses, cache=ModelResponseCache(cache, model))
+
+
+def generation(content: str) -> list[Generation]:
+    """Build a response to store in the cache."""
+
+    return [ChatGeneration(message=AIMessage(content=content))]
+
+
+class TestModelResponseCache:
+    """Test cases for caching model calls."""
+
+    @pytest.mark.asyncio
+    async def test_repeated_call_is_cached(self) -> None:
+        """Test that a repeated call is answered from the cache, while a different call goes to the model."""
+
+        model = build_model(LLMCache(ttl_seconds=0, max_entries=10), model="cached-model")
+        question = [HumanMessage(content="What is a mixture of experts?")]
+
+        first = await model.ainvoke(question)
+        repeated = await model.ainvoke(question)
+        different = await model.ainvoke([HumanMessage(content="What is attention?")])
+
+        assert first.content == repeated.content == "response 0"
+        assert different.content == "response 1"
+        assert repeated.response_metadata["cached"] is True
+        assert "cached" not in first.response_metadata
+        assert repeated.id != first.id
+        assert llm_cache_lookups.get(model="cached-model", result="hit") == 1
+        assert llm_cache_lookups.get(model="cached-model", result="miss") == 2
+
+    @pytest.mark.asyncio
+    async def test_key_includes_tools(self) -> None:
+        """Test that the same messages with different tools bound aren't answered from each other's cache."""
+
+        cache = LLMCache(ttl_seconds=0, max_entries=10)
+        model = build_model(cache)
+        question = [HumanMessage(content="What is a mixture of experts?")]
+
+        await model.ainvoke(question)
+        with_tools = await model.bind(tools=[{"name": "search"}]).ainvoke(question)
+
+        assert with_tools.content == "response 1"
+
+    @pytest.mark.asyncio
+    async def test_expired_responses_are_refetched(self) -> None:
+        """Test that a response is fetched again once its TTL has passed."""
+
+        model = build_model(LLMCache(ttl_seconds=60, max_entries=10))
+        question = [HumanMessage(content="What is a mixture of experts?")]
+
+        with patch("app.agents.llm_cache.time.time", return_value=1000):
+            await model.ainvoke(question)
+        with patch("app.agents.llm_cache.time.time", return_value=1059):
+            assert (await model.ainvoke(question)).content == "response 0"
+        with patch("app.agents.llm_cache.time.time", return_value=1061):
+            assert (await model.ainvoke(question)).content == "response 1"
+
+
+class TestLLMCache:
+    """Test cases for the cache tiers."""
+
+    def test_memory_tier_evicts_least_recently_used(self) -> None:
+        """Test that the memory tier keeps its most recently used responses once it's full."""
+
+        cache = LLMCache(ttl_seconds=0, max_entries=2)
+        cache.put_memory("a", generation("a"), 0)
+        cache.put_memory("b", generation("b"), 0)
+        cache.get_memory("a")
+        cache.put_memory("c", generation("c"), 0)
+
+        assert cache.get_memory("a") is not None
+        assert cache.get_memory("b") is None
+        assert cache.get_memory("c") is not None
+
+    @pytest.mark.asyncio
+    async def test_sqlite_tier_survives_reopening(self, tmp_path: Path) -> None:
+        """Test that responses stored in SQLite are served after the cache is reopened, e.g. by another worker."""
+
+        path = str(tmp_path / "llm_cache.sqlite")
+        question = [HumanMessage(content="What is a mixture of experts?")]
+
+        cache = LLMCache(ttl_seconds=0, max_entries=10, sqlite_path=path)
+        await build_model(cache).ainvoke(question)
+        cache.close()
+
+        cache = LLMCache(ttl_seconds=0, max_entries=10, sqlite_path=path)
+        reopened = await build_model(cache).ainvoke(question)
+        cache.close()
+
+        assert reopened.content == "response 0"
+        assert reopened.response_metadata["cached"] is True
+
+    def test_sqlite_tier_evicts_beyond_size_limit(self, tmp_path: Path) -> None:
+        """Test that the SQLite tier drops its least recently used responses once it's over its size limit."""
+
+        # Room for two responses but not three
+        cache = LLMCache(ttl_seconds=0, max_entries=10, sqlite_path=str(tmp_path / "llm_cache.sqlite"))
+        cache.max_sqlite_bytes = len(dumps(generation("a"))) * 5 // 2
+
+        for now, step in enumerate(["a", "b", "read a", "c"]):
+            with patch("app.agents.llm_cache.time.time", return_value=now):
+                if step == "read a":
+                    cache.get_persistent("a")
+                else:
+                    cache.put_persistent(step, generation(step), 0)
+
+        assert cache.get_persistent("a") is not None
+        assert cache.get_persistent("b") is None
+        assert cache.get_persistent("c") is not None
+        cache.close()
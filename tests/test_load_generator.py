@@ -0,0 +1,95 @@
+"""Module: test_load_generator.py
+
+Description:
+    Test cases for the WebSocket load generator, run against the server with fake backends.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+import uvicorn
+
+from app.shared.config import app_config
+from app.shared.limits import build_slot_limiter
+from benchmarks.fakes import Workload, fake_backends
+from benchmarks.load_generator import run_load, summarize
+from benchmarks.summarization_throughput import free_port
+
+WORKLOAD = Workload(delegations=1, searches=1, model_latency=0, summary_latency=0, search_latency=0, page_chars=500)
+
+
+@pytest_asyncio.fixture
+async def url() -> AsyncIterator[str]:
+    """Serve the app with fake backends on a free port, and get its WebSocket URL."""
+
+    with patch.object(app_config, "APP_VERSION", "test"):
+        from app.api import server
+
+    from app.api.websocket import manager
+
+    port = free_port()
+    uvicorn_server = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    # Shutting down leaves the shared manager draining, so it's reset for the next server. Cached results would
+    # let repeated queries skip the pipeline.
+    with (
+        patch.object(app_config, "APP_WARMUP", False),
+        patch.multiple(manager, draining=False, result_cache=None),
+    ):
+        async with fake_backends(WORKLOAD):
+            task = asyncio.create_task(uvicorn_server.serve())
+            while not uvicorn_server.started:
+                await asyncio.sleep(0.01)
+
+            yield f"ws://127.0.0.1:{port}/ws"
+
+            uvicorn_server.should_exit = True
+            await task
+
+
+class TestLoadGenerator:
+    """Test cases for run_load and its report."""
+
+    def test_summarize(self) -> None:
+        """Test that distributions are summarized by their percentiles, and empty ones not at all."""
+
+        summary = summarize([float(value) for value in range(1, 101)])
+
+        assert summary is not None
+        assert summary["p50"] == 51 and summary["p99"] == 100 and summary["max"] == 100 and summary["count"] == 100
+        assert summarize([]) is None
+
+    @pytest.mark.asyncio
+    async def test_reports_completed_queries(self, url: str) -> None:
+        """Test that queries submitted across connections all complete, with their timings and the server's
+        resource use in the report.
+        """
+
+        report = await run_load(url, clients=3, rate=50, requests=6, timeout=30, query="Load test {n}")
+
+        assert report["connections"]["accepted"] == 3 and report["connections"]["rejected"] == 0
+        assert report["requests"]["completed"] == 6 and report["requests"]["errors"] == {}
+        assert report["time_to_first_event_ms"]["count"] == 6
+        assert report["completion_ms"]["p50"] >= report["time_to_first_event_ms"]["p50"]
+        assert report["event_latency_ms"]["count"] > 6
+        assert report["server"]["cpu_seconds"] > 0 and report["server"]["max_rss_bytes"] > 0
+        assert report["server"]["peak_connections"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_counts_rejected_connections(self, url: str) -> None:
+        """Test that connections turned away by the server's connection limit are counted as rejected."""
+
+        from app.api.websocket import manager
+
+        with patch.object(manager, "connection_slots", build_slot_limiter("connections", 1)):
+            report = await run_load(
+                url, clients=3, rate=50, requests=2, timeout=30, query="Load test {n}", scrape=False
+            )
+
+        assert report["connections"]["accepted"] == 1 and report["connections"]["rejected"] == 2
+        assert report["requests"]["completed"] == 2
+        assert report["server"] is None
@@ -0,0 +1,77 @@
+"""Module: test_loop_monitor.py
+
+Description:
+    Test cases for the event loop monitor: lag measurement and the detection of calls blocking the loop.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import sys
+import time
+
+import pytest
+
+from app.shared.loop_monitor import LoopMonitor, call_site
+from app.shared.loop_monitor.loop_monitor import loop_blocks, loop_lag
+
+
+def block_loop(seconds: float) -> None:
+    """Block the calling thread, standing in for sync work run on the event loop."""
+
+    time.sleep(seconds)
+
+
+class TestLoopMonitor:
+    """Test cases for LoopMonitor."""
+
+    @pytest.mark.asyncio
+    async def test_catches_blocking_call_site(self, capsys: pytest.CaptureFixture[str]) -> None:
+        """Test that a call blocking the loop is attributed to its call site, counted, and logged with its stack
+        only the first time.
+        """
+
+        monitor = LoopMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.03)
+            for _ in range(2):
+                block_loop(0.2)
+                await asyncio.sleep(0.03)
+        finally:
+            await monitor.stop()
+
+        [site] = monitor.sites
+        assert site.startswith("test_loop_monitor.py:") and site.endswith("(block_loop)")
+        assert monitor.sites[site].blocks == 2
+        assert monitor.sites[site].max_blocked_seconds >= 0.15
+        assert "in block_loop" in monitor.sites[site].stack
+        assert loop_blocks.get(site=site) == 2
+
+        logged = capsys.readouterr().out
+        assert logged.count(f"at {site}") == 2
+        assert logged.count("sampled from") == 1
+
+    @pytest.mark.asyncio
+    async def test_measures_lag_without_blocks(self) -> None:
+        """Test that lag is recorded every interval, and that a loop that isn't blocked has no blocked call sites."""
+
+        heartbeats = loop_lag.get()
+        monitor = LoopMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        try:
+            for _ in range(10):
+                await asyncio.sleep(0.005)
+        finally:
+            await monitor.stop()
+
+        assert loop_lag.get() > heartbeats
+        assert monitor.sites == {}
+
+    def test_call_site_outside_the_app(self) -> None:
+        """Test that stacks without application frames are described by their innermost frame."""
+
+        frame = sys._getframe()
+
+        assert call_site(frame) == f"test_loop_monitor.py:{frame.f_lineno} (test_call_site_outside_the_app)"
+        assert call_site(None) == "unknown"
@@ -0,0 +1,236 @@
+"""Module: test_memory.py
+
+Description:
+    Test cases for memory accounting of research runs and the caps on the files kept in agent state.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncGenerator, Iterator
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agents import agents
+from app.agents.memory import (
+    RAW_CONTENT_EVICTED,
+    SPILLED_FILE_PREFIX,
+    RunMemory,
+    _spill_writer,
+    current_run_memory,
+    enforce_file_limits,
+    file_evictions,
+    record_state,
+    remove_spilled_files,
+    spill_failures,
+)
+from app.agents.prompt_caching import ModelUsageHandler
+from app.agents.state import file_reducer
+from app.agents.tools.file_tools import read_file
+from app.agents.utils import stream_agent_for_websocket
+from app.api.websocket import WebSocketManager
+from app.shared.config import app_config
+
+from .test_usage import ScriptedChatModel, delegate
+from .test_websocket import FakeWebSocket, wait_until_idle
+
+
+def search_result(title: str, raw_size: int) -> str:
+    """Build a file like the ones `tavily_search` saves, with a given amount of raw page content."""
+
+    return f"# Search Result: {title}\n\n## Summary\nAbout {title}.\n\n## Raw Content\n{'x' * raw_size}\n"
+
+
+@pytest.fixture(autouse=True)
+def limits(tmp_path: Path) -> Iterator[None]:
+    """Cap files at 1,000 characters (soft) and 3,000 characters (hard), spilling into a temporary directory."""
+
+    with (
+        patch.object(app_config, "STATE_FILES_SOFT_LIMIT_BYTES", 1000),
+        patch.object(app_config, "STATE_FILES_HARD_LIMIT_BYTES", 3000),
+        patch.object(app_config, "STATE_SPILL_DIR", str(tmp_path)),
+    ):
+        yield
+
+
+async def growing_stream(*_args: Any, **_kwargs: Any) -> AsyncGenerator[dict[str, Any], None]:
+    """Stand-in for stream_agent_for_websocket whose state grows between its events."""
+
+    record_state("", {"messages": [HumanMessage(content="moe routing")], "files": {}})
+    yield {"event_type": "status_update", "data": {"graph": "root", "node": "agent", "status": "processing"}}
+    record_state("", {"messages": [HumanMessage(content="moe routing")], "files": {"a.md": search_result("a", 5000)}})
+    await asyncio.sleep(0)
+    yield {"event_type": "completed", "data": {"message": "Research completed successfully"}}
+
+
+async def spilling_stream(*_args: Any, **_kwargs: Any) -> AsyncGenerator[dict[str, Any], None]:
+    """Stand-in for stream_agent_for_websocket whose files go over the hard limit."""
+
+    file_reducer({}, {"notes.md": "n" * 3500})
+    yield {"event_type": "completed", "data": {"message": "Research completed successfully"}}
+
+
+class TestFileLimits:
+    """Test cases for enforce_file_limits and the files reducer."""
+
+    def test_under_limits_untouched(self) -> None:
+        """Test that files under the soft limit are left as they are."""
+
+        files = {"a.md": search_result("a", 100), "notes.md": "Notes"}
+
+        assert enforce_file_limits(files) is files
+
+    def test_soft_limit_evicts_oldest_raw_content(self) -> None:
+        """Test that going over the soft limit evicts the raw content of the oldest search results first, and
+        leaves files without raw content alone.
+        """
+
+        evictions = file_evictions.get(action="raw_content")
+        files = {"notes.md": "n" * 300, "a.md": search_result("a", 500), "b.md": search_result("b", 500)}
+
+        capped = enforce_file_limits(files)
+
+        assert capped["notes.md"] == files["notes.md"]
+        assert capped["a.md"].endswith(RAW_CONTENT_EVICTED) and "About a." in capped["a.md"]
+        assert capped["b.md"] == files["b.md"]
+        assert file_evictions.get(action="raw_content") == evictions + 1
+
+    def test_hard_limit_spills_to_disk(self, tmp_path: Path) -> None:
+        """Test that files still over the hard limit once raw content is gone are spilled to the run's directory,
+        that read_file reads them back, and that the directory is deleted with the run's files.
+        """
+
+        files = {"notes.md": "n" * 2500, "plan.md": "p" * 700, "todo.md": "t" * 100}
+
+        token = current_run_memory.set(RunMemory("run"))
+        try:
+            capped = file_reducer({}, files)
+        finally:
+            current_run_memory.reset(token)
+
+        assert capped is not None
+        assert capped["notes.md"].startswith(f"{SPILLED_FILE_PREFIX}run/")
+        assert capped["plan.md"] == files["plan.md"]
+        assert sum(len(content) for content in capped.values()) <= 1000
+
+        # Spilled files are readable while they're being written and once they're on disk
+        assert read_file.func("notes.md", {"files": capped}) == f"     1\t{'n' * 2000}"  # type: ignore[attr-defined]
+        _spill_writer.submit(lambda: None).result()
+        assert len(list((tmp_path / "run").iterdir())) == 1
+        assert read_file.func("notes.md", {"files": capped}) == f"     1\t{'n' * 2000}"  # type: ignore[attr-defined]
+
+        remove_spilled_files("run").result()
+        assert not (tmp_path / "run").exists()
+        assert "no longer available" in read_file.func("notes.md", {"files": capped})  # type: ignore[attr-defined]
+
+    def test_failed_spills_stay_in_memory(self, tmp_path: Path) -> None:
+        """Test that a file that can't be written to disk is counted and kept in memory, so it can still be read."""
+
+        failures = spill_failures.get()
+        (tmp_path / "run").write_text("Not a directory")
+
+        token = current_run_memory.set(RunMemory("run"))
+        try:
+            capped = file_reducer({}, {"notes.md": "n" * 3500})
+        finally:
+            current_run_memory.reset(token)
+
+        assert capped is not None
+        _spill_writer.submit(lambda: None).result()
+        assert spill_failures.get() == failures + 1
+        assert read_file.func("notes.md", {"files": capped}) == f"     1\t{'n' * 2000}"  # type: ignore[attr-defined]
+
+    def test_limits_can_be_disabled(self) -> None:
+        """Test that limits of 0 leave files uncapped."""
+
+        files = {"a.md": search_result("a", 5000)}
+        with (
+            patch.object(app_config, "STATE_FILES_SOFT_LIMIT_BYTES", 0),
+            patch.object(app_config, "STATE_FILES_HARD_LIMIT_BYTES", 0),
+        ):
+            assert enforce_file_limits(files) is files
+
+
+class TestRunMemory:
+    """Test cases for the memory accounting of research runs."""
+
+    @pytest.mark.asyncio
+    async def test_streamed_states_are_accounted(self) -> None:
+        """Test that the states streamed from the supervisor and its sub-agents are measured, and that finished
+        sub-agents stop counting once the supervisor moves on.
+        """
+
+        responses = [delegate("call_1"), AIMessage(content="Findings"), AIMessage(content="Done")]
+        model = ScriptedChatModel(responses=responses, callbacks=[ModelUsageHandler("scripted")])
+        with (
+            patch.object(agents, "get_supervisor_model", return_value=model),
+            patch.object(agents, "get_researcher_model", return_value=model),
+        ):
+            agent = agents.build_supervisor_agent()
+
+        memory = RunMemory()
+        token = current_run_memory.set(memory)
+        try:
+            query = {"messages": [{"role": "user", "content": "moe routing"}]}
+            events = [event["event_type"] async for event in stream_agent_for_websocket(agent, query)]
+        finally:
+            current_run_memory.reset(token)
+
+        assert events[-1] == "completed"
+        assert list(memory.graphs) == [""]
+        assert memory.total.messages > len("moe routing")
+        assert memory.peak.messages >= memory.total.messages
+
+    @pytest.mark.asyncio
+    async def test_memory_events(self) -> None:
+        """Test that changes to a run's memory use are streamed to clients ahead of the next event."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=growing_stream),
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            await websocket.incoming.put(json.dumps({"query": "moe routing", "request_id": "a"}))
+            await asyncio.sleep(0.01)
+            await wait_until_idle(manager, "client")
+            await websocket.incoming.put(None)
+            await handler
+
+        assert websocket.events_for("a") == ["status_update", "memory", "status_update", "memory", "completed"]
+        memory_events = [event["data"] for event in websocket.sent if event["event_type"] == "memory"]
+        assert memory_events[0]["state_bytes"] == {"files": 0, "messages": 11, "todos": 0}
+        assert memory_events[1]["peak_state_bytes"]["files"] == len(search_result("a", 5000))
+        assert memory_events[1]["files_soft_limit_bytes"] == 1000
+
+    @pytest.mark.asyncio
+    async def test_spilled_files_are_deleted_with_the_run(self, tmp_path: Path) -> None:
+        """Test that a run spills files to its own directory, which is deleted once the run completes."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+        spilled = file_evictions.get(action="spilled")
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=spilling_stream),
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            await websocket.incoming.put(json.dumps({"query": "moe routing", "request_id": "a"}))
+            await asyncio.sleep(0.01)
+            await wait_until_idle(manager, "client")
+            await websocket.incoming.put(None)
+            await handler
+
+        assert websocket.events_for("a")[-1] == "completed"
+        assert file_evictions.get(action="spilled") == spilled + 1
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,145 @@
+"""Module: test_metrics.py
+
+Description:
+    Test cases for the Prometheus-style metrics registry and the metrics recorded across the research pipeline.
+
+Author: Nathan Thomas
+"""
+
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.agents import agents
+from app.agents.instrumentation import node_duration, tool_duration
+from app.agents.prompt_caching import ModelUsageHandler
+from app.agents.utils import stream_agent_for_websocket
+from app.shared.config import app_config
+from app.shared.metrics import MetricsRegistry, registry
+
+from .test_usage import ScriptedChatModel, delegate
+
+
+class TestMetricsRegistry:
+    """Test cases for MetricsRegistry and its metric types."""
+
+    def test_counter_render(self) -> None:
+        """Test that labelled counters render in the Prometheus text format."""
+
+        registry = MetricsRegistry()
+        counter = registry.counter("runs_cancelled_total", "Cancelled runs", ["reason"])
+        counter.inc(reason="client_disconnect")
+        counter.inc(2, reason="client_disconnect")
+
+        rendered = registry.render()
+
+        assert "# TYPE runs_cancelled_total counter" in rendered
+        assert 'runs_cancelled_total{reason="client_disconnect"} 3' in rendered
+
+    def test_gauge_up_and_down(self) -> None:
+        """Test that gauges can be incremented, decremented, and set."""
+
+        registry = MetricsRegistry()
+        gauge = registry.gauge("active_runs", "Active runs")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert gauge.get() == 1
+        gauge.set(5)
+        assert "active_runs 5" in registry.render()
+
+    def test_get_or_create_returns_same_metric(self) -> None:
+        """Test that registering the same metric twice returns the existing one."""
+
+        registry = MetricsRegistry()
+
+        assert registry.counter("a_total", "A") is registry.counter("a_total", "A")
+        with pytest.raises(ValueError):
+            registry.gauge("a_total", "A")
+
+    def test_counter_rejects_wrong_labels_and_negative_amounts(self) -> None:
+        """Test that counters validate their labels and amounts."""
+
+        counter = MetricsRegistry().counter("b_total", "B", ["kind"])
+
+        with pytest.raises(ValueError):
+            counter.inc(other="x")
+        with pytest.raises(ValueError):
+            counter.inc(-1, kind="x")
+
+    def test_histogram_render(self) -> None:
+        """Test that histograms render cumulative buckets, a sum and a count per label combination."""
+
+        registry = MetricsRegistry()
+        histogram = registry.histogram("tool_seconds", "Tool durations", ["tool"], buckets=[0.1, 1])
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value, tool="tavily_search")
+
+        rendered = registry.render()
+
+        assert "# TYPE tool_seconds histogram" in rendered
+        assert 'tool_seconds_bucket{tool="tavily_search",le="0.1"} 1' in rendered
+        assert 'tool_seconds_bucket{tool="tavily_search",le="1"} 3' in rendered
+        assert 'tool_seconds_bucket{tool="tavily_search",le="+Inf"} 4' in rendered
+        assert 'tool_seconds_sum{tool="tavily_search"} 4.25' in rendered
+        assert histogram.get(tool="tavily_search") == 4
+
+
+async def run_streamed_supervisor() -> None:
+    """Stream a supervisor run that delegates once, with a scripted model answering for every agent."""
+
+    responses = [delegate("call_1"), AIMessage(content="Findings"), AIMessage(content="Done")]
+    model = ScriptedChatModel(responses=responses, callbacks=[ModelUsageHandler("scripted")])
+    with (
+        patch.object(agents, "get_supervisor_model", return_value=model),
+        patch.object(agents, "get_researcher_model", return_value=model),
+    ):
+        agent = agents.build_supervisor_agent()
+
+    query = {"messages": [{"role": "user", "content": "moe routing"}]}
+    events = [event["event_type"] async for event in stream_agent_for_websocket(agent, query)]
+    assert events[-1] == "completed"
+
+
+class TestPipelineMetrics:
+    """Test cases for the metrics recorded while research runs stream."""
+
+    @pytest.mark.asyncio
+    async def test_nodes_and_tools_are_timed(self) -> None:
+        """Test that every graph node run and tool call is timed under the agent that ran it, and that nothing is
+        timed while metrics are disabled.
+        """
+
+        timed = [
+            (node_duration, {"agent": "supervisor", "node": "agent"}),
+            (node_duration, {"agent": "supervisor", "node": "tools"}),
+            (node_duration, {"agent": "research-agent", "node": "agent"}),
+            (tool_duration, {"agent": "supervisor", "tool": "task", "result": "success"}),
+        ]
+        before = [histogram.get(**labels) for histogram, labels in timed]
+
+        await run_streamed_supervisor()
+
+        after = [histogram.get(**labels) for histogram, labels in timed]
+        assert after == [before[0] + 2, before[1] + 1, before[2] + 1, before[3] + 1]
+
+        with patch.object(registry, "enabled", False):
+            await run_streamed_supervisor()
+
+        assert [histogram.get(**labels) for histogram, labels in timed] == after
+
+    @pytest.mark.asyncio
+    async def test_endpoint_can_be_disabled(self) -> None:
+        """Test that /metrics serves the registry, and isn't found while metrics are disabled."""
+
+        with patch.object(app_config, "APP_VERSION", "test"):
+            from app.api import server
+
+        body = bytes((await server.metrics()).body)
+        assert b"agent_node_duration_seconds" in body
+        assert b"process_cpu_seconds_total " in body and b"process_max_resident_memory_bytes " in body
+
+        with patch.object(registry, "enabled", False):
+            assert (await server.metrics()).status_code == 404
@@ -0,0 +1,59 @@
+"""Module: test_pipeline_benchmark.py
+
+Description:
+    Test cases for the offline research pipeline benchmark and the fake models, search and pages it runs against.
+
+Author: Nathan Thomas
+"""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agents.tools import research_tools
+from benchmarks.fakes import FakeChatModel, Workload, fake_backends
+from benchmarks.pipeline_throughput import run_level
+
+# No latency, so runs only take as long as the pipeline itself
+WORKLOAD = Workload(model_latency=0, summary_latency=0, search_latency=0, pages=3, page_chars=500)
+
+
+class TestFakes:
+    """Test cases for the fake backends."""
+
+    def test_follows_plan(self) -> None:
+        """Test that the fake chat model works out its turn from the conversation, then gives its answer."""
+
+        search = {"name": "tavily_search", "args": {"query": "moe routing"}}
+        model = FakeChatModel(plan=[[search], [search, search]], answer="Findings")
+
+        first = model.invoke([HumanMessage(content="Research moe routing")])
+        second = model.invoke([HumanMessage(content="Research moe routing"), first])
+        last = model.invoke([HumanMessage(content="Research moe routing"), first, second])
+
+        assert [call["name"] for call in first.tool_calls] == ["tavily_search"]  # type: ignore[attr-defined]
+        assert len(second.tool_calls) == 2  # type: ignore[attr-defined]
+        assert isinstance(last, AIMessage) and last.content == "Findings" and not last.tool_calls
+        assert last.usage_metadata is not None and last.usage_metadata["input_tokens"] > 0
+
+
+class TestPipelineThroughput:
+    """Test cases for the pipeline throughput benchmark."""
+
+    @pytest.mark.asyncio
+    async def test_runs_level(self) -> None:
+        """Test that a concurrency level completes every run through the WebSocket manager, fetching pages from
+        the page server and summarizing them with the fake summarization model.
+        """
+
+        fetched = research_tools.fetch_bytes.get(status="2xx")
+        summarized = research_tools.summaries.get(result="success")
+        async with fake_backends(WORKLOAD):
+            result = await run_level(2, 4)
+
+        assert result.failed == 0
+        assert len(result.latencies_ms) == 4
+        assert result.runs_per_second > 0 and result.cpu_seconds > 0 and result.peak_rss_mb > 0
+
+        # 4 runs, each delegating 2 tasks of 2 searches with 2 results
+        assert research_tools.summaries.get(result="success") == summarized + 32
+        assert research_tools.fetch_bytes.get(status="2xx") > fetched
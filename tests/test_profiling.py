@@ -0,0 +1,203 @@
+"""Module: test_profiling.py
+
+Description:
+    Test cases for on-demand profiling: the sampling profiler, and the admin endpoints that profile a live worker
+    or a single research run.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+import pstats
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.api import admin
+from app.api.websocket import WebSocketManager
+from app.shared.config import app_config
+from app.shared.profiling import SamplingProfiler
+
+from .test_websocket import FakeWebSocket, wait_until_idle
+
+ADMIN = {"X-Admin-Key": "admin_key"}
+
+
+def spin(seconds: float) -> None:
+    """Keep the CPU busy on the calling thread."""
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def busy(seconds: float) -> None:
+    """Keep the event loop busy in short bursts, like sync work interleaved with awaits."""
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        spin(0.02)
+        await asyncio.sleep(0)
+
+
+async def busy_stream(*_args: Any, **_kwargs: Any) -> AsyncGenerator[dict[str, Any], None]:
+    """Stand-in for stream_agent_for_websocket that keeps the event loop busy in a task of its own."""
+
+    yield {"event_type": "status_update", "data": {"graph": "root", "node": "agent", "status": "processing"}}
+    await asyncio.create_task(busy(0.3))
+    yield {"event_type": "completed", "data": {"message": "Research completed successfully"}}
+
+
+@pytest.fixture(autouse=True)
+def admin_key() -> Iterator[None]:
+    """Enable the admin endpoints."""
+
+    with patch.object(app_config, "ADMIN_API_KEY", "admin_key"):
+        yield
+
+
+@pytest_asyncio.fixture
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    """Client for the server app, without running its lifespan."""
+
+    with patch.object(app_config, "APP_VERSION", "test"):
+        from app.api import server
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
+
+
+class TestSamplingProfiler:
+    """Test cases for SamplingProfiler."""
+
+    @pytest.mark.asyncio
+    async def test_samples_event_loop(self) -> None:
+        """Test that samples of the event loop are collapsed into root-first stacks."""
+
+        profiler = SamplingProfiler(0.001)
+        profiler.start()
+        try:
+            await busy(0.2)
+        finally:
+            await profiler.stop()
+
+        assert profiler.samples > 0
+        lines = profiler.render().splitlines()
+        assert all(line.startswith("event_loop;") for line in lines)
+        assert any(line.split(" ")[0].endswith("tests.test_profiling:spin") for line in lines)
+
+    @pytest.mark.asyncio
+    async def test_task_filter(self) -> None:
+        """Test that a task filter leaves out samples taken while other tasks run."""
+
+        profiler = SamplingProfiler(0.001, task_filter=lambda task: task.get_name() == "wanted")
+        profiler.start()
+        try:
+            await asyncio.gather(asyncio.create_task(busy(0.2), name="wanted"), busy(0.2))
+        finally:
+            await profiler.stop()
+
+        assert profiler.samples > 0
+        assert all("test_task_filter" not in stack for stack in profiler.stacks)
+
+
+class TestAdminEndpoints:
+    """Test cases for the admin profiling endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_requires_admin_key(self, client: httpx.AsyncClient) -> None:
+        """Test that the endpoints need the admin key, and aren't found without one configured."""
+
+        assert (await client.post("/admin/profile/cpu?seconds=0.01")).status_code == 401
+        assert (await client.post("/admin/profile/cpu?seconds=0.01", headers={"X-Admin-Key": "x"})).status_code == 403
+
+        with patch.object(app_config, "ADMIN_API_KEY", ""):
+            assert (await client.post("/admin/profile/cpu?seconds=0.01", headers=ADMIN)).status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_cpu_profiles(self, client: httpx.AsyncClient, tmp_path: Path) -> None:
+        """Test that CPU profiles download as collapsed stacks or as pstats."""
+
+        load = asyncio.create_task(busy(0.5))
+        collapsed = await client.post("/admin/profile/cpu?seconds=0.2&interval=0.001", headers=ADMIN)
+        calls = await client.post("/admin/profile/cpu?seconds=0.2&format=pstats", headers=ADMIN)
+        await load
+
+        assert collapsed.status_code == 200
+        assert collapsed.headers["content-disposition"].endswith('.collapsed"')
+        assert "tests.test_profiling:spin" in collapsed.text
+
+        assert calls.headers["content-disposition"].endswith('.pstats"')
+        path = tmp_path / "cpu.pstats"
+        path.write_bytes(calls.content)
+        functions = {function for _, _, function in pstats.Stats(str(path)).stats}  # type: ignore[attr-defined]
+        assert "spin" in functions
+
+    @pytest.mark.asyncio
+    async def test_memory_diff(self, client: httpx.AsyncClient) -> None:
+        """Test that the memory diff lists where memory grew while it ran."""
+
+        retained: list[bytes] = []
+
+        async def allocate() -> None:
+            await asyncio.sleep(0.05)
+            retained.extend(bytes(1000) for _ in range(1000))
+
+        task = asyncio.create_task(allocate())
+        response = await client.post("/admin/profile/memory?seconds=0.2&limit=5", headers=ADMIN)
+        await task
+
+        assert response.status_code == 200
+        assert response.text.startswith("Memory change over 0.2s: +")
+        assert "retained.extend(bytes(1000) for _ in range(1000))" in response.text
+
+    @pytest.mark.asyncio
+    async def test_limits(self, client: httpx.AsyncClient) -> None:
+        """Test that profiles are capped at PROFILE_MAX_SECONDS and don't overlap."""
+
+        with patch.object(app_config, "PROFILE_MAX_SECONDS", 1):
+            assert (await client.post("/admin/profile/cpu?seconds=2", headers=ADMIN)).status_code == 422
+
+        async with admin.profiling:
+            assert (await client.post("/admin/profile/memory?seconds=0.01", headers=ADMIN)).status_code == 409
+
+    @pytest.mark.asyncio
+    async def test_profiles_single_run(self, client: httpx.AsyncClient) -> None:
+        """Test that a run's profile covers the tasks it started, and that only running runs can be profiled."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        with (
+            patch.object(admin, "manager", manager),
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=busy_stream),
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            await websocket.incoming.put(json.dumps({"query": "moe routing", "request_id": "a"}))
+            await asyncio.sleep(0.01)
+            run_id = next(event["run_id"] for event in websocket.sent if event.get("request_id") == "a")
+
+            # Load outside the run shouldn't show up in its profile
+            outside = asyncio.create_task(busy(0.3))
+            response = await client.post(f"/admin/profile/runs/{run_id}?seconds=5&interval=0.001", headers=ADMIN)
+            await outside
+
+            await wait_until_idle(manager, "client")
+            finished = await client.post(f"/admin/profile/runs/{run_id}?seconds=1", headers=ADMIN)
+            await websocket.incoming.put(None)
+            await handler
+
+        assert response.status_code == 200
+        assert f'filename="run-{run_id}-' in response.headers["content-disposition"]
+        assert "tests.test_profiling:busy;tests.test_profiling:spin" in response.text
+        assert all("test_profiles_single_run" not in line for line in response.text.splitlines())
+        assert finished.status_code == 404
@@ -0,0 +1,102 @@
+"""Module: test_prompt_caching.py
+
+Description:
+    Test cases for marking static prompt prefixes for provider-side prompt caching.
+
+Author: Nathan Thomas
+"""
+
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+
+from app.agents import agents
+from app.agents.prompt_caching import ModelUsageHandler, llm_input_tokens
+
+
+class RecordingChatModel(BaseChatModel):
+    """Chat model that answers straight away and records every request, including cache-control markers."""
+
+    requests: list[tuple[list[BaseMessage], dict[str, Any]]] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable[Any, BaseMessage]:
+        return self.bind(
+            tools=[tool if isinstance(tool, dict) else convert_to_openai_tool(tool) for tool in tools], **kwargs
+        )
+
+    def _generate(
+        self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        self.requests.append((messages, kwargs))
+        message = AIMessage(
+            content="Research complete",
+            usage_metadata={
+                "input_tokens": 1000,
+                "output_tokens": 10,
+                "total_tokens": 1010,
+                "input_token_details": {"cache_read": 900, "cache_creation": 60},
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+async def run_supervisor(model: RecordingChatModel) -> tuple[list[BaseMessage], dict[str, Any]]:
+    """Build the supervisor agent around a model, run one turn, and get the request the model received."""
+
+    with (
+        patch.object(agents, "get_supervisor_model", return_value=model),
+        patch.object(agents, "get_researcher_model", return_value=model),
+    ):
+        agent = agents.build_supervisor_agent()
+
+    await agent.ainvoke({"messages": [{"role": "user", "content": "moe routing"}]})
+    return model.requests[-1]
+
+
+class TestPromptCaching:
+    """Test cases for prompt cache markers on agent model calls."""
+
+    @pytest.mark.asyncio
+    async def test_marks_static_prefix(self) -> None:
+        """Test that the tool definitions, system prompt and latest message are marked as cache breakpoints for
+        providers that take markers, with tools in a stable order and cached tokens counted.
+        """
+
+        model = RecordingChatModel(callbacks=[ModelUsageHandler("recording")])
+        read_before = llm_input_tokens.get(model="recording", cache="read")
+
+        with patch("app.agents.prompt_caching.PROMPT_CACHING_LLM_TYPES", {"recording"}):
+            messages, kwargs = await run_supervisor(model)
+
+        tool_names = [tool["name"] for tool in kwargs["tools"]]
+        assert tool_names == ["tavily_search", "think_tool", "read_file", "ls", "write_file", "write_todos", "task"]
+        assert [tool.get("cache_control") for tool in kwargs["tools"]] == [None] * 6 + [{"type": "ephemeral"}]
+        assert kwargs["cache_control"] == {"type": "ephemeral"}
+
+        system_content: Any = messages[0].content
+        assert system_content == [
+            {"type": "text", "text": agents.SUPERVISOR_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}
+        ]
+
+        assert llm_input_tokens.get(model="recording", cache="read") - read_before == 900
+
+    @pytest.mark.asyncio
+    async def test_other_providers_are_unmarked(self) -> None:
+        """Test that models whose provider doesn't take cache markers get the prompt unchanged."""
+
+        messages, kwargs = await run_supervisor(RecordingChatModel())
+
+        assert messages[0].content == agents.SUPERVISOR_INSTRUCTIONS
+        assert "cache_control" not in kwargs
+        assert all("cache_control" not in tool for tool in kwargs["tools"])
@@ -0,0 +1,401 @@
+"""Module: test_resilience.py
+
+Description:
+    Test cases for rate limiting, retries and circuit breaking of provider calls, and for routing model calls
+    across endpoints, hedging them and falling back.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+from collections.abc import Iterator
+from typing import Any
+from unittest.mock import patch
+from uuid import UUID
+
+import httpx
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.tools import tool
+
+from app.agents.model_router import (
+    ModelRouter,
+    build_chat_model,
+    build_model_router,
+    get_endpoint_stats,
+    parse_model_endpoints,
+    reset_endpoint_stats,
+)
+from app.shared.config import app_config
+from app.shared.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    TokenBucket,
+    call_provider,
+    get_circuit_breaker,
+    get_rate_limiter,
+    reset_providers,
+)
+from app.shared.resilience.resilience import circuit_state
+
+
+class ProviderError(Exception):
+    """Error with an HTTP status, like the ones raised by the provider SDKs."""
+
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+        super().__init__(f"HTTP {status_code}")
+
+
+class FlakyChatModel(BaseChatModel):
+    """Chat model that raises the given errors on its first calls, then answers with its name after its latency."""
+
+    name: str
+    errors: list[Exception] = []
+    latency: float = 0.0
+    calls: int = 0
+    cancelled: int = 0
+    bound: list[dict[str, Any]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky"
+
+    def _get_ls_params(self, stop: list[str] | None = None, **kwargs: Any) -> Any:
+        return {"ls_provider": self.name}
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable[Any, BaseMessage]:
+        self.bound.append({"tools": tools, **kwargs})
+        return self.bind(tools=tools, **kwargs)
+
+    def _generate(
+        self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.name))])
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self._generate(messages, stop)
+
+
+@pytest.fixture(autouse=True)
+def fresh_providers() -> Iterator[None]:
+    """Give every test its own limiters and breakers, and retry without waiting."""
+
+    reset_providers()
+    reset_endpoint_stats()
+    with (
+        patch.object(app_config, "PROVIDER_RETRY_BASE_SECONDS", 0),
+        patch.object(app_config, "PROVIDER_MAX_RETRIES", 2),
+        patch.object(app_config, "CIRCUIT_BREAKER_MIN_CALLS", 4),
+        patch.object(app_config, "CIRCUIT_BREAKER_ERROR_RATE", 0.5),
+    ):
+        yield
+    reset_providers()
+    reset_endpoint_stats()
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket."""
+
+    def test_waiting_callers_are_spaced_out(self) -> None:
+        """Test that a burst beyond the bucket's capacity is spread out at the bucket's rate."""
+
+        with patch("app.shared.resilience.resilience.time.monotonic", return_value=100.0):
+            bucket = TokenBucket(rate=10, capacity=2)
+            delays = [bucket.reserve() for _ in range(4)]
+
+        assert delays == pytest.approx([0, 0, 0.1, 0.2])
+
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker."""
+
+    def test_opens_and_recovers(self) -> None:
+        """Test that the breaker opens once enough calls fail, then lets one probe through after cooling down and
+        closes again when it succeeds.
+        """
+
+        breaker = CircuitBreaker("anthropic", error_rate=0.5, min_calls=4, window_seconds=60, cooldown_seconds=30)
+        with patch("app.shared.resilience.resilience.time.monotonic", return_value=100.0):
+            for success in (True, False, True, False):
+                assert breaker.allow()
+                breaker.record(success)
+
+            assert circuit_state.get(provider="anthropic") == CircuitState.OPEN.value
+            assert not breaker.allow()
+
+        with patch("app.shared.resilience.resilience.time.monotonic", return_value=131.0):
+            assert breaker.allow()
+            assert circuit_state.get(provider="anthropic") == CircuitState.HALF_OPEN.value
+            assert not breaker.allow()
+
+            breaker.record(True)
+            assert circuit_state.get(provider="anthropic") == CircuitState.CLOSED.value
+            assert breaker.allow()
+
+
+class TestCallProvider:
+    """Test cases for call_provider."""
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_failures(self) -> None:
+        """Test that transient failures are retried while errors in the request itself aren't, and don't count
+        against the provider's health.
+        """
+
+        async def bad_request() -> str:
+            raise ProviderError(400)
+
+        for _ in range(3):
+            with pytest.raises(ProviderError):
+                await call_provider("tavily", bad_request)
+
+        errors = [ProviderError(429), ConnectionError("reset")]
+
+        async def call() -> str:
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        assert await call_provider("tavily", call) == "ok"
+        assert get_circuit_breaker("tavily").state == CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_fails_fast_while_circuit_is_open(self) -> None:
+        """Test that once a provider keeps failing, calls are rejected without reaching it."""
+
+        calls = 0
+
+        async def call() -> str:
+            nonlocal calls
+            calls += 1
+            raise ProviderError(503)
+
+        for _ in range(2):
+            with pytest.raises((ProviderError, CircuitOpenError)):
+                await call_provider("tavily", call)
+
+        assert get_circuit_breaker("tavily").state == CircuitState.OPEN
+        calls_before = calls
+        with pytest.raises(CircuitOpenError):
+            await call_provider("tavily", call)
+        assert calls == calls_before
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_is_given_back(self) -> None:
+        """Test that a probe call cancelled while waiting for the rate limit lets the next call probe instead."""
+
+        clock = [100.0]
+        calls = 0
+
+        async def call() -> str:
+            nonlocal calls
+            calls += 1
+            return "ok"
+
+        with (
+            patch.object(app_config, "PROVIDER_RATE_LIMITS", "tavily=60"),
+            patch("app.shared.resilience.resilience.time.monotonic", side_effect=lambda: clock[0]),
+        ):
+            breaker = get_circuit_breaker("tavily")
+            for success in (True, False, True, False):
+                assert breaker.allow()
+                breaker.record(success)
+            assert breaker.state == CircuitState.OPEN
+
+            clock[0] += breaker.cooldown_seconds
+            limiter = get_rate_limiter("tavily")
+            assert limiter is not None
+            limiter.reserve()
+
+            probe = asyncio.create_task(call_provider("tavily", call))
+            await asyncio.sleep(0)
+            assert circuit_state.get(provider="tavily") == CircuitState.HALF_OPEN.value
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+            clock[0] += 10
+            assert await call_provider("tavily", call) == "ok"
+
+        assert calls == 1
+        assert circuit_state.get(provider="tavily") == CircuitState.CLOSED.value
+
+
+class TestModelRouter:
+    """Test cases for ModelRouter."""
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_primary_keeps_failing(self) -> None:
+        """Test that the fallback model answers once the primary model's retries run out, and that the primary is
+        skipped entirely while its circuit is open.
+        """
+
+        primary = FlakyChatModel(name="anthropic", errors=[ProviderError(529)] * 3)
+        fallback = FlakyChatModel(name="openai")
+        model = ModelRouter(models=[primary, fallback], names=["primary", "fallback"], fallbacks=1)
+
+        assert (await model.ainvoke("moe routing")).content == "openai"
+        assert primary.calls == 3
+
+        get_circuit_breaker("primary")._open(0)
+        with patch("app.shared.resilience.resilience.time.monotonic", return_value=1.0):
+            assert (await model.ainvoke("moe routing")).content == "openai"
+        assert primary.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_request_errors_are_not_retried(self) -> None:
+        """Test that an error in the request itself is raised without retries or falling back."""
+
+        primary = FlakyChatModel(name="anthropic", errors=[ProviderError(400)])
+        fallback = FlakyChatModel(name="openai")
+        model = ModelRouter(models=[primary, fallback], names=["primary", "fallback"], fallbacks=1)
+
+        with pytest.raises(ProviderError):
+            await model.ainvoke("moe routing")
+        assert (primary.calls, fallback.calls) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_sdk_retries_are_disabled(self) -> None:
+        """Test that a provider's SDK doesn't retry on its own, so every attempt goes through call_provider."""
+
+        attempts = 0
+
+        def unavailable(request: httpx.Request) -> httpx.Response:
+            nonlocal attempts
+            attempts += 1
+            return httpx.Response(503, json={"error": {"message": "Overloaded"}})
+
+        chat_model = build_chat_model("key", "http://openai.test/v1", "gpt-4o", "openai")
+        chat_model.root_async_client._client = httpx.AsyncClient(  # type: ignore[attr-defined]
+            transport=httpx.MockTransport(unavailable)
+        )
+        model = build_model_router("supervisor", [("gpt-4o", chat_model)])
+
+        with pytest.raises(Exception, match="Overloaded"):
+            await model.ainvoke("moe routing")
+
+        # The first attempt and PROVIDER_MAX_RETRIES retries, without any from the SDK
+        assert attempts == 3
+
+    @pytest.mark.asyncio
+    async def test_tools_are_bound_to_each_model(self) -> None:
+        """Test that tools bound to the model are bound to whichever model answers, once per set of tools."""
+
+        @tool
+        def think(reflection: str) -> str:
+            """Reflect on progress."""
+            return reflection
+
+        @tool
+        def search(query: str) -> str:
+            """Search the web."""
+            return query
+
+        primary = FlakyChatModel(name="anthropic")
+        model = ModelRouter(models=[primary], names=["primary"])
+        # Agents sharing a router each bind their own tools, and use them in turn
+        thinking = model.bind_tools([think], tool_choice="any")
+        searching = model.bind_tools([search])
+
+        for _ in range(2):
+            await thinking.ainvoke("moe routing")
+            await searching.ainvoke("moe routing")
+
+        assert len(primary.bound) == 2
+        assert primary.bound[0]["tools"][0]["function"]["name"] == "think"
+        assert primary.bound[0]["tool_choice"] == "any"
+        assert primary.bound[1]["tools"][0]["function"]["name"] == "search"
+
+    @pytest.mark.asyncio
+    async def test_endpoint_runs_nest_under_the_router(self) -> None:
+        """Test that callbacks given to the router see the endpoint model's run, as a child of the router's run."""
+
+        class RunRecorder(BaseCallbackHandler):
+            def __init__(self) -> None:
+                self.runs: list[tuple[str, UUID, UUID | None]] = []
+
+            def on_chat_model_start(
+                self, serialized: Any, messages: Any, *, run_id: UUID, parent_run_id: UUID | None = None, **kwargs: Any
+            ) -> None:
+                self.runs.append((kwargs["invocation_params"]["_type"], run_id, parent_run_id))
+
+        recorder = RunRecorder()
+        model = ModelRouter(models=[FlakyChatModel(name="anthropic")], names=["primary"])
+        await model.ainvoke("moe routing", {"callbacks": [recorder]})
+        model.invoke("moe routing", {"callbacks": [recorder]})
+
+        router_run, endpoint_run = recorder.runs[0], recorder.runs[1]
+        assert [run[0] for run in recorder.runs] == ["flaky", "flaky", "flaky", "flaky"]
+        assert endpoint_run[2] == router_run[1]
+        assert recorder.runs[3][2] == recorder.runs[2][1]
+
+    def test_parses_endpoints(self) -> None:
+        """Test that extra endpoints are parsed with their optional provider prefix and base URL."""
+
+        assert parse_model_endpoints("gpt-4o-mini, ollama:llama3.1@http://gpu-2:11434,") == [
+            ("gpt-4o-mini", ""),
+            ("ollama:llama3.1", "http://gpu-2:11434"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_routes_to_fastest_healthy_endpoint(self) -> None:
+        """Test that calls go to the endpoint with the lowest median latency, skipping it while its circuit is
+        open.
+        """
+
+        slow = FlakyChatModel(name="anthropic", latency=0.02)
+        fast = FlakyChatModel(name="anthropic", latency=0.0)
+        model = ModelRouter(models=[slow, fast], names=["slow", "fast"])
+
+        # Endpoints without latency samples are tried first, so both get measured
+        for _ in range(2):
+            await model.ainvoke("moe routing")
+        assert (slow.calls, fast.calls) == (1, 1)
+
+        for _ in range(3):
+            await model.ainvoke("moe routing")
+        assert (slow.calls, fast.calls) == (1, 4)
+
+        get_circuit_breaker("fast")._open(0)
+        with patch("app.shared.resilience.resilience.time.monotonic", return_value=1.0):
+            assert model.route() == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_hedges_slow_calls(self) -> None:
+        """Test that a call outlasting its endpoint's p95 latency is hedged to the next endpoint, that the first
+        answer wins and that the losing request is cancelled.
+        """
+
+        primary = FlakyChatModel(name="anthropic")
+        backup = FlakyChatModel(name="openai", latency=0.01)
+        model = ModelRouter(models=[primary, backup], names=["primary", "backup"], hedge=True)
+
+        stats = get_endpoint_stats("primary")
+        for _ in range(20):
+            stats.record(0.001)
+        get_endpoint_stats("backup").record(0.01)
+
+        # The primary is hedged only once it takes longer than usual
+        assert (await model.ainvoke("moe routing")).content == "anthropic"
+        assert backup.calls == 0
+
+        primary.latency = 1.0
+        assert (await model.ainvoke("moe routing")).content == "openai"
+        await asyncio.sleep(0)
+        assert primary.cancelled == 1
@@ -0,0 +1,111 @@
+"""Module: test_result_cache.py
+
+Description:
+    Test cases for the research result cache, near-duplicate query matching, and replaying cached results.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.api.result_cache import ResultCache, normalize_query
+from app.api.websocket import WebSocketManager
+
+from .test_websocket import FakeWebSocket, slow_stream, wait_until_idle
+
+COMPLETED = [{"event_type": "completed", "data": {"message": "Research completed successfully"}}]
+
+
+class TestResultCache:
+    """Test cases for ResultCache."""
+
+    def test_normalization_ignores_phrasing(self) -> None:
+        """Test that case, punctuation, hyphenation, filler words and plurals don't change a query."""
+
+        assert normalize_query("What are the latest advances in mixture of experts routing?") == normalize_query(
+            "latest advance in Mixture-of-Experts routing"
+        )
+
+    def test_matches_near_duplicates_only(self) -> None:
+        """Test that a query matches a cached query with nearly the same words, but not a related question."""
+
+        cache = ResultCache(ttl_seconds=60, similarity=0.6, max_entries=10)
+        cache.store("latest advances in mixture-of-experts routing", "{}", COMPLETED)
+
+        near_duplicate = cache.lookup("recent advances in mixture of experts routing", "{}")
+        assert near_duplicate is not None
+        assert near_duplicate.query == "latest advances in mixture-of-experts routing"
+        assert 0.6 <= near_duplicate.similarity < 1
+
+        assert cache.lookup("mixture of experts load balancing", "{}") is None
+
+    def test_matches_only_same_subscription(self) -> None:
+        """Test that a result streamed for one event subscription isn't replayed for another."""
+
+        cache = ResultCache(ttl_seconds=60, similarity=0.8, max_entries=10)
+        cache.store("mixture of experts routing", '{"verbosity": "quiet"}', COMPLETED)
+
+        assert cache.lookup("mixture of experts routing", '{"verbosity": "full"}') is None
+        assert cache.lookup("mixture of experts routing", '{"verbosity": "quiet"}') is not None
+
+    def test_stale_and_evicted_results_miss(self) -> None:
+        """Test that results are dropped once they're older than the TTL or pushed out by newer results."""
+
+        cache = ResultCache(ttl_seconds=60, similarity=0.8, max_entries=2)
+        with patch("app.api.result_cache.time.time", return_value=1000):
+            cache.store("mixture of experts routing", "{}", COMPLETED)
+            cache.store("speculative decoding", "{}", COMPLETED)
+            cache.store("state space models", "{}", COMPLETED)
+
+        with patch("app.api.result_cache.time.time", return_value=1030):
+            assert cache.lookup("mixture of experts routing", "{}") is None
+            assert cache.lookup("speculative decoding", "{}") is not None
+
+        with patch("app.api.result_cache.time.time", return_value=1061):
+            assert cache.lookup("speculative decoding", "{}") is None
+            assert len(cache) == 1
+
+
+class TestCachedResultReplay:
+    """Test cases for answering research requests from the result cache."""
+
+    @pytest.mark.asyncio
+    async def test_similar_request_replays_cached_result(self) -> None:
+        """Test that a near-duplicate request replays the earlier run's events without running the agent again,
+        and that clients can bypass the cache.
+        """
+
+        manager = WebSocketManager()
+        manager.result_cache = ResultCache(ttl_seconds=60, similarity=0.8, max_entries=10)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=slow_stream) as stream,
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            for request_id, query, bypass in (
+                ("a", "Latest advances in mixture-of-experts routing", False),
+                ("b", "what are the latest advances in mixture of experts routing?", False),
+                ("c", "latest advances in mixture of experts routing", True),
+            ):
+                await websocket.incoming.put(
+                    json.dumps({"query": query, "request_id": request_id, "bypass_cache": bypass})
+                )
+                await asyncio.sleep(0.01)
+                await wait_until_idle(manager, "client")
+
+            await websocket.incoming.put(None)
+            await handler
+
+        assert stream.call_count == 2
+        assert websocket.events_for("b") == ["status_update", "status_update", "completed"]
+        replay_status = next(event for event in websocket.sent if event.get("request_id") == "b")
+        assert replay_status["data"]["status"] == "cached"
+        assert replay_status["data"]["cached_query"] == "Latest advances in mixture-of-experts routing"
+        assert websocket.events_for("c")[-1] == "completed"
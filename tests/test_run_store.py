@@ -0,0 +1,190 @@
+"""Module: test_run_store.py
+
+Description:
+    Test cases for durable research run storage and resuming interrupted runs from their checkpoints.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.api.models import ResearchRequest
+from app.api.run_store import MemoryRunStore, SqliteRunStore, open_run_store
+from app.api.runs import ResearchRun
+from app.api.websocket import WebSocketManager
+
+from .test_websocket import slow_stream, wait_until_idle
+
+
+def build_run(run_id: str = "run") -> ResearchRun:
+    """Build a run to store."""
+
+    return ResearchRun(run_id, "request", ResearchRequest(query="moe routing"), 10)
+
+
+async def write_checkpoint(store: MemoryRunStore, run_id: str) -> None:
+    """Write an empty checkpoint for a run, as if its first agent step had completed."""
+
+    config: Any = {"configurable": {"thread_id": run_id, "checkpoint_ns": ""}}
+    await store.checkpointer.aput(config, empty_checkpoint(), {}, {})
+
+
+class TestSqliteRunStore:
+    """Test cases for SqliteRunStore."""
+
+    @pytest.mark.asyncio
+    async def test_runs_survive_reopening(self, tmp_path: Path) -> None:
+        """Test that in-flight runs and their progress can be read back after the store is reopened."""
+
+        path = str(tmp_path / "runs.sqlite")
+        store = await SqliteRunStore.open(path)
+        run = build_run()
+        await store.save(run)
+        run.record({"event_type": "status_update", "data": {}})
+        await store.save_progress([run])
+        await store.save(build_run("finished"))
+        await store.forget("finished")
+        await store.close()
+
+        store = await SqliteRunStore.open(path)
+        interrupted = await store.interrupted()
+        await store.close()
+
+        assert [(stored.run_id, stored.next_seq) for stored in interrupted] == [("run", 2)]
+        assert interrupted[0].request.query == "moe routing"
+
+    @pytest.mark.asyncio
+    async def test_workers_only_claim_abandoned_runs(self, tmp_path: Path) -> None:
+        """Test that a worker only resumes runs from an earlier launch, not runs owned by a live sibling worker."""
+
+        store = await SqliteRunStore.open(str(tmp_path / "runs.sqlite"))
+        store.launch_id = "current"
+        for run_id, owner in (("previous", f"earlier:{os.getppid()}"), ("sibling", f"current:{os.getppid()}")):
+            await store.conn.execute(
+                "INSERT INTO research_runs (run_id, request_id, request, next_seq, owner) VALUES (?, ?, ?, ?, ?)",
+                (run_id, "request", ResearchRequest(query="moe routing").model_dump_json(), 1, owner),
+            )
+        await store.conn.commit()
+
+        claimed = await store.interrupted()
+        claimed_again = await store.interrupted()
+        await store.close()
+
+        assert [stored.run_id for stored in claimed] == ["previous"]
+        assert [stored.run_id for stored in claimed_again] == ["previous"]
+
+    @pytest.mark.asyncio
+    async def test_unknown_backend(self) -> None:
+        """Test that an unknown checkpointer backend is rejected."""
+
+        with pytest.raises(ValueError):
+            await open_run_store("redis", "")
+
+
+class TestRestoreInterruptedRuns:
+    """Test cases for resuming interrupted runs on startup."""
+
+    @pytest.mark.asyncio
+    async def test_restored_run_continues_from_checkpoint(self) -> None:
+        """Test that an interrupted run with a checkpoint is resumed under its run ID instead of starting over."""
+
+        store = MemoryRunStore()
+        run = build_run()
+        run.next_seq = 7
+        await store.save(run)
+        await write_checkpoint(store, "run")
+
+        manager = WebSocketManager()
+        manager.store = store
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=slow_stream) as stream,
+        ):
+            await manager.restore_interrupted_runs()
+            restored = manager.runs.get("run")
+            assert restored is not None and restored.client_id is None
+
+            await asyncio.sleep(0.01)
+            await wait_until_idle(manager, "")
+            assert restored.task is not None
+            await restored.task
+
+        query, config = stream.call_args.args[1:3]
+        assert query is None
+        assert config == {"configurable": {"thread_id": "run"}}
+        assert [event["seq"] for event in restored.events][0] == 7
+        assert await store.interrupted() == []
+        assert await store.checkpointer.aget_tuple(config) is None
+
+    @pytest.mark.asyncio
+    async def test_restored_run_without_checkpoint_starts_over(self) -> None:
+        """Test that a run interrupted before its first checkpoint is restarted from the original query."""
+
+        store = MemoryRunStore()
+        await store.save(build_run())
+
+        manager = WebSocketManager()
+        manager.store = store
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=slow_stream) as stream,
+        ):
+            await manager.restore_interrupted_runs()
+            restored = manager.runs.get("run")
+            assert restored is not None and restored.task is not None
+            await restored.task
+
+        query = stream.call_args.args[1]
+        assert query["messages"][0]["content"] == "moe routing"
+
+    @pytest.mark.asyncio
+    async def test_progress_is_saved_in_batches(self) -> None:
+        """Test that sending events doesn't write to the run store, and that a drained run's progress is saved once
+        so it resumes numbering its events where it stopped.
+        """
+
+        class CountingRunStore(MemoryRunStore):
+            def __init__(self) -> None:
+                super().__init__()
+                self.saves: list[list[str]] = []
+
+            async def save_progress(self, runs: Sequence[ResearchRun]) -> None:
+                self.saves.append([run.run_id for run in runs])
+                await super().save_progress(runs)
+
+        store = CountingRunStore()
+        await store.save(build_run())
+        await write_checkpoint(store, "run")
+
+        manager = WebSocketManager()
+        manager.store = store
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=slow_stream),
+        ):
+            await manager.restore_interrupted_runs()
+            await asyncio.sleep(0.01)
+            restored = manager.runs.get("run")
+            assert restored is not None and restored.next_seq > 2
+            assert store.saves == []
+
+            await manager.drain(0)
+
+        assert store.saves == [["run"]]
+        assert [(stored.run_id, stored.next_seq) for stored in await store.interrupted()] == [
+            ("run", restored.next_seq)
+        ]
+
+        await manager.save_progress()
+        assert store.saves == [["run"]]
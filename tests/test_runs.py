@@ -0,0 +1,56 @@
+"""Module: test_runs.py
+
+Description:
+    Test cases for resumable research runs and their event replay buffers.
+
+Author: Nathan Thomas
+"""
+
+from app.api.models import ResearchRequest
+from app.api.runs import ResearchRun
+
+
+def build_run(buffer_size: int) -> ResearchRun:
+    """Build a run with a given replay buffer size."""
+
+    return ResearchRun("run", "request", ResearchRequest(query="moe routing"), buffer_size)
+
+
+class TestResearchRun:
+    """Test cases for ResearchRun event recording and replay."""
+
+    def test_record_tags_events(self) -> None:
+        """Test that recorded events are tagged with run and request IDs and increasing sequence numbers."""
+
+        run = build_run(10)
+        first = run.record({"event_type": "status_update", "data": {}})
+        second = run.record({"event_type": "completed", "data": {}})
+
+        assert (first["seq"], second["seq"]) == (1, 2)
+        assert first["run_id"] == "run"
+        assert first["request_id"] == "request"
+
+    def test_replay_from_sequence(self) -> None:
+        """Test that replay returns only events after the client's last sequence number."""
+
+        run = build_run(10)
+        for _ in range(5):
+            run.record({"event_type": "status_update", "data": {}})
+
+        events, has_gap = run.replay_from(3)
+
+        assert [event["seq"] for event in events] == [4, 5]
+        assert has_gap is False
+
+    def test_replay_reports_gap_when_buffer_overflowed(self) -> None:
+        """Test that replay flags events that already fell out of the ring buffer."""
+
+        run = build_run(2)
+        for _ in range(5):
+            run.record({"event_type": "status_update", "data": {}})
+
+        events, has_gap = run.replay_from(1)
+
+        assert [event["seq"] for event in events] == [4, 5]
+        assert has_gap is True
+        assert run.replay_from(5) == ([], False)
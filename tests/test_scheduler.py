@@ -0,0 +1,167 @@
+"""Module: test_scheduler.py
+
+Description:
+    Test cases for research run admission control and the fair-share queue.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+import pytest
+
+from app.api.scheduler import QueueFullError, ResearchScheduler
+from app.shared.limits import SlotLimiter
+
+
+class PolledSlotLimiter(SlotLimiter):
+    """Slot limiter polled like one shared across workers, counting how often it's checked."""
+
+    poll_interval = 0.01
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(limit)
+        self.checks = 0
+
+    def try_acquire(self) -> bool:
+        self.checks += 1
+        return super().try_acquire()
+
+
+async def settle() -> None:
+    """Let queued coroutines run until they block again."""
+
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestResearchScheduler:
+    """Test cases for ResearchScheduler."""
+
+    @pytest.mark.asyncio
+    async def test_admits_up_to_limit_then_queues(self) -> None:
+        """Test that runs beyond the active limit wait until a slot is released."""
+
+        scheduler = ResearchScheduler(max_active=1, max_queued=5)
+        await scheduler.acquire("a")
+
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await settle()
+        assert not waiter.done()
+        assert scheduler.queued == 1
+
+        scheduler.release(10.0)
+        await waiter
+        assert scheduler.active == 1
+        assert scheduler.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_round_robin_across_clients(self) -> None:
+        """Test that a client with many queued runs doesn't starve other clients."""
+
+        scheduler = ResearchScheduler(max_active=1, max_queued=10)
+        await scheduler.acquire("busy")
+
+        order: list[str] = []
+
+        async def run(client_id: str, label: str) -> None:
+            await scheduler.acquire(client_id)
+            order.append(label)
+            scheduler.release()
+
+        tasks = [
+            asyncio.create_task(run("busy", "busy-1")),
+            asyncio.create_task(run("busy", "busy-2")),
+            asyncio.create_task(run("busy", "busy-3")),
+            asyncio.create_task(run("quiet", "quiet-1")),
+        ]
+        await settle()
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+        assert order == ["busy-1", "quiet-1", "busy-2", "busy-3"]
+
+    @pytest.mark.asyncio
+    async def test_queue_full_rejects_with_retry_hint(self) -> None:
+        """Test that runs beyond queue capacity are rejected with a retry hint based on run history."""
+
+        scheduler = ResearchScheduler(max_active=1, max_queued=1)
+        await scheduler.acquire("a")
+        scheduler.release(20.0)
+        await scheduler.acquire("a")
+
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await settle()
+
+        with pytest.raises(QueueFullError) as exc_info:
+            await scheduler.acquire("c")
+        assert exc_info.value.retry_after_seconds == 40.0
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_queue_updates_and_cancellation(self) -> None:
+        """Test that queued runs receive position updates and leave the queue when cancelled."""
+
+        scheduler = ResearchScheduler(max_active=1, max_queued=5)
+        await scheduler.acquire("a")
+        scheduler.release(30.0)
+        await scheduler.acquire("a")
+
+        updates: list[tuple[int, float | None]] = []
+
+        async def on_update(position: int, eta: float | None) -> None:
+            updates.append((position, eta))
+
+        first = asyncio.create_task(scheduler.acquire("b"))
+        second = asyncio.create_task(scheduler.acquire("c", on_update))
+        await settle()
+        assert updates == [(1, 60.0)]
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await settle()
+        assert updates == [(1, 60.0), (0, 30.0)]
+        assert scheduler.queued == 1
+
+        scheduler.release()
+        await second
+        assert scheduler.active == 1
+
+    @pytest.mark.asyncio
+    async def test_only_the_head_of_the_queue_polls_shared_slots(self) -> None:
+        """Test that while runs wait for slots shared with other workers, only the next run in line checks for a
+        free slot, and queued runs are only woken when their position changes.
+        """
+
+        slots = PolledSlotLimiter(1)
+        scheduler = ResearchScheduler(max_active=1, max_queued=50, slots=slots)
+        await scheduler.acquire("a")
+
+        updates: dict[int, list[int]] = {}
+
+        def tracker(number: int) -> Callable[[int, float | None], Awaitable[None]]:
+            async def on_update(position: int, eta: float | None) -> None:
+                updates.setdefault(number, []).append(position)
+
+            return on_update
+
+        waiters = [asyncio.create_task(scheduler.acquire(f"client-{n}", tracker(n))) for n in range(20)]
+        await settle()
+        slots.checks = 0
+        await asyncio.sleep(0.1)
+
+        # About one check per poll interval, where every waiter polling would make 20 times as many
+        assert 1 <= slots.checks <= 15
+        assert all(positions == [n] for n, positions in updates.items())
+
+        scheduler.release()
+        await settle()
+        assert waiters[0].done()
+        assert updates[19] == [19, 18]
+
+        for waiter in waiters[1:]:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
@@ -0,0 +1,99 @@
+"""Module: test_server.py
+
+Description:
+    Test cases for server startup: keeping the agent stack out of the import path, warming it up ahead of the
+    first research run, and reporting readiness through the health check.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+from types import ModuleType
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import Response
+
+from app.agents import agents
+from app.shared.config import app_config
+
+
+@pytest.fixture
+def server() -> ModuleType:
+    """Import the server module, which needs a version to build the OpenAPI schema."""
+
+    with patch.object(app_config, "APP_VERSION", "test"):
+        from app.api import server
+
+    return server
+
+
+class TestStartup:
+    """Test cases for what the server loads on startup."""
+
+    def test_import_defers_agent_stack(self) -> None:
+        """Test that importing the server doesn't load LangChain, LangGraph or the checkpointer backends."""
+
+        heavy = ("langchain", "langchain_core", "langgraph", "langsmith", "aiosqlite", "rich")
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, app.api.server; print(sorted({m.split('.')[0] for m in sys.modules} & set(sys.argv[1:])))",
+                *heavy,
+            ],
+            capture_output=True,
+            check=True,
+            env={**os.environ, "APP_VERSION": "test"},
+            text=True,
+        )
+
+        assert result.stdout.strip() == "[]"
+
+
+class TestWarmUp:
+    """Test cases for warming up the agent stack."""
+
+    def test_builds_supervisor_agent_once(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that warm-up builds the supervisor agent that research runs then reuse, and reports anything that
+        couldn't be built instead of failing.
+        """
+
+        monkeypatch.setattr(agents, "_supervisor_agent", None)
+        checkpointer = MagicMock()
+
+        with (
+            patch.object(agents, "build_supervisor_agent", side_effect=lambda _: object()) as build,
+            patch.object(agents.research_tools, "get_summarization_model"),
+            patch.object(agents.research_tools, "get_tavily_client", side_effect=ValueError("missing API key")),
+            patch.object(agents.research_tools, "get_http_client"),
+        ):
+            failed = agents.warm_up(checkpointer)
+            agent = agents.get_supervisor_agent(checkpointer)
+
+            assert failed == ["tavily_client"]
+            assert agents.get_supervisor_agent(checkpointer) is agent
+            assert build.call_count == 1
+
+            # A different checkpointer needs its own graph
+            assert agents.get_supervisor_agent(None) is not agent
+            assert build.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_health_reports_warming_up(self, server: ModuleType, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that the health check reports not ready until warm-up has finished."""
+
+        warmup: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        monkeypatch.setattr(server.app.state, "warmup", warmup)
+
+        response = Response()
+        assert (await server.health_check(response))["status"] == "warming_up"
+        assert response.status_code == 503
+
+        warmup.set_result(None)
+        response = Response()
+        assert (await server.health_check(response))["status"] == "healthy"
+        assert response.status_code == 200
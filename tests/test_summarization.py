@@ -0,0 +1,186 @@
+"""Module: test_summarization.py
+
+Description:
+    Test cases for web page summarization: the summarization model role, its concurrency limit and timeout, and the
+    Ollama stand-in it can run against.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+from collections.abc import Iterator
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langchain_ollama import ChatOllama
+
+from app.agents.model_router import ModelRouter, build_model_router
+from app.agents.prompt_caching import ModelUsageHandler
+from app.agents.tools import research_tools
+from app.agents.usage import RunUsage, current_run_usage
+from app.shared.resilience import reset_providers
+from benchmarks.ollama_stand_in import build_app
+
+PAGE = "Mixture of experts models route each token to a few experts. " * 20
+
+
+class ConcurrencyTracker:
+    """ASGI middleware that tracks how many requests an app is serving at once."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+
+
+def stand_in_router(app: Any) -> ModelRouter:
+    """Build a summarization router whose only endpoint is an Ollama model talking to the given app."""
+
+    model = ChatOllama(
+        model="stand-in",
+        base_url="http://stand-in",
+        async_client_kwargs={"transport": httpx.ASGITransport(app=app)},
+        callbacks=[ModelUsageHandler("stand-in")],
+    )
+    return build_model_router(research_tools.SUMMARIZATION_AGENT, [("stand-in", model)])
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool() -> Iterator[None]:
+    """Give every test its own summarization slots and provider breakers."""
+
+    reset_providers()
+    with patch.object(research_tools, "summarization_slots", None):
+        yield
+    reset_providers()
+
+
+class TestSummarization:
+    """Test cases for summarize_webpage_content."""
+
+    @pytest.mark.asyncio
+    async def test_summarizes_with_stand_in(self) -> None:
+        """Test that pages are summarized through an Ollama-compatible endpoint with structured output, and that
+        the tokens are accounted to summarization rather than the researcher.
+        """
+
+        usage = RunUsage(prices={})
+        token = current_run_usage.set(usage)
+        try:
+            with patch.object(research_tools, "get_summarization_model", return_value=stand_in_router(build_app())):
+                summary = await research_tools.summarize_webpage_content(PAGE)
+        finally:
+            current_run_usage.reset(token)
+
+        assert summary.filename.endswith(".md") and summary.filename != "search_result.md"
+        assert summary.summary.startswith("Mixture of experts")
+        assert [agent for agent, _ in usage.models] == ["summarization"]
+
+    @pytest.mark.asyncio
+    async def test_limits_concurrency(self) -> None:
+        """Test that no more than MAX_CONCURRENT_SUMMARIES summaries are generated at once."""
+
+        server = ConcurrencyTracker(build_app(latency=0.02))
+        with (
+            patch.object(research_tools, "get_summarization_model", return_value=stand_in_router(server)),
+            patch.object(research_tools.app_config, "MAX_CONCURRENT_SUMMARIES", 2),
+        ):
+            summaries = await asyncio.gather(*(research_tools.summarize_webpage_content(PAGE) for _ in range(6)))
+
+        assert server.peak == 2
+        assert all(summary.filename != "search_result.md" for summary in summaries)
+
+    @pytest.mark.asyncio
+    async def test_slow_summaries_fall_back(self) -> None:
+        """Test that a summary outlasting SUMMARIZATION_TIMEOUT_SECONDS falls back to the page's opening."""
+
+        timeouts = research_tools.summaries.get(result="timeout")
+        with (
+            patch.object(
+                research_tools, "get_summarization_model", return_value=stand_in_router(build_app(latency=1.0))
+            ),
+            patch.object(research_tools.app_config, "SUMMARIZATION_TIMEOUT_SECONDS", 0.01),
+        ):
+            summary = await research_tools.summarize_webpage_content(PAGE)
+
+        assert summary.filename == "search_result.md"
+        assert summary.summary == PAGE[:1000] + "..."
+        assert research_tools.summaries.get(result="timeout") == timeouts + 1
+
+
+class TestProcessSearchResults:
+    """Test cases for process_search_results."""
+
+    @staticmethod
+    def results(*urls: str) -> dict:
+        """Build Tavily search results for the given URLs."""
+
+        return {
+            "results": [
+                {"url": url, "title": url, "content": f"Tavily's summary of {url}", "raw_content": ""} for url in urls
+            ]
+        }
+
+    @pytest.mark.asyncio
+    async def test_unreachable_pages_fall_back(self) -> None:
+        """Test that a page that can't be fetched falls back to Tavily's summary without failing the others."""
+
+        def serve(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "down.example":
+                raise httpx.ConnectError("Connection refused", request=request)
+            return httpx.Response(200, html=f"<p>{PAGE}</p>")
+
+        async def summarize(content: str) -> research_tools.Summary:
+            return research_tools.Summary(filename="moe.md", summary="Experts")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(serve))
+        with (
+            patch.object(research_tools, "get_http_client", return_value=client),
+            patch.object(research_tools, "summarize_webpage_content", side_effect=summarize),
+        ):
+            processed = await research_tools.process_search_results(
+                self.results("https://up.example", "https://down.example")
+            )
+
+        assert [result["summary"] for result in processed] == ["Experts", "Tavily's summary of https://down.example"]
+        assert processed[1]["filename"].startswith("URL_error_")
+
+    @pytest.mark.asyncio
+    async def test_failure_cancels_other_results(self) -> None:
+        """Test that when one result fails, the others still being summarized are cancelled with it."""
+
+        cancelled = research_tools.cancelled_work.get(kind="summarization")
+
+        async def summarize(content: str) -> research_tools.Summary:
+            if "fails" in content:
+                raise RuntimeError("Summarization failed")
+            await asyncio.sleep(10)
+            return research_tools.Summary(filename="moe.md", summary="Experts")
+
+        def serve(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, html=f"<p>{request.url.host}</p>")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(serve))
+        with (
+            patch.object(research_tools, "get_http_client", return_value=client),
+            patch.object(research_tools, "summarize_webpage_content", side_effect=summarize),
+            pytest.raises(RuntimeError, match="Summarization failed"),
+        ):
+            await asyncio.wait_for(
+                research_tools.process_search_results(
+                    self.results("https://slow.example", "https://fails.example", "https://slower.example")
+                ),
+                timeout=5,
+            )
+
+        assert research_tools.cancelled_work.get(kind="summarization") == cancelled + 2
@@ -0,0 +1,245 @@
+"""Module: test_tracing.py
+
+Description:
+    Test cases for per-run execution traces: span nesting across tasks and sub-agents, the Chrome trace and OTLP
+    exports, and the traces of runs served over the WebSocket.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncGenerator, Iterator
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.agents import agents
+from app.agents.model_router import build_model_router
+from app.agents.prompt_caching import ModelUsageHandler
+from app.agents.utils import stream_agent_for_websocket
+from app.api.websocket import WebSocketManager, trace_export_failures
+from app.shared.config import app_config
+from app.shared.resilience import reset_providers
+from app.shared.tracing import RunTrace, current_span, current_trace, span, start_trace, trace_path
+
+from .test_usage import ScriptedChatModel, delegate
+from .test_websocket import FakeWebSocket, wait_until_idle
+
+
+@pytest.fixture(autouse=True)
+def tracing_enabled() -> Iterator[None]:
+    """Enable tracing, and give every test its own trace context."""
+
+    trace_token = current_trace.set(None)
+    span_token = current_span.set(None)
+    with patch.object(app_config, "TRACING_ENABLED", True):
+        yield
+    current_span.reset(span_token)
+    current_trace.reset(trace_token)
+
+
+async def traced_stream(*_args: Any, **_kwargs: Any) -> AsyncGenerator[dict[str, Any], None]:
+    """Stand-in for stream_agent_for_websocket that opens a span like the real one does."""
+
+    with span("stream_agent"):
+        yield {"event_type": "status_update", "data": {"graph": "root", "node": "agent", "status": "processing"}}
+        with span("tavily_search", query="moe routing"):
+            await asyncio.sleep(0.01)
+        yield {"event_type": "completed", "data": {"message": "Research completed successfully"}}
+
+
+class TestRunTrace:
+    """Test cases for RunTrace and span."""
+
+    @pytest.mark.asyncio
+    async def test_spans_nest_across_tasks(self) -> None:
+        """Test that spans opened in concurrent tasks are children of the span open where the tasks were created,
+        and are put on separate lanes.
+        """
+
+        async def fetch(url: str) -> None:
+            with span("page_fetch", url=url):
+                await asyncio.sleep(0.01)
+
+        trace = start_trace("run")
+        assert trace is not None
+        with span("task", subagent_type="research-agent") as task:
+            await asyncio.gather(fetch("https://a.example"), fetch("https://b.example"))
+
+        assert task is not None
+        fetches = [recorded for recorded in trace.spans if recorded.name == "page_fetch"]
+        assert [recorded.parent_id for recorded in fetches] == [task.span_id, task.span_id]
+        assert len({task.lane, *(recorded.lane for recorded in fetches)}) == 3
+        assert all(recorded.end_ns is not None for recorded in trace.spans)
+        assert current_span.get() is None
+
+    def test_errors_are_recorded_and_spans_capped(self) -> None:
+        """Test that a span records the error raised in it, and that spans past the cap are dropped."""
+
+        with patch.object(app_config, "TRACE_MAX_SPANS", 2):
+            trace = start_trace("run")
+            assert trace is not None
+            with pytest.raises(ValueError), span("summarize"):
+                raise ValueError("bad page")
+            for _ in range(3):
+                with span("page_fetch"):
+                    pass
+
+        assert trace.spans[0].error == "ValueError: bad page"
+        assert len(trace.spans) == 2
+        assert trace.dropped == 2
+
+    def test_disabled_outside_a_trace(self) -> None:
+        """Test that nothing is traced while tracing is disabled."""
+
+        with patch.object(app_config, "TRACING_ENABLED", False):
+            assert start_trace("run") is None
+            with span("page_fetch") as fetching:
+                assert fetching is None
+
+    def test_exports(self) -> None:
+        """Test that traces export as Chrome trace events and as OTLP/JSON spans with matching parents."""
+
+        trace = RunTrace("run", 100)
+        parent = trace.start_span("research_run", None, {"run_id": "run"})
+        child = trace.start_span("tavily_search", parent, {"query": "moe", "max_results": 3})
+        assert parent is not None and child is not None
+        child.end_ns = child.start_ns + 2_000_000
+        parent.end_ns = child.end_ns
+
+        chrome = trace.export("chrome")
+        events = [event for event in chrome["traceEvents"] if event["ph"] == "X"]
+        assert [event["name"] for event in events] == ["research_run", "tavily_search"]
+        assert events[1]["dur"] == 2000
+        assert events[1]["args"]["parent_id"] == parent.span_id
+
+        otlp = trace.export("otlp")["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert "parentSpanId" not in otlp[0]
+        assert otlp[1]["parentSpanId"] == parent.span_id
+        assert {"key": "max_results", "value": {"intValue": "3"}} in otlp[1]["attributes"]
+
+        with pytest.raises(ValueError):
+            trace.export("jaeger")
+
+
+class TestTracedRuns:
+    """Test cases for the traces recorded while research runs execute."""
+
+    @pytest.mark.asyncio
+    async def test_sub_agents_nest_under_their_task(self) -> None:
+        """Test that a sub-agent's model calls are traced within the supervisor's `task` call."""
+
+        reset_providers()
+        responses = [delegate("call_1"), AIMessage(content="Findings"), AIMessage(content="Done")]
+        model = ScriptedChatModel(responses=responses, callbacks=[ModelUsageHandler("scripted")])
+        with (
+            patch.object(agents, "get_supervisor_model", return_value=build_model_router("supervisor", [("a", model)])),
+            patch.object(agents, "get_researcher_model", return_value=build_model_router("researcher", [("a", model)])),
+        ):
+            agent = agents.build_supervisor_agent()
+
+        trace = start_trace("run")
+        assert trace is not None
+        query = {"messages": [{"role": "user", "content": "moe routing"}]}
+        events = [event["event_type"] async for event in stream_agent_for_websocket(agent, query)]
+        reset_providers()
+
+        assert events[-1] == "completed"
+        by_id = {recorded.span_id: recorded for recorded in trace.spans}
+        model_calls = [recorded for recorded in trace.spans if recorded.name == "model_call"]
+        assert [recorded.attributes["role"] for recorded in model_calls] == ["supervisor", "researcher", "supervisor"]
+
+        task = next(recorded for recorded in trace.spans if recorded.name == "task")
+        assert task.attributes["subagent_type"] == "research-agent"
+        assert model_calls[1].parent_id == task.span_id
+        assert by_id[str(task.parent_id)].name == "stream_agent"
+        assert all(
+            by_id[str(recorded.parent_id)].name == "model_call"
+            for recorded in trace.spans
+            if recorded.name == "model_call.endpoint"
+        )
+
+    @pytest.mark.asyncio
+    async def test_run_traces_are_exported_and_served(self, tmp_path: Path) -> None:
+        """Test that a run's trace is written to TRACE_DIR when it finishes, and served to admins while the run is
+        retained and from TRACE_DIR afterwards.
+        """
+
+        with patch.object(app_config, "APP_VERSION", "test"):
+            from app.api import admin, server
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        with (
+            patch.multiple(app_config, TRACE_DIR=str(tmp_path), ADMIN_API_KEY="admin_key"),
+            patch.object(admin, "manager", manager),
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=traced_stream),
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            await websocket.incoming.put(json.dumps({"query": "moe routing", "request_id": "a"}))
+            await asyncio.sleep(0.01)
+            await wait_until_idle(manager, "client")
+            await websocket.incoming.put(None)
+            await handler
+
+            run_id = next(event["run_id"] for event in websocket.sent if event.get("request_id") == "a")
+            with open(trace_path(str(tmp_path), run_id, "chrome")) as file:
+                exported = json.load(file)
+            names = [event["name"] for event in exported["traceEvents"] if event["ph"] == "X"]
+            assert names == ["research_run", "queue", "stream_agent", "tavily_search"]
+
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=server.app),
+                base_url="http://test",
+                headers={"X-Admin-Key": "admin_key"},
+            ) as client:
+                url = f"/admin/runs/{run_id}/trace"
+                served = await client.get(url, params={"format": "otlp"})
+                spans = served.json()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+                assert [served_span["name"] for served_span in spans] == names
+
+                manager.runs.runs.clear()
+                assert (await client.get(url)).json() == exported
+                assert (await client.get(url, params={"format": "otlp"})).status_code == 404
+                assert (await client.get(url, params={"format": "perfetto"})).status_code == 422
+
+                # Traces hold the query, fetched URLs and tool arguments, so only admins can read them
+                assert (await client.get(url, headers={"X-Admin-Key": "wrong"})).status_code == 403
+                del client.headers["X-Admin-Key"]
+                assert (await client.get(url)).status_code == 401
+
+                with patch.object(app_config, "TRACING_ENABLED", False):
+                    assert (await client.get(url, headers={"X-Admin-Key": "admin_key"})).status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_failed_exports_are_counted(self, tmp_path: Path) -> None:
+        """Test that a trace that can't be written to TRACE_DIR is counted, and the run still completes."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+        failures = trace_export_failures.get()
+
+        with (
+            patch.object(app_config, "TRACE_DIR", str(tmp_path)),
+            patch("app.api.websocket.write_trace", side_effect=OSError("disk full")),
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=traced_stream),
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            await websocket.incoming.put(json.dumps({"query": "moe routing", "request_id": "a"}))
+            await asyncio.sleep(0.01)
+            await wait_until_idle(manager, "client")
+            await websocket.incoming.put(None)
+            await handler
+
+        assert trace_export_failures.get() == failures + 1
+        assert [event["event_type"] for event in websocket.sent if event.get("request_id") == "a"][-1] == "completed"
@@ -0,0 +1,206 @@
+"""Module: test_usage.py
+
+Description:
+    Test cases for token and cost accounting of research runs, run budgets, and the limit on delegation rounds.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import Field
+
+from app.agents import agents
+from app.agents.prompt_caching import ModelUsageHandler
+from app.agents.usage import (
+    BUDGET_EXCEEDED_NOTE,
+    ModelPrice,
+    RunUsage,
+    current_run_usage,
+    find_model_price,
+    parse_model_prices,
+    record_model_usage,
+)
+from app.api.websocket import WebSocketManager
+
+from .test_websocket import FakeWebSocket, wait_until_idle
+
+USAGE = {"input_tokens": 100, "output_tokens": 10, "total_tokens": 110}
+
+
+def delegate(call_id: str) -> AIMessage:
+    """Build a supervisor turn that delegates a task to the researcher."""
+
+    tool_call = {
+        "name": "task",
+        "args": {"description": "Research moe routing", "subagent_type": "research-agent"},
+        "id": call_id,
+    }
+    return AIMessage(content="", tool_calls=[tool_call])
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that gives scripted answers in order (to whichever agent calls it) and records every request."""
+
+    responses: list[AIMessage]
+    requests: list[list[BaseMessage]] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable[Any, BaseMessage]:
+        return self
+
+    def _generate(
+        self, messages: list[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        self.requests.append(messages)
+        response = self.responses.pop(0).model_copy(update={"usage_metadata": USAGE})
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+
+async def run_supervisor(responses: list[AIMessage], usage: RunUsage) -> tuple[ScriptedChatModel, dict[str, Any]]:
+    """Run the supervisor agent with a scripted model as part of a research run with the given usage."""
+
+    model = ScriptedChatModel(responses=responses, callbacks=[ModelUsageHandler("scripted")])
+    with (
+        patch.object(agents, "get_supervisor_model", return_value=model),
+        patch.object(agents, "get_researcher_model", return_value=model),
+        patch.object(agents.app_config, "RUN_TOKEN_BUDGET", usage.token_budget),
+    ):
+        agent = agents.build_supervisor_agent()
+
+    token = current_run_usage.set(usage)
+    try:
+        result = await agent.ainvoke({"messages": [{"role": "user", "content": "moe routing"}]})
+    finally:
+        current_run_usage.reset(token)
+
+    return model, result
+
+
+class TestRunUsage:
+    """Test cases for RunUsage."""
+
+    def test_prices(self) -> None:
+        """Test that prices are parsed and matched by model name prefix, ignoring provider prefixes."""
+
+        prices = parse_model_prices("claude-3-5-sonnet=3:15:0.3, gpt-4o=2.5:10,gpt-4o-mini=0.15:0.6")
+
+        assert prices["gpt-4o"] == ModelPrice(2.5, 10)
+        assert find_model_price(prices, "anthropic:claude-3-5-sonnet-20241022") == ModelPrice(3, 15, 0.3)
+        assert find_model_price(prices, "gpt-4o-mini-2024-07-18") == ModelPrice(0.15, 0.6)
+        assert find_model_price(prices, "llama3") is None
+
+        with pytest.raises(ValueError):
+            parse_model_prices("gpt-4o=2.5")
+
+    def test_cost_and_budget(self) -> None:
+        """Test that usage is priced with cache reads at their own price, and that going over budget is flagged."""
+
+        usage = RunUsage(token_budget=0, cost_budget=0.01, prices={"claude": ModelPrice(3, 15, 0.3)})
+        details = {"input_token_details": {"cache_read": 1000}}
+        usage.record("supervisor", "claude-sonnet-4", {"input_tokens": 2000, "output_tokens": 100, **details})
+
+        assert usage.cost_usd == pytest.approx((1000 * 3 + 1000 * 0.3 + 100 * 15) / 1_000_000)
+        assert usage.exceeded is None
+
+        usage.record("research-agent", "claude-sonnet-4", {"input_tokens": 2000, "output_tokens": 100})
+        snapshot = usage.snapshot()
+
+        assert usage.exceeded == "cost"
+        assert snapshot["total_tokens"] == 4200
+        assert [(row["agent"], row["calls"]) for row in snapshot["by_model"]] == [
+            ("supervisor", 1),
+            ("research-agent", 1),
+        ]
+
+
+class TestRunLimits:
+    """Test cases for accounting and limiting agent runs."""
+
+    @pytest.mark.asyncio
+    async def test_usage_by_agent_and_iteration_limit(self) -> None:
+        """Test that model calls are accounted to the agent that made them, and that delegation rounds past
+        MAX_RESEARCHER_ITERATIONS are refused without starting a sub-agent.
+        """
+
+        usage = RunUsage(prices={})
+        responses = [delegate("call_1"), AIMessage(content="Findings"), delegate("call_2"), AIMessage(content="Done")]
+        with patch.object(agents.app_config, "MAX_RESEARCHER_ITERATIONS", 1):
+            _model, result = await run_supervisor(responses, usage)
+
+        assert {key: entry.calls for key, entry in usage.models.items()} == {
+            ("supervisor", "scripted"): 3,
+            ("research-agent", "scripted"): 1,
+        }
+
+        tool_results = [message for message in result["messages"] if isinstance(message, ToolMessage)]
+        assert tool_results[0].content == "Findings"
+        assert "limit of 1 rounds" in str(tool_results[1].content)
+
+    @pytest.mark.asyncio
+    async def test_over_budget_run_wraps_up(self) -> None:
+        """Test that once a run is over budget, delegation is refused and the supervisor is told to wrap up."""
+
+        usage = RunUsage(token_budget=150, prices={})
+        responses = [delegate("call_1"), AIMessage(content="Findings"), delegate("call_2"), AIMessage(content="Done")]
+        with patch.object(agents.app_config, "MAX_RESEARCHER_ITERATIONS", 5):
+            model, result = await run_supervisor(responses, usage)
+
+        assert usage.exceeded == "tokens"
+        tool_results = [message for message in result["messages"] if isinstance(message, ToolMessage)]
+        assert "budget" in str(tool_results[1].content)
+        assert model.requests[-1][-1].content == BUDGET_EXCEEDED_NOTE
+        assert all(message.content != BUDGET_EXCEEDED_NOTE for message in result["messages"])
+
+
+async def metered_stream(*_args: Any, **_kwargs: Any) -> AsyncGenerator[dict[str, Any], None]:
+    """Stand-in for stream_agent_for_websocket that makes a model call between its events."""
+
+    yield {"event_type": "status_update", "data": {"graph": "root", "node": "agent", "status": "processing"}}
+    record_model_usage("scripted", USAGE)
+    await asyncio.sleep(0)
+    yield {"event_type": "completed", "data": {"message": "Research completed successfully"}}
+
+
+class TestUsageEvents:
+    """Test cases for streaming usage events."""
+
+    @pytest.mark.asyncio
+    async def test_changed_totals_are_streamed(self) -> None:
+        """Test that a run's totals are sent when they change, ahead of the next event, to subscribed clients."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        with (
+            patch("app.agents.get_supervisor_agent", return_value=object()),
+            patch("app.api.websocket.stream_agent_for_websocket", side_effect=metered_stream),
+        ):
+            handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+            await websocket.incoming.put(json.dumps({"query": "moe routing", "request_id": "a"}))
+            subscription = {"event_types": ["completed"]}
+            await websocket.incoming.put(
+                json.dumps({"query": "moe routing", "request_id": "b", "subscription": subscription})
+            )
+            await asyncio.sleep(0.01)
+            await wait_until_idle(manager, "client")
+            await websocket.incoming.put(None)
+            await handler
+
+        assert websocket.events_for("a") == ["status_update", "status_update", "usage", "completed"]
+        usage_event = next(event for event in websocket.sent if event["event_type"] == "usage")
+        assert usage_event["data"]["total_tokens"] == 110
+        assert websocket.events_for("b") == ["status_update", "status_update", "completed"]
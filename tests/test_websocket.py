@@ -0,0 +1,273 @@
+"""Module: test_websocket.py
+
+Description:
+    Test cases for the WebSocket manager, including multiplexed research runs and cancellation.
+
+Author: Nathan Thomas
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from app.api.run_store import MemoryRunStore
+from app.api.websocket import WebSocketManager, cancelled_runs
+
+
+class FakeWebSocket:
+    """In-memory WebSocket that feeds queued client messages and records everything the server sends."""
+
+    def __init__(self) -> None:
+        self.incoming: asyncio.Queue[str | None] = asyncio.Queue()
+        self.sent: list[dict[str, Any]] = []
+        self.closed = False
+        self.close_code: int | None = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.closed = True
+        self.close_code = code
+
+    async def receive_text(self) -> str:
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect()
+        return message
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(json.loads(data))
+
+    def events_for(self, request_id: str) -> list[str]:
+        return [event["event_type"] for event in self.sent if event.get("request_id") == request_id]
+
+    def sequence_numbers(self) -> list[int]:
+        return [event["seq"] for event in self.sent if "seq" in event]
+
+
+async def slow_stream(*_args: Any, **_kwargs: Any) -> AsyncGenerator[dict[str, Any], None]:
+    """Stand-in for stream_agent_for_websocket that takes a while to complete."""
+
+    yield {"event_type": "status_update", "data": {"graph": "root", "node": "agent", "status": "processing"}}
+    await asyncio.sleep(0.05)
+    yield {"event_type": "completed", "data": {"message": "Research completed successfully"}}
+
+
+async def wait_until_idle(manager: WebSocketManager, client_id: str) -> None:
+    """Wait for every research run on a connection to finish."""
+
+    for _ in range(100):
+        if all(run.finished for run in manager.runs.runs_for(client_id)):
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def patched_agent() -> Any:
+    with (
+        patch("app.agents.get_supervisor_agent", return_value=object()),
+        patch("app.api.websocket.stream_agent_for_websocket", side_effect=slow_stream),
+    ):
+        yield
+
+
+class TestWebSocketManager:
+    """Test cases for WebSocketManager request multiplexing."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_concurrent_runs_are_tagged_by_request_id(self) -> None:
+        """Test that several queries on one connection run concurrently with events tagged by request ID."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        assert await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await websocket.incoming.put(json.dumps({"query": "second", "request_id": "b"}))
+        await asyncio.sleep(0.01)
+
+        assert {run.request_id for run in manager.runs.runs_for("client")} == {"a", "b"}
+
+        await wait_until_idle(manager, "client")
+        await websocket.incoming.put(None)
+        await handler
+
+        for request_id in ("a", "b"):
+            assert websocket.events_for(request_id) == ["status_update", "status_update", "completed"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_per_connection_run_cap(self) -> None:
+        """Test that runs beyond the per-connection cap are rejected."""
+
+        manager = WebSocketManager()
+        manager.max_runs_per_connection = 1
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await websocket.incoming.put(json.dumps({"query": "second", "request_id": "b"}))
+        await asyncio.sleep(0.01)
+        await wait_until_idle(manager, "client")
+        await websocket.incoming.put(None)
+        await handler
+
+        assert websocket.events_for("b") == ["error"]
+        assert websocket.events_for("a")[-1] == "completed"
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_cancel_message_stops_run(self) -> None:
+        """Test that a cancel message stops only the targeted run."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await websocket.incoming.put(json.dumps({"query": "second", "request_id": "b"}))
+        await asyncio.sleep(0.01)
+        await websocket.incoming.put(json.dumps({"type": "cancel", "request_id": "a"}))
+        await wait_until_idle(manager, "client")
+        await websocket.incoming.put(None)
+        await handler
+
+        assert websocket.events_for("a")[-1] == "cancelled"
+        assert websocket.events_for("b")[-1] == "completed"
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_disconnect_cancels_runs_after_grace_period(self) -> None:
+        """Test that runs nobody resumes after a disconnect are cancelled and the reason is recorded."""
+
+        manager = WebSocketManager()
+        manager.runs.resume_grace_seconds = 0
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await asyncio.sleep(0.01)
+        task = manager.runs.runs_for("client")[0].task
+        assert task is not None
+        before = cancelled_runs.get(reason="client_disconnect")
+
+        await websocket.incoming.put(None)
+        await handler
+        await asyncio.gather(task, return_exceptions=True)
+
+        assert task.cancelled()
+        assert cancelled_runs.get(reason="client_disconnect") == before + 1
+        assert "client" not in manager.active_connections
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_resume_replays_missed_events(self) -> None:
+        """Test that a reconnecting client can resume a run and receives every event exactly once, in order."""
+
+        manager = WebSocketManager()
+        first_socket = FakeWebSocket()
+        await manager.connect(first_socket, "first")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(first_socket, "first"))  # type: ignore[arg-type]
+        await first_socket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await asyncio.sleep(0.01)
+        await first_socket.incoming.put(None)
+        await handler
+
+        run_id = first_socket.sent[0]["run_id"]
+        last_seq = first_socket.sequence_numbers()[0]
+
+        second_socket = FakeWebSocket()
+        await manager.connect(second_socket, "second")  # type: ignore[arg-type]
+        handler = asyncio.create_task(manager.handle_websocket_stream(second_socket, "second"))  # type: ignore[arg-type]
+        await second_socket.incoming.put(json.dumps({"type": "resume", "run_id": run_id, "last_seq": last_seq}))
+        await asyncio.sleep(0.01)
+        await wait_until_idle(manager, "second")
+        await second_socket.incoming.put(None)
+        await handler
+
+        assert second_socket.sent[0]["data"]["status"] == "resumed"
+        assert second_socket.events_for("a")[-1] == "completed"
+        assert [last_seq, *second_socket.sequence_numbers()] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_resume_unknown_run(self) -> None:
+        """Test that resuming an unknown run returns an error."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"type": "resume", "run_id": "missing"}))
+        await websocket.incoming.put(None)
+        await handler
+
+        assert websocket.sent[0]["event_type"] == "error"
+        assert websocket.sent[0]["data"]["code"] == "NOT_FOUND"
+
+
+class TestDrain:
+    """Test cases for draining the WebSocket manager ahead of a shutdown."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_drain_waits_for_runs_and_rejects_new_work(self) -> None:
+        """Test that draining lets running runs finish, turns away new requests, and closes connections."""
+
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await asyncio.sleep(0.01)
+
+        drain = asyncio.create_task(manager.drain(timeout=5))
+        await asyncio.sleep(0)
+        await websocket.incoming.put(json.dumps({"query": "second", "request_id": "b"}))
+        await drain
+        await websocket.incoming.put(None)
+        await handler
+
+        late_socket = FakeWebSocket()
+        assert not await manager.connect(late_socket, "late")  # type: ignore[arg-type]
+
+        assert websocket.events_for("a")[-1] == "completed"
+        assert websocket.events_for("b") == ["error"]
+        assert websocket.close_code == 1012
+        assert late_socket.close_code == 1012
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("patched_agent")
+    async def test_drain_deadline_keeps_runs_resumable(self) -> None:
+        """Test that runs still going at the drain deadline are cancelled but kept in the run store."""
+
+        manager = WebSocketManager()
+        manager.store = MemoryRunStore()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")  # type: ignore[arg-type]
+
+        handler = asyncio.create_task(manager.handle_websocket_stream(websocket, "client"))  # type: ignore[arg-type]
+        await websocket.incoming.put(json.dumps({"query": "first", "request_id": "a"}))
+        await asyncio.sleep(0.01)
+        before = cancelled_runs.get(reason="shutdown")
+
+        await manager.drain(timeout=0)
+        await websocket.incoming.put(None)
+        await handler
+
+        assert websocket.events_for("a")[-1] == "cancelled"
+        assert cancelled_runs.get(reason="shutdown") == before + 1
+        assert [stored.request_id for stored in await manager.store.interrupted()] == ["a"]